@@ -1,19 +1,45 @@
+import sys
 from argparse import ArgumentParser
 from DSE.AccumMethod import AccumMethod
 from DSE.DesignConfig import DesignConfig
 from DSE.SynthesisHandler import SynthesisHandler
-from DSE.analytical_model import calibrate_analytical_models, predict_synthesis_results
+from DSE.analytical_model import calibrate_analytical_models, calibrate_perplexity_model, predict_synthesis_results, predict_perplexity, predict_perplexities
 from DSE.Plotter import Plotter
+from DSE.YosysEstimator import YosysEstimator
+from DSE import tracing
 
+def predict_designs(design_strs, pickle_dir="synthesis_fits", yosys_estimator=None):
+  """Predicted LUTs, FFs and perplexity of designs given as repr(DesignConfig), from the saved fits only."""
+  designs = [DesignConfig.from_str(s) for s in design_strs]
+  perplexities, stds = predict_perplexities(pickle_dir, designs, return_std=True)
+  for design, perplexity, std in zip(designs, perplexities, stds):
+    luts = predict_synthesis_results(pickle_dir, "LUTs", design, yosys_estimator=yosys_estimator)
+    ffs = predict_synthesis_results(pickle_dir, "FFs", design, yosys_estimator=yosys_estimator)
+    print(f"{design!r}: LUTs {luts:.0f}, FFs {ffs:.0f}, perplexity {perplexity:.2f} (log std {std:.3f})")
 
 if __name__ == "__main__":
   parser = ArgumentParser(description='Run DSE for attention module synthesis')
   parser.add_argument('--dry', action='store_true', help='Dry run, do not run synthesis')
   parser.add_argument('--verbose', action='store_true', help='Enable verbose output')
   parser.add_argument('--max-workers', type=int, default=4, help='Maximum number of parallel synthesis processes')
+  parser.add_argument('--yosys', default=None, help='Yosys binary with the slang frontend, adds Yosys estimates as a model feature')
+  parser.add_argument('--perplexity-cv', type=int, default=0, metavar='FOLDS', help='Cross-validate the perplexity surrogate with this many folds, with 3 kernel optimizer restarts (default: off)')
+  parser.add_argument('--trace', default=None, help='Write a Chrome trace of the pipeline stages to this file and print a summary table')
+  parser.add_argument('--predict', nargs='+', default=None, metavar='DESIGN', help='Only print predictions for these designs (repr(DesignConfig) strings) from the saved fits, skipping calibration and plotting')
   args = parser.parse_args()
   
-  calibrate_analytical_models(args.verbose)
+  if args.trace:
+    tracing.enable()
+  
+  yosys_estimator = YosysEstimator(yosys_bin=args.yosys, max_workers=args.max_workers, verbose=args.verbose) if args.yosys else None
+
+  if args.predict:
+    predict_designs(args.predict, yosys_estimator=yosys_estimator)
+    sys.exit(0)
+  
+  with tracing.span("calibration"):
+    calibrate_analytical_models(args.verbose, yosys_estimator=yosys_estimator)
+    calibrate_perplexity_model(args.verbose, cv_folds=args.perplexity_cv)
 
   # Prediction Example
   design_to_predict = DesignConfig(
@@ -29,12 +55,22 @@ if __name__ == "__main__":
     accum_method2=AccumMethod.Kahan,
     accum_method3=AccumMethod.Kahan,
   )
-  predicted_luts = predict_synthesis_results("synthesis_fits", "LUTs", design_to_predict)
-  predicted_ffs = predict_synthesis_results("synthesis_fits", "FFs", design_to_predict)
+  with tracing.span("prediction"):
+    predicted_luts = predict_synthesis_results("synthesis_fits", "LUTs", design_to_predict, yosys_estimator=yosys_estimator)
+    predicted_ffs = predict_synthesis_results("synthesis_fits", "FFs", design_to_predict, yosys_estimator=yosys_estimator)
+    predicted_ppl, predicted_ppl_std = predict_perplexity("synthesis_fits", design_to_predict, return_std=True)
   print(f"Predicted LUTS: {predicted_luts}, FFs: {predicted_ffs}")
+  print(f"Predicted perplexity: {predicted_ppl:.2f} (log std {predicted_ppl_std:.3f})")
+  
+  with tracing.span("ingestion"):
+    synthesis_handler = SynthesisHandler([], synth_output_dir="synth_output")
+    synthesis_handler.find_and_process_results(report_filter="accuracy", predict_resources=True, ablation_check=True, verbose=args.verbose)
   
-  synthesis_handler = SynthesisHandler([], synth_output_dir="synth_output")
-  synthesis_handler.find_and_process_results(report_filter="accuracy", predict_resources=True, ablation_check=True, verbose=args.verbose)
+  with tracing.span("plotting"):
+    plotter = Plotter(synthesis_handler.results)
+    plotter.plot_perplexity(directory="./plots", filename_suffix="joint", plot_file_format="png")
   
-  plotter = Plotter(synthesis_handler.results)
-  plotter.plot_perplexity(directory="./plots", filename_suffix="joint", plot_file_format="png")
\ No newline at end of file
+  if args.trace:
+    tracing.save_chrome_trace(args.trace)
+    tracing.print_summary()
+    print(f"Saved Chrome trace to {args.trace}")
\ No newline at end of file
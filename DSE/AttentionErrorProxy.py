@@ -0,0 +1,173 @@
+import os
+import json
+import math
+import pickle
+
+import numpy as np
+import torch
+from scipy.stats import spearmanr
+
+from quant.quant_utils.modelling_llama import QuantLlamaAttention
+
+METRICS = ["mse", "kl"]
+
+class AttentionErrorProxy:
+  """
+  Experimental accuracy proxy from per-layer attention error. Runs the
+  quantized Q*K^T, softmax and P*V of QuantLlamaAttention on cached post-RoPE
+  Q/K/V states (`quant/llama_ppl.py --save_attn_states`) on CPU and compares
+  against the unquantized attention, so designs can be ranked without a model
+  forward pass once it is fitted to measured perplexities.
+
+  No calibrated fit ships with the repository and its rank correlation with
+  perplexity is unmeasured, so nothing in the DSE uses it: perplexity is
+  predicted by analytical_model.predict_perplexity.
+
+  The ordered-sum reference is slow on CPU, so by default only max_layers
+  evenly spaced layers and the first max_heads heads are used, pass
+  max_layers=None and max_heads=None (or explicit layers) to use all of them.
+  """
+  def __init__(self, states_dir, layers=None, max_layers=4, max_heads=8, num_tokens=None, pickle_dir="./synthesis_fits", verbose=False):
+    self.states_dir = states_dir
+    self.pickle_dir = pickle_dir
+    self.verbose = verbose
+
+    with open(os.path.join(states_dir, "attn_meta.json"), "r") as f:
+      self.meta = json.load(f)
+
+    if layers is None:
+      num_layers = self.meta["num_layers"]
+      num_used = num_layers if max_layers is None else min(max_layers, num_layers)
+      layers = sorted({i * num_layers // num_used for i in range(num_used)})
+    self.layers = list(layers)
+    self.num_key_value_groups = self.meta["num_key_value_groups"]
+
+    # Keep whole key/value heads with their query groups
+    num_kv_heads = self.meta["num_heads"] // self.num_key_value_groups
+    if max_heads is not None:
+      num_kv_heads = min(num_kv_heads, max(max_heads // self.num_key_value_groups, 1))
+
+    self.states = {}
+    for layer in self.layers:
+      qkv = torch.load(os.path.join(states_dir, f"{layer}_qkv.pt"))
+      self.states[layer] = (
+        qkv["q"][:, :num_kv_heads * self.num_key_value_groups, :num_tokens],
+        qkv["k"][:, :num_kv_heads, :num_tokens],
+        qkv["v"][:, :num_kv_heads, :num_tokens],
+      )
+
+    q = self.states[self.layers[0]][0]
+    seq_len = q.shape[2]
+    self.attention_mask = torch.full((seq_len, seq_len), torch.finfo(q.dtype).min, dtype=q.dtype).triu(1)[None, None]
+
+    reference = self._attention({})
+    self.reference = {layer: (out.float(), probs.float()) for layer, (out, probs) in reference.items()}
+
+    self._cache = {}
+    self.fit = None
+
+  def _attention(self, q_config):
+    attn = QuantLlamaAttention.from_states(self.meta["head_dim"], self.num_key_value_groups, q_config)
+    with torch.no_grad():
+      return {layer: attn.quant_attention(q, k, v, self.attention_mask) for layer, (q, k, v) in self.states.items()}
+
+  @staticmethod
+  def _key(design):
+    # Designs differing only in hardware parameters share a quantization config
+    return json.dumps(design.get_quant_config(), sort_keys=True)
+
+  def measure(self, design):
+    """
+    Returns {"mse", "kl"} averaged over layers, with the per-layer values
+    under "mse_per_layer" and "kl_per_layer". The MSE is of the attention
+    output relative to its mean square, the KL is of the unquantized from the
+    quantized attention probabilities, averaged over query rows.
+    """
+    key = self._key(design)
+    if key in self._cache:
+      return self._cache[key]
+
+    outputs = self._attention(design.get_quant_config())
+
+    mse, kl = [], []
+    for layer in self.layers:
+      out_ref, probs_ref = self.reference[layer]
+      out, probs = outputs[layer][0].float(), outputs[layer][1].float()
+
+      mse.append(((out - out_ref) ** 2).mean().item() / (out_ref ** 2).mean().item())
+
+      probs = probs.clamp_min(1e-12)
+      probs = probs / probs.sum(dim=-1, keepdim=True)
+      kl_rows = torch.where(probs_ref > 0, probs_ref * (probs_ref.clamp_min(1e-12).log() - probs.log()), 0.0).sum(dim=-1)
+      kl.append(kl_rows.mean().item())
+
+    errors = {"mse": float(np.mean(mse)), "kl": float(np.mean(kl)), "mse_per_layer": mse, "kl_per_layer": kl}
+    self._cache[key] = errors
+
+    if self.verbose:
+      print(f"Attention error of {design!r}: MSE {errors['mse']:.3e}, KL {errors['kl']:.3e}")
+
+    return errors
+
+  def calibrate(self, results, metric="kl", degree=1):
+    """
+    Fits log perplexity as a polynomial of the log proxy error over results
+    with a measured perplexity, and saves it to the pickle directory.
+    Returns the Spearman rank correlation between proxy and perplexity.
+    """
+    if metric not in METRICS:
+      raise ValueError(f"Unsupported metric: {metric}")
+
+    # Average repeated measurements of the same quantization config
+    perplexities = {}
+    designs = {}
+    for result in results:
+      if result.accuracy <= 0:
+        continue
+      key = self._key(result.design_config)
+      perplexities.setdefault(key, []).append(result.accuracy)
+      designs.setdefault(key, result.design_config)
+
+    if len(perplexities) <= degree:
+      raise ValueError(f"Need more than {degree} distinct quantization configs with perplexities, got {len(perplexities)}.")
+
+    x = np.array([math.log(self.measure(designs[key])[metric] + 1e-12) for key in perplexities])
+    y = np.array([math.log(np.mean(ppls)) for ppls in perplexities.values()])
+
+    rho = spearmanr(x, y).correlation
+    self.fit = {
+      "metric": metric,
+      "coefficients": np.polyfit(x, y, degree),
+      "spearman": rho,
+      "num_configs": len(perplexities),
+      "meta": self.meta,
+    }
+
+    with open(os.path.join(self.pickle_dir, "fit_model_perplexity_proxy.pkl"), "wb") as f:
+      pickle.dump(self.fit, f)
+
+    if self.verbose:
+      print(f"Calibrated attention {metric} proxy on {len(perplexities)} configs, Spearman rho: {rho:.3f}")
+
+    return rho
+
+  def load_fit(self):
+    fit_path = os.path.join(self.pickle_dir, "fit_model_perplexity_proxy.pkl")
+    if not os.path.exists(fit_path):
+      raise RuntimeError(f"No attention proxy fit at {fit_path}, the proxy is uncalibrated until calibrate() is run on measured perplexities")
+
+    with open(fit_path, "rb") as f:
+      self.fit = pickle.load(f)
+
+    return self.fit
+
+  def predict_perplexity(self, design):
+    if self.fit is None:
+      self.load_fit()
+
+    error = self.measure(design)[self.fit["metric"]]
+    return math.exp(np.polyval(self.fit["coefficients"], math.log(error + 1e-12)))
+
+  def rank(self, designs, metric="kl"):
+    """Designs sorted by proxy error, lowest first."""
+    return sorted(designs, key=lambda design: self.measure(design)[metric])
@@ -1,9 +1,26 @@
 import re
+import json
+import hashlib
+import functools
 
 from DSE.MXFPBits import MXFPBits
 from DSE.AccumMethod import AccumMethod
 
+# One pattern for design strings in both naming schemes, the legacy single
+# block size (_k_32_) or one per stage (_k1_32_k2_32_k3_32_)
+_DESIGN_PATTERN = re.compile(
+  r"([^/]+?)_S_q_(\d+)_S_kv_(\d+)_d_kq_(\d+)_d_v_(\d+)_(?:k_(\d+)|k1_(\d+)_k2_(\d+)_k3_(\d+))_scale_width_(\d+)_"
+  r"M1_E_(\d+)_M1_M_(\d+)_M2_E_(\d+)_M2_M_(\d+)_M3_E_(\d+)_M3_M_(\d+)_ACCUM_METHOD_([A-Z]+)_([A-Z]+)_([A-Z]+)_DSP_([a-zA-Z]+)_([a-zA-Z]+)_([a-zA-Z]+)"
+)
+# What follows "_time_" in a report filename: the time and the report suffix
+_TIME_PATTERN = re.compile(r"(\d+_\d+)(?:_(.*))?")
+
 class DesignConfig:
+  model_id = "meta-llama/Llama-3.2-1B"
+
+  # Design strings decoded by _decode_str, enough for every design of a large sweep directory
+  DECODE_CACHE_SIZE = 1 << 14
+
   def __init__(self, name, S_q=-1, S_kv=-1, d_kq=-1, d_v=-1, k1=-1, k2=-1, k3=-1, scale_width=-1, M1_E=-1, M1_M=-1, M2_E=-1, M2_M=-1, M3_E=-1, M3_M=-1, accum_method1=AccumMethod.Kulisch, accum_method2=AccumMethod.Kulisch, accum_method3=AccumMethod.Kulisch, m1_dsp="yes", m2_dsp="yes", m3_dsp="yes"):
     self.name = name
     
@@ -37,141 +54,66 @@ class DesignConfig:
   
   def get_total_k(self):
     return self.k1 + self.k2 + self.k3
+
+  def get_params(self):
+    """Parameters that identify the design, in constructor order, as plain values."""
+    return (
+      self.name, self.S_q, self.S_kv, self.d_kq, self.d_v, self.k1, self.k2, self.k3, self.scale_width,
+      self.M1_bits.exp_bits, self.M1_bits.mant_bits, self.M2_bits.exp_bits, self.M2_bits.mant_bits, self.M3_bits.exp_bits, self.M3_bits.mant_bits,
+      self.accum_method1.value, self.accum_method2.value, self.accum_method3.value, self.m1_dsp, self.m2_dsp, self.m3_dsp,
+    )
+
+  @property
+  def key(self):
+    """
+    Content-addressed design ID, a 16 hex character hash of the normalised
+    parameters (plain ints, lower case strings). A design has the same key
+    whichever naming scheme its reports use and on every machine.
+    """
+    params = "|".join(str(param).lower() for param in self.get_params())
+    return hashlib.blake2b(params.encode(), digest_size=8).hexdigest()
   
-  def get_quant_flags(self):
-    out = "--model_id 'meta-llama/Llama-3.2-1B' "
+  def get_quant_config(self):
+    config = {}
+    for name, bits, k in [("k_quantizer", self.M1_bits, self.k1), ("s_quantizer", self.M2_bits, self.k2), ("v_quantizer", self.M3_bits, self.k3)]:
+      if bits.exp_bits == 0:
+        config[name] = {"quant": "MXINTQuantizer", "bit_w": bits.mant_bits, "group_size": k}
+      else:
+        config[name] = {"quant": "MXFPQuantizer", "man_w": bits.mant_bits, "exp_w": bits.exp_bits, "group_size": k}
 
-    if self.M1_bits.exp_bits == 0:
-      out += f'--config \'k_quantizer={{"quant":"MXINTQuantizer","bit_w":{self.M1_bits.mant_bits},"group_size":{self.k1}}}\' '
-    else:
-      out += f'--config \'k_quantizer={{"quant":"MXFPQuantizer","man_w":{self.M1_bits.mant_bits},"exp_w":{self.M1_bits.exp_bits},"group_size":{self.k1}}}\' '
+    config["sum_type_attn_s"] = self.accum_method1.value
+    config["sum_type_smax"] = self.accum_method2.value
+    config["sum_type_attn_o"] = self.accum_method3.value
 
-    if self.M2_bits.exp_bits == 0:
-      out += f'--config \'s_quantizer={{"quant":"MXINTQuantizer","bit_w":{self.M2_bits.mant_bits},"group_size":{self.k2}}}\' '
-    else:
-      out += f'--config \'s_quantizer={{"quant":"MXFPQuantizer","man_w":{self.M2_bits.mant_bits},"exp_w":{self.M2_bits.exp_bits},"group_size":{self.k2}}}\' '
+    return config
 
-    if self.M3_bits.exp_bits == 0:
-      out += f'--config \'v_quantizer={{"quant":"MXINTQuantizer","bit_w":{self.M3_bits.mant_bits},"group_size":{self.k3}}}\' '
-    else:
-      out += f'--config \'v_quantizer={{"quant":"MXFPQuantizer","man_w":{self.M3_bits.mant_bits},"exp_w":{self.M3_bits.exp_bits},"group_size":{self.k3}}}\' '
-    
-    out += f'--config \'sum_type_attn_s="{self.accum_method1.value}"\' '
-    out += f'--config \'sum_type_smax="{self.accum_method2.value}"\' '
-    out += f'--config \'sum_type_attn_o="{self.accum_method3.value}"\' '
+  def get_quant_flags(self):
+    out = f"--model_id '{self.model_id}' "
+
+    for name, value in self.get_quant_config().items():
+      out += f"--config '{name}={json.dumps(value, separators=(',', ':'))}' "
 
     return out
   
-  def _check_all_widths_are(self, e, m, e2=None, m2=None):
-    e2 = e if e2 is None else e2
-    m2 = m if m2 is None else m2
-    return (
-      self.M1_bits.exp_bits == e and self.M1_bits.mant_bits == m and
-      self.M2_bits.exp_bits == e2 and self.M2_bits.mant_bits == m2 and
-      self.M3_bits.exp_bits == e and self.M3_bits.mant_bits == m
-    )
-    
-  def _check_all_k_are(self, k):
-    return self.k1 == k and self.k2 == k and self.k3 == k
-  
-  def _check_all_accum_methods_are(self, method):
-    return (
-      self.accum_method1 == method and
-      self.accum_method2 == method and
-      self.accum_method3 == method
-    )
-    
-  def _check_if_model_dims_are_baseline(self):
-    return (
-      self.S_q == 2048 and
-      self.S_kv == 2048 and
-      self.d_kq == 64 and
-      self.d_v == 64
-    )
-    
+  def _matches(self, definition):
+    # The ablations are defined in DSE/ablations.json, see DSE.ablation_filters
+    from DSE.ablation_filters import default_engine
+    return default_engine().matches(self, definition)
+
   def is_baseline(self):
-    baseline_e_m = [(0, 8), (5, 2), (4, 3), (3, 2), (2, 3), (2, 1)] #  ABLATION: BASELINE & MIXED PRECISION
-    # baseline_e_m = [(5, 2), (4, 3), (3, 2), (2, 3)] # ABLATION: MIXED K
-    if not any(self._check_all_widths_are(e, m, 5, 10) for e, m in baseline_e_m):
-      return False
-    
-    baseline_k = [32]
-    if not any(self._check_all_k_are(k) for k in baseline_k):
-      return False
-    
-    baseline_accum_methods = [AccumMethod.Kulisch]
-    if not any(self._check_all_accum_methods_are(method) for method in baseline_accum_methods):
-      return False
-    
-    if not self._check_if_model_dims_are_baseline():
-      return False
-    
-    return True
-    
+    return self._matches("is_baseline")
+
   def is_mixed_precision_ablation(self):
-    baseline_k = [32]
-    if not any(self._check_all_k_are(k) for k in baseline_k):
-      return False
-    
-    baseline_accum_methods = [AccumMethod.Kulisch]
-    if not any(self._check_all_accum_methods_are(method) for method in baseline_accum_methods):
-      return False
-    
-    if not self._check_if_model_dims_are_baseline():
-      return False
-    
-    if self.M1_bits.exp_bits + self.M1_bits.mant_bits > 7:
-      return False
-    
-    if self.M2_bits.exp_bits + self.M2_bits.mant_bits > 7:
-      return False
-    
-    if self.M3_bits.exp_bits + self.M3_bits.mant_bits > 7:
-      return False
-    
-    return True
-  
+    return self._matches("is_mixed_precision")
+
   def is_mixed_k_ablation(self):
-    # baseline_e_m = [(0, 8), (5, 2), (4, 3), (3, 2), (2, 3), (2, 1)]
-    baseline_e_m = [(2,3)]
-    if not any(self._check_all_widths_are(e, m, 5, 10) for e, m in baseline_e_m):
-      return False
-    
-    # Only check for certain k values
-    allowed_k = [16, 32, 64]
-    if self.k1 not in allowed_k:
-      return False
-    if self.k2 not in allowed_k:
-      return False
-    if self.k3 not in allowed_k:
-      return False
-    
-    
-    baseline_accum_methods = [AccumMethod.Kulisch]
-    if not any(self._check_all_accum_methods_are(method) for method in baseline_accum_methods):
-      return False
-    
-    if not self._check_if_model_dims_are_baseline():
-      return False
-    
-    return True
-  
+    return self._matches("is_mixed_k")
+
   def is_mixed_accum_ablation(self):
-    baseline_k = [32]
-    if not any(self._check_all_k_are(k) for k in baseline_k):
-      return False
-    
-    e_m = [(0, 8), (5, 2), (4, 3), (3, 2), (2, 3), (2, 1)]
-    if not any(self._check_all_widths_are(e, m, 5, 10) for e, m in e_m):
-      return False
-    
-    return True
-  
+    return self._matches("is_mixed_accum")
+
   def is_joint_ablation(self):
-    if self.M2_bits.exp_bits == 5 and self.M2_bits.mant_bits == 10:
-      return False
-    
-    return True
+    return self._matches("is_joint")
 
   def __repr__(self):
     return (
@@ -200,8 +142,10 @@ class DesignConfig:
     s += f"  Accumulation method 3: {self.accum_method3.value}\n"
     return s
     
-  def get_vivado_tclargs(self):
-    return f"{self.S_q} {self.S_kv} {self.d_kq} {self.d_v} {self.k1} {self.k2} {self.k3} {self.scale_width} {self.M1_bits.exp_bits} {self.M1_bits.mant_bits} {self.M2_bits.exp_bits} {self.M2_bits.mant_bits} {self.M3_bits.exp_bits} {self.M3_bits.mant_bits} {self.accum_method1.value} {self.accum_method2.value} {self.accum_method3.value} {self.m1_dsp} {self.m2_dsp} {self.m3_dsp} {self.name}"
+  def get_vivado_tclargs(self, time_str=None):
+    # time_str, when given, is passed last and used by the tcl script to name its reports
+    timestamp = "" if time_str is None else f" {time_str}"
+    return f"{self.S_q} {self.S_kv} {self.d_kq} {self.d_v} {self.k1} {self.k2} {self.k3} {self.scale_width} {self.M1_bits.exp_bits} {self.M1_bits.mant_bits} {self.M2_bits.exp_bits} {self.M2_bits.mant_bits} {self.M3_bits.exp_bits} {self.M3_bits.mant_bits} {self.accum_method1.value} {self.accum_method2.value} {self.accum_method3.value} {self.m1_dsp} {self.m2_dsp} {self.m3_dsp} {self.name}{timestamp}"
   
   def get_tcl_filename(self):
     if self.name == "attention_fp":
@@ -231,60 +175,60 @@ class DesignConfig:
   
   
   @classmethod
-  def from_str(cls, design_str, use_new_filename=False):
-    details = re.search(
-      cls.get_design_regex() if use_new_filename else cls.get_old_design_regex(),
-      design_str
-    ) 
-    # print(cls.get_design_regex())
-    # print(design_str)
-    if not details:
+  def _decode(cls, groups):
+    """Constructor arguments and legacy naming of the groups of _DESIGN_PATTERN."""
+    legacy = groups[5] is not None
+    ints = [int(group) for group in groups[1:16] if group is not None]
+    if legacy:
+      ints[4:5] = [ints[4]] * 3
+    args = (
+      groups[0], *ints,
+      AccumMethod(groups[16]), AccumMethod(groups[17]), AccumMethod(groups[18]),
+      groups[19], groups[20], groups[21],
+    )
+    return args, legacy
+
+  @staticmethod
+  @functools.lru_cache(maxsize=DECODE_CACHE_SIZE)
+  def _decode_str(design_str):
+    """_decode of a whole design string, None if it is not one."""
+    m = _DESIGN_PATTERN.fullmatch(design_str)
+    return DesignConfig._decode(m.groups()) if m is not None else None
+
+  @classmethod
+  def parse_filename(cls, filename):
+    """
+    (design string, time string, report suffix, legacy naming) of a report
+    filename, None if it is not one. Each design string is decoded once,
+    for all of its reports and for from_str.
+    """
+    design_str, sep, rest = filename.partition("_time_")
+    time_match = _TIME_PATTERN.fullmatch(rest) if sep else None
+    if time_match is None:
+      return None
+
+    decoded = cls._decode_str(design_str)
+    if decoded is None:
+      return None
+    return design_str, time_match.group(1), time_match.group(2), decoded[1]
+
+  @classmethod
+  def from_str(cls, design_str, use_new_filename=None):
+    """
+    Design of a design string in either naming scheme, with use_new_filename
+    True or False only in the per-stage or legacy one. Whole design strings
+    share the memo of parse_filename (up to DECODE_CACHE_SIZE strings), ones
+    embedded in a longer string are searched for on every call. Every call
+    returns a new DesignConfig.
+    """
+    decoded = cls._decode_str(design_str)
+    if decoded is None:
+      m = _DESIGN_PATTERN.search(design_str)
+      if m is None:
+        raise ValueError(f"Design string {design_str} does not match expected pattern.")
+      decoded = cls._decode(m.groups())
+
+    args, legacy = decoded
+    if use_new_filename is not None and legacy == use_new_filename:
       raise ValueError(f"Design string {design_str} does not match expected pattern.")
-    
-    if use_new_filename:
-      name = details.group(1)
-      S_q = int(details.group(2))
-      S_kv = int(details.group(3))
-      d_kq = int(details.group(4))
-      d_v = int(details.group(5))
-      k1 = int(details.group(6))
-      k2 = int(details.group(7))
-      k3 = int(details.group(8))
-      scale_width = int(details.group(9))
-      M1_E = int(details.group(10))
-      M1_M = int(details.group(11))
-      M2_E = int(details.group(12))
-      M2_M = int(details.group(13))
-      M3_E = int(details.group(14))
-      M3_M = int(details.group(15))
-      accum_method1 = AccumMethod(details.group(16))
-      accum_method2 = AccumMethod(details.group(17))
-      accum_method3 = AccumMethod(details.group(18))
-      m1_dsp = details.group(19)
-      m2_dsp = details.group(20)
-      m3_dsp = details.group(21)
-    
-    else:
-      name = details.group(1)
-      S_q = int(details.group(2))
-      S_kv = int(details.group(3))
-      d_kq = int(details.group(4))
-      d_v = int(details.group(5))
-      k1 = int(details.group(6))
-      k2 = int(details.group(6))
-      k3 = int(details.group(6))
-      scale_width = int(details.group(7))
-      M1_E = int(details.group(8))
-      M1_M = int(details.group(9))
-      M2_E = int(details.group(10))
-      M2_M = int(details.group(11))
-      M3_E = int(details.group(12))
-      M3_M = int(details.group(13))
-      accum_method1 = AccumMethod(details.group(14))
-      accum_method2 = AccumMethod(details.group(15))
-      accum_method3 = AccumMethod(details.group(16))
-      m1_dsp = details.group(17)
-      m2_dsp = details.group(18)
-      m3_dsp = details.group(19)
-    
-    return cls(name=name, S_q=S_q, S_kv=S_kv, d_kq=d_kq, d_v=d_v, k1=k1, k2=k2, k3=k3, scale_width=scale_width, M1_E=M1_E, M1_M=M1_M, M2_E=M2_E, M2_M=M2_M, M3_E=M3_E, M3_M=M3_M, accum_method1=accum_method1, accum_method2=accum_method2, accum_method3=accum_method3, m1_dsp=m1_dsp, m2_dsp=m2_dsp, m3_dsp=m3_dsp)
+    return cls(*args)
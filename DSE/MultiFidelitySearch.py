@@ -0,0 +1,198 @@
+import copy
+import math
+import time
+
+from DSE.analytical_model import predict_synthesis_results
+from DSE.SynthesisResult import SynthesisResult
+
+FIDELITIES = ["analytical", "quick", "vivado"]
+
+class Candidate:
+  """A design in the search pool with its results so far, one per fidelity."""
+  def __init__(self, design):
+    self.design = design
+    self.results = {}
+
+  @property
+  def fidelity(self):
+    return max(self.results, key=FIDELITIES.index) if self.results else None
+
+  @property
+  def result(self):
+    return self.results[self.fidelity] if self.results else None
+
+  def __repr__(self):
+    return f"{self.design!r} ({self.fidelity})"
+
+class MultiFidelitySearch:
+  """
+  Successive halving over a single candidate pool. Every design is scored with
+  the analytical model, the best 1/eta are promoted to a quick synthesis pass
+  at reduced S_q (Yosys if an estimator is given, Vivado otherwise), and the
+  best 1/eta of those to full Vivado synthesis. Each promotion is also capped
+  by that level's budget in CPU-hours.
+  """
+  def __init__(self, designs, synthesis_handler, yosys_estimator=None, pickle_dir="./synthesis_fits", y_type="LUTs", eta=3, quick_S_q=64, budget_cpu_hours=None, cost_cpu_hours=None, score_fn=None, verbose=False):
+    self.synthesis_handler = synthesis_handler
+    self.yosys_estimator = yosys_estimator
+    self.pickle_dir = pickle_dir
+    self.y_type = y_type
+    self.eta = eta
+    self.quick_S_q = quick_S_q
+    self.verbose = verbose
+
+    # Lower is better, the default ranks on the resource being minimised
+    self.score_fn = score_fn if score_fn is not None else (lambda candidate: candidate.result.utilisation[self.y_type])
+
+    self.budget_cpu_hours = {"quick": math.inf, "vivado": math.inf}
+    self.budget_cpu_hours.update(budget_cpu_hours or {})
+
+    # Prior cost per design, replaced by the running mean of measured costs
+    self.cost_cpu_hours = {"quick": 0.01 if yosys_estimator is not None else 1.0, "vivado": 8.0}
+    self.cost_cpu_hours.update(cost_cpu_hours or {})
+
+    self.spent_cpu_hours = {"quick": 0.0, "vivado": 0.0}
+    self._num_measured = {"quick": 0, "vivado": 0}
+
+    self.pool = {}
+    for design in designs:
+      if synthesis_handler.check_if_design_is_invalid(design):
+        if verbose:
+          print(f"Skipping {design!r} as design configuration is invalid.")
+        continue
+      self.pool.setdefault(repr(design), Candidate(design))
+
+  def _record_cost(self, fidelity, cpu_hours, num_designs):
+    self.spent_cpu_hours[fidelity] += cpu_hours
+    if num_designs == 0:
+      return
+
+    # Running mean over all designs measured at this fidelity
+    n = self._num_measured[fidelity]
+    self.cost_cpu_hours[fidelity] = (self.cost_cpu_hours[fidelity] * n + cpu_hours) / (n + num_designs) if n > 0 else cpu_hours / num_designs
+    self._num_measured[fidelity] += num_designs
+
+  def _num_to_promote(self, candidates, fidelity):
+    by_halving = math.ceil(len(candidates) / self.eta)
+    remaining = self.budget_cpu_hours[fidelity] - self.spent_cpu_hours[fidelity]
+    if math.isinf(remaining) or self.cost_cpu_hours[fidelity] <= 0:
+      return by_halving
+    by_budget = math.floor(remaining / self.cost_cpu_hours[fidelity])
+    return max(min(by_halving, by_budget), 0)
+
+  def rank(self, fidelity=None):
+    """Candidates at (or above) the given fidelity, best score first."""
+    candidates = [c for c in self.pool.values() if c.results and (fidelity is None or FIDELITIES.index(c.fidelity) >= FIDELITIES.index(fidelity))]
+    return sorted(candidates, key=self.score_fn)
+
+  def _result(self, design, utilisation, fidelity):
+    # Placeholders for power and timing, as for predicted results
+    return SynthesisResult(
+      design_config=design,
+      power={"dynamic": -1, "static": -1, "total": -2},
+      timing={"no_violation": None, "max_freq": 1},
+      utilisation=utilisation,
+      accuracy=-1.0,
+      fidelity=fidelity,
+    )
+
+  def run_analytical(self):
+    for candidate in self.pool.values():
+      if "analytical" in candidate.results:
+        continue
+      utilisation = {
+        "LUTs": predict_synthesis_results(self.pickle_dir, "LUTs", candidate.design),
+        "FFs": predict_synthesis_results(self.pickle_dir, "FFs", candidate.design),
+        "BRAMs": -1,
+        "DSPs": -1,
+      }
+      candidate.results["analytical"] = self._result(candidate.design, utilisation, "analytical")
+
+    if self.verbose:
+      print(f"Analytical model scored {len(self.pool)} candidates.")
+
+  def get_quick_design(self, design):
+    """The design with S_q reduced to quick_S_q, but no smaller than any k."""
+    quick_design = copy.deepcopy(design)
+    quick_design.S_q = min(design.S_q, max(self.quick_S_q, design.k1, design.k2, design.k3))
+    return quick_design
+
+  def _scale_quick(self, design, quick_design, utilisation):
+    # Each query row has its own datapath, so resources extrapolate linearly in S_q
+    scale = design.S_q / quick_design.S_q
+    return {key: value * scale if key in ["LUTs", "FFs"] else value for key, value in utilisation.items()}
+
+  def run_quick(self, candidates):
+    quick_designs = {repr(c.design): self.get_quick_design(c.design) for c in candidates}
+
+    start_time = time.perf_counter()
+    if self.yosys_estimator is not None:
+      estimates = self.yosys_estimator.estimate_all(list(quick_designs.values()))
+      # Cached estimates are charged their recorded run time, keeping budgets stable across restarts
+      elapsed_hours = sum(e["elapsed"] for e in estimates.values() if e is not None) / 3600
+      utilisations = {
+        key: {"LUTs": estimates[repr(d)]["LUTs"], "FFs": estimates[repr(d)]["FFs"], "BRAMs": -1, "DSPs": -1} if estimates[repr(d)] is not None else None
+        for key, d in quick_designs.items()
+      }
+    else:
+      self.synthesis_handler.designs_to_synthesise = list(quick_designs.values())
+      self.synthesis_handler.run_synthesis(verbose=self.verbose)
+      elapsed_hours = (time.perf_counter() - start_time) / 3600 * min(self.synthesis_handler.max_workers, len(candidates))
+      utilisations = {}
+      for key, d in quick_designs.items():
+        result = self.synthesis_handler.read_result(d)
+        utilisations[key] = result.utilisation if result is not None else None
+
+    self._record_cost("quick", elapsed_hours, len(candidates))
+
+    for candidate in candidates:
+      key = repr(candidate.design)
+      if utilisations[key] is None:
+        print(f"WARNING: quick synthesis failed for {key}, keeping its analytical result.")
+        continue
+      utilisation = self._scale_quick(candidate.design, quick_designs[key], utilisations[key])
+      candidate.results["quick"] = self._result(candidate.design, utilisation, "quick")
+
+  def run_vivado(self, candidates):
+    start_time = time.perf_counter()
+    self.synthesis_handler.designs_to_synthesise = [c.design for c in candidates]
+    self.synthesis_handler.run_synthesis(verbose=self.verbose)
+    elapsed_hours = (time.perf_counter() - start_time) / 3600 * min(self.synthesis_handler.max_workers, len(candidates))
+
+    self._record_cost("vivado", elapsed_hours, len(candidates))
+
+    for candidate in candidates:
+      result = self.synthesis_handler.read_result(candidate.design, verbose=self.verbose)
+      if result is None:
+        print(f"WARNING: Vivado results missing for {candidate.design!r}, keeping its lower fidelity result.")
+        continue
+      candidate.results["vivado"] = result
+
+  def run(self):
+    """Runs all fidelity levels, returns the pool ranked at its highest fidelities."""
+    self.run_analytical()
+    candidates = self.rank("analytical")
+
+    for fidelity, run_level in [("quick", self.run_quick), ("vivado", self.run_vivado)]:
+      num_promoted = self._num_to_promote(candidates, fidelity)
+      promoted = candidates[:num_promoted]
+
+      if self.verbose:
+        print(f"Promoting {len(promoted)} of {len(candidates)} candidates to {fidelity} "
+              f"(~{self.cost_cpu_hours[fidelity]:.2f} CPU-hours each, {self.spent_cpu_hours[fidelity]:.2f}/{self.budget_cpu_hours[fidelity]} spent).")
+
+      if not promoted:
+        break
+
+      run_level(promoted)
+      candidates = self.rank(fidelity)
+
+    return self.ranked()
+
+  def ranked(self):
+    """Highest fidelity first, then by score, so Vivado results lead the pool."""
+    return sorted(self.pool.values(), key=lambda c: (-FIDELITIES.index(c.fidelity), self.score_fn(c)) if c.results else (1, 0))
+
+  def results(self):
+    """The best available SynthesisResult of every scored candidate."""
+    return [c.result for c in self.ranked() if c.results]
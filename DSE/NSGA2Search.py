@@ -0,0 +1,360 @@
+import copy
+import json
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from DSE.AccumMethod import AccumMethod
+from DSE.MXFPBits import MXFPBits
+from DSE.SynthesisHandler import SynthesisHandler
+from DSE.analytical_model import predict_synthesis_results
+from DSE.golden_model import decode_mx, encode_mx
+
+# Choices per gene, the genome holds one index per gene in this order
+SEARCH_SPACE = {
+  "k1": [16, 32, 64],
+  "k2": [16, 32, 64],
+  "k3": [16, 32, 64],
+  "M1": [(0, 8), (5, 2), (4, 3), (3, 2), (2, 3), (2, 1)],
+  "M2": [(0, 8), (5, 2), (4, 3), (3, 2), (2, 3), (2, 1)],
+  "M3": [(0, 8), (5, 2), (4, 3), (3, 2), (2, 3), (2, 1)],
+  "accum_method1": [AccumMethod.Kulisch, AccumMethod.Kahan, AccumMethod.Neumaier, AccumMethod.Klein, AccumMethod.TwoSum, AccumMethod.FastTwoSum],
+  "accum_method2": [AccumMethod.Kulisch, AccumMethod.Kahan, AccumMethod.Neumaier, AccumMethod.Klein, AccumMethod.TwoSum, AccumMethod.FastTwoSum],
+  "accum_method3": [AccumMethod.Kulisch, AccumMethod.Kahan, AccumMethod.Neumaier, AccumMethod.Klein, AccumMethod.TwoSum, AccumMethod.FastTwoSum],
+  "m1_dsp": ["yes", "no"],
+  "m2_dsp": ["yes", "no"],
+  "m3_dsp": ["yes", "no"],
+}
+
+def predicted_resource(design, y_type, pickle_dir="./synthesis_fits"):
+  return predict_synthesis_results(pickle_dir, y_type, design)
+
+def format_error(design, num_vectors=16, S_q=8, seed=0):
+  """
+  Accuracy proxy: relative RMS error of attention when Q, K, V, the scores and
+  the probabilities are rounded to the design's MX formats and block sizes,
+  with exact accumulation, against float64 attention on the same inputs.
+  """
+  S_kv = max(64, design.k2, design.k3)
+  d_kq = max(64, design.k1)
+  d_v = 64
+
+  rng = np.random.default_rng(seed)
+  q = rng.standard_normal((num_vectors, S_q, d_kq))
+  kt = rng.standard_normal((num_vectors, d_kq, S_kv))
+  v = rng.standard_normal((num_vectors, S_kv, d_v))
+
+  def rnd(x, bits, k, axis):
+    words, scales = encode_mx(x, bits.exp_bits, bits.mant_bits, k, design.scale_width, axis=axis)
+    return decode_mx(words, scales, bits.exp_bits, bits.mant_bits, k, design.scale_width, axis=axis)
+
+  def attention(q, kt, v, quantise):
+    scores = q @ kt / math.sqrt(d_kq)
+    if quantise:
+      scores = rnd(scores, design.M2_bits, design.k2, axis=-1)
+    probs = np.exp(scores - np.max(scores, axis=-1, keepdims=True))
+    probs = probs / np.sum(probs, axis=-1, keepdims=True)
+    if quantise:
+      probs = rnd(probs, design.M3_bits, design.k3, axis=-1)
+    return probs @ v
+
+  ref = attention(q, kt, v, quantise=False)
+  out = attention(
+    rnd(q, design.M1_bits, design.k1, axis=-1),
+    rnd(kt, design.M1_bits, design.k1, axis=-2),
+    rnd(v, design.M3_bits, design.k3, axis=-2),
+    quantise=True,
+  )
+  return float(np.sqrt(np.mean((out - ref)**2) / np.mean(ref**2)))
+
+def max_freq_objective(results):
+  """
+  Throughput objective from synthesised designs. Every design is fully
+  unrolled, so throughput follows the clock: the negated mean max frequency
+  of synthesised designs with the same accumulation methods and DSP flags,
+  falling back to the same accumulation methods, then to the slowest stage
+  (the lowest mean over designs with the same method in that stage), then to
+  all results.
+  """
+  def mean(values):
+    return sum(values) / len(values) if values else None
+
+  def accum_key(d):
+    return (d.accum_method1.value, d.accum_method2.value, d.accum_method3.value)
+
+  def dsp_key(d):
+    return accum_key(d) + (d.m1_dsp, d.m2_dsp, d.m3_dsp)
+
+  freqs = [(r.design_config, r.timing["max_freq"]) for r in results if r.timing["max_freq"] > 1]
+  by_dsp, by_accum, by_stage = {}, {}, {}
+  for d, f in freqs:
+    by_dsp.setdefault(dsp_key(d), []).append(f)
+    by_accum.setdefault(accum_key(d), []).append(f)
+    for stage, method in enumerate(accum_key(d)):
+      by_stage.setdefault((stage, method), []).append(f)
+
+  table = {
+    "dsp": {key: mean(values) for key, values in by_dsp.items()},
+    "accum": {key: mean(values) for key, values in by_accum.items()},
+    "stage": {key: mean(values) for key, values in by_stage.items()},
+    "all": mean([f for _, f in freqs]),
+  }
+  return partial(_lookup_max_freq, table=table)
+
+def _lookup_max_freq(design, table):
+  accum_key = (design.accum_method1.value, design.accum_method2.value, design.accum_method3.value)
+  dsp_key = accum_key + (design.m1_dsp, design.m2_dsp, design.m3_dsp)
+  stage_freqs = [table["stage"].get((stage, method)) for stage, method in enumerate(accum_key)]
+  slowest_stage = min(stage_freqs) if None not in stage_freqs else None
+  freq = table["dsp"].get(dsp_key) or table["accum"].get(accum_key) or slowest_stage or table["all"] or 0.0
+  return -freq
+
+def _evaluate(design, objectives):
+  values = []
+  for fn in objectives.values():
+    try:
+      values.append(float(fn(design)))
+    except Exception as e:
+      print(f"Objective evaluation failed for {design!r}: {e}")
+      values.append(math.inf)
+  return values
+
+class NSGA2Search:
+  """
+  NSGA-II over DesignConfig genomes: non-dominated sorting with crowding
+  distance, binary tournaments, uniform crossover and per-gene mutation.
+  All objectives are minimised. Every evaluation and the current population
+  are saved to a JSON archive after each generation, so a run resumes where
+  it stopped and never evaluates a design twice.
+
+  The default objectives are the predicted LUTs and FFs, format_error and
+  max_freq_objective over results, the synthesis results read from the
+  default synthesis output directory if None.
+  """
+  def __init__(self, base_design, objectives=None, results=None, search_space=None, population_size=40, crossover_prob=0.9, mutation_prob=None, archive_path="./nsga2_archive.json", max_workers=4, seed=0, verbose=False):
+    self.base_design = base_design
+    self.search_space = search_space if search_space is not None else SEARCH_SPACE
+    self.genes = list(self.search_space)
+    if objectives is None:
+      if results is None:
+        synthesis_handler = SynthesisHandler([])
+        synthesis_handler.find_and_process_results()
+        results = synthesis_handler.results
+      objectives = {
+        "LUTs": partial(predicted_resource, y_type="LUTs"),
+        "FFs": partial(predicted_resource, y_type="FFs"),
+        "error": format_error,
+        "throughput": max_freq_objective(results),
+      }
+    self.objectives = objectives
+    self.population_size = population_size
+    self.crossover_prob = crossover_prob
+    self.mutation_prob = mutation_prob if mutation_prob is not None else 1 / len(self.genes)
+    self.archive_path = archive_path
+    self.max_workers = max_workers
+    self.verbose = verbose
+
+    self.rng = random.Random(seed)
+    self.generation = 0
+    self.population = []
+    # repr(design) -> {"genome": [...], "objectives": {...}}
+    self.archive = {}
+    self._validity_checker = SynthesisHandler([])
+
+    self.load()
+
+  def decode(self, genome):
+    genes = {gene: self.search_space[gene][index] for gene, index in zip(self.genes, genome)}
+
+    design = copy.deepcopy(self.base_design)
+    for gene, value in genes.items():
+      if gene in ["M1", "M2", "M3"]:
+        setattr(design, f"{gene}_bits", MXFPBits(*value))
+      else:
+        setattr(design, gene, value)
+    return design
+
+  def random_genome(self):
+    return tuple(self.rng.randrange(len(self.search_space[gene])) for gene in self.genes)
+
+  def is_valid(self, genome):
+    return not self._validity_checker.check_if_design_is_invalid(self.decode(genome))
+
+  def objective_values(self, genome):
+    entry = self.archive[repr(self.decode(genome))]
+    return [entry["objectives"][name] for name in self.objectives]
+
+  def evaluate(self, genomes):
+    """Evaluates the genomes missing from the archive in parallel."""
+    pending = {}
+    for genome in genomes:
+      design = self.decode(genome)
+      if repr(design) not in self.archive and repr(design) not in pending:
+        pending[repr(design)] = (genome, design)
+
+    if not pending:
+      return
+
+    with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+      values = list(executor.map(partial(_evaluate, objectives=self.objectives), [design for _, design in pending.values()]))
+
+    for (key, (genome, _)), objective_values in zip(pending.items(), values):
+      self.archive[key] = {
+        "genome": list(genome),
+        "objectives": dict(zip(self.objectives, objective_values)),
+      }
+
+  @staticmethod
+  def dominates(a, b):
+    return all(x <= y for x, y in zip(a, b)) and any(x < y for x, y in zip(a, b))
+
+  @classmethod
+  def non_dominated_sort(cls, values):
+    """Fast non-dominated sort, returns fronts as lists of indices."""
+    dominated_by = [[] for _ in values]
+    domination_count = [0] * len(values)
+    fronts = [[]]
+
+    for i, a in enumerate(values):
+      for j, b in enumerate(values):
+        if cls.dominates(a, b):
+          dominated_by[i].append(j)
+        elif cls.dominates(b, a):
+          domination_count[i] += 1
+      if domination_count[i] == 0:
+        fronts[0].append(i)
+
+    while fronts[-1]:
+      next_front = []
+      for i in fronts[-1]:
+        for j in dominated_by[i]:
+          domination_count[j] -= 1
+          if domination_count[j] == 0:
+            next_front.append(j)
+      fronts.append(next_front)
+
+    return fronts[:-1]
+
+  @staticmethod
+  def crowding_distance(values, front):
+    distance = {i: 0.0 for i in front}
+    for m in range(len(values[front[0]])):
+      ordered = sorted(front, key=lambda i: values[i][m])
+      lo, hi = values[ordered[0]][m], values[ordered[-1]][m]
+      distance[ordered[0]] = distance[ordered[-1]] = math.inf
+      if hi == lo or math.isinf(hi - lo):
+        continue
+      for prev, cur, nxt in zip(ordered, ordered[1:], ordered[2:]):
+        distance[cur] += (values[nxt][m] - values[prev][m]) / (hi - lo)
+    return distance
+
+  def _rank(self, genomes):
+    """Returns {genome index: (front, -crowding distance)}, lower is better."""
+    values = [self.objective_values(g) for g in genomes]
+    rank = {}
+    for front_id, front in enumerate(self.non_dominated_sort(values)):
+      distance = self.crowding_distance(values, front)
+      for i in front:
+        rank[i] = (front_id, -distance[i])
+    return rank
+
+  def select(self, genomes):
+    """Environmental selection of population_size genomes by front, then crowding."""
+    rank = self._rank(genomes)
+    order = sorted(range(len(genomes)), key=lambda i: rank[i])
+    return [genomes[i] for i in order[:self.population_size]]
+
+  def _tournament(self, rank):
+    a, b = self.rng.randrange(len(rank)), self.rng.randrange(len(rank))
+    return a if rank[a] <= rank[b] else b
+
+  def _crossover(self, a, b):
+    if self.rng.random() >= self.crossover_prob:
+      return a
+    return tuple(x if self.rng.random() < 0.5 else y for x, y in zip(a, b))
+
+  def _mutate(self, genome):
+    return tuple(
+      self.rng.randrange(len(self.search_space[gene])) if self.rng.random() < self.mutation_prob else index
+      for gene, index in zip(self.genes, genome)
+    )
+
+  def _new_genome(self, make, max_tries=100):
+    # Resample until valid, the constraints on k are tight for small dimensions
+    for _ in range(max_tries):
+      genome = make()
+      if self.is_valid(genome):
+        return genome
+    raise RuntimeError("Could not sample a valid design, check the search space against the base design.")
+
+  def offspring(self):
+    rank = self._rank(self.population)
+    def make():
+      a = self.population[self._tournament(rank)]
+      b = self.population[self._tournament(rank)]
+      return self._mutate(self._crossover(a, b))
+    return [self._new_genome(make) for _ in range(self.population_size)]
+
+  def run(self, generations):
+    """Runs until `generations` generations in total, resuming from the archive."""
+    if not self.population:
+      self.population = [self._new_genome(self.random_genome) for _ in range(self.population_size)]
+      self.evaluate(self.population)
+      self.save()
+
+    while self.generation < generations:
+      children = self.offspring()
+      self.evaluate(children)
+      combined = list(dict.fromkeys(self.population + children))
+      self.population = self.select(combined)
+      self.generation += 1
+      self.save()
+
+      if self.verbose:
+        print(f"Generation {self.generation}: {len(self.pareto_front())} designs on the Pareto front, {len(self.archive)} evaluated.")
+
+    return self.pareto_front()
+
+  def pareto_front(self):
+    """Non-dominated designs over every evaluation in the archive, with their objectives."""
+    entries = list(self.archive.values())
+    values = [[entry["objectives"][name] for name in self.objectives] for entry in entries]
+    front = self.non_dominated_sort(values)[0] if values else []
+    return [(self.decode(entries[i]["genome"]), entries[i]["objectives"]) for i in front]
+
+  def save(self):
+    state = {
+      "genes": self.genes,
+      "objectives": list(self.objectives),
+      "generation": self.generation,
+      "population": [list(g) for g in self.population],
+      "rng_state": self.rng.getstate(),
+      "archive": self.archive,
+    }
+    tmp_path = f"{self.archive_path}.tmp"
+    with open(tmp_path, "w") as f:
+      json.dump(state, f, indent=2)
+    os.replace(tmp_path, self.archive_path)
+
+  def load(self):
+    if not os.path.exists(self.archive_path):
+      return
+
+    with open(self.archive_path, "r") as f:
+      state = json.load(f)
+
+    if state["genes"] != self.genes or state["objectives"] != list(self.objectives):
+      raise ValueError(f"Archive {self.archive_path} was written for a different search space or objectives.")
+
+    self.generation = state["generation"]
+    self.population = [tuple(g) for g in state["population"]]
+    version, internal_state, gauss_next = state["rng_state"]
+    self.rng.setstate((version, tuple(internal_state), gauss_next))
+    self.archive = state["archive"]
+
+    if self.verbose:
+      print(f"Resuming from generation {self.generation} with {len(self.archive)} evaluated designs.")
@@ -0,0 +1,178 @@
+import collections
+import os
+import subprocess
+import threading
+import time
+from multiprocessing.connection import Client
+
+from DSE.DesignConfig import DesignConfig
+
+class PerplexityWorkerPool:
+  """
+  Pool of long-lived quant/ppl_server.py processes, one per device, each
+  keeping the model and dataset resident between designs.
+  """
+  def __init__(self, devices, base_port=6000, host="localhost", authkey="a-pace", batch_size=4, log_dir=".", startup_timeout=1800, verbose=False):
+    self.devices = devices
+    self.base_port = base_port
+    self.host = host
+    self.authkey = authkey
+    self.batch_size = batch_size
+    self.log_dir = log_dir
+    self.startup_timeout = startup_timeout
+    self.verbose = verbose
+
+    self.processes = []
+    self.connections = []
+    self.log_files = []
+
+  def start(self):
+    for worker_id, device in enumerate(self.devices):
+      port = self.base_port + worker_id
+      server_cmd = [
+        "python", "-u", "quant/ppl_server.py",
+        "--host", self.host,
+        "--port", str(port),
+        "--authkey", self.authkey,
+        "--batch_size", str(self.batch_size),
+        "--model_id", DesignConfig.model_id,
+      ]
+      env = dict(os.environ, CUDA_VISIBLE_DEVICES=str(device))
+      log_file = open(os.path.join(self.log_dir, f"ppl_server_{worker_id}.log"), "w")
+      self.log_files.append(log_file)
+
+      if self.verbose:
+        print(f"Starting perplexity worker {worker_id} on device {device}, port {port}")
+
+      self.processes.append(subprocess.Popen(server_cmd, env=env, stdout=log_file, stderr=subprocess.STDOUT))
+
+    # Model loading dominates startup, connect once every server listens
+    try:
+      for worker_id, process in enumerate(self.processes):
+        self.connections.append(self._connect(worker_id, process))
+    except Exception:
+      # __exit__ is not called when start fails inside __enter__
+      self.close()
+      raise
+
+    if self.verbose:
+      print(f"{len(self.connections)} perplexity workers ready.")
+
+  def _connect(self, worker_id, process):
+    address = (self.host, self.base_port + worker_id)
+    deadline = time.monotonic() + self.startup_timeout
+
+    while time.monotonic() < deadline:
+      if process.poll() is not None:
+        raise RuntimeError(f"Perplexity worker {worker_id} exited with return code {process.returncode} during startup.")
+      try:
+        return Client(address, authkey=self.authkey.encode())
+      except ConnectionRefusedError:
+        time.sleep(1)
+
+    raise TimeoutError(f"Perplexity worker {worker_id} did not start within {self.startup_timeout} seconds.")
+
+  def evaluate(self, designs):
+    """
+    Evaluates designs across all workers, returns {repr(design): reply} where
+    reply holds "perplexity" on success or "error" otherwise. A worker whose
+    connection is lost is dropped from the pool and its design goes back to
+    the surviving workers, at most once. Designs left once no worker
+    survives get an error reply.
+    """
+    if not self.connections and not self.processes:
+      self.start()
+
+    pending = collections.deque(designs)
+    replies = {}
+    requeued = set()
+    lost = []
+    in_flight = 0
+    cond = threading.Condition()
+
+    def worker_loop(worker_id, conn):
+      nonlocal in_flight
+
+      while True:
+        # A design in flight on another worker can still come back
+        with cond:
+          while not pending and in_flight:
+            cond.wait()
+          if not pending:
+            return
+          design = pending.popleft()
+          in_flight += 1
+
+        try:
+          conn.send({"config": design.get_quant_config()})
+          reply = conn.recv()
+        except (EOFError, OSError) as e:
+          reply = {"status": "error", "error": f"Worker {worker_id} connection lost: {e}"}
+          conn_lost = True
+        else:
+          conn_lost = False
+
+        if self.verbose:
+          status = f"perplexity {reply['perplexity']:.2f}" if reply["status"] == "ok" else reply["error"]
+          print(f"Worker {worker_id}: {design!r} -> {status}")
+
+        with cond:
+          in_flight -= 1
+          if conn_lost:
+            lost.append(conn)
+          if conn_lost and repr(design) not in requeued and len(lost) < len(self.connections):
+            requeued.add(repr(design))
+            pending.append(design)
+          else:
+            replies[repr(design)] = reply
+          cond.notify_all()
+
+        if conn_lost:
+          return
+
+    threads = [threading.Thread(target=worker_loop, args=(worker_id, conn)) for worker_id, conn in enumerate(self.connections)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    for design in pending:
+      replies[repr(design)] = {"status": "error", "error": "No perplexity worker left"}
+
+    for conn in lost:
+      try:
+        conn.close()
+      except OSError:
+        pass
+    self.connections = [conn for conn in self.connections if conn not in lost]
+
+    return replies
+
+  def close(self):
+    for conn in self.connections:
+      try:
+        conn.send({"cmd": "shutdown"})
+        conn.recv()
+        conn.close()
+      except (EOFError, OSError):
+        pass
+
+    for process in self.processes:
+      try:
+        process.wait(timeout=60)
+      except subprocess.TimeoutExpired:
+        process.kill()
+
+    for log_file in self.log_files:
+      log_file.close()
+
+    self.connections = []
+    self.processes = []
+    self.log_files = []
+
+  def __enter__(self):
+    self.start()
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
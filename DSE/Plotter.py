@@ -1,201 +1,231 @@
 import os
-import matplotlib
-import matplotlib.pyplot as plt
 import numpy as np
 
-from DSE.SynthesisResult import SynthesisResult, LUTS_BASELINE, FFS_BASELINE
+from DSE.SynthesisResult import LUTS_BASELINE, FFS_BASELINE
+from DSE.ResultSet import ResultSet
+from DSE.ablation_filters import default_engine
+from DSE import tracing
+
+# How each ablation of the paper is drawn: what the colour encodes (colour
+# step 1 for bit widths and method codes, 16 for block sizes), the label of
+# non-baseline designs, whether baseline designs get their own marker and
+# legend entry, and the perplexity range
+ABLATION_STYLES = {
+  "baseline": {
+    "color": "total_bits", "color_step": 1, "colorbar_label": "Combined bit widths across operators",
+    "other_label": "New design", "mark_baseline": True, "ylim": (9, 18),
+  },
+  "mixed_precision": {
+    "color": "total_bits", "color_step": 1, "colorbar_label": "Combined bit widths across operators",
+    "other_label": "Mixed precision", "mark_baseline": True, "ylim": (9, 35),
+  },
+  "mixed_k": {
+    "color": "total_k", "color_step": 16, "colorbar_label": "Combined block sizes across operators",
+    "other_label": "Mixed block size", "mark_baseline": True, "ylim": (9.75, 11),
+  },
+  "mixed_accum": {
+    "color": "accum_methods", "color_step": 1, "colorbar_label": "Accumulation method across operators",
+    "other_label": "Mixed accumulation method", "mark_baseline": True, "ylim": (9.75, 15),
+  },
+  "joint": {
+    "color": "total_bits", "color_step": 1, "colorbar_label": "Combined bit widths across operators",
+    "other_label": "New design", "mark_baseline": False, "ylim": (9.7, 11.2),
+  },
+}
+
+# Resource axes: result column, value drawn as 1x (None: absolute) and label
+RESOURCE_AXES = {
+  "LUTs": ("LUTs", LUTS_BASELINE, "LUTs (×baseline)"),
+  "FFs": ("FFs", FFS_BASELINE, "FFs (×baseline)"),
+  "BRAMs": ("BRAMs", None, "BRAMs"),
+  "DSPs": ("DSPs", None, "DSPs"),
+  "power": ("power_total", None, "Power (W)"),
+}
 
 class Plotter:
-  def __init__(self, results):
-    self.results = results
-    self.LUTs = [r.utilisation["LUTs"] for r in self.results]
-    self.FFs = [r.utilisation["FFs"] for r in self.results]
-    self.accuracies = [r.accuracy for r in self.results]
-    self.designs = [r.design_config for r in self.results]
+  def __init__(self, results, ablation="joint"):
+    # A ResultSet is used as is, a list of SynthesisResults is converted once
+    self.results = ResultSet.from_results(results)
+    self.LUTs = self.results.LUTs
+    self.FFs = self.results.FFs
+    self.accuracies = self.results.accuracies
+    self.ablation = ablation
+    # Ablations added to DSE/ablations.json without a style are drawn like the joint one
+    self.style = ABLATION_STYLES.get(ablation, ABLATION_STYLES["joint"])
     self.pareto_optimal = None
-    
+    # Resource -> Pareto front points, filled on first use or by the caller
+    self.pareto_fronts = {}
+
+  @property
+  def designs(self):
+    return self.results.designs
+
+  @tracing.traced()
   def find_pareto_optimal(self, weights):
     if not self.results:
       raise ValueError("No synthesis results available to find Pareto optimal solution.")
-    
-    # Normalise results based on the ideal result
-    results_normalised = SynthesisResult.normalise_results(self.results)
-    
-    # Create normalised ideal result
-    ideal_result_normalised = SynthesisResult.create_ideal_result_normalised()
-      
+
+    # Normalise results based on the ideal result, the normalised ideal result is at the origin
+    normalised = self.results.normalised()
+
     # Find the best result by finding a result that is closest to the ideal result in "distance" in the normalised space
-    best_distance = 1e10
-    best_index = 0
-    
-    for index, result in enumerate(results_normalised):
-      actual_LUTs = result.utilisation["LUTs"]
-      ideal_LUTs = ideal_result_normalised.utilisation["LUTs"]
-      LUTs_diff = (actual_LUTs - ideal_LUTs) ** 2
-      actual_FFs = result.utilisation["FFs"]
-      ideal_FFs = ideal_result_normalised.utilisation["FFs"]
-      FFs_diff = (actual_FFs - ideal_FFs) ** 2
-      accuracy_diff = (result.accuracy - ideal_result_normalised.accuracy) ** 2
-
-      distance = (
-        LUTs_diff * weights['LUTs'] +
-        FFs_diff * weights['FFs'] +
-        accuracy_diff * weights['accuracy']
-      ) ** 0.5
-
-      if distance < best_distance:
-        best_index = index
-        best_distance = distance
+    distances = (
+      normalised.LUTs ** 2 * weights['LUTs'] +
+      normalised.FFs ** 2 * weights['FFs'] +
+      normalised.accuracies ** 2 * weights['accuracy']
+    ) ** 0.5
+    best_index = int(np.argmin(distances))
 
     self.pareto_optimal = self.results[best_index]
     return self.pareto_optimal
 
+  @tracing.traced()
   def _pareto_front(self, x, y, maximize_y=True):
-    points = list(zip(x, y))
-    
-    # 1. Filter dominated points
-    non_dominated = []
-    for p in points:
-      dominated = False
-      for q in points:
-        if q == p:
-          continue
+    """
+    Non-dominated (x, y) points sorted by x, minimising x. After sorting by
+    x (ties best y first), a point is on the front iff its y improves on all
+    points before it, so one pass replaces the pairwise dominance check.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    order = np.lexsort((-y if maximize_y else y, x))
 
-        better_x = q[0] <= p[0]
-        better_y = q[1] >= p[1] if maximize_y else q[1] <= p[1]
+    pareto = []
+    best_y = -float("inf") if maximize_y else float("inf")
+    for i in order:
+      if (maximize_y and y[i] > best_y) or (not maximize_y and y[i] < best_y):
+        pareto.append((x[i], y[i]))
+        best_y = y[i]
 
-        strictly_better_x = q[0] < p[0]
-        strictly_better_y = q[1] > p[1] if maximize_y else q[1] < p[1]
+    return pareto
 
-        if better_x and better_y and (strictly_better_x or strictly_better_y):
-          dominated = True
-          break
+  def resource_values(self, resource):
+    column, baseline, _ = RESOURCE_AXES[resource]
+    values = self.results.column(column)
+    return values / baseline if baseline is not None else values
 
-      if not dominated:
-        non_dominated.append(p)
+  def pareto_front(self, resource):
+    """Pareto front of perplexity against a resource, computed once per Plotter."""
+    if resource not in self.pareto_fronts:
+      self.pareto_fronts[resource] = self._pareto_front(self.resource_values(resource), self.accuracies, maximize_y=False) # maximize_y is False for Perplexity minimization
+    return self.pareto_fronts[resource]
 
-    # 2. Sort by x for plotting
-    non_dominated.sort(key=lambda pt: pt[0])
+  def color_values(self):
+    color = self.style["color"]
+    if color == "total_bits":
+      return self.results.total_bits()
+    if color == "total_k":
+      return self.results.total_k()
+    if color == "accum_methods":
+      # One code per combination of accumulation methods
+      methods = np.column_stack([self.results.column(f"accum_method{i}") for i in (1, 2, 3)])
+      return np.unique(methods, axis=0, return_inverse=True)[1].reshape(-1)
+    raise ValueError(f"Unknown colour: {color}")
 
-    # 3. Filter out "backward" y steps (enforce monotonicity in y)
-    pareto = []
-    best_y = -float("inf") if maximize_y else float("inf")
-    for pt in non_dominated:
-      if (maximize_y and pt[1] > best_y) or (not maximize_y and pt[1] < best_y):
-        pareto.append(pt)
-        best_y = pt[1]
+  @tracing.traced()
+  def plot_perplexity(self, directory="./plots", filename_suffix="", plot_file_format="svg", resources=("LUTs", "FFs")):
+    """
+    Perplexity against each resource in one figure, saved once per format
+    (plot_file_format is a format or a list of them). Returns the saved paths.
+    """
+    # matplotlib is only imported once something is drawn
+    import matplotlib.pyplot as plt
 
-    return pareto
+    color_values = self.color_values()
+    resources = list(resources)
+
+    # One subplot per resource, the last one is wider for the colour bar
+    fig, axes = plt.subplots(1, len(resources), figsize=(7 * len(resources), 6), sharey=True, squeeze=False,
+                             gridspec_kw={'width_ratios': [8] * (len(resources) - 1) + [10]})
+
+    for i, (ax, resource) in enumerate(zip(axes[0], resources)):
+      self._plot(
+        fig=fig,
+        ax=ax,
+        x=self.resource_values(resource),
+        y=self.accuracies,
+        color_values=color_values,
+        xlabel=RESOURCE_AXES[resource][2],
+        ylabel="Perplexity",
+        title=f"Perplexity vs {resource}",
+        resource=resource,
+        show_colorbar=(i == len(resources) - 1)
+      )
 
-  def plot_perplexity(self, directory="./plots", filename_suffix="", plot_file_format="svg"):
-    color_values = np.array([r.design_config.get_total_bits() for r in self.results]) # BASELINE and ABLATION: MIXED PRECISION
-    # color_values = np.array([r.design_config.get_total_k() for r in self.results]) # ABLATION: MIXED K
-    # color_values = np.array([0, 1, 2, 3, 4, 5]) # ABLATION: MIXED ACCUM
-
-    LUTs_mults = np.array(self.LUTs) / LUTS_BASELINE
-    FFs_mults = np.array(self.FFs) / FFS_BASELINE
-    
-    # Create a single figure with two subplots
-    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 6), sharey=True, gridspec_kw={'width_ratios': [8, 10]})
-    
-    self._plot(
-      fig=fig,
-      ax=ax1,
-      x=LUTs_mults,
-      y=self.accuracies,
-      color_values=color_values,
-      xlabel="LUTs (×baseline)",
-      ylabel="Perplexity",
-      title=f"Perplexity vs LUTs",
-      resource="LUTs",
-      show_colorbar=False
-    )
-    
-    self._plot(
-      fig=fig,
-      ax=ax2,
-      x=FFs_mults,
-      y=self.accuracies,
-      color_values=color_values,
-      xlabel="FFs (×baseline)",
-      ylabel="Perplexity",
-      title=f"Perplexity vs FFs",
-      resource="FFs",
-      show_colorbar=True
-    )
-    
     # Save the combined figure
     fig.tight_layout()
-    fig.savefig(os.path.join(directory, f"perplexity_combined_{filename_suffix}.{plot_file_format}"))
+    name = "combined" if resources == ["LUTs", "FFs"] else "_".join(resources)
+    formats = [plot_file_format] if isinstance(plot_file_format, str) else plot_file_format
+    paths = [os.path.join(directory, f"perplexity_{name}_{filename_suffix}.{file_format}") for file_format in formats]
+    for path in paths:
+      fig.savefig(path)
+    plt.close(fig)
+    return paths
 
+  @tracing.traced()
   def _plot(self, fig, ax, x, y, color_values, xlabel, ylabel, title, resource,
             do_pareto_front=True, do_pareto_optimal=True, show_colorbar=True):
-    
+    import matplotlib
+    import matplotlib.pyplot as plt
+
     marker_map = {
       True: "o",   # baseline
       False: "s",  # new
     }
-    
-    # ABLATION: BASELINE & MIXED PRECISION
-    cmap = matplotlib.colormaps["viridis"].resampled(color_values.max() - color_values.min() + 1)
-    bounds = np.arange(color_values.min() - 0.5, color_values.max() + 1.5, 1)
-    norm = matplotlib.colors.BoundaryNorm(bounds, cmap.N)
-    
-    # # ABLATION: MIXED K
-    # step = 16
-    # vmin = int(np.floor(color_values.min() / step) * step)
-    # vmax = int(np.ceil(color_values.max() / step) * step)
-    # ticks = np.arange(vmin, vmax + 1, step)
-    # bounds = np.concatenate(([ticks[0] - step / 2], (ticks[:-1] + ticks[1:]) / 2, [ticks[-1] + step / 2]))
-    # norm = matplotlib.colors.BoundaryNorm(bounds, len(ticks))
-    # cmap = matplotlib.colormaps["viridis"].resampled(len(ticks))
-    
-    plotted_markers = {}
+    style = self.style
+
+    step = style["color_step"]
+    if step == 1:
+      cmap = matplotlib.colormaps["viridis"].resampled(color_values.max() - color_values.min() + 1)
+      bounds = np.arange(color_values.min() - 0.5, color_values.max() + 1.5, 1)
+      ticks = np.arange(color_values.min(), color_values.max() + 1)
+      norm = matplotlib.colors.BoundaryNorm(bounds, cmap.N)
+    else:
+      vmin = int(np.floor(color_values.min() / step) * step)
+      vmax = int(np.ceil(color_values.max() / step) * step)
+      ticks = np.arange(vmin, vmax + 1, step)
+      bounds = np.concatenate(([ticks[0] - step / 2], (ticks[:-1] + ticks[1:]) / 2, [ticks[-1] + step / 2]))
+      norm = matplotlib.colors.BoundaryNorm(bounds, len(ticks))
+      cmap = matplotlib.colormaps["viridis"].resampled(len(ticks))
 
-    for design, xi, yi, cval in zip(self.designs, x, y, color_values):
-      # other_label = "Mixed precision" # ABLATION: MIXED PRECISION
-      # other_label = "Mixed block size"        # ABLATION: MIXED K
-      # other_label = "Mixed accumulation method"  # ABLATION: MIXED ACCUM
-      other_label = "New design" # JOINT ABLATION
-      
-      # label = "Baseline" if design.is_baseline() else other_label # NO-JOINT ABLATION
-      label = other_label # JOINT ABLATION
-      # marker = marker_map[design.is_baseline()] # NO-JOINT ABLATION
-      marker = marker_map[False] # JOINT ABLATION
-      
+    # One scatter call per marker rather than per design
+    if style["mark_baseline"]:
+      is_baseline = default_engine().mask(self.results, "is_baseline")
+    else:
+      is_baseline = np.zeros(len(self.results), dtype=bool)
+
+    x = np.asarray(x)
+    y = np.asarray(y)
+    plotted_markers = {}
+    for baseline in (True, False):
+      mask = is_baseline == baseline
+      if not mask.any():
+        continue
+      label = "Baseline" if baseline else style["other_label"]
       ax.scatter(
-        xi, yi,
-        c=[cmap(norm(cval))],
+        x[mask], y[mask],
+        c=cmap(norm(color_values[mask])),
         alpha=1.0,
         s=120,
-        marker=marker,
-        # label=label # NO-JOINT ABLATION
+        marker=marker_map[baseline],
+        label=label if style["mark_baseline"] else None
       )
-      plotted_markers[label] = marker
+      plotted_markers[label] = marker_map[baseline]
 
     ax.set_title(title, fontsize=20)
     ax.set_xlabel(xlabel, fontsize=18)
     ax.set_ylabel(ylabel, fontsize=18)
-    
-    # ax.set_ylim(bottom=9, top=18) # BASELINE
-    # ax.set_ylim(bottom=9, top=35) # ABLATION: MIXED PRECISION ONLY
-    # ax.set_ylim(bottom=9.75, top=11) # ABLATION: MIXED K
-    # ax.set_ylim(bottom=9.75, top=15) # ABLATION: MIXED ACCUM
-    ax.set_ylim(bottom=9.7, top=11.2) # JOINT ABLATION
-    
-    
+    ax.set_ylim(bottom=style["ylim"][0], top=style["ylim"][1])
+
     ax.tick_params(axis='x', labelsize=16)
     ax.tick_params(axis='y', labelsize=16)
     ax.grid(True)
-    
+
     sm = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
     sm.set_array([])
     if show_colorbar is True:
-      cbar = plt.colorbar(sm, ax=ax, boundaries=bounds, ticks=np.arange(color_values.min(), color_values.max() + 1)) # BASELINE and ABLATION: MIXED PRECISION
-      # cbar = plt.colorbar(sm, ax=ax, boundaries=bounds, ticks=ticks) # ABLATION: MIXED K & ACCUM
-      cbar.set_label("Combined bit widths across operators", fontsize=18) # BASELINE and ABLATION: MIXED PRECISION
-      # cbar.set_label("Combined block sizes across operators", fontsize=18) # ABLATION: MIXED K
-      # cbar.set_label("Accumulation method across operators", fontsize=18) # ABLATION: MIXED ACCUM
+      cbar = plt.colorbar(sm, ax=ax, boundaries=bounds, ticks=ticks)
+      cbar.set_label(style["colorbar_label"], fontsize=18)
       cbar.ax.tick_params(labelsize=16)
 
     handles, labels = ax.get_legend_handles_labels()
@@ -207,26 +237,29 @@ class Plotter:
                 linestyle="", markersize=10)
       for label in unique_labels
     ]
-    
-    # === Compute and plot Pareto front ===
+
+    # === Plot Pareto front ===
     if do_pareto_front:
-      pareto_points = self._pareto_front(x, y, maximize_y=False) # maximize_y is False for Perplexity minimization
+      pareto_points = self.pareto_front(resource)
       pareto_x = [p[0] for p in pareto_points]
       pareto_y = [p[1] for p in pareto_points]
 
       ax.plot(pareto_x, pareto_y, linestyle="dashdot", color="black", linewidth=1.2)
-      
+
       pareto_front_legend = matplotlib.lines.Line2D([], [], color="black", linestyle="dashdot", linewidth=1.5, label="Pareto front")
-      
+
       black_handles += [pareto_front_legend]
       unique_labels += ["Pareto front"]
-    
+
     # === Highlight pareto optimal point ===
     weights={'LUTs': 1.0, 'FFs': 1.0, 'accuracy': 100.0}
-    if do_pareto_optimal and self.find_pareto_optimal(weights=weights) is not None:
+    if self.pareto_optimal is None and do_pareto_optimal:
+      self.find_pareto_optimal(weights=weights)
+    if do_pareto_optimal and self.pareto_optimal is not None:
       # Compute X and Y of the pareto optimal point for this plot
-      baseline = LUTS_BASELINE if resource == "LUTs" else FFS_BASELINE
-      x_val = self.pareto_optimal.utilisation[resource] / baseline
+      column, baseline, _ = RESOURCE_AXES[resource]
+      x_val = self.pareto_optimal.power["total"] if column == "power_total" else self.pareto_optimal.utilisation[column]
+      x_val = x_val / baseline if baseline is not None else x_val
       y_val = self.pareto_optimal.accuracy
 
       radius_coeff = 0.04
@@ -244,7 +277,7 @@ class Plotter:
       )
 
       ax.add_patch(ellipse)
-      
+
       ellipse_legend = matplotlib.patches.Ellipse(
         (0, 0),  # position doesn't matter for legend
         width=0.1, height=0.5,  # small size for legend
@@ -254,7 +287,7 @@ class Plotter:
         linewidth=1.5,
         label="Ideal* Pareto"
       )
-      
+
       black_handles += [ellipse_legend]
       unique_labels += ["Optimal*"]
 
@@ -264,4 +297,3 @@ class Plotter:
       ax.legend(black_handles, unique_labels, fontsize=14)
 
     fig.tight_layout()
-    
\ No newline at end of file
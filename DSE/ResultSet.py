@@ -0,0 +1,264 @@
+import numpy as np
+
+from DSE.AccumMethod import AccumMethod
+from DSE.DesignConfig import DesignConfig
+from DSE.SynthesisResult import SynthesisResult, AVAILABLE_FPGA_RESOURCES
+
+# Per-result metrics, one float64 column each (None is stored as NaN)
+METRIC_COLUMNS = ["power_dynamic", "power_static", "power_total", "max_freq", "LUTs", "FFs", "BRAMs", "DSPs", "accuracy", "accuracy_std"]
+
+# Design parameters, one row per result. Strings (name, DSP flags) are codes
+# into a per-set string table, accumulation methods indices into AccumMethod
+DESIGN_DTYPE = np.dtype([
+  ("name", np.int16),
+  ("S_q", np.int32), ("S_kv", np.int32), ("d_kq", np.int32), ("d_v", np.int32),
+  ("k1", np.int32), ("k2", np.int32), ("k3", np.int32), ("scale_width", np.int32),
+  ("M1_E", np.int8), ("M1_M", np.int8), ("M2_E", np.int8), ("M2_M", np.int8), ("M3_E", np.int8), ("M3_M", np.int8),
+  ("accum_method1", np.int8), ("accum_method2", np.int8), ("accum_method3", np.int8),
+  ("m1_dsp", np.int16), ("m2_dsp", np.int16), ("m3_dsp", np.int16),
+])
+
+_ACCUM_METHODS = list(AccumMethod)
+_STRING_FIELDS = ["name", "m1_dsp", "m2_dsp", "m3_dsp"]
+
+def _to_float(value):
+  return np.nan if value is None else value
+
+def _from_float(value, integral=False):
+  if np.isnan(value):
+    return None
+  value = float(value)
+  # Vivado reports integer resource counts, predictions are floats
+  return int(value) if integral and value.is_integer() else value
+
+class ResultSet:
+  """
+  Columnar synthesis results: a NumPy array per metric and a structured
+  design table, grown by doubling. Indexing returns a SynthesisResult built
+  from the row (a snapshot, writes to it are not stored back), slices and
+  index arrays return a new ResultSet.
+  """
+  def __init__(self, capacity=256):
+    capacity = max(capacity, 1)
+    self._size = 0
+    self._metrics = {name: np.empty(capacity, dtype=np.float64) for name in METRIC_COLUMNS}
+    # 1 / 0 for timing met / violated, -1 when unknown (predicted results)
+    self._no_violation = np.empty(capacity, dtype=np.int8)
+    self._fidelity = np.empty(capacity, dtype=np.int8)
+    self._designs = np.empty(capacity, dtype=DESIGN_DTYPE)
+    self._strings = []
+    self._string_codes = {}
+    # Row -> Vivado telemetry, only results with a log have one
+    self._telemetry = {}
+
+  @classmethod
+  def from_results(cls, results):
+    if isinstance(results, cls):
+      return results
+    results = list(results)
+    result_set = cls(capacity=len(results))
+    for result in results:
+      result_set.append(result)
+    return result_set
+
+  def _code(self, string):
+    code = self._string_codes.get(string)
+    if code is None:
+      code = self._string_codes[string] = len(self._strings)
+      self._strings.append(string)
+    return code
+
+  def _grow(self):
+    capacity = 2 * len(self._fidelity)
+    for name, column in self._metrics.items():
+      self._metrics[name] = np.resize(column, capacity)
+    self._no_violation = np.resize(self._no_violation, capacity)
+    self._fidelity = np.resize(self._fidelity, capacity)
+    self._designs = np.resize(self._designs, capacity)
+
+  def add(self, design_config, power, timing, utilisation, accuracy, fidelity="vivado", accuracy_std=None, telemetry=None):
+    """Appends a result, same arguments as SynthesisResult."""
+    if self._size == len(self._fidelity):
+      self._grow()
+    i = self._size
+
+    metrics = self._metrics
+    metrics["power_dynamic"][i] = power["dynamic"]
+    metrics["power_static"][i] = power["static"]
+    metrics["power_total"][i] = power["total"]
+    metrics["max_freq"][i] = timing["max_freq"]
+    for key in AVAILABLE_FPGA_RESOURCES:
+      metrics[key][i] = utilisation[key]
+    metrics["accuracy"][i] = _to_float(accuracy)
+    metrics["accuracy_std"][i] = _to_float(accuracy_std)
+
+    no_violation = timing["no_violation"]
+    self._no_violation[i] = -1 if no_violation is None else int(bool(no_violation))
+    self._fidelity[i] = self._code(fidelity)
+
+    dc = design_config
+    self._designs[i] = (
+      self._code(dc.name), dc.S_q, dc.S_kv, dc.d_kq, dc.d_v, dc.k1, dc.k2, dc.k3, dc.scale_width,
+      dc.M1_bits.exp_bits, dc.M1_bits.mant_bits, dc.M2_bits.exp_bits, dc.M2_bits.mant_bits, dc.M3_bits.exp_bits, dc.M3_bits.mant_bits,
+      _ACCUM_METHODS.index(dc.accum_method1), _ACCUM_METHODS.index(dc.accum_method2), _ACCUM_METHODS.index(dc.accum_method3),
+      self._code(dc.m1_dsp), self._code(dc.m2_dsp), self._code(dc.m3_dsp),
+    )
+
+    if telemetry is not None:
+      self._telemetry[i] = telemetry
+    self._size += 1
+
+  def append(self, result):
+    self.add(result.design_config, result.power, result.timing, result.utilisation, result.accuracy,
+             fidelity=result.fidelity, accuracy_std=result.accuracy_std, telemetry=result.telemetry)
+
+  def extend(self, results):
+    for result in results:
+      self.append(result)
+
+  def __len__(self):
+    return self._size
+
+  def __bool__(self):
+    return self._size > 0
+
+  def __iter__(self):
+    for i in range(self._size):
+      yield self._row(i)
+
+  def __getitem__(self, index):
+    if isinstance(index, (int, np.integer)):
+      if index < 0:
+        index += self._size
+      if not 0 <= index < self._size:
+        raise IndexError(f"Result index {index} out of range for {self._size} results")
+      return self._row(int(index))
+    return self.take(np.arange(self._size)[index])
+
+  def take(self, indices):
+    """New ResultSet with the rows at indices (or a boolean mask) in that order."""
+    indices = np.arange(self._size)[np.asarray(indices)]
+    result_set = ResultSet(capacity=len(indices))
+    result_set._size = len(indices)
+    for name, column in self._metrics.items():
+      result_set._metrics[name][:len(indices)] = column[indices]
+    result_set._no_violation[:len(indices)] = self._no_violation[indices]
+    result_set._fidelity[:len(indices)] = self._fidelity[indices]
+    result_set._designs[:len(indices)] = self._designs[indices]
+    result_set._strings = list(self._strings)
+    result_set._string_codes = dict(self._string_codes)
+    result_set._telemetry = {new: self._telemetry[old] for new, old in enumerate(indices) if old in self._telemetry}
+    return result_set
+
+  def column(self, name):
+    """Read-only view of a metric column or a design table field, no copy."""
+    if name in self._metrics:
+      view = self._metrics[name][:self._size]
+    elif name in DESIGN_DTYPE.names:
+      view = self._designs[name][:self._size]
+    else:
+      raise KeyError(f"Unknown result column: {name}")
+    view.flags.writeable = False
+    return view
+
+  @property
+  def powers(self):
+    return self.column("power_total")
+
+  @property
+  def LUTs(self):
+    return self.column("LUTs")
+
+  @property
+  def FFs(self):
+    return self.column("FFs")
+
+  @property
+  def BRAMs(self):
+    return self.column("BRAMs")
+
+  @property
+  def DSPs(self):
+    return self.column("DSPs")
+
+  @property
+  def accuracies(self):
+    return self.column("accuracy")
+
+  def total_bits(self):
+    """DesignConfig.get_total_bits() of every row."""
+    d = self._designs[:self._size]
+    return sum(d[field].astype(np.int64) for field in ["M1_E", "M1_M", "M2_E", "M2_M", "M3_E", "M3_M"])
+
+  def total_k(self):
+    """DesignConfig.get_total_k() of every row."""
+    d = self._designs[:self._size]
+    return d["k1"].astype(np.int64) + d["k2"] + d["k3"]
+
+  def design(self, index):
+    row = self._designs[index]
+    kwargs = {field: int(row[field]) for field in DESIGN_DTYPE.names}
+    for field in _STRING_FIELDS:
+      kwargs[field] = self._strings[kwargs[field]]
+    for field in ["accum_method1", "accum_method2", "accum_method3"]:
+      kwargs[field] = _ACCUM_METHODS[kwargs[field]]
+    return DesignConfig(**kwargs)
+
+  def iter_designs(self):
+    for i in range(self._size):
+      yield self.design(i)
+
+  @property
+  def designs(self):
+    return list(self.iter_designs())
+
+  def _row(self, i):
+    m = {name: column[i] for name, column in self._metrics.items()}
+    no_violation = self._no_violation[i]
+    return SynthesisResult(
+      design_config=self.design(i),
+      power={
+        "dynamic": _from_float(m["power_dynamic"]),
+        "static": _from_float(m["power_static"]),
+        "total": _from_float(m["power_total"]),
+      },
+      timing={
+        "no_violation": None if no_violation < 0 else bool(no_violation),
+        "max_freq": _from_float(m["max_freq"]),
+      },
+      utilisation={key: _from_float(m[key], integral=True) for key in AVAILABLE_FPGA_RESOURCES},
+      accuracy=_from_float(m["accuracy"]),
+      fidelity=self._strings[self._fidelity[i]],
+      accuracy_std=_from_float(m["accuracy_std"]),
+      telemetry=self._telemetry.get(i),
+    )
+
+  def ideal(self):
+    """Column-wise best values, as SynthesisResult.create_ideal_result: {column: value}."""
+    ideal = {
+      "power_dynamic": min(1e10, np.min(self.column("power_dynamic"), initial=np.inf)),
+      "power_static": min(1e10, np.min(self.column("power_static"), initial=np.inf)),
+      "power_total": min(1e10, np.min(self.column("power_total"), initial=np.inf)),
+      "max_freq": max(0, np.max(self.column("max_freq"), initial=-np.inf)),
+      "accuracy": min(1e10, np.nanmin(self.column("accuracy"), initial=np.inf)),
+    }
+    for key, available in AVAILABLE_FPGA_RESOURCES.items():
+      ideal[key] = min(available, np.min(self.column(key), initial=np.inf))
+    return ideal
+
+  def normalised(self):
+    """Copy with power, frequency, resources and accuracy divided by the ideal result."""
+    ideal = self.ideal()
+    result_set = self.take(np.arange(self._size))
+    n = self._size
+    for name in ["power_total", "max_freq", "accuracy"]:
+      result_set._metrics[name][:n] /= ideal[name]
+    for key in AVAILABLE_FPGA_RESOURCES:
+      column = result_set._metrics[key]
+      column[:n] = column[:n] / ideal[key] if ideal[key] > 0 else 0.0
+    return result_set
+
+  @property
+  def nbytes(self):
+    """Bytes held by the columns and design table (excluding telemetry)."""
+    return sum(column.nbytes for column in self._metrics.values()) + self._no_violation.nbytes + self._fidelity.nbytes + self._designs.nbytes
@@ -0,0 +1,254 @@
+import os
+import json
+import time
+import socket
+import bisect
+
+from DSE.DesignConfig import DesignConfig
+
+# Report suffix -> kind of run. A run is complete once all reports of its kind
+# exist and are non-empty, the Vivado log is kept as provenance only
+RUN_REPORTS = {
+  "vivado": ("power.rpt", "timing.rpt", "util.rpt"),
+  "accuracy": ("accuracy.txt",),
+}
+_SUFFIX_KINDS = {suffix: kind for kind, suffixes in RUN_REPORTS.items() for suffix in suffixes}
+_SUFFIX_KINDS["vivado.log"] = "vivado"
+
+class RunStore:
+  """
+  Every synthesis and accuracy run of every design, indexed by the design's
+  content-addressed key (DesignConfig.key) rather than its filename. A run is
+  one design, kind ("vivado" or "accuracy") and time, with the directories
+  its reports were found in. Runs of the same design in both naming schemes
+  or in copies of a result directory from another machine are merged.
+
+  A journal (JSON lines, appended to by every machine sharing it) records
+  claimed and finished runs with their host and pid, so a design being
+  synthesised elsewhere is not started again. A claim is stale once its
+  process has exited (checked on the same host only) or after
+  claim_timeout_s, clear_claims() releases claims by hand.
+  """
+  def __init__(self, journal_path=None, claim_timeout_s=24 * 3600):
+    self.journal_path = journal_path
+    self.claim_timeout_s = claim_timeout_s
+    # Design key -> runs sorted by time
+    self._runs = {}
+    # (key, kind, time) -> run, for merging copies of a run
+    self._index = {}
+    self.host = socket.gethostname()
+    # Journal state: bytes read, (key, kind) -> unreleased claims in journal order, (key, kind, time) -> host
+    self._journal_offset = 0
+    self._claims = {}
+    self._hosts = {}
+
+  def __len__(self):
+    return sum(len(runs) for runs in self._runs.values())
+
+  def __contains__(self, design):
+    return self._key(design) in self._runs
+
+  @staticmethod
+  def _key(design):
+    # A design, a design string in either naming scheme or a key
+    if isinstance(design, DesignConfig):
+      return design.key
+    if "_S_q_" in design:
+      return DesignConfig.from_str(design).key
+    return design
+
+  def keys(self):
+    return self._runs.keys()
+
+  def add(self, design_str, time_str, suffix, path, size=None):
+    """
+    Records one report file of a run, returns the run (None if the suffix is
+    not a report). size is the file size, looked up if not given.
+    """
+    kind = _SUFFIX_KINDS.get(suffix)
+    if kind is None:
+      return None
+    key = DesignConfig.from_str(design_str).key
+
+    run = self._index.get((key, kind, time_str))
+    if run is None:
+      run = {
+        "key": key, "design_str": design_str, "kind": kind, "time": time_str,
+        "directories": [], "reports": {}, "log": None, "complete": False, "host": self._hosts.get((key, kind, time_str)),
+      }
+      self._index[(key, kind, time_str)] = run
+      runs = self._runs.setdefault(key, [])
+      runs.insert(bisect.bisect([r["time"] for r in runs], time_str), run)
+
+    directory = os.path.normpath(os.path.dirname(path))
+    if directory not in run["directories"]:
+      run["directories"].append(directory)
+    if suffix == "vivado.log":
+      run["log"] = run["log"] or path
+      return run
+
+    size = os.path.getsize(path) if size is None else size
+    # The first non-empty copy of each report is kept
+    if size > 0 and suffix not in run["reports"]:
+      run["reports"][suffix] = path
+      run["complete"] = all(report in run["reports"] for report in RUN_REPORTS[kind])
+    return run
+
+  def scan(self, directory):
+    """Adds the runs of every report in directory, returns the number of files recorded."""
+    recorded = 0
+    with os.scandir(directory) as entries:
+      for entry in entries:
+        parsed = DesignConfig.parse_filename(entry.name)
+        if parsed is None or parsed[2] not in _SUFFIX_KINDS:
+          continue
+        design_str, time_str, suffix, _ = parsed
+        self.add(design_str, time_str, suffix, entry.path, size=entry.stat().st_size)
+        recorded += 1
+
+    self._read_journal()
+    return recorded
+
+  def runs(self, design, kind=None):
+    """All runs of a design (DesignConfig, design string or key), oldest first."""
+    runs = self._runs.get(self._key(design), [])
+    return [run for run in runs if kind is None or run["kind"] == kind]
+
+  def latest(self, design, kind, complete=True):
+    """Newest run of a kind, only complete runs unless complete is False, None if there is none."""
+    for run in reversed(self._runs.get(self._key(design), [])):
+      if run["kind"] == kind and (run["complete"] or not complete):
+        return run
+    return None
+
+  def duplicates(self, kind):
+    """Design key -> complete runs of a kind, for designs run more than once."""
+    duplicates = {}
+    for key, runs in self._runs.items():
+      complete = [run for run in runs if run["kind"] == kind and run["complete"]]
+      if len(complete) > 1:
+        duplicates[key] = complete
+    return duplicates
+
+  def _read_journal(self):
+    """Reads the journal lines appended since the last read, by any machine."""
+    if self.journal_path is None or not os.path.exists(self.journal_path):
+      return
+
+    with open(self.journal_path, "rb") as f:
+      f.seek(self._journal_offset)
+      data = f.read()
+    # A line still being appended by another machine is read next time
+    data = data[:data.rfind(b"\n") + 1]
+    self._journal_offset += len(data)
+
+    for line in data.decode().splitlines():
+      record = json.loads(line)
+      run_id = (record["key"], record["kind"], record["time"])
+      self._hosts[run_id] = record["host"]
+      if run_id in self._index:
+        self._index[run_id]["host"] = record["host"]
+      claims = self._claims.setdefault(run_id[:2], [])
+      if record["event"] == "claim":
+        claims.append(record)
+      else:
+        claims[:] = [claim for claim in claims if (claim["time"], claim["host"], claim["pid"]) != (record["time"], record["host"], record["pid"])]
+
+  def _append(self, record):
+    # One write per line, O_APPEND keeps lines from several processes whole
+    line = json.dumps(record) + "\n"
+    fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+      os.write(fd, line.encode())
+    finally:
+      os.close(fd)
+
+  @staticmethod
+  def _pid_alive(pid):
+    try:
+      os.kill(pid, 0)
+    except ProcessLookupError:
+      return False
+    except PermissionError:
+      # Exists, owned by another user
+      return True
+    return True
+
+  def _stale(self, claim, now):
+    # Claims of exited processes on this host, and claims older than
+    # claim_timeout_s on other hosts, whose processes cannot be checked
+    if claim["host"] == self.host and not self._pid_alive(claim["pid"]):
+      return True
+    return now - claim["claimed_at"] > self.claim_timeout_s
+
+  def claimed_by(self, design, kind):
+    """(host, pid) of a live claim on a design by another process, None if there is none."""
+    self._read_journal()
+    # The first live claim of a design wins until it is released
+    now = time.time()
+    claims = [claim for claim in self._claims.get((self._key(design), kind), []) if not self._stale(claim, now)]
+    if not claims or (claims[0]["host"] == self.host and claims[0]["pid"] == os.getpid()):
+      return None
+    return claims[0]["host"], claims[0]["pid"]
+
+  def claim(self, design, kind, time_str):
+    """
+    Records that this process runs a design. Returns False if another
+    process claimed it first, the first claim in the journal wins.
+    """
+    if self.journal_path is None:
+      return True
+    if self.claimed_by(design, kind) is not None:
+      return False
+    self._append({
+      "event": "claim", "key": design.key, "design": repr(design), "kind": kind, "time": time_str,
+      "host": self.host, "pid": os.getpid(), "claimed_at": time.time(),
+    })
+    if self.claimed_by(design, kind) is None:
+      return True
+    # Lost the race, withdraw the claim so it does not block the design once the winner releases it
+    self._append({
+      "event": "done", "key": design.key, "design": repr(design), "kind": kind, "time": time_str,
+      "host": self.host, "pid": os.getpid(), "elapsed_s": None, "withdrawn": True,
+    })
+    self._read_journal()
+    return False
+
+  def release(self, design, kind, time_str, elapsed_s=None):
+    """Records that a claimed run finished, successfully or not."""
+    if self.journal_path is None:
+      return
+    self._append({
+      "event": "done", "key": design.key, "design": repr(design), "kind": kind, "time": time_str,
+      "host": self.host, "pid": os.getpid(), "elapsed_s": elapsed_s,
+    })
+
+  def claims(self, stale=False):
+    """Unreleased claims in journal order, only live ones unless stale is True."""
+    self._read_journal()
+    now = time.time()
+    return [claim for claims in self._claims.values() for claim in claims if stale or not self._stale(claim, now)]
+
+  def clear_claims(self, design=None, kind=None, host=None, stale_only=True):
+    """
+    Releases unreleased claims, e.g. of a process killed on another host
+    before claim_timeout_s. Filters by design, kind and host, and clears
+    only stale claims unless stale_only is False. Returns the cleared claims.
+    """
+    if self.journal_path is None:
+      return []
+    key = None if design is None else self._key(design)
+    now = time.time()
+    cleared = [
+      claim for claim in self.claims(stale=True)
+      if (key is None or claim["key"] == key) and (kind is None or claim["kind"] == kind)
+      and (host is None or claim["host"] == host) and (not stale_only or self._stale(claim, now))
+    ]
+    for claim in cleared:
+      # Released in the name of the claiming process, so the claim matches
+      self._append({
+        "event": "done", "key": claim["key"], "design": claim["design"], "kind": claim["kind"], "time": claim["time"],
+        "host": claim["host"], "pid": claim["pid"], "elapsed_s": None, "cleared_by": self.host,
+      })
+    self._read_journal()
+    return cleared
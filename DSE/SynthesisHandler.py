@@ -1,19 +1,26 @@
 import os
 import glob
+import json
 import re
+import tempfile
 import subprocess
 import time
 from datetime import datetime
 from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
 
 
-from DSE.analytical_model import predict_synthesis_results
-from DSE.SynthesisResult import SynthesisResult, LUTS_BASELINE, FFS_BASELINE
+from DSE.analytical_model import predict_synthesis_results, predict_synthesis_results_batch, predict_perplexities
+from DSE.SynthesisResult import SynthesisResult
+from DSE.ResultSet import ResultSet
+from DSE.RunStore import RunStore
 from DSE.DesignConfig import DesignConfig
+from DSE.ablation_filters import default_engine
+from DSE import tracing
 
 class SynthesisHandler:
-  def __init__(self, designs_to_synthesise=None, hdl_dir="./src/attention/", synth_output_dir="synth_output", clock_period_ns=5, max_workers=4):
-    self.results = []
+  def __init__(self, designs_to_synthesise=None, hdl_dir="./src/attention/", synth_output_dir="synth_output", clock_period_ns=5, max_workers=4, run_dirs=None):
+    self.results = ResultSet()
     self.designs_to_synthesise = designs_to_synthesise
     self.hdl_dir = hdl_dir
     self.clock_period_ns = clock_period_ns
@@ -23,19 +30,65 @@ class SynthesisHandler:
     # TODO placeholder
     self.board_max_freq = 1200 # MHz 
     
+    # Results above this perplexity are discarded, also the early stopping threshold of sequential evaluation
+    self.max_perplexity = 12
+    
     self.synth_output_dir = os.path.join(self.hdl_dir, synth_output_dir)
     self._time_format = "%Y%m%d_%H%M"
+    
+    # Every run of every design by design key, with the journal of runs
+    # claimed by the machines sharing synth_output_dir. run_dirs are other
+    # result directories (e.g. copied from other machines) whose runs count
+    # as done, see index_runs
+    self.run_store = RunStore(journal_path=os.path.join(self.synth_output_dir, "runs.jsonl"))
+    self.run_dirs = [] if run_dirs is None else run_dirs
     self.pickle_dir = "./synthesis_fits"
     
+    self._vivado_phase_pattern = re.compile(
+      r"^(?:Finished (?P<finished>[^:\n]+?)|(?P<command>\w+))\s*: Time \(s\): cpu = (?P<cpu>\d+:\d+:\d+) ; elapsed = (?P<elapsed>\d+:\d+:\d+) \. Memory \(MB\): peak = (?P<peak>[\d.]+)",
+      re.MULTILINE,
+    )
+    # Design -> newest Vivado log, indexed once per find_and_process_results
+    self._vivado_logs = None
+    
   def check_if_result_exist(self, design, suffix):
     return bool(glob.glob(os.path.join(self.synth_output_dir, f"{design!r}_time_*{suffix}")))
   
   def check_if_results_exist(self, design, suffixes):
     return all(self.check_if_result_exist(design, suffix) for suffix in suffixes)
   
+  @tracing.traced()
+  def index_runs(self):
+    """Records the runs in synth_output_dir and run_dirs in run_store, in one directory listing each."""
+    for directory in [self.synth_output_dir, *self.run_dirs]:
+      if os.path.isdir(directory):
+        self.run_store.scan(directory)
+    return self.run_store
+  
+  def _skip_run(self, design, kind, queued, verbose):
+    """
+    Whether a run of design is already done (in any indexed directory, in
+    either naming scheme), queued earlier in this call or claimed by
+    another process sharing the journal.
+    """
+    run = self.run_store.latest(design, kind)
+    claim = self.run_store.claimed_by(design, kind) if run is None else None
+    if design.key in queued:
+      reason = "it duplicates an earlier design in the list"
+    elif run is not None:
+      reason = f"results already exist (run {run['time']} in {run['directories'][0]})"
+    elif claim is not None:
+      reason = f"it is being run on {claim[0]} (pid {claim[1]})"
+    else:
+      return False
+    
+    if verbose:
+      print(f"Skipping {kind} run for {design!r} as {reason}.")
+    return True
+  
   def check_if_design_is_invalid(self, design):
     # All parameters must be >= 0
-    for param in [design.S_q, design.S_kv, design.d_kq, design.d_v, design.k, design.scale_width]:
+    for param in [design.S_q, design.S_kv, design.d_kq, design.d_v, design.k1, design.k2, design.k3, design.scale_width]:
       if param <= 0:
         return True
       
@@ -48,34 +101,42 @@ class SynthesisHandler:
       if (param & (param - 1)) != 0:
         return True
       
-    # d_kq and d_v must be divisible by k
-    if design.d_kq % design.k != 0 or design.d_v % design.k != 0:
-      return True
-      
-    # S_kq and S_v must be divisible by k
-    if design.S_q % design.k != 0 or design.S_kv % design.k != 0:
-      return True
+    for k in [design.k1, design.k2, design.k3]:
+      # d_kq and d_v must be divisible by k
+      if design.d_kq % k != 0 or design.d_v % k != 0:
+        return True
+        
+      # S_kq and S_v must be divisible by k
+      if design.S_q % k != 0 or design.S_kv % k != 0:
+        return True
     
     return False
   
   @staticmethod
-  def run_synthesis_on_design(design, synthesis_cmd, verbose):
+  def run_synthesis_on_design(design, synthesis_cmd, verbose, log_path=None):
     if verbose:
       print(f"Results for {design!r} not found, running synthesis command: {synthesis_cmd}")
       
     start_time = time.perf_counter()
+    log = open(log_path, "w") if log_path is not None else subprocess.DEVNULL
     try:
-      _ = subprocess.run(synthesis_cmd, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+      _ = subprocess.run(synthesis_cmd, shell=True, stdout=log, stderr=subprocess.STDOUT, check=True)
     except subprocess.CalledProcessError as e:
       print(f"Synthesis failed for {design} with return code: {e.returncode}")
     except Exception as e:
       print(f"An unknown error occurred while running synthesis for {design}: {e}")
+    finally:
+      if log_path is not None:
+        log.close()
         
     end_time = time.perf_counter()
     
     if verbose:
       print(f"Synthesis for {design!r} completed in {end_time - start_time:.2f} seconds.")
     
+    return start_time, end_time, os.getpid()
+    
+  @tracing.traced()
   def run_synthesis(self, dry_run=False, verbose=False):
     if not self.designs_to_synthesise:
       print("No designs to synthesise specified.")
@@ -84,7 +145,12 @@ class SynthesisHandler:
     if verbose:
       print(f"Starting synthesis for {len(self.designs_to_synthesise)} designs...")
     
+    # One listing of the result directories instead of a glob per design
+    self.index_runs()
+    queued = set()
+    
     jobs = []
+    designs = {}
     with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
       for design_id, design in enumerate(self.designs_to_synthesise):
         # time.sleep(design_id)
@@ -93,38 +159,145 @@ class SynthesisHandler:
             print(f"Skipping synthesis for {design!r} as design configuration is invalid.")
           continue
         
-        if self.check_if_results_exist(design, ["_power.rpt", "_timing.rpt", "_util.rpt"]):
-          if verbose:
-            print(f"Skipping synthesis for {design!r} as results already exist.")
+        if self._skip_run(design, "vivado", queued, verbose):
           continue
+        queued.add(design.key)
         
+        # The tcl script names its reports with this time, the same as the Vivado log and the claim
+        date_time_str = datetime.now().strftime(self._time_format)
         run_synth_path = os.path.join(self.hdl_dir, design.get_tcl_filename())
-        # synthesis_cmd = f"vivado -mode batch -source {run_synth_path} -tclargs {design.get_vivado_tclargs()}"
-        synthesis_cmd = f"/mnt/applications/Xilinx/24.2/Vivado/2024.2/bin/vivado -mode batch -source {run_synth_path} -tclargs {design.get_vivado_tclargs()}"
+        # synthesis_cmd = f"vivado -mode batch -source {run_synth_path} -tclargs {design.get_vivado_tclargs(date_time_str)}"
+        synthesis_cmd = f"/mnt/applications/Xilinx/24.2/Vivado/2024.2/bin/vivado -mode batch -source {run_synth_path} -tclargs {design.get_vivado_tclargs(date_time_str)}"
         
         if dry_run:
           if verbose:
             print(f"Dry run mode enabled, skipping actual synthesis, cmd supposed to run:\n{synthesis_cmd}")
           continue
         
-        # Submit parallel task
-        future = executor.submit(self.run_synthesis_on_design, design, synthesis_cmd, verbose)
+        # Claimed in the journal so other machines skip it, lost races are skipped here
+        if not self.run_store.claim(design, "vivado", date_time_str):
+          if verbose:
+            print(f"Skipping synthesis for {design!r} as another process claimed it first.")
+          continue
+        
+        # Submit parallel task, the Vivado log is kept for its per-phase telemetry
+        log_path = os.path.join(self.synth_output_dir, f"{design!r}_time_{date_time_str}_vivado.log")
+        future = executor.submit(self.run_synthesis_on_design, design, synthesis_cmd, verbose, log_path)
         jobs.append(future)
+        designs[future] = (design, date_time_str)
         # self.run_synthesis_on_design(design, synthesis_cmd, verbose=verbose)
         
       # Wait for all futures to complete
       for future in as_completed(jobs):
+        design, date_time_str = designs[future]
         try:
-          future.result()
+          start_time, end_time, pid = future.result()
+          # Worker processes do not share the tracer, so their runs are recorded here
+          tracing.record("SynthesisHandler.run_synthesis_on_design", start_time, end_time, pid=pid, design=repr(design))
+          self.run_store.release(design, "vivado", date_time_str, elapsed_s=end_time - start_time)
         except Exception as e:
           print(f"Synthesis subprocess failed with: {e}")
+          self.run_store.release(design, "vivado", date_time_str)
           
     if verbose:
       print("Synthesis completed for all designs.")
 
+  def screen_designs(self, yosys_estimator, y_type="LUTs", max_value=None, keep_top=None, verbose=False):
+    """
+    Narrows designs_to_synthesise to the valid designs that pass the Yosys
+    screen, so only those reach Vivado.
+    """
+    if not self.designs_to_synthesise:
+      print("No designs to screen specified.")
+      return
+    
+    valid_designs = [d for d in self.designs_to_synthesise if not self.check_if_design_is_invalid(d)]
+    self.designs_to_synthesise = yosys_estimator.screen(valid_designs, y_type=y_type, max_value=max_value, keep_top=keep_top)
+    
+    if verbose:
+      print(f"Screened down to {len(self.designs_to_synthesise)} designs from {len(valid_designs)} valid designs.")
+
+  @tracing.traced()
+  def read_result(self, design, fidelity="vivado", verbose=False):
+    """
+    Newest complete synthesis result of design in synth_output_dir and
+    run_dirs, found by design key so reports in either naming scheme count.
+    None if no run has all of its reports.
+    """
+    run = self.index_runs().latest(design, "vivado")
+    if run is None:
+      if verbose:
+        print(f"No complete synthesis run found for {design!r}.")
+      return None
+    reports = run["reports"]
+    
+    try:
+      dynamic_power, static_power = self._read_power_report(reports["power.rpt"])
+      no_timing_violation, max_freq = self._read_timing_report(reports["timing.rpt"])
+      utilisation = self._read_utilisation_report(reports["util.rpt"])
+    except FileNotFoundError as e:
+      if verbose:
+        print(f"Error processing run {run['time']} of {design!r}: {e}")
+      return None
+    
+    # Accuracy reports use the per-stage naming, so they are a run of their own
+    accuracy_run = self.run_store.latest(design, "accuracy")
+    accuracy = self._read_accuracy_report(accuracy_run["reports"]["accuracy.txt"], verbose=False) if accuracy_run is not None else -1.0
+    
+    return SynthesisResult(
+      design_config=design,
+      power={
+          "dynamic": dynamic_power,
+          "static": static_power,
+          "total": dynamic_power + static_power
+      },
+      timing={
+          "no_violation": no_timing_violation,
+          "max_freq": max_freq
+      },
+      utilisation=utilisation,
+      accuracy=accuracy,
+      fidelity=fidelity,
+      telemetry=self._read_vivado_log(run["log"] or self._find_vivado_log(design)),
+    )
+
+  @tracing.traced()
+  def predict_results(self, designs=None, verbose=False):
+    """
+    Analytical results for designs (default: designs_to_synthesise), with
+    predicted resources and surrogate perplexities in one batch.
+    """
+    designs = self.designs_to_synthesise if designs is None else designs
+    perplexities, stds = predict_perplexities(self.pickle_dir, designs, return_std=True)
+    LUTs = predict_synthesis_results_batch(self.pickle_dir, "LUTs", designs, normalise_S_q=True)
+    FFs = predict_synthesis_results_batch(self.pickle_dir, "FFs", designs, normalise_S_q=True)
+
+    results = ResultSet(capacity=len(designs))
+    for design, perplexity, std, design_LUTs, design_FFs in zip(designs, perplexities, stds, LUTs, FFs):
+      results.add(
+        design_config=design,
+        power={"dynamic": -1, "static": -1, "total": -2},
+        timing={"no_violation": None, "max_freq": 1},
+        utilisation={
+          "LUTs": float(design_LUTs),
+          "FFs": float(design_FFs),
+          "BRAMs": -1,
+          "DSPs": -1,
+        },
+        accuracy=float(perplexity),
+        fidelity="analytical",
+        accuracy_std=float(std),
+      )
+
+      if verbose:
+        print(f"Predicted {design!r}: perplexity {perplexity:.2f} (log std {std:.3f})")
+
+    return results
+
   def _read_power_report(self, file_path):
     with open(file_path, 'r') as file:
       text = file.read()
+    tracing.count("bytes_read", len(text))
       
     dynamic_match = re.search(r"Dynamic \(W\)\s*\|\s*([\d.]+)", text)
     static_match = re.search(r"Device Static \(W\)\s*\|\s*([\d.]+)", text)
@@ -137,6 +310,7 @@ class SynthesisHandler:
   def _read_timing_report(self, file_path):
     with open(file_path, 'r') as file:
       text = file.read()
+    tracing.count("bytes_read", len(text))
       
     timing_match = re.search(r"\n\s*([-?\d\.]+)\s+([-?\d\.]+)\s+\d+\s+\d+\s+([-?\d\.]+)\s+([-?\d\.]+)\s+\d+\s+\d+", text)
     
@@ -153,6 +327,7 @@ class SynthesisHandler:
   def _read_utilisation_report(self, file_path):
     with open(file_path, "r") as file:
         text = file.read()
+    tracing.count("bytes_read", len(text))
 
     results = {}
 
@@ -184,10 +359,60 @@ class SynthesisHandler:
     
     return results
   
+  def _find_vivado_log(self, design):
+    """Newest Vivado log of design in synth_output_dir, None if there is none."""
+    if self._vivado_logs is not None:
+      return self._vivado_logs.get(repr(design))
+    log_paths = sorted(glob.glob(os.path.join(self.synth_output_dir, f"{design!r}_time_*_vivado.log")))
+    return log_paths[-1] if log_paths else None
+
+  def _read_vivado_log(self, file_path):
+    """
+    Per-phase telemetry from the "<phase>: Time (s): cpu = ... ; elapsed = ...
+    . Memory (MB): peak = ..." lines Vivado prints after each Tcl command, with
+    RTL elaboration reported as its own phase. Returns None without a log.
+    """
+    if file_path is None:
+      return None
+    try:
+      with open(file_path, 'r', errors='replace') as file:
+        text = file.read()
+    except FileNotFoundError:
+      return None
+    tracing.count("bytes_read", len(text))
+
+    def seconds(hms):
+      h, m, s = (int(x) for x in hms.split(":"))
+      return 3600 * h + 60 * m + s
+
+    phases = {}
+    for m in self._vivado_phase_pattern.finditer(text):
+      name = "elaboration" if m.group("finished") == "RTL Elaboration" else m.group("command")
+      if name is None:
+        continue
+      phase = phases.setdefault(name, {"cpu_s": 0, "elapsed_s": 0, "peak_mb": 0.0})
+      phase["cpu_s"] += seconds(m.group("cpu"))
+      phase["elapsed_s"] += seconds(m.group("elapsed"))
+      phase["peak_mb"] = max(phase["peak_mb"], float(m.group("peak")))
+
+    if not phases:
+      return None
+
+    # Elaboration runs inside synth_design, so only the commands add up to the job
+    commands = [phase for name, phase in phases.items() if name != "elaboration"]
+    return {
+      "phases": phases,
+      "elapsed_s": sum(phase["elapsed_s"] for phase in commands),
+      "cpu_s": sum(phase["cpu_s"] for phase in commands),
+      "peak_mb": max(phase["peak_mb"] for phase in phases.values()),
+      "log": file_path,
+    }
+
   def _read_accuracy_report(self, file_path, verbose):
     try:
       with open(file_path, 'r') as file:
         text = file.read()
+      tracing.count("bytes_read", len(text))
         
       accuracy_match = re.search(r"Perplexity:\s*(\d+\.\d+)", text)
       
@@ -205,39 +430,115 @@ class SynthesisHandler:
 
     return accuracy
   
-  def run_accuracy_measurement(self, dry_run=False, verbose=False):
+  def run_accuracy_measurement(self, dry_run=False, verbose=False, configs_per_run=1, worker_pool=None, early_stop=False, profile=False):
     if not self.designs_to_synthesise:
       print("No designs to measure accuracy for specified.")
       return
     
+    # Batched runs and resident workers evaluate the whole dataset per design,
+    # they support neither sequential early stopping nor stage profiling
+    if (early_stop or profile) and (configs_per_run > 1 or worker_pool is not None):
+      raise ValueError("early_stop and profile need configs_per_run=1 and no worker_pool")
+    
+    self.index_runs()
+    queued = set()
+    
+    pending = []
+    claimed = []
     for design in self.designs_to_synthesise:
-      if self.check_if_result_exist(design, "_accuracy.txt"):
-        if verbose:
-          print(f"Skipping accuracy measurement for {design!r} as accuracy report already exists.")
+      if self._skip_run(design, "accuracy", queued, verbose):
         continue
+      queued.add(design.key)
       
       date_time_str = datetime.now().strftime(self._time_format)
       accuracy_report_path = os.path.join(self.synth_output_dir, f"{design!r}_time_{date_time_str}_accuracy.txt")
       
+      if not dry_run:
+        if not self.run_store.claim(design, "accuracy", date_time_str):
+          if verbose:
+            print(f"Skipping accuracy measurement for {design!r} as another process claimed it first.")
+          continue
+        claimed.append((design, date_time_str))
+      
       if verbose:
         print(f"Running accuracy measurement for {design!r}, saving report to {accuracy_report_path}...")
       
-      if not dry_run:
-        self._generate_accuracy_report(design, accuracy_report_path)
+      pending.append((design, accuracy_report_path))
+      
+    if dry_run:
+      return
+    
+    try:
+      # Resident workers (see PerplexityWorkerPool) skip the per-design model load entirely
+      if worker_pool is not None:
+        self._generate_accuracy_reports_with_pool([d for d, _ in pending], [p for _, p in pending], worker_pool)
+        return
+      
+      # Several designs share one model load and forward pass when configs_per_run > 1
+      for i in range(0, len(pending), configs_per_run):
+        batch = pending[i:i + configs_per_run]
+        if len(batch) == 1:
+          self._generate_accuracy_report(*batch[0], early_stop=early_stop, profile=profile)
+        else:
+          self._generate_accuracy_reports_batched([d for d, _ in batch], [p for _, p in batch])
+    finally:
+      for design, date_time_str in claimed:
+        self.run_store.release(design, "accuracy", date_time_str)
       
   
-  def _generate_accuracy_report(self, design, accuracy_report_path):
+  def _generate_accuracy_report(self, design, accuracy_report_path, early_stop=False, profile=False):
     accuracy_cmd = f"CUDA_VISIBLE_DEVICES=1 python -u quant/llama_ppl.py {design.get_quant_flags()}"
+    if early_stop:
+      # Sequential evaluation, stops once the design is confidently above max_perplexity
+      accuracy_cmd += f" --ppl_threshold {self.max_perplexity} --ppl_rel_tol 0.005"
+    if profile:
+      # Per-layer attention stage timings, written next to the accuracy report
+      accuracy_cmd += f" --profile {accuracy_report_path[:-len('_accuracy.txt')]}_profile.txt"
     print(accuracy_cmd)
 
     try:
-        completed_process = subprocess.run(accuracy_cmd, shell=True, stdout=open(accuracy_report_path, "w"), stderr=subprocess.DEVNULL, check=True)
+      with open(accuracy_report_path, "w") as f:
+        completed_process = subprocess.run(accuracy_cmd, shell=True, stdout=f, stderr=subprocess.DEVNULL, check=True)
     except subprocess.CalledProcessError as e:
         print(f"Accuracy measurement failed for {design} with return code: {e.returncode}")
     except Exception as e:
         print(f"An unknown error occurred while running accuracy measurement for {design}: {e}")
+        
+  def _generate_accuracy_reports_batched(self, designs, accuracy_report_paths):
+    entries = [{"config": design.get_quant_config(), "report": path} for design, path in zip(designs, accuracy_report_paths)]
+    
+    with tempfile.NamedTemporaryFile("w", suffix="_multi_config.json", delete=False) as f:
+      json.dump(entries, f, indent=2)
+      multi_config_path = f.name
+    
+    accuracy_cmd = f"CUDA_VISIBLE_DEVICES=1 python -u quant/llama_ppl.py --model_id '{DesignConfig.model_id}' --multi_config {multi_config_path}"
+    print(accuracy_cmd)
+
+    try:
+        completed_process = subprocess.run(accuracy_cmd, shell=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    except subprocess.CalledProcessError as e:
+        print(f"Batched accuracy measurement failed for {len(designs)} designs with return code: {e.returncode}")
+    except Exception as e:
+        print(f"An unknown error occurred while running batched accuracy measurement for {len(designs)} designs: {e}")
+    finally:
+      os.remove(multi_config_path)
+    
+  def _generate_accuracy_reports_with_pool(self, designs, accuracy_report_paths, worker_pool):
+    replies = worker_pool.evaluate(designs)
+    
+    for design, accuracy_report_path in zip(designs, accuracy_report_paths):
+      reply = replies.get(repr(design))
+      if reply is None or reply["status"] != "ok":
+        print(f"Accuracy measurement failed for {design}: {reply['error'] if reply else 'no reply'}")
+        continue
+      
+      with open(accuracy_report_path, "w") as f:
+        f.write(f"Config: {json.dumps(design.get_quant_config())}\n")
+        f.write(f"Validation samples: {reply['validation_samples']}\n")
+        f.write(f"\nPerplexity: {reply['perplexity']:.2f}\n")
     
-  def _process_result(self, design_str, date_time, predict_resources=False, ablation_check=False, use_new_filename=False, verbose=False):
+  @tracing.traced()
+  def _process_result(self, design_str, date_time, predict_resources=False, predict_accuracy=False, use_new_filename=False, verbose=False):
     file_path = os.path.join(self.synth_output_dir, f"{design_str}_time_{date_time.strftime(self._time_format)}")
     design = DesignConfig.from_str(design_str, use_new_filename=use_new_filename)
     
@@ -247,6 +548,8 @@ class SynthesisHandler:
     accuracy_report_path = f"{file_path}_accuracy.txt"
     
     accuracy = self._read_accuracy_report(accuracy_report_path, verbose=verbose)
+    if predict_accuracy and accuracy < 0:
+      accuracy = float(predict_perplexities(self.pickle_dir, [design])[0])
     
     if predict_resources:
       dynamic_power, static_power = -1, -1
@@ -266,7 +569,14 @@ class SynthesisHandler:
         print(f"Error processing {file_path}: {e} - the report is probably being generated, try again later.")
         return
     
-    result = SynthesisResult(
+    if not predict_resources:
+      # Only include results that have valid max frequency
+      if not (max_freq > 0 and max_freq < self.board_max_freq):
+        print(f"WARNING: Skipping result for {design!r} due to invalid max frequency: {max_freq:.2f} MHz.")
+        return
+      
+    # Stored straight into the result columns, no SynthesisResult per design
+    self.results.add(
       design_config=design,
       power={
           "dynamic": dynamic_power,
@@ -278,120 +588,156 @@ class SynthesisHandler:
           "max_freq": max_freq
       },
       utilisation=utilisation,
-      accuracy=accuracy
+      accuracy=accuracy,
+      fidelity="analytical" if predict_resources else "vivado",
+      telemetry=None if predict_resources else self._read_vivado_log(self._find_vivado_log(design)),
     )
-    
-    if not predict_resources:
-      # Only include results that have valid max frequency
-      if not (max_freq > 0 and max_freq < self.board_max_freq):
-        print(f"WARNING: Skipping result for {result} due to invalid max frequency: {max_freq:.2f} MHz.")
-        return
-      
-    if ablation_check:
-      # BASELINE
-      # if (not design.is_baseline()):
-      #   if verbose:
-      #     print(f"Skipping result for {design} as it does not meet ablation check criteria.")
-      #   return
-      
-      # ABLATION: MIXED PRECISION
-      # if (not design.is_baseline()) and (not design.is_mixed_precision_ablation()):
-      #   if verbose:
-      #     print(f"Skipping result for {design} as it does not meet ablation check criteria.")
-      #   return
-      
-      # ABLATION: MIXED K
-      # if (not design.is_baseline()) and (not design.is_mixed_k_ablation()):
-      #   if verbose:
-      #     print(f"Skipping result for {design} as it does not meet ablation check criteria.")
-      #   return
-      
-      # ABLATION: MIXED ACCUM
-      # if (not design.is_baseline()) and (not design.is_mixed_accum_ablation()):
-      #   if verbose:
-      #     print(f"Skipping result for {design} as it does not meet ablation check criteria.")
-      #   return
-      
-      # JOINT ABLATION:
-      if (not design.is_joint_ablation()):
-        if verbose:
-          print(f"Skipping result for {design} as it does not meet ablation check criteria.")
-        return
-      
-      if result.accuracy < 0:
-        if verbose:
-          print(f"Skipping result for {design} as accuracy could not be determined.")
-        return
-      
-      if result.accuracy > 12:
-        if verbose:
-          print(f"Skipping result for {design} as accuracy is too high.")
-        return
-      
-      if result.utilisation["LUTs"] > (2.5 * LUTS_BASELINE):
-        if verbose:
-          print(f"Skipping result for {design} as it exceeds FPGA resource limits.")
-        return
-
-    self.results.append(result)
       
+  @tracing.traced()
   def _find_results(self, directory, report_filter=None, verbose=False):
     matches = {}
     
+    # Accuracy reports use the per-stage block size naming, Vivado reports the legacy one
     if report_filter is not None:
       if report_filter == "accuracy":
-        file_ext = "*.txt"
-        pattern = re.compile(DesignConfig.get_filename_regex())
+        file_ext = ".txt"
+        legacy = False
       else:
         raise ValueError(f"Unsupported report_filter: {report_filter}")
     else:
-      file_ext = "*.rpt"
-      pattern = re.compile(DesignConfig.get_old_filename_regex())
+      file_ext = ".rpt"
+      legacy = True
     
-    for file_path in glob.glob(os.path.join(directory, file_ext)):
-      filename = os.path.basename(file_path)
-      # print(f"\nExtracted filename: {filename}")
-      
-      # Match the filename against the regex
-      m = pattern.match(filename)
-      # print(f"pattern: {pattern}\n")
-      
-      if not m:
-        print(f"WARNING: Filename {filename} does not match expected pattern, skipping.")
-        continue
-      
-      matched_str = m.group(1)
-      # print(f"Matched string: {matched_str}")
-      
-      result_date_time = datetime.strptime(m.group(2), self._time_format)
-      # print(f"Extracted datetime: {result_date_time}")
-      
-      # Only store newest synthesis result
-      if matched_str not in matches:
-        matches[matched_str] = result_date_time
-        # print(f"Added new match: {matched_str}")
-      elif result_date_time > matches[matched_str]:
-        matches[matched_str] = result_date_time
-        # print(f"Updated match with newer datetime: {matched_str}")
+    # Every run is kept in run_store, design key -> kind of the runs found here
+    found = {}
+    with os.scandir(directory) as entries:
+      for entry in entries:
+        if not entry.name.endswith(file_ext) or entry.name.startswith("."):
+          continue
+        tracing.count("files")
+        
+        # Decode the filename, the design is cached for _process_result
+        parsed = DesignConfig.parse_filename(entry.name)
+        
+        if parsed is None or parsed[3] != legacy:
+          print(f"WARNING: Filename {entry.name} does not match expected pattern, skipping.")
+          continue
+        
+        design_str, time_str, suffix, _ = parsed
+        run = self.run_store.add(design_str, time_str, suffix, entry.path, size=entry.stat().st_size)
+        if run is not None:
+          found.setdefault(run["key"], run["kind"])
+    
+    # Only the newest complete run of each design is processed, the newest
+    # incomplete one if none is complete
+    normalised_dir = os.path.normpath(directory)
+    for key, kind in found.items():
+      runs = [run for run in self.run_store.runs(key, kind) if normalised_dir in run["directories"]]
+      run = ([run for run in runs if run["complete"]] or runs)[-1]
+      matches[run["design_str"]] = datetime.strptime(run["time"], self._time_format)
 
+    tracing.count("matches", len(matches))
     print (f"Found {len(matches)} synthesis results in {directory}.")
     return matches
   
-  def find_and_process_results(self, result_dir=None, report_filter=None, predict_resources=False, ablation_check=False, verbose=False):  
-    matches = self._find_results(self.synth_output_dir if result_dir is None else result_dir, report_filter=report_filter, verbose=verbose)
-    for design_str, date_time in matches.items():
-      self._process_result(design_str, date_time, predict_resources=predict_resources, ablation_check=ablation_check, use_new_filename=(report_filter == "accuracy"), verbose=verbose)
+  def _find_vivado_logs(self, directory):
+    """Design string -> newest Vivado log in directory."""
+    logs = {}
+    for file_path in glob.glob(os.path.join(directory, "*_vivado.log")):
+      parsed = DesignConfig.parse_filename(os.path.basename(file_path))
+      if parsed is None or parsed[3]:
+        continue
+      design_str, time_str = parsed[:2]
+      if design_str not in logs or time_str > logs[design_str][0]:
+        logs[design_str] = (time_str, file_path)
+    return {design_str: file_path for design_str, (_, file_path) in logs.items()}
+
+  def telemetry_table(self):
+    """
+    DataFrame of the design parameters and Vivado telemetry of results with a
+    log, one row per result, for modelling job cost against the parameters.
+    """
+    import pandas as pd
+
+    rows = []
+    for result in self.results:
+      if result.telemetry is None:
+        continue
+      dc = result.design_config
+      row = {
+        "design": repr(dc), "S_q": dc.S_q, "S_kv": dc.S_kv, "d_kq": dc.d_kq, "d_v": dc.d_v,
+        "k1": dc.k1, "k2": dc.k2, "k3": dc.k3,
+        "M1_E": dc.M1_bits.exp_bits, "M1_M": dc.M1_bits.mant_bits,
+        "M2_E": dc.M2_bits.exp_bits, "M2_M": dc.M2_bits.mant_bits,
+        "M3_E": dc.M3_bits.exp_bits, "M3_M": dc.M3_bits.mant_bits,
+        "accum1": dc.accum_method1.value, "accum2": dc.accum_method2.value, "accum3": dc.accum_method3.value,
+        "elapsed_s": result.telemetry["elapsed_s"], "cpu_s": result.telemetry["cpu_s"], "peak_mb": result.telemetry["peak_mb"],
+      }
+      for name, phase in result.telemetry["phases"].items():
+        row[f"{name}_elapsed_s"] = phase["elapsed_s"]
+        row[f"{name}_peak_mb"] = phase["peak_mb"]
+      rows.append(row)
+
+    return pd.DataFrame(rows)
+
+  @tracing.traced()
+  def find_and_process_results(self, result_dir=None, report_filter=None, predict_resources=False, predict_accuracy=False, ablation_check=False, ablation="joint", verbose=False):
+    """
+    Ingests the newest reports of every design in result_dir. With
+    ablation_check, the newly ingested results are then filtered by an
+    ablation of DSE/ablations.json (an ablation name or a filter expression),
+    so one set of reports can be ingested once and filtered any number of
+    times with DSE.ablation_filters.
+    """
+    directory = self.synth_output_dir if result_dir is None else result_dir
+    matches = self._find_results(directory, report_filter=report_filter, verbose=verbose)
+    if not predict_resources:
+      self._vivado_logs = self._find_vivado_logs(directory)
+    start = len(self.results)
+    try:
+      for design_str, date_time in matches.items():
+        self._process_result(design_str, date_time, predict_resources=predict_resources, predict_accuracy=predict_accuracy, use_new_filename=(report_filter == "accuracy"), verbose=verbose)
+    finally:
+      self._vivado_logs = None
     
     if ablation_check:
+      # Results ingested before this call were already filtered
+      mask = default_engine().mask(self.results, ablation, variables={"max_perplexity": self.max_perplexity})
+      mask[:start] = True
+      if verbose:
+        for i in np.flatnonzero(~mask):
+          print(f"Skipping result for {self.results.design(i)!r} as it does not meet ablation check criteria.")
+      self.results = self.results[mask]
       print(f"Ablation check enabled, total valid results found: {len(self.results)}")
-      
-    self.designs = [r.design_config for r in self.results]
-    self.powers = [r.power['total'] for r in self.results]
-    self.LUTs = [r.utilisation["LUTs"] for r in self.results]
-    self.FFs = [r.utilisation["FFs"] for r in self.results]
-    self.BRAMs = [r.utilisation["BRAMs"] for r in self.results]
-    self.DSPs = [r.utilisation["DSPs"] for r in self.results]
-    self.accuracies = [r.accuracy for r in self.results]
+
+  # Per-result columns of self.results, NumPy views rather than copies
+  @property
+  def designs(self):
+    return self.results.designs
+
+  @property
+  def powers(self):
+    return self.results.powers
+
+  @property
+  def LUTs(self):
+    return self.results.LUTs
+
+  @property
+  def FFs(self):
+    return self.results.FFs
+
+  @property
+  def BRAMs(self):
+    return self.results.BRAMs
+
+  @property
+  def DSPs(self):
+    return self.results.DSPs
+
+  @property
+  def accuracies(self):
+    return self.results.accuracies
   
   def __str__(self):
     spacer = "="*60 + "\n"
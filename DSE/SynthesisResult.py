@@ -14,12 +14,18 @@ AVAILABLE_FPGA_RESOURCES = {
 }
 
 class SynthesisResult:
-  def __init__(self, design_config, power, timing, utilisation, accuracy):
+  def __init__(self, design_config, power, timing, utilisation, accuracy, fidelity="vivado", accuracy_std=None, telemetry=None):
     self.design_config = design_config
     self.power = power
     self.timing = timing
     self.utilisation = utilisation
     self.accuracy = accuracy
+    # Std of the surrogate's log perplexity, None for measured perplexities
+    self.accuracy_std = accuracy_std
+    # Where the resources come from: "analytical", "quick" or "vivado"
+    self.fidelity = fidelity
+    # Per-phase run time and peak memory parsed from the Vivado log, None without a log
+    self.telemetry = telemetry
   
   @classmethod
   def create_ideal_result(cls, all_results):
@@ -69,18 +75,9 @@ class SynthesisResult:
     
   @staticmethod
   def normalise_results(results):
-    ideal_result = SynthesisResult.create_ideal_result(results)
-    results_normalised = copy.deepcopy(results)
-    for result in results_normalised:
-      result.power['total'] = result.power['total'] / ideal_result.power['total']
-      result.timing['max_freq'] = result.timing['max_freq'] / ideal_result.timing['max_freq']
-      
-      for key in AVAILABLE_FPGA_RESOURCES.keys():
-        result.utilisation[key] = result.utilisation[key] / ideal_result.utilisation[key] if ideal_result.utilisation[key] > 0 else 0.0
-        
-      result.accuracy = result.accuracy / ideal_result.accuracy
-        
-    return results_normalised
+    """Results divided by the ideal result, as a ResultSet (iterating it yields SynthesisResults)."""
+    from DSE.ResultSet import ResultSet
+    return ResultSet.from_results(results).normalised()
   
   def __str__(self):
     s = f"{self.design_config!s}\n"
@@ -96,5 +93,8 @@ class SynthesisResult:
       s += f"\t{key}: {value:,} ({(value / AVAILABLE_FPGA_RESOURCES[key]) * 100:.2f}%)\n"
       
     s += f"Perplexity: {self.accuracy:.2f}\n" if self.accuracy is not None else "Perplexity: N/A\n"
+    
+    if self.telemetry is not None:
+      s += f"Vivado: {self.telemetry['elapsed_s']:.0f} s elapsed, {self.telemetry['cpu_s']:.0f} s CPU, {self.telemetry['peak_mb']:.0f} MB peak\n"
 
     return s
\ No newline at end of file
@@ -0,0 +1,203 @@
+import os
+import re
+import glob
+import json
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from DSE.DesignConfig import DesignConfig
+
+class YosysEstimator:
+  """
+  Pre-synthesis resource estimates from a generic Yosys flow (slang frontend,
+  synth to K-input LUTs and FFs). Runs in seconds per design, between the
+  analytical model and Vivado. Results are cached per design parameter tuple.
+  """
+  def __init__(self, yosys_bin="yosys", hdl_dir="./src/attention/", cache_dir="./yosys_cache", lut_size=6, timeout=600, max_workers=4, verbose=False):
+    self.yosys_bin = yosys_bin
+    self.hdl_dir = hdl_dir
+    self.cache_dir = cache_dir
+    self.lut_size = lut_size
+    self.timeout = timeout
+    self.max_workers = max_workers
+    self.verbose = verbose
+
+    self._cache = {}
+    os.makedirs(self.cache_dir, exist_ok=True)
+
+  def get_sources(self, design):
+    """
+    Source files from the read_verilog lines of the design's Vivado script,
+    so both flows elaborate the same RTL.
+    """
+    with open(os.path.join(self.hdl_dir, design.get_tcl_filename()), "r") as f:
+      text = f.read()
+
+    sources = []
+    for line in text.splitlines():
+      m = re.match(r"\s*read_verilog\s+(?:\[\s*glob\s+)?([^\s\]]+)", line)
+      if not m:
+        continue
+      for path in sorted(glob.glob(m.group(1))):
+        if path not in sources:
+          sources.append(path)
+
+    return sources
+
+  @staticmethod
+  def get_generics(design):
+    """Top-level parameters, mirroring the generics set in the Vivado scripts."""
+    BW_1 = 1 + design.M1_bits.exp_bits + design.M1_bits.mant_bits
+    BW_2 = 1 + design.M2_bits.exp_bits + design.M2_bits.mant_bits
+    BW_3 = 1 + design.M3_bits.exp_bits + design.M3_bits.mant_bits
+
+    if design.name == "matmul_fp":
+      return {
+        "x_rows": design.S_q, "vec_elem_count": design.d_kq, "y_cols": design.S_kv,
+        "k": design.k1, "bit_width": BW_1, "exp_width": design.M1_bits.exp_bits, "man_width": design.M1_bits.mant_bits,
+        "out_width": BW_1, "scale_width": design.scale_width,
+        "USE_DSP": f'"{design.m1_dsp}"', "ACCUM_METHOD": f'"{design.accum_method1.value}"',
+      }
+    elif design.name == "mxint_softmax":
+      return {
+        "DATA_IN_0_PRECISION_0": BW_2, "DATA_IN_0_PRECISION_1": design.scale_width, "DATA_IN_0_DIM": BW_3, "DATA_IN_0_PARALLELISM": design.k1,
+        "DATA_OUT_0_PRECISION_0": BW_3, "DATA_OUT_0_PRECISION_1": design.scale_width, "DATA_OUT_0_DIM": BW_3, "DATA_OUT_0_PARALLELISM": design.k2,
+        "USE_DSP": f'"{design.m2_dsp}"', "ACCUM_METHOD": f'"{design.accum_method2.value}"',
+      }
+    elif design.name == "attention_fp":
+      return {
+        "S_q": design.S_q, "S_kv": design.S_kv, "d_kq": design.d_kq, "d_v": design.d_v,
+        "k": design.k1, "scale_width": design.scale_width,
+        "M1_EXP_WIDTH": design.M1_bits.exp_bits, "M1_MAN_WIDTH": design.M1_bits.mant_bits,
+        "M2_EXP_WIDTH": design.M2_bits.exp_bits, "M2_MAN_WIDTH": design.M2_bits.mant_bits,
+        "M3_EXP_WIDTH": design.M3_bits.exp_bits, "M3_MAN_WIDTH": design.M3_bits.mant_bits,
+        "ACCUM_METHOD1": f'"{design.accum_method1.value}"', "ACCUM_METHOD2": f'"{design.accum_method2.value}"', "ACCUM_METHOD3": f'"{design.accum_method3.value}"',
+        "M1_USE_DSP": f'"{design.m1_dsp}"', "M2_USE_DSP": f'"{design.m2_dsp}"', "M3_USE_DSP": f'"{design.m3_dsp}"',
+      }
+
+    raise ValueError(f"Unsupported design name: {design.name}")
+
+  def get_script(self, design, stat_path):
+    generics = " ".join(f"-G {name}={value}" for name, value in self.get_generics(design).items())
+    # The RTL `includes its dependencies without guards, which Vivado tolerates.
+    # As library files, slang keeps the first definition of each module.
+    sources = " ".join(f"-v {path}" for path in self.get_sources(design))
+
+    return (
+      f"read_slang --threads 1 --top {design.name} {generics} -I {self.hdl_dir} --allow-lib-module-redef {sources}\n"
+      f"synth -top {design.name} -flatten -lut {self.lut_size}\n"
+      f"tee -q -o {stat_path} stat -json\n"
+    )
+
+  @staticmethod
+  def _read_stat(stat_path):
+    with open(stat_path, "r") as f:
+      stat = json.load(f)
+
+    cells = stat["design"]["num_cells_by_type"]
+    luts = sum(count for cell, count in cells.items() if cell == "$lut")
+    ffs = sum(count for cell, count in cells.items() if "DFF" in cell or "DLATCH" in cell)
+
+    return {
+      "LUTs": luts,
+      "FFs": ffs,
+      "cells": stat["design"]["num_cells"],
+    }
+
+  def _cache_path(self, design):
+    return os.path.join(self.cache_dir, f"{design!r}.json")
+
+  def estimate(self, design):
+    """
+    Returns {"LUTs", "FFs", "cells", "elapsed"} for the design, or None if
+    elaboration failed.
+    """
+    key = repr(design)
+    if key in self._cache:
+      return self._cache[key]
+
+    cache_path = self._cache_path(design)
+    if os.path.exists(cache_path):
+      with open(cache_path, "r") as f:
+        self._cache[key] = json.load(f)
+      return self._cache[key]
+
+    script_path = os.path.join(self.cache_dir, f"{design!r}.ys")
+    stat_path = os.path.join(self.cache_dir, f"{design!r}_stat.json")
+    with open(script_path, "w") as f:
+      f.write(self.get_script(design, stat_path))
+
+    if self.verbose:
+      print(f"Running Yosys estimate for {design!r}")
+
+    start_time = time.perf_counter()
+    try:
+      subprocess.run([self.yosys_bin, "-q", "-l", f"{script_path[:-3]}.log", "-s", script_path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True, timeout=self.timeout)
+      result = self._read_stat(stat_path)
+    except subprocess.CalledProcessError as e:
+      print(f"Yosys estimate failed for {design!r} with return code: {e.returncode}, see {script_path[:-3]}.log")
+      return None
+    except subprocess.TimeoutExpired:
+      print(f"Yosys estimate for {design!r} timed out after {self.timeout} seconds.")
+      return None
+    result["elapsed"] = time.perf_counter() - start_time
+
+    with open(cache_path, "w") as f:
+      json.dump(result, f, indent=2)
+    os.remove(stat_path)
+
+    if self.verbose:
+      print(f"Yosys estimate for {design!r}: {result['LUTs']} LUTs, {result['FFs']} FFs in {result['elapsed']:.2f} seconds.")
+
+    self._cache[key] = result
+    return result
+
+  def estimate_all(self, designs):
+    """Estimates designs in parallel, returns {repr(design): estimate or None}."""
+    with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+      estimates = list(executor.map(self.estimate, designs))
+
+    return {repr(design): estimate for design, estimate in zip(designs, estimates)}
+
+  @staticmethod
+  def get_stage_designs(design):
+    """
+    Splits an attention design into the Q*K^T matmul, softmax and S*V matmul,
+    shaped like the calibration designs of the analytical model (k = d) so
+    their estimates line up with the fitted features.
+    """
+    def matmul(S, d, mxfp_bits, accum_method, dsp):
+      E, M = mxfp_bits.exp_bits, mxfp_bits.mant_bits
+      return DesignConfig("matmul_fp", S, S, d, d, d, d, d, design.scale_width, E, M, E, M, E, M, accum_method, accum_method, accum_method, dsp, dsp, dsp)
+
+    matmul1 = matmul(design.S_q, design.d_kq, design.M1_bits, design.accum_method1, design.m1_dsp)
+    matmul2 = matmul(design.S_q, design.S_kv, design.M3_bits, design.accum_method3, design.m3_dsp)
+
+    k = design.k2
+    E2, M2 = design.M2_bits.exp_bits, design.M2_bits.mant_bits
+    E3, M3 = design.M3_bits.exp_bits, design.M3_bits.mant_bits
+    softmax = DesignConfig("mxint_softmax", k, k, k, k, k, k, k, design.scale_width, E2, M2, E2, M2, E3, M3,
+                           design.accum_method2, design.accum_method2, design.accum_method2, design.m2_dsp, design.m2_dsp, design.m2_dsp)
+
+    return matmul1, softmax, matmul2
+
+  def screen(self, designs, y_type="LUTs", max_value=None, keep_top=None):
+    """
+    Cheap fidelity level for the DSE: drops designs that fail to elaborate or
+    exceed max_value, then keeps the keep_top smallest by y_type.
+    """
+    estimates = self.estimate_all(designs)
+
+    kept = [d for d in designs if estimates[repr(d)] is not None]
+    if max_value is not None:
+      kept = [d for d in kept if estimates[repr(d)][y_type] <= max_value]
+
+    kept.sort(key=lambda d: estimates[repr(d)][y_type])
+    if keep_top is not None:
+      kept = kept[:keep_top]
+
+    if self.verbose:
+      print(f"Yosys screening kept {len(kept)} of {len(designs)} designs.")
+
+    return kept
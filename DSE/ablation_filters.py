@@ -0,0 +1,285 @@
+import os
+import ast
+import json
+import operator
+import numpy as np
+
+from DSE.AccumMethod import AccumMethod
+from DSE.SynthesisResult import LUTS_BASELINE, FFS_BASELINE
+
+# Ablation filters are boolean expressions over the columns of a result table,
+# e.g. "valid and (M1_E, M1_M) in [(2, 3), (4, 3)] and k1 <= 32". They are
+# compiled once into functions of a column mapping and evaluated as NumPy
+# masks over all results at once. Names resolve to, in order: variables
+# (max_perplexity, LUTS_BASELINE, ...), other definitions of the spec, and
+# columns (design parameters, metrics, total_bits and total_k).
+
+DEFAULT_SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ablations.json")
+
+DEFAULT_VARIABLES = {
+  "max_perplexity": 12,
+  "LUTS_BASELINE": LUTS_BASELINE,
+  "FFS_BASELINE": FFS_BASELINE,
+}
+
+_ACCUM_VALUES = np.array([method.value for method in AccumMethod])
+
+_COMPARISONS = {
+  ast.Eq: operator.eq, ast.NotEq: operator.ne,
+  ast.Lt: operator.lt, ast.LtE: operator.le,
+  ast.Gt: operator.gt, ast.GtE: operator.ge,
+}
+
+_ARITHMETIC = {
+  ast.Add: operator.add, ast.Sub: operator.sub,
+  ast.Mult: operator.mul, ast.Div: operator.truediv,
+  ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod,
+}
+
+_spec_cache = {}
+
+def load_spec(path=None):
+  """{"definitions": {name: expression}, "ablations": {name: expression}} from a JSON or YAML file."""
+  path = DEFAULT_SPEC_PATH if path is None else path
+  mtime_ns = os.stat(path).st_mtime_ns
+  cached = _spec_cache.get(path)
+  if cached is not None and cached[0] == mtime_ns:
+    return cached[1]
+
+  with open(path) as f:
+    if path.endswith((".yaml", ".yml")):
+      import yaml
+      spec = yaml.safe_load(f)
+    else:
+      spec = json.load(f)
+  spec = {"definitions": spec.get("definitions", {}), "ablations": spec.get("ablations", {})}
+  _spec_cache[path] = (mtime_ns, spec)
+  return spec
+
+class _Table:
+  """Column name -> array, decoded from the source on first access."""
+  def __init__(self, size, getter):
+    self.size = size
+    self._getter = getter
+    self._columns = {}
+
+  def __getitem__(self, name):
+    if name not in self._columns:
+      self._columns[name] = self._getter(name)
+    return self._columns[name]
+
+def result_columns(results):
+  """Column table of a ResultSet, string columns (name, accumulation methods, DSP flags) decoded."""
+  strings = np.array(results._strings) if results._strings else np.array([], dtype=str)
+
+  def getter(name):
+    if name in ("accum_method1", "accum_method2", "accum_method3"):
+      return _ACCUM_VALUES[results.column(name)]
+    if name in ("name", "m1_dsp", "m2_dsp", "m3_dsp"):
+      return strings[results.column(name)]
+    if name == "total_bits":
+      return results.total_bits()
+    if name == "total_k":
+      return results.total_k()
+    try:
+      return results.column(name)
+    except KeyError:
+      return None
+
+  return _Table(len(results), getter)
+
+def design_columns(designs):
+  """Column table of a list of DesignConfigs, for filters over design parameters only."""
+  fields = {
+    "name": lambda dc: dc.name,
+    "S_q": lambda dc: dc.S_q, "S_kv": lambda dc: dc.S_kv, "d_kq": lambda dc: dc.d_kq, "d_v": lambda dc: dc.d_v,
+    "k1": lambda dc: dc.k1, "k2": lambda dc: dc.k2, "k3": lambda dc: dc.k3, "scale_width": lambda dc: dc.scale_width,
+    "M1_E": lambda dc: dc.M1_bits.exp_bits, "M1_M": lambda dc: dc.M1_bits.mant_bits,
+    "M2_E": lambda dc: dc.M2_bits.exp_bits, "M2_M": lambda dc: dc.M2_bits.mant_bits,
+    "M3_E": lambda dc: dc.M3_bits.exp_bits, "M3_M": lambda dc: dc.M3_bits.mant_bits,
+    "accum_method1": lambda dc: dc.accum_method1.value, "accum_method2": lambda dc: dc.accum_method2.value, "accum_method3": lambda dc: dc.accum_method3.value,
+    "m1_dsp": lambda dc: dc.m1_dsp, "m2_dsp": lambda dc: dc.m2_dsp, "m3_dsp": lambda dc: dc.m3_dsp,
+    "total_bits": lambda dc: dc.get_total_bits(), "total_k": lambda dc: dc.get_total_k(),
+  }
+
+  def getter(name):
+    get = fields.get(name)
+    return np.array([get(dc) for dc in designs]) if get is not None else None
+
+  return _Table(len(designs), getter)
+
+def compile_filter(expression):
+  """
+  Compiles a filter expression into fn(table, resolve) -> values, where
+  resolve(name) evaluates names that are not columns. Only boolean
+  operators, comparisons (including `in` lists and tuple equality),
+  arithmetic, names and constants are allowed.
+  """
+  try:
+    tree = ast.parse(expression.strip(), mode="eval")
+  except SyntaxError as e:
+    raise ValueError(f"Invalid filter expression {expression!r}: {e.msg}") from None
+  return _compile(tree.body, expression)
+
+def _literal(node, expression):
+  try:
+    return ast.literal_eval(node)
+  except ValueError:
+    raise ValueError(f"Expected a literal list in filter expression {expression!r}") from None
+
+def _compile(node, expression):
+  if isinstance(node, ast.BoolOp):
+    operands = [_compile(value, expression) for value in node.values]
+    reduce = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+    def bool_op(table, resolve):
+      result = operands[0](table, resolve)
+      for operand in operands[1:]:
+        result = reduce(result, operand(table, resolve))
+      return result
+    return bool_op
+
+  if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub)):
+    operand = _compile(node.operand, expression)
+    op = np.logical_not if isinstance(node.op, ast.Not) else operator.neg
+    return lambda table, resolve: op(operand(table, resolve))
+
+  if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+    left, right, op = _compile(node.left, expression), _compile(node.right, expression), _ARITHMETIC[type(node.op)]
+    return lambda table, resolve: op(left(table, resolve), right(table, resolve))
+
+  if isinstance(node, ast.Compare):
+    comparisons = []
+    left = node.left
+    for op, right in zip(node.ops, node.comparators):
+      comparisons.append(_compile_comparison(left, op, right, expression))
+      left = right
+    def compare(table, resolve):
+      result = comparisons[0](table, resolve)
+      for comparison in comparisons[1:]:
+        result = np.logical_and(result, comparison(table, resolve))
+      return result
+    return compare
+
+  if isinstance(node, ast.Name):
+    name = node.id
+    return lambda table, resolve: resolve(name)
+
+  if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str, bool)):
+    value = node.value
+    return lambda table, resolve: value
+
+  raise ValueError(f"Unsupported {type(node).__name__} in filter expression {expression!r}")
+
+def _compile_comparison(left, op, right, expression):
+  if isinstance(op, (ast.In, ast.NotIn)):
+    options = _literal(right, expression)
+    negate = isinstance(op, ast.NotIn)
+    if isinstance(left, ast.Tuple):
+      # (a, b) in [(1, 2), (3, 4)]: any row of options matches all elements
+      elements = [_compile(element, expression) for element in left.elts]
+      def tuple_in(table, resolve):
+        values = [element(table, resolve) for element in elements]
+        result = False
+        for option in options:
+          if len(option) != len(values):
+            raise ValueError(f"Tuple of {len(values)} compared with {option!r} in filter expression {expression!r}")
+          match = True
+          for value, expected in zip(values, option):
+            match = np.logical_and(match, np.equal(value, expected))
+          result = np.logical_or(result, match)
+        return np.logical_not(result) if negate else result
+      return tuple_in
+
+    element = _compile(left, expression)
+    def value_in(table, resolve):
+      result = np.isin(element(table, resolve), options)
+      return np.logical_not(result) if negate else result
+    return value_in
+
+  if type(op) not in _COMPARISONS:
+    raise ValueError(f"Unsupported comparison {type(op).__name__} in filter expression {expression!r}")
+  compare = _COMPARISONS[type(op)]
+
+  if isinstance(left, ast.Tuple) or isinstance(right, ast.Tuple):
+    # Element-wise tuple equality, (M1_E, M1_M) == (2, 3)
+    if not isinstance(op, (ast.Eq, ast.NotEq)) or not (isinstance(left, ast.Tuple) and isinstance(right, ast.Tuple)) or len(left.elts) != len(right.elts):
+      raise ValueError(f"Tuples can only be compared with == or != to tuples of the same length in {expression!r}")
+    pairs = [(_compile(a, expression), _compile(b, expression)) for a, b in zip(left.elts, right.elts)]
+    def tuple_equal(table, resolve):
+      result = True
+      for a, b in pairs:
+        result = np.logical_and(result, np.equal(a(table, resolve), b(table, resolve)))
+      return result if isinstance(op, ast.Eq) else np.logical_not(result)
+    return tuple_equal
+
+  left, right = _compile(left, expression), _compile(right, expression)
+  return lambda table, resolve: compare(left(table, resolve), right(table, resolve))
+
+class FilterEngine:
+  """
+  Compiled definitions and ablations of a spec. evaluate() returns a
+  boolean mask over a column table, definitions shared by several
+  expressions are evaluated once per table.
+  """
+  def __init__(self, spec=None, variables=None):
+    spec = load_spec(spec) if spec is None or isinstance(spec, str) else spec
+    self.spec = spec
+    self.definitions = dict(spec.get("definitions", {}))
+    self.ablations = dict(spec.get("ablations", {}))
+    self.variables = {**DEFAULT_VARIABLES, **(variables or {})}
+    self._compiled = {}
+
+  def _get_compiled(self, expression):
+    if expression not in self._compiled:
+      self._compiled[expression] = compile_filter(expression)
+    return self._compiled[expression]
+
+  def evaluate(self, expression, table, variables=None):
+    """
+    Mask of the rows of table matching an ablation name, a definition name
+    or an expression. variables override the engine's for this call.
+    """
+    expression = self.ablations.get(expression, expression)
+    variables = self.variables if variables is None else {**self.variables, **variables}
+    cache = {}
+    evaluating = set()
+
+    def resolve(name):
+      if name in variables:
+        return variables[name]
+      if name in self.definitions:
+        if name not in cache:
+          if name in evaluating:
+            raise ValueError(f"Filter definition {name} refers to itself")
+          evaluating.add(name)
+          cache[name] = self._get_compiled(self.definitions[name])(table, resolve)
+          evaluating.discard(name)
+        return cache[name]
+      column = table[name]
+      if column is None:
+        raise ValueError(f"Unknown name {name} in filter expression")
+      return column
+
+    mask = self._get_compiled(expression)(table, resolve)
+    return np.broadcast_to(np.asarray(mask, dtype=bool), (table.size,)).copy()
+
+  def mask(self, results, expression, variables=None):
+    return self.evaluate(expression, result_columns(results), variables=variables)
+
+  def select(self, results, expression, variables=None):
+    """Rows of a ResultSet matching an ablation, definition or expression, as a new ResultSet."""
+    return results[self.mask(results, expression, variables=variables)]
+
+  def matches(self, design, expression):
+    """Whether a single DesignConfig matches, for filters over design parameters only."""
+    return bool(self.evaluate(expression, design_columns([design]))[0])
+
+_default_engine = None
+
+def default_engine():
+  """Engine of the spec in DSE/ablations.json, recompiled when the file changes."""
+  global _default_engine
+  spec = load_spec()
+  if _default_engine is None or _default_engine.spec is not spec:
+    _default_engine = FilterEngine(spec)
+  return _default_engine
@@ -1,12 +1,13 @@
+import os
 import pickle
 import numpy as np
-import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import PolynomialFeatures, StandardScaler
-from gplearn.genetic import SymbolicRegressor
 
+# pandas, scikit-learn and gplearn take seconds to import, so they are
+# imported by the functions that use them rather than here
 from DSE.DesignConfig import DesignConfig
 from DSE.AccumMethod import AccumMethod
+from DSE import tracing
+from DSE import compact_fits
 
 def gplearn_expr_to_math(expr):
   """
@@ -65,59 +66,168 @@ def gplearn_expr_to_math(expr):
 
   return parse(expr)
 
-def predict_synthesis_results(pickle_dir, y_type, dc, normalise_S_q=False):
-  def load_pickled_model(path):
-    with open(pickle_dir + "/" + path, "rb") as f:
-      saved = pickle.load(f)
-      return saved["model"], saved["poly"], saved["feature_names"]
-    
-  def predict(x, poly, model, feature_names):
-    x_df = pd.DataFrame(x, columns=feature_names)
-    x_poly = poly.transform(x_df)
-    y_pred = model.predict(x_poly)
-    return y_pred
-    
-  # Load models
-  model_matmul, poly_matmul, feature_names_matmul = load_pickled_model(f"fit_model_{y_type}_matmul.pkl")
-  model_softmax, poly_softmax, feature_names_softmax = load_pickled_model(f"fit_model_{y_type}_softmax.pkl")
+def _resource_model(pickle_dir, name):
+  """
+  Evaluator X -> y of a saved polynomial fit, the exported JSON table when
+  calibration wrote one, otherwise the pickled scikit-learn objects.
+  """
+  json_path = f"{pickle_dir}/{name}.json"
+  if os.path.exists(json_path):
+    fit = compact_fits.load_polynomial(json_path)
+    return lambda X: compact_fits.predict_polynomial(fit, X)
+
+  import pandas as pd
+
+  with open(f"{pickle_dir}/{name}.pkl", "rb") as f:
+    saved = pickle.load(f)
+  return lambda X: saved["model"].predict(saved["poly"].transform(pd.DataFrame(X, columns=saved["feature_names"])))
+
+@tracing.traced()
+def predict_synthesis_results(pickle_dir, y_type, dc, normalise_S_q=False, yosys_estimator=None):
+  return float(predict_synthesis_results_batch(pickle_dir, y_type, [dc], normalise_S_q=normalise_S_q, yosys_estimator=yosys_estimator)[0])
+
+@tracing.traced()
+def predict_synthesis_results_batch(pickle_dir, y_type, dcs, normalise_S_q=False, yosys_estimator=None):
+  """predict_synthesis_results for a list of designs, one polynomial evaluation per stage."""
+  if y_type not in ["LUTs", "FFs"]:
+    raise ValueError(f"Unknown y_type: {y_type}")
+
+  # Load models, the Yosys ones take the stage estimates as an extra feature
+  suffix = "_yosys" if yosys_estimator is not None else ""
+  predict_matmul = _resource_model(pickle_dir, f"fit_model_{y_type}_matmul{suffix}")
+  predict_softmax = _resource_model(pickle_dir, f"fit_model_{y_type}_softmax{suffix}")
+  
+  def column(get):
+    return np.array([get(dc) for dc in dcs], dtype=np.float64)
+  
+  S_q, S_kv = column(lambda dc: dc.S_q), column(lambda dc: dc.S_kv)
+  d_kq = column(lambda dc: dc.d_kq)
+  k1, k2, k3 = column(lambda dc: dc.k1), column(lambda dc: dc.k2), column(lambda dc: dc.k3)
+  EM1 = column(lambda dc: dc.M1_bits.exp_bits + dc.M1_bits.mant_bits)
+  EM2 = column(lambda dc: dc.M2_bits.exp_bits + dc.M2_bits.mant_bits)
+  EM3 = column(lambda dc: dc.M3_bits.exp_bits + dc.M3_bits.mant_bits)
+  
+  yosys_matmul1, yosys_softmax, yosys_matmul2 = [], [], []
+  if yosys_estimator is not None:
+    estimates = []
+    for dc in dcs:
+      stage_estimates = [yosys_estimator.estimate(d) for d in yosys_estimator.get_stage_designs(dc)]
+      if any(e is None for e in stage_estimates):
+        raise RuntimeError(f"Yosys estimate failed for a stage of {dc!r}")
+      estimates.append([e[y_type] for e in stage_estimates])
+    yosys_matmul1, yosys_softmax, yosys_matmul2 = [[np.array(e, dtype=np.float64)] for e in zip(*estimates)]
   
   # Normalisation scale
-  S_q_div_value = dc.S_q if normalise_S_q else 1.0
+  S_q_div_value = S_q if normalise_S_q else 1.0
   k_learned_as = 64  # During model training, k was fixed at 64
-  k1_div = (dc.k1 / k_learned_as)**2 if y_type == "LUTs" else 1.0
+  k1_div = (k1 / k_learned_as)**2 if y_type == "LUTs" else 1.0
   k2_div = 1.0 
-  k3_div = (dc.k3 / k_learned_as)**2 if y_type == "LUTs" else 1.0
+  k3_div = (k3 / k_learned_as)**2 if y_type == "LUTs" else 1.0
   
   # matmul: if k is increased by 2 then FFs are the same but LUTs decrease by 2 while perplexity is worse (grows)
   
   # Matmul 1 => y(S_q, d_kq, S_kv, (E1+M1))
-  # x_matmul1 = np.array([[dc.S_q, dc.d_kq, dc.S_kv, dc.M1_bits.exp_bits + dc.M1_bits.mant_bits]])
-  x_matmul1 = np.array([[dc.S_q, dc.d_kq, dc.M1_bits.exp_bits + dc.M1_bits.mant_bits]])
-  # x_matmul1 = np.array([[dc.d_kq, dc.S_kv, dc.M1_bits.exp_bits + dc.M1_bits.mant_bits]])
-  y_matmul1 = (predict(x_matmul1, poly_matmul, model_matmul, feature_names_matmul)[0] / S_q_div_value) / k1_div
-  # print(f"Matmul1 prediction: {y_matmul1}")
+  x_matmul1 = np.column_stack([S_q, d_kq, EM1] + yosys_matmul1)
+  y_matmul1 = (predict_matmul(x_matmul1) / S_q_div_value) / k1_div
   
   # Softmax => y(k2, (E2+M2), (E3+M3))
-  x_softmax = np.array([[dc.k2, dc.M2_bits.exp_bits + dc.M2_bits.mant_bits, dc.M3_bits.exp_bits + dc.M3_bits.mant_bits]])
-  y_softmax = predict(x_softmax, poly_softmax, model_softmax, feature_names_softmax)[0]
-  # print(f"Softmax prediction: {y_softmax}")
+  x_softmax = np.column_stack([k2, EM2, EM3] + yosys_softmax)
+  y_softmax = predict_softmax(x_softmax)
   
   # Matmul 2 => y(S_q, S_kv, d_v, (E3+M3))
-  # x_matmul2 = np.array([[dc.S_q, dc.S_kv, dc.d_v, dc.M3_bits.exp_bits + dc.M3_bits.mant_bits]])
-  x_matmul2 = np.array([[dc.S_q, dc.S_kv, dc.M3_bits.exp_bits + dc.M3_bits.mant_bits]])
-  # x_matmul2 = np.array([[dc.S_kv, dc.d_v, dc.M3_bits.exp_bits + dc.M3_bits.mant_bits]])
-  y_matmul2 = (predict(x_matmul2, poly_matmul, model_matmul, feature_names_matmul)[0] / S_q_div_value) / k3_div
-  # print(f"Matmul2 prediction: {y_matmul2}")
-  
-  if y_type in ["LUTs", "FFs"]:
-    softmax_parallelism = (dc.S_q * dc.S_kv // dc.k2 / S_q_div_value) / k2_div
-    prediction = y_matmul1 + softmax_parallelism * y_softmax + y_matmul2
-  else:
-    raise ValueError(f"Unknown y_type: {y_type}")
+  x_matmul2 = np.column_stack([S_q, S_kv, EM3] + yosys_matmul2)
+  y_matmul2 = (predict_matmul(x_matmul2) / S_q_div_value) / k3_div
   
-  return prediction
+  softmax_parallelism = (np.floor_divide(S_q * S_kv, k2) / S_q_div_value) / k2_div
+  return y_matmul1 + softmax_parallelism * y_softmax + y_matmul2
     
+# Measured perplexities are capped here before fitting the surrogate
+PERPLEXITY_CAP = 30
+
+def perplexity_features(dc):
+  """Surrogate features: MX formats, log2 block sizes and one-hot accumulation methods per stage."""
+  features = {}
+  for stage, bits, k, accum_method in [(1, dc.M1_bits, dc.k1, dc.accum_method1), (2, dc.M2_bits, dc.k2, dc.accum_method2), (3, dc.M3_bits, dc.k3, dc.accum_method3)]:
+    features[f"M{stage}_E"] = bits.exp_bits
+    features[f"M{stage}_M"] = bits.mant_bits
+    features[f"log2_k{stage}"] = np.log2(k)
+    for method in AccumMethod:
+      features[f"accum{stage}_{method.value}"] = float(accum_method == method)
+  return features
+
+def predict_perplexity(pickle_dir, dc, return_std=False):
+  """
+  Surrogate perplexity of a design. With return_std also returns the
+  standard deviation of the prediction in log perplexity, so exp(log(ppl)
+  +- std) is a one sigma interval.
+  """
+  ppl, std = predict_perplexities(pickle_dir, [dc], return_std=True)
+  return (ppl[0], std[0]) if return_std else ppl[0]
+
+@tracing.traced()
+def predict_perplexities(pickle_dir, dcs, return_std=False):
+  """Batched predict_perplexity, one GP evaluation for all designs."""
+  fit = compact_fits.load_gaussian_process(f"{pickle_dir}/fit_model_perplexity.npz")
+  features = [perplexity_features(dc) for dc in dcs]
+  X = np.array([[f[name] for name in fit["feature_names"]] for f in features], dtype=np.float64)
+  log_ppl, std = compact_fits.predict_gaussian_process(fit, X, return_std=True)
+
+  if return_std:
+    return np.exp(log_ppl), std
+  return np.exp(log_ppl)
+
+@tracing.traced()
+def find_perplexity_fit(results, pickle_dir, cv_folds=0, n_restarts_optimizer=0, verbose=True):
+  """
+  Gaussian process surrogate of log perplexity over perplexity_features,
+  fitted on results with a measured perplexity. cv_folds > 1 also reports
+  the cross-validated R², refitting the kernel hyperparameters per fold.
+  """
+  import pandas as pd
+  from sklearn.preprocessing import StandardScaler
+  from sklearn.pipeline import make_pipeline
+  from sklearn.model_selection import cross_val_predict
+  from sklearn.gaussian_process import GaussianProcessRegressor
+  from sklearn.gaussian_process.kernels import ConstantKernel, Matern, WhiteKernel
+
+  results = [r for r in results if r.accuracy > 0]
+  df = pd.DataFrame([perplexity_features(r.design_config) for r in results])
+  # A few broken designs reach perplexities in the thousands and would
+  # dominate the fit, far above max_perplexity they only need to rank as bad
+  y = np.log(np.minimum(np.array([r.accuracy for r in results]), PERPLEXITY_CAP))
+
+  # Constant columns carry no information and break the scaling
+  df = df.loc[:, df.nunique() > 1]
+  scaler = StandardScaler()
+  X = scaler.fit_transform(df)
+
+  # The noise floor keeps the GP from interpolating measurement noise. The
+  # likelihood puts the noise on the floor, so the floor regularises the fit:
+  # 5-fold CV R² 0.40 at 1e-5, 0.49 at 1e-3 and 0.56 at 1e-2, but the median
+  # error of the larger floors is twice as large
+  kernel = ConstantKernel(1.0) * Matern(length_scale=np.ones(X.shape[1]), length_scale_bounds=(1e-2, 1e3), nu=2.5) + WhiteKernel(1e-2, noise_level_bounds=(1e-3, 1e1))
+  model = GaussianProcessRegressor(kernel=kernel, normalize_y=True, n_restarts_optimizer=n_restarts_optimizer, random_state=0)
+  model.fit(X, y)
+
+  if verbose:
+    print(f"\nGaussian process perplexity surrogate on {len(results)} results")
+    print(f"\tKernel: {model.kernel_}")
+  if cv_folds > 1:
+    # The unfitted kernel, so each fold optimises its hyperparameters on its own training split
+    fold_model = GaussianProcessRegressor(kernel=kernel, normalize_y=True, n_restarts_optimizer=n_restarts_optimizer, random_state=0)
+    y_cv = cross_val_predict(make_pipeline(StandardScaler(), fold_model), df, y, cv=cv_folds)
+    r2 = 1 - np.sum((y - y_cv) ** 2) / np.sum((y - y.mean()) ** 2)
+    print(f"\t{cv_folds}-fold CV R² of log perplexity (capped at {PERPLEXITY_CAP}): {r2:.4f}, median abs. error: {np.median(np.abs(np.exp(y_cv) - np.exp(y))):.3f}\n")
+
+  # Only the NumPy export is kept, predict_perplexities reads it without scikit-learn
+  compact_fits.save_gaussian_process(f"{pickle_dir}/fit_model_perplexity.npz", model, scaler, df.columns.tolist())
+
+@tracing.traced()
 def find_fit(results, y_type, data, pickle_dir, degree=2, threshold=1e-3, verbose=True, pickle_suffix=""):
+  import pandas as pd
+  from sklearn.linear_model import LinearRegression
+  from sklearn.preprocessing import PolynomialFeatures
+
   # # Create a DataFrame from design parameters
   df = pd.DataFrame(data)
   if y_type == "LUTs":
@@ -154,8 +264,25 @@ def find_fit(results, y_type, data, pickle_dir, degree=2, threshold=1e-3, verbos
         "poly": poly,
         "feature_names": df.columns.tolist()
     }, f)
+  compact_fits.save_polynomial(f"{pickle_dir}/fit_model_{y_type}_{pickle_suffix}.json", poly, model, df.columns.tolist())
+  
+@tracing.traced()
+def find_fit_with_yosys(results, designs, data, yosys_estimator, pickle_dir, degrees, verbose=True, pickle_suffix=""):
+  """Fits each y_type in degrees with the design's Yosys estimate of it as an extra feature."""
+  estimates = yosys_estimator.estimate_all(designs)
+  failed = [key for key, estimate in estimates.items() if estimate is None]
+  if failed:
+    raise RuntimeError(f"Yosys estimate failed for {len(failed)} calibration designs, e.g. {failed[0]}")
+  
+  for y_type, degree in degrees.items():
+    yosys_data = dict(data)
+    yosys_data['yosys'] = np.array([estimates[repr(d)][y_type] for d in designs])
+    find_fit(results, y_type, yosys_data, pickle_dir=pickle_dir, degree=degree, threshold=0, verbose=verbose, pickle_suffix=pickle_suffix)
   
 def find_fit_with_gplearn(results, y_type, X, population_size=5000, generations=50, parsimony_coefficient=1e-3):
+  from sklearn.preprocessing import StandardScaler
+  from gplearn.genetic import SymbolicRegressor
+
   # Prepare the design matrix
   if y_type == "LUTs":
     y = np.array([r.utilisation["LUTs"] for r in results])
@@ -193,7 +320,8 @@ def find_fit_with_gplearn(results, y_type, X, population_size=5000, generations=
   print(gplearn_expr_to_math(model._program.__str__()))
   print(f"\nR² score: {model.score(X_scaled, y):.4f}")
     
-def calibrate_analytical_models(verbose):
+@tracing.traced()
+def calibrate_analytical_models(verbose, yosys_estimator=None):
   from DSE.SynthesisHandler import SynthesisHandler
   # Analatical model: MATMUL 
   designs_to_synthesise = [
@@ -222,6 +350,9 @@ def calibrate_analytical_models(verbose):
   find_fit(synthesis_handler.results, "LUTs", matmul_fit_data, pickle_dir=synthesis_handler.pickle_dir, degree=2, threshold=0, verbose=True, pickle_suffix="matmul")
   find_fit(synthesis_handler.results, "FFs", matmul_fit_data, pickle_dir=synthesis_handler.pickle_dir, degree=2, threshold=0, verbose=True, pickle_suffix="matmul")
   
+  if yosys_estimator is not None:
+    find_fit_with_yosys(synthesis_handler.results, synthesis_handler.designs, matmul_fit_data, yosys_estimator, synthesis_handler.pickle_dir, {"LUTs": 2, "FFs": 2}, pickle_suffix="matmul_yosys")
+  
   # matmul_fit_data_gplearn = np.array([[d.S_q, d.d_kq, d.M1_bits.exp_bits + d.M1_bits.mant_bits] for d in synthesis_handler.designs])
   
   # find_fit_with_gplearn(synthesis_handler.results, "LUTs", matmul_fit_data_gplearn,       population_size=5000, generations=20, parsimony_coefficient=0.0001)
@@ -252,8 +383,21 @@ def calibrate_analytical_models(verbose):
   
   find_fit(synthesis_handler.results, "LUTs", softmax_fit_data, pickle_dir=synthesis_handler.pickle_dir, degree=3, threshold=0, verbose=True, pickle_suffix="softmax")
   find_fit(synthesis_handler.results, "FFs", softmax_fit_data, pickle_dir=synthesis_handler.pickle_dir, degree=2, threshold=0, verbose=True, pickle_suffix="softmax")
+  
+  if yosys_estimator is not None:
+    find_fit_with_yosys(synthesis_handler.results, synthesis_handler.designs, softmax_fit_data, yosys_estimator, synthesis_handler.pickle_dir, {"LUTs": 3, "FFs": 2}, pickle_suffix="softmax_yosys")
     
   # softmax_fit_data_gplearn = np.array([[d.k2, d.M2_bits.exp_bits + d.M2_bits.mant_bits, d.M3_bits.exp_bits + d.M3_bits.mant_bits] for d in synthesis_handler.designs])
     
   # find_fit_with_gplearn(synthesis_handler.results, "LUTs", softmax_fit_data_gplearn,       population_size=5000, generations=20, parsimony_coefficient=0.0001)
-  # find_fit_with_gplearn(synthesis_handler.results, "FFs", softmax_fit_data_gplearn,        population_size=5000, generations=20, parsimony_coefficient=0.0001)
\ No newline at end of file
+  # find_fit_with_gplearn(synthesis_handler.results, "FFs", softmax_fit_data_gplearn,        population_size=5000, generations=20, parsimony_coefficient=0.0001)
+
+@tracing.traced()
+def calibrate_perplexity_model(verbose, synth_output_dir="synth_output", cv_folds=0):
+  """Fits the perplexity surrogate, cv_folds > 1 cross-validates it and restarts the kernel optimizer 3 times."""
+  from DSE.SynthesisHandler import SynthesisHandler
+  # Resources are predicted so results without Vivado reports are kept
+  synthesis_handler = SynthesisHandler([], synth_output_dir=synth_output_dir)
+  synthesis_handler.find_and_process_results(report_filter="accuracy", predict_resources=True, verbose=verbose)
+
+  find_perplexity_fit(synthesis_handler.results, pickle_dir=synthesis_handler.pickle_dir, cv_folds=cv_folds, n_restarts_optimizer=3 if cv_folds > 1 else 0, verbose=verbose)
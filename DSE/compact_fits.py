@@ -0,0 +1,111 @@
+import os
+import json
+import numpy as np
+
+# Fits exported next to the pickles at calibration time, so prediction only
+# needs NumPy: polynomial fits as a JSON table of exponents and coefficients,
+# the perplexity Gaussian process as an .npz of its training state
+
+# Path -> (mtime_ns, fit), so repeated predictions do not re-read the file
+_cache = {}
+
+def _load(path, reader):
+  mtime_ns = os.stat(path).st_mtime_ns
+  cached = _cache.get(path)
+  if cached is not None and cached[0] == mtime_ns:
+    return cached[1]
+  fit = reader(path)
+  _cache[path] = (mtime_ns, fit)
+  return fit
+
+def save_polynomial(path, poly, model, feature_names):
+  """Exports a fitted PolynomialFeatures + LinearRegression pair as term exponents and coefficients."""
+  with open(path, "w") as f:
+    json.dump({
+      "feature_names": list(feature_names),
+      "powers": poly.powers_.tolist(),
+      "coef": model.coef_.tolist(),
+      "intercept": float(model.intercept_),
+    }, f)
+
+def _read_polynomial(path):
+  with open(path) as f:
+    saved = json.load(f)
+  return {
+    "feature_names": saved["feature_names"],
+    "powers": np.array(saved["powers"], dtype=np.int64),
+    "coef": np.array(saved["coef"], dtype=np.float64),
+    "intercept": saved["intercept"],
+  }
+
+def load_polynomial(path):
+  return _load(path, _read_polynomial)
+
+def predict_polynomial(fit, X):
+  """Predictions for X of shape (designs, features), columns in fit["feature_names"] order."""
+  X = np.asarray(X, dtype=np.float64).reshape(-1, len(fit["feature_names"]))
+  terms = np.prod(X[:, None, :] ** fit["powers"][None, :, :], axis=2)
+  return terms @ fit["coef"] + fit["intercept"]
+
+def save_gaussian_process(path, model, scaler, feature_names):
+  """
+  Exports a fitted GaussianProcessRegressor with a
+  ConstantKernel * Matern + WhiteKernel kernel and normalize_y, together
+  with the StandardScaler applied to its inputs.
+  """
+  kernel = model.kernel_
+  constant, matern, white = kernel.k1.k1, kernel.k1.k2, kernel.k2
+  np.savez(
+    path,
+    feature_names=np.array(feature_names),
+    scaler_mean=scaler.mean_,
+    scaler_scale=scaler.scale_,
+    constant=constant.constant_value,
+    length_scale=np.broadcast_to(matern.length_scale, (len(feature_names),)),
+    nu=matern.nu,
+    noise_level=white.noise_level,
+    X_train=model.X_train_,
+    alpha=model.alpha_,
+    L=model.L_,
+    y_train_mean=model._y_train_mean,
+    y_train_std=model._y_train_std,
+  )
+
+def _read_gaussian_process(path):
+  with np.load(path, allow_pickle=False) as saved:
+    fit = {key: saved[key] for key in saved.files}
+  fit["feature_names"] = fit["feature_names"].tolist()
+  fit["X_train_scaled"] = fit["X_train"] / fit["length_scale"]
+  # Inverse of the Cholesky factor, so the predictive variance is a matrix product
+  fit["L_inv"] = np.linalg.inv(fit["L"])
+  return fit
+
+def load_gaussian_process(path):
+  return _load(path, _read_gaussian_process)
+
+def _matern(d, nu):
+  if nu == 0.5:
+    return np.exp(-d)
+  if nu == 1.5:
+    d = np.sqrt(3) * d
+    return (1 + d) * np.exp(-d)
+  if nu == 2.5:
+    d = np.sqrt(5) * d
+    return (1 + d + d ** 2 / 3) * np.exp(-d)
+  raise ValueError(f"Unsupported Matern nu: {nu}")
+
+def predict_gaussian_process(fit, X, return_std=False):
+  """Mean (and std) of the GP at unscaled inputs X, as GaussianProcessRegressor.predict."""
+  X = (np.asarray(X, dtype=np.float64) - fit["scaler_mean"]) / fit["scaler_scale"]
+  X = X / fit["length_scale"]
+  sq_dist = (X ** 2).sum(axis=1)[:, None] + (fit["X_train_scaled"] ** 2).sum(axis=1)[None, :] - 2 * X @ fit["X_train_scaled"].T
+  K_trans = fit["constant"] * _matern(np.sqrt(np.maximum(sq_dist, 0)), float(fit["nu"]))
+
+  y_mean = (K_trans @ fit["alpha"]) * fit["y_train_std"] + fit["y_train_mean"]
+  if not return_std:
+    return y_mean
+
+  V = fit["L_inv"] @ K_trans.T
+  y_var = fit["constant"] + fit["noise_level"] - np.einsum("ij,ij->j", V, V)
+  y_var = np.maximum(y_var, 0) * fit["y_train_std"] ** 2
+  return y_mean, np.sqrt(y_var)
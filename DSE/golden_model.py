@@ -0,0 +1,749 @@
+import math
+import numpy as np
+
+from DSE.AccumMethod import AccumMethod
+
+# Accumulation methods with an adder tree in src/dot/dot_fp.sv
+SUPPORTED_ACCUM_METHODS = [
+  AccumMethod.Kulisch,
+  AccumMethod.Kahan,
+  AccumMethod.TwoSum,
+  AccumMethod.FastTwoSum,
+  AccumMethod.Neumaier,
+  AccumMethod.Klein,
+]
+
+# mxint_exp constants: log2(e) ~= MLOG2_E / 2^7 * 2^ELOG2_E
+MLOG2_E = 92
+ELOG2_E = 1
+LOG2_E = MLOG2_E / 2**7 * 2**ELOG2_E
+
+# add_nrm is instantiated with its default scale_w
+ADD_NRM_SCALE_WIDTH = 8
+
+
+def _clog2(x):
+  return max(0, math.ceil(math.log2(x)))
+
+
+def _mask(width):
+  return np.uint64((1 << width) - 1) if width < 64 else np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def _wrap(x, width):
+  """
+  Two's complement value of the low width bits of x (int64/uint64 array).
+  Wider widths keep all 64 bits, callers only rely on the result modulo 2^64.
+  """
+  if width >= 64:
+    return x.astype(np.uint64).view(np.int64)
+  shift = np.uint64(64 - width)
+  return (x.astype(np.uint64) << shift).view(np.int64) >> np.int64(64 - width)
+
+
+def _shl(x, shift):
+  """
+  x << shift modulo 2^64 for per-element shift amounts, shifts >= 64 give 0.
+  """
+  x = x.astype(np.uint64)
+  shift = np.asarray(shift, dtype=np.uint64)
+  if shift.size == 0 or shift.max() < 64:
+    return x << shift
+  return np.where(shift >= 64, np.uint64(0), x << np.minimum(shift, np.uint64(63)))
+
+
+def _clz(x, width):
+  """
+  Leading zeros of the width-bit unsigned value x, width for x == 0 (clz_int.sv).
+  """
+  x = x.astype(np.uint64) & _mask(width)
+  # frexp gives the bit length, except where the float conversion rounded up to 2^n
+  _, bit_length = np.frexp(x.astype(np.float64))
+  bit_length = bit_length.astype(np.int64)
+  rounded_up = (bit_length > 0) & ((x >> np.maximum(bit_length - 1, 0).astype(np.uint64)) == 0)
+  return width - (bit_length - rounded_up)
+
+
+def decode_elements(words, exp_bits, mant_bits):
+  """
+  mul_fp operand decoding: returns (signed mantissa incl. hidden bit, left shift)
+  so that an element is worth mantissa << shift in mantissa LSB units.
+  Integer mode (exp_bits == 0) passes the two's complement word through.
+  """
+  words = np.asarray(words, dtype=np.int64)
+  if exp_bits == 0:
+    return _wrap(words, 1 + mant_bits), np.zeros_like(words)
+
+  bit_width = 1 + exp_bits + mant_bits
+  raw = words & np.int64((1 << bit_width) - 1)
+  sign = (raw >> (bit_width - 1)) & 1
+  exp = (raw >> mant_bits) & ((1 << exp_bits) - 1)
+  nrm = (exp != 0).astype(np.int64)
+  man = (nrm << mant_bits) | (raw & ((1 << mant_bits) - 1))
+  return np.where(sign == 1, -man, man), exp - nrm
+
+
+def decode_mx(words, scales, exp_bits, mant_bits, k, scale_width, axis=-1):
+  """
+  Real value of MX words: element value (mantissa LSB units) * 2^scale, with one
+  two's complement scale per k consecutive elements along axis.
+  """
+  man, shift = decode_elements(words, exp_bits, mant_bits)
+  scales = _wrap(np.asarray(scales, dtype=np.int64), scale_width)
+  scales = np.repeat(scales, k, axis=axis)
+  return man.astype(np.float64) * np.exp2(shift + scales)
+
+
+def encode_mx(x, exp_bits, mant_bits, k, scale_width, axis=-1):
+  """
+  Round x to MX words along axis (blocks of k, round to nearest, saturating),
+  the inverse of decode_mx. Returns (words, scales) with scales as unsigned
+  scale_width-bit words.
+  """
+  x = np.moveaxis(np.asarray(x, dtype=np.float64), axis, -1)
+  blocks = x.reshape(*x.shape[:-1], x.shape[-1] // k, k)
+
+  if exp_bits == 0:
+    max_elem = 2**mant_bits - 1
+  else:
+    max_elem = (2**(mant_bits + 1) - 1) * 2.0**(2**exp_bits - 2)
+
+  max_abs = np.max(np.abs(blocks), axis=-1, keepdims=True)
+  with np.errstate(divide="ignore"):
+    scales = np.where(max_abs > 0, np.ceil(np.log2(max_abs / max_elem)), 0).astype(np.int64)
+  scale_min, scale_max = -2**(scale_width - 1), 2**(scale_width - 1) - 1
+  scales = np.clip(scales, scale_min, scale_max)
+  y = blocks / np.exp2(scales)
+
+  if exp_bits == 0:
+    words = np.clip(np.rint(y), -max_elem, max_elem).astype(np.int64)
+  else:
+    mag = np.minimum(np.abs(y), max_elem)
+    # Subnormals (exp field 0) share the LSB of exp field 1
+    with np.errstate(divide="ignore"):
+      exp = np.where(mag >= 2**mant_bits, np.floor(np.log2(np.maximum(mag, 1))) - mant_bits + 1, 0).astype(np.int64)
+    step = np.exp2(np.maximum(exp - 1, 0))
+    man = np.rint(mag / step).astype(np.int64)
+    # Rounding up may carry into the next binade
+    carry = man >= 2**(mant_bits + 1)
+    exp = np.where(carry, exp + 1, exp)
+    man = np.where(carry, man >> 1, man)
+    exp = np.where((exp == 0) & (man >= 2**mant_bits), 1, exp)
+    man = np.where(exp > 0, man - 2**mant_bits, man)
+    words = (exp << mant_bits) | man
+    words = np.where(np.signbit(y) & (words != 0), words | (1 << (exp_bits + mant_bits)), words)
+    words = _wrap(words, 1 + exp_bits + mant_bits)
+
+  words = np.moveaxis(words.reshape(x.shape), -1, axis)
+  scales = np.moveaxis(scales[..., 0], -1, axis) & ((1 << scale_width) - 1)
+  return words, scales
+
+
+def _bit_length(x):
+  """Position of the leading one plus one of non-negative values, 0 for 0."""
+  return 64 - _clz(x, 64)
+
+
+def _rne_shift(mag, shift):
+  """
+  mag / 2^shift rounded to nearest even, for non-negative mag and per-element
+  shifts >= 0.
+  """
+  mag = np.asarray(mag).astype(np.uint64)
+  shift = np.broadcast_to(np.asarray(shift, dtype=np.int64), mag.shape)
+  top = np.where(shift >= 64, np.uint64(0), mag >> np.minimum(shift, 63).astype(np.uint64))
+  half = _shl(np.ones_like(mag), np.maximum(shift - 1, 0))
+  round_bit = (shift > 0) & ((mag & half) != 0)
+  sticky = (mag & (half - np.uint64(1))) != 0
+  round_up = round_bit & (sticky | ((top & np.uint64(1)) == 1))
+  return (top + round_up.astype(np.uint64)).astype(np.int64)
+
+
+def rnd_rne(num, width_i, width_o):
+  """
+  Bit-accurate src/util/rnd/rnd_rne.sv: the top width_o bits of the unsigned
+  width_i-bit num rounded to nearest even, with the overflow flag as bit width_o.
+  """
+  num = np.asarray(num).astype(np.uint64) & _mask(width_i)
+  return _rne_shift(num, width_i - width_o)
+
+
+def _normalise(x, width):
+  """
+  Rounds signed values to width-bit two's complement mantissas, to nearest even.
+  Returns (mantissa, shift >= 0) with x ~= mantissa * 2^shift.
+  """
+  x = np.asarray(x, dtype=np.int64)
+  mag = np.abs(x)
+  shift = np.maximum(_bit_length(mag) - (width - 1), 0)
+  man = _rne_shift(mag, shift)
+  # Rounding up may carry into the sign bit
+  carry = man >> (width - 1)
+  man, shift = man >> carry, shift + carry
+  return np.where(x < 0, -man, man), shift
+
+
+def _align_blocks(man, scale, k):
+  """
+  Aligns each block of k mantissas along the last axis to the largest scale of
+  its non-zero elements, to nearest even. Returns (mantissas, one scale per block).
+  """
+  blocks = man.reshape(*man.shape[:-1], man.shape[-1] // k, k)
+  scales = scale.reshape(blocks.shape)
+  block_scale = np.max(np.where(blocks != 0, scales, np.iinfo(np.int64).min), axis=-1)
+  block_scale = np.where(np.any(blocks != 0, axis=-1), block_scale, np.max(scales, axis=-1))
+  mag = _rne_shift(np.abs(blocks), np.maximum(block_scale[..., None] - scales, 0))
+  return np.where(blocks < 0, -mag, mag).reshape(man.shape), block_scale
+
+
+def _block_sums(man_prd, shift_prd, k, acc_width):
+  """
+  dot_fp sums of the products man_prd << shift_prd over blocks of k along the
+  last axis, in an acc_width-bit accumulator. Products too wide for it are
+  shifted right by a per-block base, so the sum is dot_out * 2^base. Exact,
+  with base 0, whenever the products fit (every format but E5M2).
+  """
+  window = acc_width - 1 - _clog2(k)
+  man = man_prd.reshape(*man_prd.shape[:-1], man_prd.shape[-1] // k, k)
+  shift = np.broadcast_to(shift_prd, man_prd.shape).reshape(man.shape)
+
+  mag = np.abs(man)
+  base = np.maximum(np.max(np.where(mag > 0, _bit_length(mag) + shift, 0), axis=-1) - window, 0)
+  rel = shift - base[..., None]
+  mag = np.where(rel >= 0, _shl(mag, np.maximum(rel, 0)).astype(np.int64), _rne_shift(mag, np.maximum(-rel, 0)))
+  return np.where(man < 0, -mag, mag).sum(axis=-1), base
+
+
+def _mul_fp(man_a, shift_a, man_b, shift_b):
+  """
+  mul_fp products of decoded elements modulo 2^64. The RTL products are exact
+  in prd_width bits and every consumer keeps at most 64 low bits of them.
+  """
+  return _shl((man_a * man_b).astype(np.uint64), shift_a + shift_b).view(np.int64)
+
+
+def dot_fp(prd, k, bit_width, out_width, accum_method):
+  """
+  Bit-accurate src/dot/dot_fp.sv sums of the mul_fp products prd over blocks of
+  k along the last axis, as out_width-bit two's complement values.
+
+  Kulisch accumulation keeps the whole sum, dot_fp its low out_width bits. The
+  compensated trees take the low bit_width bits of each product, and since
+  their compensation terms cancel in integer arithmetic only the width of
+  each level is left: each start stage sums 4 elements in bit_width bits,
+  only the first k/4 merges of the first level are driven, and the Kahan
+  merges zero-extend their results where the other trees sign-extend them.
+  A 2-element Kahan tree is a single step, the other trees drive none of
+  their merges then and sum to 0.
+  """
+  blocks = prd.reshape(*prd.shape[:-1], prd.shape[-1] // k, k)
+  if accum_method == AccumMethod.Kulisch:
+    return _wrap(blocks.sum(axis=-1), out_width)
+
+  leaves = _wrap(blocks, bit_width)
+  if k < 4:
+    total = _wrap(leaves.sum(axis=-1), bit_width) if accum_method == AccumMethod.Kahan else np.zeros(blocks.shape[:-1], dtype=np.int64)
+    return _wrap(total, out_width)
+
+  starts = leaves.reshape(*leaves.shape[:-1], k // 4, 4).sum(axis=-1)
+  if accum_method == AccumMethod.Kahan:
+    starts = (starts.astype(np.uint64) & _mask(bit_width)).astype(np.int64)
+  else:
+    starts = _wrap(starts, bit_width)
+  return _wrap(starts.sum(axis=-1), out_width)
+
+
+def add_nrm(op0, op1, scale0, scale1, int_w, scale_w=ADD_NRM_SCALE_WIDTH):
+  """
+  Bit-accurate src/util/arith/add_nrm.sv on arrays of int_w-bit operand words
+  and unsigned scale_w-bit scale words, returns the (out, o_scale) words.
+  """
+  assert int_w + 4 <= 64, "add_nrm sums need int_w + 4 bits of uint64"
+  op0 = np.asarray(op0).astype(np.uint64) & _mask(int_w)
+  op1 = np.asarray(op1).astype(np.uint64) & _mask(int_w)
+  scale0 = np.asarray(scale0).astype(np.uint64) & _mask(scale_w)
+  scale1 = np.asarray(scale1).astype(np.uint64) & _mask(scale_w)
+  bit = lambda v, i: (v >> np.uint64(i)) & np.uint64(1)
+
+  # Scales compare unsigned
+  swap = scale0 < scale1
+  op_lrg = np.where(swap, op1, op0)
+  op_sml = np.where(swap, op0, op1)
+  scale_lrg = np.where(swap, scale1, scale0)
+  scale_diff = scale_lrg - np.where(swap, scale0, scale1)
+
+  sticky_mask = (_shl(np.ones_like(scale_diff), np.maximum(scale_diff, 3) - np.uint64(3)) - np.uint64(1)) & _mask(int_w)
+  s_bit = (scale_diff > 3) & ((op_sml & sticky_mask) != 0)
+
+  # Logical shift of {op_sml, 3'h0}, its LSB ANDed with the sticky bit
+  op_sml_shift = np.where(scale_diff >= 64, np.uint64(0), (op_sml << np.uint64(3)) >> np.minimum(scale_diff, np.uint64(63)))
+  op_sml_shift = op_sml_shift & ~(np.uint64(1) & ~s_bit.astype(np.uint64))
+
+  # Both operands sign-extended by one bit to int_w + 4 bits
+  sum_w = int_w + 4
+  lrg_ext = (op_lrg | (bit(op_lrg, int_w - 1) << np.uint64(int_w))) << np.uint64(3)
+  sml_ext = op_sml_shift | (bit(op_sml_shift, int_w + 2) << np.uint64(int_w + 3))
+  total = (lrg_ext + sml_ext) & _mask(sum_w)
+
+  clz_prep = np.where(bit(total, sum_w - 1) == 1, ~total & _mask(sum_w), total)
+  sum_clz = _clz(clz_prep, sum_w).astype(np.uint64)
+  aligned = _shl(total, sum_clz - np.uint64(1)) & _mask(sum_w)
+
+  round_up = bit(aligned, 3) & (((aligned & np.uint64(0x7)) != 0).astype(np.uint64) | bit(aligned, 4))
+  sum_rnd = ((aligned >> np.uint64(4)) & _mask(int_w)) + round_up
+  scale_adj = (scale_lrg + sum_clz - np.uint64(1)) & np.uint64(0xFF)
+
+  overflow = (bit(sum_rnd, int_w) ^ bit(sum_rnd, int_w - 1)) == 1
+  out = np.where(overflow, sum_rnd >> np.uint64(1), sum_rnd & _mask(int_w))
+  o_scale = np.where(overflow, scale_adj + np.uint64(1), scale_adj) & _mask(scale_w)
+  return out.astype(np.int64), o_scale.astype(np.int64)
+
+
+def dot_general_fp(dot_out, S, T, dp_width, out_width, scale_width):
+  """
+  Bit-accurate src/dot/dot_general_fp.sv on the dot_fp block sums dot_out
+  ([..., C/k], dp_width bits) with the scale words S and T ([..., C/k]).
+  Returns o_dp as out_width-bit two's complement values and the o_scale words.
+  """
+  scales = (np.asarray(S, dtype=np.int64) + np.asarray(T, dtype=np.int64)) & ((1 << scale_width) - 1)
+  out = dot_out
+  while out.shape[-1] > 1:
+    # The tree's scale wires are signed, so the add_nrm ports sign-extend them
+    port_scales = _wrap(scales, scale_width) & ((1 << ADD_NRM_SCALE_WIDTH) - 1)
+    out, o_scale = add_nrm(out[..., 0::2], out[..., 1::2], port_scales[..., 0::2], port_scales[..., 1::2], dp_width)
+    scales = o_scale & ((1 << scale_width) - 1)
+
+  return _wrap(out[..., 0], out_width), scales[..., 0]
+
+
+def matmul_fp(A, B, S_A, S_B, exp_width, man_width, k, out_width, scale_width, accum_method):
+  """
+  Bit-accurate src/attention/matmul_fp.sv: A [.., rows, C], B [.., C, cols] element
+  words, S_A [.., rows, C/k] and S_B [.., C/k, cols] scale words. Returns (C, S_C),
+  C [.., rows, cols] out_width-bit two's complement values and S_C the scale words.
+  """
+  bit_width = 1 + exp_width + man_width
+  dp_width = 2 * bit_width + _clog2(k)
+
+  man_a, shift_a = decode_elements(A, exp_width, man_width)
+  man_b, shift_b = decode_elements(np.swapaxes(B, -1, -2), exp_width, man_width)
+  prd = _mul_fp(man_a[..., :, None, :], shift_a[..., :, None, :], man_b[..., None, :, :], shift_b[..., None, :, :])
+  dot_out = dot_fp(prd, k, bit_width, dp_width, accum_method)
+
+  S, T = np.broadcast_arrays(np.asarray(S_A)[..., :, None, :], np.swapaxes(np.asarray(S_B), -1, -2)[..., None, :, :])
+  return dot_general_fp(dot_out, S, T, dp_width, out_width, scale_width)
+
+def _pack_words(fields):
+  """
+  Packs [(words [num_vectors, ...], width)] into one Python int per vector,
+  the first field and element in the most significant bits.
+  """
+  packed = [0] * len(fields[0][0])
+  for words, width in fields:
+    flat = (np.asarray(words).reshape(len(packed), -1).astype(np.uint64) & _mask(width)).tolist()
+    for n, row in enumerate(flat):
+      for word in row:
+        packed[n] = (packed[n] << width) | word
+  return packed
+
+
+def matmul_fp_vectors(num_vectors, x_rows, vec_elem_count, y_cols, k, exp_width, man_width, scale_width, seed=0):
+  """
+  $readmemh vectors of matmul_fp for tb/attention/matmul_fp/matmul_fp_tb.sv:
+  random element words, and in every other vector block scales within 8 of
+  each other, so that add_nrm also aligns overlapping operands. Returns
+  (stim, exp, stim_width, exp_width), each stimulus word packing
+  {A, B, S_A, S_B} and each expected word {C, S_C} of every method in
+  SUPPORTED_ACCUM_METHODS, as Python ints.
+  """
+  bit_width = 1 + exp_width + man_width
+  block_count = vec_elem_count // k
+  rng = np.random.default_rng(seed)
+
+  A = rng.integers(0, 1 << bit_width, size=(num_vectors, x_rows, vec_elem_count))
+  B = rng.integers(0, 1 << bit_width, size=(num_vectors, vec_elem_count, y_cols))
+  S_A = rng.integers(0, 1 << scale_width, size=(num_vectors, x_rows, block_count))
+  S_B = rng.integers(0, 1 << scale_width, size=(num_vectors, block_count, y_cols))
+  close = np.arange(num_vectors) % 2 == 1
+  base = rng.integers(0, 1 << scale_width, size=num_vectors)
+  S_A[close] = (base[close, None, None] + rng.integers(0, 4, size=S_A[close].shape)) & ((1 << scale_width) - 1)
+  S_B[close] = rng.integers(0, 4, size=S_B[close].shape)
+
+  results = []
+  for accum_method in SUPPORTED_ACCUM_METHODS:
+    results += list(matmul_fp(A, B, S_A, S_B, exp_width, man_width, k, bit_width, scale_width, accum_method))
+  widths = [bit_width, scale_width] * len(SUPPORTED_ACCUM_METHODS)
+
+  stim = _pack_words([(A, bit_width), (B, bit_width), (S_A, scale_width), (S_B, scale_width)])
+  exp = _pack_words(list(zip(results, widths)))
+  stim_width = (x_rows * vec_elem_count + vec_elem_count * y_cols) * bit_width + (x_rows + y_cols) * block_count * scale_width
+  exp_width = len(SUPPORTED_ACCUM_METHODS) * x_rows * y_cols * (bit_width + scale_width)
+  return stim, exp, stim_width, exp_width
+
+def _add_nrm_keep_value(op0, op1, scale0, scale1, int_w):
+  """
+  add_nrm() on signed operands with signed scales (value op * 2^scale),
+  returns (out, o_scale). The alignment, sticky bit, clz normalisation and
+  rounding follow the RTL, with fixes so the sum keeps its value: the smaller operand is shifted arithmetically, where the RTL
+  shifts {op_sml, 3'h0} logically, the rounded sum is sign-extended, where
+  the RTL zero-extends it and so flags every negative sum as an overflow, and
+  the scale is adjusted by 2 - sum_clz, where the RTL adds sum_clz - 1. Scales
+  are compared signed, the RTL compares its 8-bit scales unsigned.
+  """
+  scale0 = np.asarray(scale0, dtype=np.int64)
+  scale1 = np.asarray(scale1, dtype=np.int64)
+  swap = scale0 < scale1
+  op_lrg = np.where(swap, op1, op0)
+  op_sml = np.where(swap, op0, op1)
+  scale_lrg = np.where(swap, scale1, scale0)
+  scale_diff = scale_lrg - np.where(swap, scale0, scale1)
+
+  # Sticky bit over the bits shifted out past the 3 guard bits
+  sticky_mask = (_shl(np.ones_like(scale_diff), np.maximum(scale_diff - 3, 0)) - np.uint64(1)) & _mask(int_w)
+  s_bit = (scale_diff > 3) & ((op_sml.astype(np.uint64) & sticky_mask) != 0)
+
+  # Arithmetic shift of {op_sml, 3'h0}, the LSB is kept only with the sticky bit
+  op_sml_shift = (op_sml.astype(np.int64) << 3) >> np.minimum(scale_diff, 63)
+  op_sml_shift = op_sml_shift & ~(np.int64(1) & ~s_bit.astype(np.int64))
+
+  sum_w = int_w + 4
+  total = ((op_lrg.astype(np.int64) << 3) + op_sml_shift).astype(np.uint64) & _mask(sum_w)
+
+  negative = (total >> np.uint64(sum_w - 1)) & np.uint64(1) == 1
+  clz_prep = np.where(negative, ~total & _mask(sum_w), total)
+  sum_clz = _clz(clz_prep, sum_w)
+  aligned = _shl(total, sum_clz - 1) & _mask(sum_w)
+
+  # Round to nearest even on the 4 dropped bits
+  bit = lambda v, i: (v >> np.uint64(i)) & np.uint64(1)
+  round_up = bit(aligned, 3) & (((aligned & np.uint64(0x7)) != 0).astype(np.uint64) | bit(aligned, 4))
+  sum_rnd = _wrap(aligned >> np.uint64(4), int_w) + round_up.astype(np.int64)
+  scale_adj = scale_lrg - sum_clz + 2
+
+  overflow = sum_rnd > 2**(int_w - 1) - 1
+  out = np.where(overflow, sum_rnd >> 1, sum_rnd)
+  o_scale = np.where(overflow, scale_adj + 1, scale_adj)
+  return out, o_scale
+
+
+def check_rtl_vectors(num_vectors=1 << 16, seed=0, simulate=False):
+  """
+  Checks the model against the references of the RTL testbenches, returns the
+  number of mismatches of each check:
+  - "dot_fp": Kulisch block sums of random E4M3 words (k = 32) against the
+    reference of tb/dot/dot_fp/dot_fp_tb.sv, the exact sum of the products in
+    units of the smallest subnormal squared, through both dot_fp() and the
+    keep_values block sums. NaN words are replaced, the model has no NaNs.
+  - "rnd_rne": the rounding of the output casts against the exhaustive
+    rnd_rne vector set of tb/vectors/gen_vectors.py.
+  - "matmul_fp" (simulate=True): tb/attention/matmul_fp, the RTL matmul_fp
+    of every accumulation method against matmul_fp() on the vectors of
+    matmul_fp_vectors(), run through tb/run_tests.py. The bench stops at the
+    first mismatch, so the count is 0 or 1.
+  """
+  import os
+  import sys
+
+  repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+  mismatches = {}
+
+  # dot_fp_tb.sv localparams
+  exp_width, man_width, k = 4, 3, 32
+  bit_width = 1 + exp_width + man_width
+  rng = np.random.default_rng(seed)
+  words = rng.integers(0, 1 << bit_width, size=(2, num_vectors, k))
+  nan_word = (1 << (bit_width - 1)) - 1
+  words = np.where((words & nan_word) == nan_word, words ^ 1, words)
+
+  def fp_to_real(words):
+    # fp6tosr(): the fields placed into an FP32 word, times 2^127
+    sign = (words >> (bit_width - 1)) & 1
+    exp = (words >> man_width) & ((1 << exp_width) - 1)
+    man = words & ((1 << man_width) - 1)
+    sr_bits = (sign << 31) | (exp << 23) | (man << (23 - man_width))
+    return sr_bits.astype(np.uint32).view(np.float32).astype(np.float64) * 2.0**127
+
+  ref = np.sum(fp_to_real(words[0]) * fp_to_real(words[1]), axis=-1) / fp_to_real(np.int64(1))**2
+
+  man_a, shift_a = decode_elements(words[0], exp_width, man_width)
+  man_b, shift_b = decode_elements(words[1], exp_width, man_width)
+  prd_width = 2 * ((1 << exp_width) + man_width)
+  dot_out, base = _block_sums(man_a * man_b, shift_a + shift_b, k, prd_width + _clog2(k) + 1)
+  out_width = prd_width + _clog2(k)
+  rtl_out = dot_fp(_mul_fp(man_a, shift_a, man_b, shift_b), k, bit_width, out_width, AccumMethod.Kulisch)
+  mismatches["dot_fp"] = int(np.count_nonzero((dot_out[..., 0] * np.exp2(base[..., 0]) != ref) | (rtl_out[..., 0] != ref)))
+
+  # gen_vectors imports ref_spec as a top-level module
+  vectors_dir = os.path.join(repo_root, "tb", "vectors")
+  sys.path.insert(0, vectors_dir)
+  try:
+    import gen_vectors
+  finally:
+    sys.path.remove(vectors_dir)
+
+  params = gen_vectors.default_params("rnd_rne")
+  spec = gen_vectors.rnd_rne(**params)
+  stim, exp = gen_vectors.generate(spec, gen_vectors.vector_indices(spec, 0, seed))
+  out = rnd_rne(stim, params["width_i"], params["width_o"])
+  mismatches["rnd_rne"] = int(np.count_nonzero(out.astype(np.uint64) != exp))
+
+  if simulate:
+    tb_dir = os.path.join(repo_root, "tb")
+    sys.path.insert(0, tb_dir)
+    try:
+      import run_tests
+    finally:
+      sys.path.remove(tb_dir)
+
+    bench = next(bench for bench in run_tests.discover(tb_dir) if bench.name == "matmul_fp")
+    simulator = run_tests.find_simulator("auto")
+    result = run_tests.run_bench(bench, simulator, run_tests.simulator_version(simulator), timeout=3600)
+    if result.status not in ["PASS", "FAIL"]:
+      raise RuntimeError(f"matmul_fp bench {result.status}:\n{result.log}")
+    mismatches["matmul_fp"] = int(result.status == "FAIL")
+
+  return mismatches
+
+
+class AttentionGoldenModel:
+  """
+  Vectorized NumPy model of src/attention/attention_fp.sv. All port arrays carry a
+  leading batch dimension, so thousands of vectors run in one call.
+
+  By default the model follows the RTL bit for bit up to the softmax. Both
+  matmuls are matmul_fp(), checked against the RTL for every accumulation
+  method by tb/attention/matmul_fp. The glue follows the RTL too: each k block
+  of Q*K^T keeps the scale of its first output, the BW_1 to BW_2 cast keeps
+  the low bits or zero-pads, and each k block of the output keeps the scale
+  of its first element. The RTL has a single block size k, so this mode needs
+  k1 == k2 == k3.
+
+  mxint_softmax is modelled at format level, since its mxint_div comes from
+  the mase submodule and its power2_lut is a placeholder ROM: the exp uses
+  the RTL log2(e) constant and DATA_R_WIDTH fraction bits and is rounded to
+  BW_3-bit MX words per k2 block. Each block is normalised on its own, like
+  the one mxint_softmax per k block of attention_fp, and the quotients are
+  rounded to BW_3-bit two's complement MX words, which the second matmul
+  reads as M3 words. Override softmax() to plug in a bit-accurate one.
+
+  The RTL loses the value on the way, so its R * 2^S_R is far from
+  attention. With keep_values=True the model keeps it instead, so its
+  outputs can be compared with float attention:
+  - dot_general_fp gives dot_fp a 2*bit_width + clog2(k)-bit output, narrower
+    than the sum of the FP products; the model keeps the whole sum.
+  - The compensated adder trees sum the low bit_width bits of the products;
+    the model rounds the products to the element precision and sums them
+    exactly.
+  - dot_general_fp keeps the low out_width bits of the accumulator; the model
+    rounds it to its top out_width bits and raises the scale to match.
+  - add_nrm loses the sign of negative operands and sums and adjusts the scale
+    the wrong way after normalising (see _add_nrm_keep_value()).
+  - matmul_fp gives each output its own scale, attention_fp keeps the scale of
+    the first element of each block; the model aligns each k2 block (softmax
+    input) and k3 block (output) to the block's largest scale.
+  - The BW_1 to BW_2 cast keeps the low bits or zero-pads; the model rounds to
+    the top bits or sign-extends.
+  - attention_fp runs one mxint_softmax per k block, so each block sums to
+    one; the model normalises over the whole row and rounds the result to
+    M3-format MX words.
+  - The model takes k1 (Q*K^T), k2 (softmax) and k3 (S*V) from the design and
+    re-blocks the softmax output when k2 != k3.
+  """
+  def __init__(self, design, r_width=2, keep_values=False):
+    for method in [design.accum_method1, design.accum_method3]:
+      if method not in SUPPORTED_ACCUM_METHODS:
+        raise ValueError(f"Accumulation method {method.value} has no dot_fp adder tree.")
+    if not keep_values and not design.k1 == design.k2 == design.k3:
+      raise ValueError(f"attention_fp has a single block size, k1={design.k1} k2={design.k2} k3={design.k3} needs keep_values=True.")
+
+    self.design = design
+    self.r_width = r_width
+    self.keep_values = keep_values
+
+    self.bw_1 = 1 + design.M1_bits.exp_bits + design.M1_bits.mant_bits
+    self.bw_2 = 1 + design.M2_bits.exp_bits + design.M2_bits.mant_bits
+    self.bw_3 = 1 + design.M3_bits.exp_bits + design.M3_bits.mant_bits
+
+  def _block_dot(self, man_prd, shift_prd, S, T, bits, k, accum_method):
+    """
+    keep_values dot_fp block sums of the mul_fp products man_prd << shift_prd
+    ([..., C]) and the add_nrm tree across blocks with signed scales S + T
+    ([..., C/k]). Returns bit_width-bit mantissas and their signed scales.
+    """
+    bit_width = 1 + bits.exp_bits + bits.mant_bits
+    prd_width = 2 * ((1 << bits.exp_bits) + bits.mant_bits)
+    # Wide enough for k full products, the add_nrm model needs 4 spare bits of int64
+    acc_width = min(prd_width + _clog2(k) + 1, 59)
+
+    if accum_method != AccumMethod.Kulisch:
+      # The compensated trees take products in the element format
+      man_prd, shift = _normalise(man_prd, bits.mant_bits + (bits.exp_bits > 0) + 1)
+      shift_prd = shift_prd + shift
+
+    dot_out, base = _block_sums(man_prd, shift_prd, k, acc_width)
+    dot_scales = S.astype(np.int64) + T.astype(np.int64) + base
+
+    while dot_out.shape[-1] > 1:
+      dot_out, dot_scales = _add_nrm_keep_value(dot_out[..., 0::2], dot_out[..., 1::2], dot_scales[..., 0::2], dot_scales[..., 1::2], acc_width)
+
+    man, shift = _normalise(dot_out[..., 0], bit_width)
+    return man, dot_scales[..., 0] + shift
+
+  def dot_general(self, X, Y, S, T, bits, k, accum_method):
+    """
+    dot_general_fp over the last axis of X and Y ([..., C]) with block scales
+    S and T ([..., C/k]). Returns (o_dp, o_scale), o_scale a scale word, or
+    signed with keep_values.
+    """
+    scale_width = self.design.scale_width
+    man_x, shift_x = decode_elements(X, bits.exp_bits, bits.mant_bits)
+    man_y, shift_y = decode_elements(Y, bits.exp_bits, bits.mant_bits)
+
+    if not self.keep_values:
+      bit_width = 1 + bits.exp_bits + bits.mant_bits
+      dp_width = 2 * bit_width + _clog2(k)
+      dot_out = dot_fp(_mul_fp(man_x, shift_x, man_y, shift_y), k, bit_width, dp_width, accum_method)
+      return dot_general_fp(dot_out, S, T, dp_width, bit_width, scale_width)
+
+    return self._block_dot(man_x * man_y, shift_x + shift_y, _wrap(S, scale_width), _wrap(T, scale_width), bits, k, accum_method)
+
+  def matmul(self, A, B, S_A, S_B, bits, k, accum_method):
+    """
+    matmul_fp: A [.., rows, C], B [.., C, cols], S_A [.., rows, C/k], S_B [.., C/k, cols].
+    Returns (C, S_C) with one scale per output, a scale word, or signed with
+    keep_values.
+    """
+    scale_width = self.design.scale_width
+    if not self.keep_values:
+      bit_width = 1 + bits.exp_bits + bits.mant_bits
+      return matmul_fp(A, B, S_A, S_B, bits.exp_bits, bits.mant_bits, k, bit_width, scale_width, accum_method)
+
+    # Decode once, then broadcast every row of A against every column of B
+    man_a, shift_a = decode_elements(A, bits.exp_bits, bits.mant_bits)
+    man_b, shift_b = decode_elements(np.swapaxes(B, -1, -2), bits.exp_bits, bits.mant_bits)
+    man_prd = man_a[..., :, None, :] * man_b[..., None, :, :]
+    shift_prd = shift_a[..., :, None, :] + shift_b[..., None, :, :]
+
+    S, T = np.broadcast_arrays(_wrap(S_A, scale_width)[..., :, None, :], np.swapaxes(_wrap(S_B, scale_width), -1, -2)[..., None, :, :])
+    return self._block_dot(man_prd, shift_prd, S, T, bits, k, accum_method)
+
+  def softmax(self, m_in, e_in):
+    """
+    Softmax over each row of the scores m_in * 2^e_in, m_in [..., S_kv] signed
+    BW_2-bit mantissas and e_in one signed scale per k2 block, with the
+    division by sqrt(d_kq) already in it. Returns probabilities (float) before
+    rounding to the S*V input words.
+    """
+    d = self.design
+    scale_width = d.scale_width
+    e_in = np.repeat(e_in.astype(np.int64), d.k2, axis=-1)
+
+    # mxint_exp: 2^(x*log2e) split into n + r, r with r_width-1 fraction bits
+    t = m_in * np.exp2(e_in) * LOG2_E
+    t = np.floor(t * 2**(self.r_width - 1)) / 2**(self.r_width - 1)
+    exp_t = np.exp2(np.clip(t, -2**(scale_width - 1), 2**(scale_width - 1) - 1))
+
+    blocks = exp_t.reshape(*exp_t.shape[:-1], exp_t.shape[-1] // d.k2, d.k2)
+    # mxint_cast of the exp output: BW_3-bit mantissas with BW_3-2 fraction bits per block
+    block_exp = np.floor(np.log2(np.max(blocks, axis=-1, keepdims=True)))
+    step = np.exp2(block_exp - (self.bw_3 - 2))
+    blocks = np.clip(np.rint(blocks / step), 0, 2**(self.bw_3 - 1) - 1) * step
+
+    if not self.keep_values:
+      # One mxint_softmax per block
+      return (blocks / np.sum(blocks, axis=-1, keepdims=True)).reshape(exp_t.shape)
+
+    exp_t = blocks.reshape(exp_t.shape)
+    return exp_t / np.sum(exp_t, axis=-1, keepdims=True)
+
+  def forward(self, Q, Kt, V, S_Q, S_Kt, S_V):
+    """
+    attention_fp with the RTL port layout plus a leading batch axis:
+    Q [B, S_q, d_kq], Kt [B, d_kq, S_kv], V [B, S_kv, d_v], S_Q [B, S_q, d_kq/k1],
+    S_Kt [B, d_kq/k1, S_kv], S_V [B, S_kv, d_v/k3]. Returns (R, S_R) with
+    R [B, S_q, d_v] BW_3-bit two's complement mantissas and S_R [B, S_q, d_v/k3]
+    scale words.
+    """
+    d = self.design
+    scale_width = d.scale_width
+    # Divide by sqrt(d_kq) through the scale, log2(sqrt(d_kq)) rounded down
+    scale_shift_bits = _clog2(d.d_kq) // 2
+
+    QKt, S_QKt = self.matmul(Q, Kt, S_Q, S_Kt, d.M1_bits, d.k1, d.accum_method1)
+
+    if self.keep_values:
+      QKt, S_QKt = _align_blocks(QKt, S_QKt, d.k2)
+      # Cast BW_1 to BW_2 bits, keeping the top bits
+      if self.bw_2 < self.bw_1:
+        mag = np.minimum(_rne_shift(np.abs(QKt), self.bw_1 - self.bw_2), 2**(self.bw_2 - 1) - 1)
+        QKt, S_QKt = np.where(QKt < 0, -mag, mag), S_QKt + self.bw_1 - self.bw_2
+      probs = self.softmax(QKt, S_QKt - scale_shift_bits)
+      soft_res, soft_scale = encode_mx(probs, d.M3_bits.exp_bits, d.M3_bits.mant_bits, d.k3, scale_width, axis=-1)
+    else:
+      # Each block keeps the scale of its first output, the cast keeps the low bits or zero-pads
+      S_QKt = (S_QKt[..., ::d.k2] - scale_shift_bits) & ((1 << scale_width) - 1)
+      QKt_2 = QKt & ((1 << min(self.bw_1, self.bw_2)) - 1)
+      probs = self.softmax(_wrap(QKt_2, self.bw_2), _wrap(S_QKt, scale_width))
+      soft_res, soft_scale = encode_mx(probs, 0, self.bw_3 - 1, d.k3, scale_width, axis=-1)
+
+    # {>>{S_V_reshaped}} = {>>{S_V_i}}: flat reinterpretation of [S_kv][d_v/k] as [S_kv/k][d_v]
+    S_V_reshaped = S_V.reshape(S_V.shape[0], d.S_kv // d.k3, d.d_v)
+
+    R, S_R = self.matmul(soft_res, V, soft_scale, S_V_reshaped, d.M3_bits, d.k3, d.accum_method3)
+    if not self.keep_values:
+      return R, S_R[..., ::d.k3]
+
+    R, S_R = _align_blocks(R, S_R, d.k3)
+    S_R = np.clip(S_R, -2**(scale_width - 1), 2**(scale_width - 1) - 1) & ((1 << scale_width) - 1)
+    return R, S_R
+
+  def random_inputs(self, num_vectors, seed=0):
+    """
+    Random attention inputs (standard normal Q, K, V) rounded to the design's
+    M1 / M3 MX formats, as attention_fp port arrays.
+    """
+    d = self.design
+    rng = np.random.default_rng(seed)
+    q = rng.standard_normal((num_vectors, d.S_q, d.d_kq))
+    kt = rng.standard_normal((num_vectors, d.d_kq, d.S_kv))
+    v = rng.standard_normal((num_vectors, d.S_kv, d.d_v))
+
+    Q, S_Q = encode_mx(q, d.M1_bits.exp_bits, d.M1_bits.mant_bits, d.k1, d.scale_width, axis=-1)
+    Kt, S_Kt = encode_mx(kt, d.M1_bits.exp_bits, d.M1_bits.mant_bits, d.k1, d.scale_width, axis=-2)
+    V, S_V = encode_mx(v, d.M3_bits.exp_bits, d.M3_bits.mant_bits, d.k3, d.scale_width, axis=-2)
+    S_V = S_V.reshape(num_vectors, d.S_kv, d.d_v // d.k3)
+
+    return {"Q": Q, "Kt": Kt, "V": V, "S_Q": S_Q, "S_Kt": S_Kt, "S_V": S_V}
+
+  def reference(self, inputs):
+    """
+    Float64 softmax(Q K^T / sqrt(d_kq)) V on the decoded MX inputs.
+    """
+    d = self.design
+    q = decode_mx(inputs["Q"], inputs["S_Q"], d.M1_bits.exp_bits, d.M1_bits.mant_bits, d.k1, d.scale_width, axis=-1)
+    kt = decode_mx(inputs["Kt"], inputs["S_Kt"], d.M1_bits.exp_bits, d.M1_bits.mant_bits, d.k1, d.scale_width, axis=-2)
+    S_V = inputs["S_V"].reshape(-1, d.S_kv // d.k3, d.d_v)
+    v = decode_mx(inputs["V"], S_V, d.M3_bits.exp_bits, d.M3_bits.mant_bits, d.k3, d.scale_width, axis=-2)
+
+    scores = q @ kt / math.sqrt(d.d_kq)
+    scores = np.exp(scores - np.max(scores, axis=-1, keepdims=True))
+    return (scores / np.sum(scores, axis=-1, keepdims=True)) @ v
+
+  def estimate_error(self, num_vectors=1000, seed=0):
+    """
+    Output error of the datapath against float64 attention on the same MX inputs.
+    """
+    d = self.design
+    inputs = self.random_inputs(num_vectors, seed)
+    R, S_R = self.forward(**inputs)
+    # R holds two's complement mantissas, whatever the M3 format
+    out = decode_mx(R, S_R, 0, self.bw_3 - 1, d.k3, d.scale_width, axis=-1)
+    ref = self.reference(inputs)
+
+    err = out - ref
+    return {
+      "rel_rms": float(np.sqrt(np.mean(err**2) / np.mean(ref**2))),
+      "max_abs": float(np.max(np.abs(err))),
+      "mean_abs": float(np.mean(np.abs(err))),
+    }
@@ -0,0 +1,71 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from DSE.Plotter import Plotter
+from DSE.ablation_filters import default_engine
+from DSE import tracing
+
+DEFAULT_OBJECTIVES = [("LUTs", "FFs")]
+
+def ablation_results(results, ablation, max_perplexity=12, engine=None):
+  """
+  Results of one ablation, selected by its filter expression in one
+  vectorised pass. The "valid" definition keeps the checks of
+  SynthesisHandler's ablation_check: a known perplexity up to
+  max_perplexity and at most 2.5x the baseline LUTs.
+  """
+  engine = default_engine() if engine is None else engine
+  return engine.select(results, ablation, variables={"max_perplexity": max_perplexity})
+
+def _render(plotter, directory, objectives, formats):
+  # Worker processes never show figures
+  import matplotlib
+  matplotlib.use("Agg")
+
+  start = time.perf_counter()
+  paths = []
+  for resources in objectives:
+    paths += plotter.plot_perplexity(directory=directory, filename_suffix=plotter.ablation, plot_file_format=formats, resources=resources)
+  return paths, start, time.perf_counter(), os.getpid()
+
+@tracing.traced()
+def render_plots(results, ablations=None, objectives=None, formats=("png",), directory="./plots", max_workers=4, max_perplexity=12, engine=None, verbose=False):
+  """
+  Renders perplexity plots for every ablation x objective (a tuple of
+  resources drawn side by side) x file format. Ablation subsets, Pareto
+  fronts and Pareto optimal designs are computed once here, then each
+  ablation's figures are drawn in a worker process. Returns the saved paths.
+  """
+  engine = default_engine() if engine is None else engine
+  ablations = list(engine.ablations) if ablations is None else ablations
+  objectives = DEFAULT_OBJECTIVES if objectives is None else objectives
+  os.makedirs(directory, exist_ok=True)
+
+  plotters = []
+  for ablation in ablations:
+    subset = ablation_results(results, ablation, max_perplexity=max_perplexity, engine=engine)
+    if not subset:
+      print(f"WARNING: No results for ablation {ablation}, skipping.")
+      continue
+
+    plotter = Plotter(subset, ablation=ablation)
+    plotter.find_pareto_optimal(weights={'LUTs': 1.0, 'FFs': 1.0, 'accuracy': 100.0})
+    for resource in {resource for resources in objectives for resource in resources}:
+      plotter.pareto_front(resource)
+    plotters.append(plotter)
+
+    if verbose:
+      print(f"Ablation {ablation}: {len(subset)} results")
+
+  paths = []
+  with ProcessPoolExecutor(max_workers=max_workers) as executor:
+    futures = {executor.submit(_render, plotter, directory, objectives, list(formats)): plotter.ablation for plotter in plotters}
+    for future in as_completed(futures):
+      saved, start, end, pid = future.result()
+      tracing.record(f"render {futures[future]}", start, end, pid=pid)
+      paths += saved
+      if verbose:
+        print(f"Rendered {futures[future]} in {end - start:.1f} s: {', '.join(saved)}")
+
+  return sorted(paths)
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import threading
+import functools
+
+# Spans are only recorded after enable(), otherwise span() hands out a shared
+# no-op context and traced functions are called directly
+_enabled = False
+_events = []
+_local = threading.local()
+_origin_ns = time.perf_counter_ns()
+
+def enable():
+  global _enabled
+  _enabled = True
+
+def disable():
+  global _enabled
+  _enabled = False
+
+def is_enabled():
+  return _enabled
+
+def reset():
+  _events.clear()
+
+def _stack():
+  if not hasattr(_local, "stack"):
+    _local.stack = []
+  return _local.stack
+
+class _Span:
+  __slots__ = ("name", "args", "start_ns", "child_ns")
+
+  def __init__(self, name, args):
+    self.name = name
+    self.args = args
+    self.child_ns = 0
+
+  def __enter__(self):
+    _stack().append(self)
+    self.start_ns = time.perf_counter_ns()
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    duration_ns = time.perf_counter_ns() - self.start_ns
+    stack = _stack()
+    stack.pop()
+    if stack:
+      stack[-1].child_ns += duration_ns
+    _record(self.name, self.start_ns, duration_ns, self.child_ns, self.args)
+    return False
+
+  def count(self, key, value=1):
+    self.args[key] = self.args.get(key, 0) + value
+
+class _NullSpan:
+  __slots__ = ()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    return False
+
+  def count(self, key, value=1):
+    pass
+
+_NULL_SPAN = _NullSpan()
+
+def _record(name, start_ns, duration_ns, child_ns, args, pid=None, tid=None):
+  _events.append({
+    "name": name,
+    "start_ns": start_ns,
+    "duration_ns": duration_ns,
+    "self_ns": duration_ns - child_ns,
+    "pid": os.getpid() if pid is None else pid,
+    "tid": threading.get_ident() if tid is None else tid,
+    "args": args,
+  })
+
+def span(name, **args):
+  """
+  Context manager timing a named span, nested spans are attributed to their
+  parent. Keyword arguments and count() calls end up in the span's args.
+  """
+  return _Span(name, args) if _enabled else _NULL_SPAN
+
+def traced(name=None):
+  """Decorator wrapping every call of a function in a span."""
+  def decorator(fn):
+    span_name = fn.__qualname__ if name is None else name
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+      if not _enabled:
+        return fn(*args, **kwargs)
+      with _Span(span_name, {}):
+        return fn(*args, **kwargs)
+    return wrapper
+  return decorator
+
+def count(key, value=1):
+  """Adds value to a counter of the innermost open span, e.g. bytes read."""
+  if _enabled:
+    stack = _stack()
+    if stack:
+      stack[-1].count(key, value)
+
+def record(name, start_s, end_s, pid=None, **args):
+  """
+  Records a span measured elsewhere with time.perf_counter(), such as a
+  synthesis run in a worker process (perf_counter is system wide on Linux).
+  """
+  if _enabled:
+    duration_ns = int((end_s - start_s) * 1e9)
+    _record(name, int(start_s * 1e9), duration_ns, 0, args, pid=pid, tid=pid)
+
+def events():
+  return list(_events)
+
+def save_chrome_trace(path):
+  """Writes the recorded spans as Chrome trace events, viewable in chrome://tracing or Perfetto."""
+  trace_events = [{
+    "name": e["name"],
+    "cat": e["name"].split(".")[0],
+    "ph": "X",
+    "ts": (e["start_ns"] - _origin_ns) / 1e3,
+    "dur": e["duration_ns"] / 1e3,
+    "pid": e["pid"],
+    "tid": e["tid"],
+    "args": e["args"],
+  } for e in _events]
+
+  with open(path, "w") as f:
+    json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+
+def summary():
+  """Per span name: calls, total and self time in seconds, and summed counters, slowest first."""
+  rows = {}
+  for e in _events:
+    row = rows.setdefault(e["name"], {"name": e["name"], "calls": 0, "total_s": 0.0, "self_s": 0.0, "max_s": 0.0, "counts": {}})
+    row["calls"] += 1
+    row["total_s"] += e["duration_ns"] / 1e9
+    row["self_s"] += e["self_ns"] / 1e9
+    row["max_s"] = max(row["max_s"], e["duration_ns"] / 1e9)
+    for key, value in e["args"].items():
+      if isinstance(value, (int, float)) and not isinstance(value, bool):
+        row["counts"][key] = row["counts"].get(key, 0) + value
+
+  return sorted(rows.values(), key=lambda row: row["total_s"], reverse=True)
+
+def print_summary():
+  rows = summary()
+  if not rows:
+    print("No spans recorded.")
+    return
+
+  width = max(len(row["name"]) for row in rows)
+  print(f"{'Span':<{width}} {'Calls':>8} {'Total (s)':>10} {'Self (s)':>10} {'Mean (ms)':>10} {'Max (ms)':>10}  Counts")
+  for row in rows:
+    counts = ", ".join(f"{key}={value:g}" for key, value in sorted(row["counts"].items()))
+    print(f"{row['name']:<{width}} {row['calls']:>8} {row['total_s']:>10.3f} {row['self_s']:>10.3f} {row['total_s'] / row['calls'] * 1e3:>10.3f} {row['max_s'] * 1e3:>10.3f}  {counts}")
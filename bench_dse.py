@@ -0,0 +1,373 @@
+"""
+End-to-end benchmark of the DSE pipeline on synthetic report corpora.
+
+Synthetic Vivado power/timing/util reports and accuracy files are written in
+the naming scheme of DesignConfig.get_filename_regex() into a workspace with
+the layout DSE.py expects (./src/attention/synth_output_*, ./synthesis_fits,
+./plots), one corpus per scale. The calibration corpora mirror the fixed
+matmul/softmax design lists of calibrate_analytical_models and a perplexity
+corpus of --calib_designs designs, so calibration is timed once. For every
+scale the benchmark then times
+
+  ingest_reports    find_and_process_results parsing power/timing/util reports
+  ingest_predicted  the DSE.py path: accuracy reports with predicted resources
+  predict           SynthesisHandler.predict_results over all designs
+  plot              Plotter.plot_perplexity
+
+and fits the log-log slope of each stage's time against the number of
+designs (1 is linear scaling). Corpora in a --workdir are kept and reused by
+later runs with the same scale and seed.
+
+Usage:
+  python bench_dse.py
+  python bench_dse.py --scales 1000 10000 100000 --workdir /tmp/bench_dse --plot bench_dse.png
+  python bench_dse.py --scales 1000000 --workdir /tmp/bench_dse --stages ingest_reports
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from DSE.AccumMethod import AccumMethod
+from DSE.DesignConfig import DesignConfig
+from DSE.SynthesisHandler import SynthesisHandler
+from DSE.analytical_model import calibrate_analytical_models, calibrate_perplexity_model
+from DSE.Plotter import Plotter
+
+
+STAGES = ["ingest_reports", "ingest_predicted", "predict", "plot"]
+
+FORMATS = [(E, M) for E in range(0, 5) for M in range(1, 8)]
+ACCUM_METHODS = [m for m in AccumMethod if m != AccumMethod.Naive]
+
+POWER_REPORT = """Copyright 1986-2022 Xilinx, Inc. All Rights Reserved.
+| Tool Version     : Vivado v.2024.2
+| Design           : {name}
+| Device           : xcvp1802-lsvc4072-2MP-e-S
+------------------------------------------------------------------------------------
+
+1. Summary
+----------
+
++--------------------------+--------------+
+| Total On-Chip Power (W)  | {total:<12.3f} |
+| Dynamic (W)              | {dynamic:<12.3f} |
+| Device Static (W)        | {static:<12.3f} |
+| Max Ambient (C)          | 100.0        |
+| Junction Temperature (C) | 25.0         |
++--------------------------+--------------+
+"""
+
+TIMING_REPORT = """Copyright 1986-2022 Xilinx, Inc. All Rights Reserved.
+| Tool Version : Vivado v.2024.2
+| Design       : {name}
+------------------------------------------------------------------------------------------------
+| Design Timing Summary
+| ---------------------
+------------------------------------------------------------------------------------------------
+
+    WNS(ns)      TNS(ns)  TNS Failing Endpoints  TNS Total Endpoints      WHS(ns)      THS(ns)  THS Failing Endpoints  THS Total Endpoints     WPWS(ns)     TPWS(ns)  TPWS Failing Endpoints  TPWS Total Endpoints
+    -------      -------  ---------------------  -------------------      -------      -------  ---------------------  -------------------     --------     --------  ----------------------  --------------------
+{wns:>11.3f} {tns:>12.3f} {tns_failing:>22d} {endpoints:>20d} {whs:>12.3f} {ths:>12.3f} {ths_failing:>22d} {endpoints:>20d} {wpws:>12.3f} {tpws:>12.3f} {tpws_failing:>23d} {endpoints:>21d}
+
+"""
+
+UTIL_REPORT = """Copyright 1986-2022 Xilinx, Inc. All Rights Reserved.
+| Tool Version : Vivado v.2024.2
+| Design       : {name}
+------------------------------------------------------------------------------------------------
+
+1. CLB Logic
+------------
+
++----------------------------+---------+-------+------------+-----------+-------+
+|          Site Type         |   Used  | Fixed | Prohibited | Available | Util% |
++----------------------------+---------+-------+------------+-----------+-------+
+| Registers                  | {FFs:>7d} |     0 |          0 |   5148416 | {FFs_util:5.2f} |
+| CLB LUTs*                  | {LUTs:>7d} |     0 |          0 |   2574208 | {LUTs_util:5.2f} |
++----------------------------+---------+-------+------------+-----------+-------+
+
+2. BLOCKRAM
+-----------
+
++--------------------------+------+-------+------------+-----------+-------+
+|         Site Type        | Used | Fixed | Prohibited | Available | Util% |
++--------------------------+------+-------+------------+-----------+-------+
+| Block RAM Tile           | {BRAMs:>4d} |     0 |          0 |      3741 | {BRAMs_util:5.2f} |
++--------------------------+------+-------+------------+-----------+-------+
+
+3. ARITHMETIC
+-------------
+
++--------------------+------+-------+------------+-----------+-------+
+|      Site Type     | Used | Fixed | Prohibited | Available | Util% |
++--------------------+------+-------+------------+-----------+-------+
+| DSP Slices         | {DSPs:>4d} |     0 |          0 |     10848 | {DSPs_util:5.2f} |
++--------------------+------+-------+------------+-----------+-------+
+"""
+
+
+def sample_designs(num_designs, seed):
+  """num_designs distinct attention_fp designs around the synthesised model dimensions."""
+  dims = [(S, d) for S in [512, 1024, 2048, 4096] for d in [64, 128]]
+  ks = [8, 16, 32, 64]
+  radices = [len(dims)] + [len(ks)] * 3 + [len(FORMATS)] * 3 + [len(ACCUM_METHODS)] * 3
+
+  space = int(np.prod(radices, dtype=object))
+  if num_designs > space:
+    raise ValueError(f"Only {space} distinct synthetic designs, got {num_designs}.")
+
+  designs = []
+  for index in random.Random(seed).sample(range(space), num_designs):
+    digits = []
+    for radix in radices:
+      index, digit = divmod(index, radix)
+      digits.append(digit)
+
+    S, d = dims[digits[0]]
+    k1, k2, k3 = (ks[i] for i in digits[1:4])
+    (M1_E, M1_M), (M2_E, M2_M), (M3_E, M3_M) = (FORMATS[i] for i in digits[4:7])
+    accum1, accum2, accum3 = (ACCUM_METHODS[i] for i in digits[7:10])
+    designs.append(DesignConfig("attention_fp", S, S, d, d, k1, k2, k3, 8, M1_E, M1_M, M2_E, M2_M, M3_E, M3_M, accum1, accum2, accum3, "auto", "auto", "auto"))
+
+  return designs
+
+
+def calibration_designs():
+  """The matmul and softmax design lists of calibrate_analytical_models."""
+  formats = [(1, 1), (1, 2), (2, 2), (2, 3), (3, 3), (3, 4), (4, 4)]
+  matmul = [
+    DesignConfig("matmul_fp", S, S, d, d, d, d, d, 8, E, M, E, M, E, M, AccumMethod.Kulisch, AccumMethod.Kulisch, AccumMethod.Kulisch, "auto", "auto", "auto")
+    for S in [2, 4, 8, 16] for d in [2, 4, 8, 16] for E, M in formats
+  ]
+  softmax = [
+    DesignConfig("mxint_softmax", S, S, d, d, d, d, d, 8, M1_E, M1_M, M1_E, M1_M, M2_E, M2_M, AccumMethod.Kulisch, AccumMethod.Kulisch, AccumMethod.Kulisch, "auto", "auto", "auto")
+    for S in [4, 8, 16] for d in [4, 8, 16] for M1_E, M1_M in formats for M2_E, M2_M in formats
+  ]
+  return matmul, softmax
+
+
+def synthetic_result(design, rng):
+  """Plausible resources, timing and perplexity, growing with the design's widths and sizes."""
+  bits = [design.M1_bits, design.M2_bits, design.M3_bits]
+  width = sum(1 + b.exp_bits + b.mant_bits for b in bits)
+  LUTs = int(design.S_q * design.d_kq * width * rng.uniform(0.8, 1.2) / 4) + 100
+  FFs = int(LUTs * rng.uniform(0.5, 0.9))
+
+  # Narrow mantissas and non-compensated sums cost accuracy
+  ppl = 9.0 + sum(2.0 ** -b.mant_bits for b in bits) * 3
+  ppl += sum(0.2 for m in [design.accum_method1, design.accum_method2, design.accum_method3] if m == AccumMethod.Quant)
+  ppl *= rng.uniform(0.98, 1.02)
+
+  return {
+    "dynamic": LUTs * 2e-5 + rng.uniform(0, 1), "static": rng.uniform(20, 25),
+    "wns": rng.uniform(-1.5, 0.5), "LUTs": LUTs, "FFs": FFs,
+    "BRAMs": 0, "DSPs": 0, "perplexity": ppl,
+  }
+
+
+def write_reports(directory, filename, design, rng, accuracy=True, pad_lines=0):
+  values = synthetic_result(design, rng)
+  path = os.path.join(directory, filename)
+  padding = "".join(f"  {design.name}/stage_{i}/reg_reg[{i % 64}]/C  0.{i % 1000:03d}\n" for i in range(pad_lines))
+
+  endpoints = values["FFs"] + 1
+  wns = values["wns"]
+  with open(f"{path}_power.rpt", "w") as f:
+    f.write(POWER_REPORT.format(name=design.name, total=values["dynamic"] + values["static"], **values))
+  with open(f"{path}_timing.rpt", "w") as f:
+    f.write(TIMING_REPORT.format(
+      name=design.name, wns=wns, tns=min(wns, 0) * 250, tns_failing=250 if wns < 0 else 0, endpoints=endpoints,
+      whs=0.012, ths=0.0, ths_failing=0, wpws=1.894, tpws=0.0, tpws_failing=0,
+    ) + padding)
+  with open(f"{path}_util.rpt", "w") as f:
+    f.write(UTIL_REPORT.format(
+      name=design.name, LUTs_util=100 * values["LUTs"] / 2574208, FFs_util=100 * values["FFs"] / 5148416,
+      BRAMs_util=0.0, DSPs_util=0.0, **values,
+    ))
+  if accuracy:
+    with open(f"{path}_accuracy.txt", "w") as f:
+      f.write(f"Model patched with quantized attention.\n\nPerplexity: {values['perplexity']:.2f}\n")
+
+
+def _old_filename(design):
+  # Calibration corpora still use a single block size in their filenames
+  return re.sub(r"_k1_(\d+)_k2_\d+_k3_\d+_", r"_k_\1_", repr(design))
+
+
+def generate_corpus(directory, designs, seed, old_filename=False, accuracy=True, pad_lines=0):
+  """Writes the reports of designs into directory unless a corpus with the same manifest exists."""
+  manifest = {"num_designs": len(designs), "seed": seed, "old_filename": old_filename, "accuracy": accuracy, "pad_lines": pad_lines}
+  manifest_path = os.path.join(directory, "corpus.json")
+  if os.path.exists(manifest_path):
+    with open(manifest_path) as f:
+      if json.load(f) == manifest:
+        return False
+    shutil.rmtree(directory)
+
+  os.makedirs(directory, exist_ok=True)
+  rng = random.Random(seed)
+  start = datetime(2026, 1, 1)
+  for i, design in enumerate(designs):
+    date_time = (start + timedelta(minutes=i % 100000)).strftime("%Y%m%d_%H%M")
+    name = _old_filename(design) if old_filename else repr(design)
+    write_reports(directory, f"{name}_time_{date_time}", design, rng, accuracy=accuracy, pad_lines=pad_lines)
+
+  with open(manifest_path, "w") as f:
+    json.dump(manifest, f)
+  return True
+
+
+def timed(fn, verbose):
+  """Runs fn with its output hidden unless verbose, returns (seconds, value)."""
+  stdout = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+  with stdout:
+    start = time.perf_counter()
+    value = fn()
+    seconds = time.perf_counter() - start
+  return seconds, value
+
+
+def run_scale(num_designs, args):
+  synth_output_dir = f"synth_output_{num_designs}"
+  directory = os.path.join("./src/attention", synth_output_dir)
+
+  generate_s, generated = timed(lambda: generate_corpus(directory, sample_designs(num_designs, args.seed), args.seed, pad_lines=args.pad_lines), args.verbose)
+  print(f"{'Generated' if generated else 'Reused'} {num_designs} designs in {directory} ({generate_s:.1f} s)")
+
+  def ingest(predict_resources):
+    handler = SynthesisHandler([], synth_output_dir=synth_output_dir)
+    handler.find_and_process_results(report_filter="accuracy", predict_resources=predict_resources, ablation_check=args.ablation_check)
+    return handler.results
+
+  stages = {
+    "ingest_reports": lambda: ingest(predict_resources=False),
+    "ingest_predicted": lambda: ingest(predict_resources=True),
+    "predict": lambda: SynthesisHandler(designs).predict_results(),
+    "plot": lambda: Plotter(results).plot_perplexity(directory="./plots", filename_suffix=str(num_designs), plot_file_format="png"),
+  }
+
+  timings = {}
+  designs, results = None, None
+  for stage in STAGES:
+    if stage not in args.stages:
+      continue
+    # Later stages run on the ingested designs and predicted results
+    if designs is None and stage in ["predict", "plot"]:
+      results = ingest(predict_resources=True)
+      designs = [r.design_config for r in results]
+
+    seconds = []
+    for _ in range(args.repeat):
+      s, value = timed(stages[stage], args.verbose)
+      seconds.append(s)
+
+    if stage == "ingest_predicted":
+      results = value
+      designs = [r.design_config for r in results]
+    timings[stage] = min(seconds)
+    print(f"{timings[stage]:10.3f} s {timings[stage] / num_designs * 1e6:10.1f} us/design  {stage}", flush=True)
+
+  return {"num_designs": num_designs, "num_results": len(results) if results is not None else None, "generate_s": generate_s, "stages": timings}
+
+
+def scaling_exponents(runs):
+  """Log-log slope of each stage's time against the number of designs."""
+  exponents = {}
+  for stage in STAGES:
+    points = [(run["num_designs"], run["stages"][stage]) for run in runs if stage in run["stages"] and run["stages"][stage] > 0]
+    if len(points) >= 2:
+      x, y = np.log([p[0] for p in points]), np.log([p[1] for p in points])
+      exponents[stage] = float(np.polyfit(x, y, 1)[0])
+  return exponents
+
+
+def plot_scaling(runs, path):
+  import matplotlib
+  matplotlib.use("Agg")
+  import matplotlib.pyplot as plt
+
+  fig, ax = plt.subplots(figsize=(7, 5))
+  for stage in STAGES:
+    points = [(run["num_designs"], run["stages"][stage]) for run in runs if stage in run["stages"]]
+    if points:
+      ax.plot(*zip(*points), marker="o", label=stage)
+  ax.set_xscale("log")
+  ax.set_yscale("log")
+  ax.set_xlabel("Designs")
+  ax.set_ylabel("Time (s)")
+  ax.set_title("DSE pipeline scaling")
+  ax.grid(True, which="both", alpha=0.3)
+  ax.legend()
+  fig.tight_layout()
+  fig.savefig(path)
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark the DSE pipeline on synthetic report corpora')
+  parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000], help='Numbers of designs to benchmark (default: %(default)s)')
+  parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES, help='Stages to time per scale (default: all)')
+  parser.add_argument('--calib_designs', type=int, default=256, help='Designs in the perplexity calibration corpus (default: %(default)s)')
+  parser.add_argument('--skip_calibration', action='store_true', help='Do not time calibration, reuse the fits in the workdir')
+  parser.add_argument('--pad_lines', type=int, default=0, help='Path rows appended to each timing report to approach real report sizes (default: %(default)s)')
+  parser.add_argument('--ablation_check', action='store_true', help='Apply the ablation filters of DSE.py during ingestion')
+  parser.add_argument('--repeat', type=int, default=1, help='Runs per stage, the fastest is reported (default: %(default)s)')
+  parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic designs and reports (default: %(default)s)')
+  parser.add_argument('--workdir', default=None, help='Workspace for the corpora, kept and reused between runs (default: a temporary directory)')
+  parser.add_argument('--output', default='bench_dse.json', help='Results file (default: %(default)s)')
+  parser.add_argument('--plot', default=None, help='Scaling plot of stage times against designs (optional)')
+  parser.add_argument('--verbose', action='store_true', help='Show the output of the pipeline stages')
+  args = parser.parse_args()
+
+  output = os.path.abspath(args.output)
+  plot = os.path.abspath(args.plot) if args.plot else None
+  workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="bench_dse_")
+  cwd = os.getcwd()
+
+  os.makedirs(workdir, exist_ok=True)
+  os.chdir(workdir)
+  try:
+    for directory in ["./synthesis_fits", "./plots"]:
+      os.makedirs(directory, exist_ok=True)
+
+    calibration = {}
+    if not args.skip_calibration:
+      matmul, softmax = calibration_designs()
+      generate_corpus("./src/attention/synth_output_matmul", matmul, args.seed, old_filename=True, accuracy=False)
+      generate_corpus("./src/attention/synth_output_softmax", softmax, args.seed, old_filename=True, accuracy=False)
+      generate_corpus("./src/attention/synth_output_calib", sample_designs(args.calib_designs, args.seed + 1), args.seed + 1)
+
+      calibration["calibrate_resources"], _ = timed(lambda: calibrate_analytical_models(args.verbose), args.verbose)
+      calibration["calibrate_perplexity"], _ = timed(lambda: calibrate_perplexity_model(args.verbose, synth_output_dir="synth_output_calib"), args.verbose)
+      for stage, seconds in calibration.items():
+        print(f"{seconds:10.3f} s {'':20s}  {stage}")
+
+    runs = [run_scale(num_designs, args) for num_designs in sorted(args.scales)]
+  finally:
+    os.chdir(cwd)
+    if args.workdir is None:
+      shutil.rmtree(workdir, ignore_errors=True)
+
+  exponents = scaling_exponents(runs)
+  if exponents:
+    print("Scaling exponents (time ~ designs^k): " + ", ".join(f"{stage} {k:.2f}" for stage, k in exponents.items()))
+
+  with open(output, "w") as f:
+    json.dump({"calibration": calibration, "runs": runs, "scaling_exponents": exponents, "calib_designs": args.calib_designs, "seed": args.seed}, f, indent=2)
+  print(f"Saved results to {output}")
+
+  if plot is not None:
+    plot_scaling(runs, plot)
+    print(f"Saved scaling plot to {plot}")
+
+if __name__ == "__main__":
+  main()
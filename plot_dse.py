@@ -0,0 +1,80 @@
+"""
+Regenerates the perplexity plot set of the paper in one command.
+
+The accuracy reports in --synth_output_dir are ingested once with predicted
+resources, as in DSE.py but without the ablation check. Every ablation in
+--ablations (filter expressions in DSE/ablations.json, or in the file given
+by --spec) is then selected from the same results in one vectorised pass, its Pareto fronts and Pareto optimal design are computed once, and
+its figures are drawn in a worker process: one figure per objective (a
+comma-separated list of resource axes drawn side by side, e.g. LUTs,FFs),
+saved in every format of --formats. Figures are named
+perplexity_<objective>_<ablation>.<format>, the LUTs,FFs figure keeping the
+perplexity_combined_<ablation> name of DSE.py.
+
+Usage:
+  python plot_dse.py
+  python plot_dse.py --ablations joint mixed_k --formats png svg pdf
+  python plot_dse.py --objectives LUTs,FFs LUTs FFs,DSPs --directory plots/all --trace plots.json
+  python plot_dse.py --spec my_ablations.yaml --ablations small_k
+"""
+import argparse
+import time
+
+from DSE.SynthesisHandler import SynthesisHandler
+from DSE.plot_pipeline import render_plots
+from DSE.ablation_filters import DEFAULT_SPEC_PATH, FilterEngine
+from DSE.Plotter import RESOURCE_AXES
+from DSE import tracing
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Render the perplexity plots of every ablation in parallel')
+  parser.add_argument('--synth_output_dir', default='synth_output', help='Result directory under ./src/attention (default: %(default)s)')
+  parser.add_argument('--spec', default=DEFAULT_SPEC_PATH, help='JSON or YAML file of ablation filter expressions (default: %(default)s)')
+  parser.add_argument('--ablations', nargs='+', default=None, help='Ablations of --spec to plot (default: all)')
+  parser.add_argument('--objectives', nargs='+', default=['LUTs,FFs'], help=f'Comma-separated resource axes per figure, from {", ".join(RESOURCE_AXES)} (default: %(default)s)')
+  parser.add_argument('--formats', nargs='+', default=['png'], help='File formats every figure is saved in (default: %(default)s)')
+  parser.add_argument('--directory', default='./plots', help='Output directory (default: %(default)s)')
+  parser.add_argument('--max_workers', type=int, default=4, help='Rendering processes (default: %(default)s)')
+  parser.add_argument('--trace', default=None, help='Write a Chrome trace of ingestion and rendering to this file')
+  parser.add_argument('--verbose', action='store_true', help='Enable verbose output')
+  args = parser.parse_args()
+
+  engine = FilterEngine(args.spec)
+  ablations = list(engine.ablations) if args.ablations is None else args.ablations
+  for ablation in ablations:
+    if ablation not in engine.ablations:
+      parser.error(f"Unknown ablation {ablation}, expected one of {', '.join(engine.ablations)}")
+
+  objectives = [tuple(objective.split(",")) for objective in args.objectives]
+  for resource in {resource for resources in objectives for resource in resources}:
+    if resource not in RESOURCE_AXES:
+      parser.error(f"Unknown resource axis {resource}, expected one of {', '.join(RESOURCE_AXES)}")
+
+  if args.trace:
+    tracing.enable()
+
+  start = time.perf_counter()
+  with tracing.span("ingestion"):
+    synthesis_handler = SynthesisHandler([], synth_output_dir=args.synth_output_dir)
+    synthesis_handler.find_and_process_results(report_filter="accuracy", predict_resources=True, verbose=args.verbose)
+
+  paths = render_plots(
+    synthesis_handler.results,
+    ablations=ablations,
+    objectives=objectives,
+    formats=args.formats,
+    directory=args.directory,
+    max_workers=args.max_workers,
+    max_perplexity=synthesis_handler.max_perplexity,
+    engine=engine,
+    verbose=args.verbose,
+  )
+  print(f"Saved {len(paths)} plots to {args.directory} in {time.perf_counter() - start:.1f} s")
+
+  if args.trace:
+    tracing.save_chrome_trace(args.trace)
+    tracing.print_summary()
+
+if __name__ == "__main__":
+  main()
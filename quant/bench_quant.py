@@ -0,0 +1,274 @@
+"""
+Micro-benchmarks for the attention quantizers and ordered-accumulation kernels.
+
+Every case is timed on inputs shaped like Llama attention states [B,H,S,D]
+(Q*K^T and P*V for ordmm_chunk_bcast_scaled, the softmax sum for
+ordacc_chunk_scaled) over a sweep of sequence lengths, group sizes and
+sum_types. The kernels run through the same dispatch as QuantLlamaAttention,
+so CPU runs measure the PyTorch reference and CUDA runs the ordmm extension.
+Peak memory is the growth of the high-water mark over the usage before the
+case: of the CUDA allocator, or of the process peak RSS on CPU
+(quant_utils/memory.py, shared with the --profile report of llama_ppl.py).
+Results are written as JSON, and --compare flags cases whose
+fastest run (less sensitive to scheduling noise than the median) or peak
+memory regressed against an earlier results file. Peak memory growth
+under 1 MiB is not compared.
+
+Usage:
+  python quant/bench_quant.py --device cpu --quick
+  python quant/bench_quant.py --device cuda --output bench_quant.json
+  python quant/bench_quant.py --filter "ordmm/*" --compare bench_main.json
+"""
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections import namedtuple
+
+import torch
+
+from quant_utils.quant_utils import MXINTQuantizer, MXFPQuantizer, IntQuantizer
+from quant_utils import modelling_llama
+from quant_utils.modelling_llama import ordmm_chunk_bcast_scaled, ordacc_chunk_scaled
+from quant_utils.memory import reset_peak, peak_growth
+
+
+
+SEQ_LENS = [64, 128, 512, 1024, 2048, 4096]
+GROUP_SIZES = [8, 16, 32]
+SUM_TYPES = ["QUANT", "KAHAN", "TWOSUM", "FASTTWOSUM", "NEUMAIER", "KLEIN"]
+# Peak memory growth below this is allocator and page noise, not compared
+MEM_NOISE_BYTES = 1 << 20
+
+Case = namedtuple("Case", ["name", "params", "setup"])
+
+
+def _states(shape, device, dtype=torch.bfloat16, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    return torch.randn(shape, generator=generator).to(device=device, dtype=dtype)
+
+
+def _mx_split(x, group_size):
+    """Per-group MX scales and scaled elements, as quant_attention passes them to the kernels."""
+    quantizer = MXFPQuantizer(exp_w=4, man_w=3, group_size=group_size)
+    x = quantizer.quantize_tensor(x)
+    scale = quantizer.dynamic_scale(x)
+    return x / scale, scale
+
+
+def quantizer_cases(args):
+    quantizers = {
+        "MXINTQuantizer": lambda g: MXINTQuantizer(bit_w=8, group_size=g),
+        "MXFPQuantizer": lambda g: MXFPQuantizer(exp_w=4, man_w=3, group_size=g),
+        "IntQuantizer": lambda g: IntQuantizer(bit_w=8, group_size=g, static_scale=False),
+    }
+
+    cases = []
+    for name, make in quantizers.items():
+        for S in args.seq_lens:
+            for g in args.group_sizes:
+                shape = [args.batch, args.heads, S, args.head_dim]
+
+                def setup(device, make=make, g=g, shape=shape):
+                    quantizer = make(g).to(device)
+                    x = _states(shape, device)
+                    return lambda: quantizer.quantize_tensor(x)
+
+                cases.append(Case(f"quantize/{name}", {"shape": shape, "group_size": g}, setup))
+
+    return cases
+
+
+def kernel_cases(args):
+    cases = []
+    for S in args.seq_lens:
+        if S > args.kernel_max_seq:
+            continue
+        for g in args.group_sizes:
+            for sum_type in args.sum_types:
+                B, H, D = args.batch, args.heads, args.head_dim
+                params = {"seq_len": S, "heads": H, "head_dim": D, "group_size": g, "sum_type": sum_type}
+
+                def setup_qk(device, S=S, g=g, sum_type=sum_type):
+                    q, q_scale = _mx_split(_states([B, H, S, D], device, seed=0), g)
+                    k, k_scale = _mx_split(_states([B, H, S, D], device, seed=1), g)
+                    return lambda: ordmm_chunk_bcast_scaled(q, k, q_scale, k_scale, 3, 7, g, sum_type)
+
+                def setup_pv(device, S=S, g=g, sum_type=sum_type):
+                    p, p_scale = _mx_split(torch.softmax(_states([B, H, S, S], device, dtype=torch.float32), dim=-1).to(torch.bfloat16), g)
+                    v, v_scale = _mx_split(_states([B, H, D, S], device, seed=1), g)
+                    return lambda: ordmm_chunk_bcast_scaled(p, v, p_scale, v_scale, 3, 7, g, sum_type)
+
+                def setup_sum(device, S=S, g=g, sum_type=sum_type):
+                    e, e_scale = _mx_split(torch.exp(-_states([B, H, S, S], device, dtype=torch.float32).abs()), g)
+                    return lambda: ordacc_chunk_scaled(e, e_scale, 3, 7, g, sum_type)
+
+                cases.append(Case("ordmm/qk", params, setup_qk))
+                cases.append(Case("ordmm/pv", params, setup_pv))
+                cases.append(Case("ordacc/softmax_sum", params, setup_sum))
+
+    return cases
+
+
+def _sync(device):
+    if torch.device(device).type == "cuda":
+        torch.cuda.synchronize()
+
+
+def run_case(case, device, warmup, repeat, max_time):
+    fn = case.setup(device)
+
+    for _ in range(warmup):
+        fn()
+    _sync(device)
+
+    baseline = reset_peak(torch.device(device))
+    times = []
+    start_all = time.perf_counter()
+    while len(times) < repeat and (not times or time.perf_counter() - start_all < max_time):
+        start = time.perf_counter()
+        fn()
+        _sync(device)
+        times.append(time.perf_counter() - start)
+
+    peak_mem = peak_growth(torch.device(device), baseline)
+
+    return {
+        "name": case.name,
+        "params": case.params,
+        "device": str(device),
+        "backend": backend(case.name, device),
+        "n": len(times),
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "mean_s": statistics.mean(times),
+        "peak_mem_bytes": peak_mem,
+        "peak_mem_kind": "cuda_delta" if torch.device(device).type == "cuda" else "rss_delta",
+    }
+
+
+def backend(name, device):
+    if name.startswith("quantize/"):
+        return "torch"
+    return "ordmm" if modelling_llama.ordmm is not None and torch.device(device).type == "cuda" else "reference"
+
+
+def machine_info(device):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+
+    return {
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "num_threads": torch.get_num_threads(),
+        "device_name": torch.cuda.get_device_name(device) if torch.device(device).type == "cuda" else platform.processor(),
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def _key(result):
+    return (result["name"], json.dumps(result["params"], sort_keys=True), result["device"])
+
+
+def _mem_ratio(result, old):
+    """Peak memory ratio against the baseline, None if either has no comparable per-case figure."""
+    if result["peak_mem_bytes"] is None or old.get("peak_mem_bytes") is None or old.get("peak_mem_kind") != result["peak_mem_kind"]:
+        return None
+    # Growth below the noise floor is not compared, a case allocating nothing has no ratio
+    if max(result["peak_mem_bytes"], old["peak_mem_bytes"]) < MEM_NOISE_BYTES:
+        return 1.0
+    return result["peak_mem_bytes"] / max(old["peak_mem_bytes"], MEM_NOISE_BYTES)
+
+
+def compare(results, baseline_path, threshold, mem_threshold):
+    """Prints minimum time and peak memory ratios against the baseline file, returns the regressed cases."""
+    with open(baseline_path) as f:
+        baseline = {_key(r): r for r in json.load(f)["results"]}
+
+    regressions = []
+    for result in results:
+        old = baseline.get(_key(result))
+        if old is None:
+            continue
+        ratio = result["min_s"] / old["min_s"]
+        mem_ratio = _mem_ratio(result, old)
+
+        flags = []
+        if ratio > 1 + threshold:
+            flags.append("REGRESSION")
+        elif ratio < 1 - threshold:
+            flags.append("improved")
+        if mem_ratio is not None and mem_ratio > 1 + mem_threshold:
+            flags.append("MEMORY REGRESSION")
+        if "REGRESSION" in flags or "MEMORY REGRESSION" in flags:
+            regressions.append(result)
+
+        mem = f"{mem_ratio:6.2f}x mem" if mem_ratio is not None else "     - mem"
+        print(f"{ratio:6.2f}x {mem} {result['name']:<24} {json.dumps(result['params'], sort_keys=True)} {' '.join(flags)}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark quantizers and ordered-accumulation kernels')
+    parser.add_argument('--device', default='cuda' if torch.cuda.is_available() else 'cpu', help='Device to benchmark on (default: %(default)s)')
+    parser.add_argument('--filter', action='append', default=None, help='Case name glob, e.g. "ordmm/*", may be repeated (default: all)')
+    parser.add_argument('--quick', action='store_true', help='Small sweep: two sequence lengths, one group size, three sum types')
+    parser.add_argument('--batch', type=int, default=1, help='Batch size B (default: %(default)s)')
+    parser.add_argument('--heads', type=int, default=32, help='Attention heads H (default: %(default)s)')
+    parser.add_argument('--head_dim', type=int, default=64, help='Head dimension D (default: %(default)s)')
+    parser.add_argument('--kernel_max_seq', type=int, default=None, help='Longest S for kernel cases (default: 4096 on CUDA, 64 on CPU where the reference is slow)')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed runs per case (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=10, help='Maximum timed runs per case (default: %(default)s)')
+    parser.add_argument('--max_time', type=float, default=5.0, help='Stop repeating a case after this many seconds (default: %(default)s)')
+    parser.add_argument('--output', default='bench_quant.json', help='Results file (default: %(default)s)')
+    parser.add_argument('--compare', default=None, help='Earlier results file to compare minimum times against (optional)')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative slowdown reported as a regression (default: %(default)s)')
+    parser.add_argument('--mem_threshold', type=float, default=0.1, help='Relative peak memory growth reported as a regression (default: %(default)s)')
+
+    args = parser.parse_args()
+
+    args.seq_lens = [128, 512] if args.quick else SEQ_LENS
+    args.group_sizes = [32] if args.quick else GROUP_SIZES
+    args.sum_types = ["QUANT", "KAHAN", "KLEIN"] if args.quick else SUM_TYPES
+    if args.kernel_max_seq is None:
+        args.kernel_max_seq = 4096 if torch.device(args.device).type == "cuda" else 64
+    if args.quick and args.kernel_max_seq < min(args.seq_lens):
+        args.seq_lens = [args.kernel_max_seq] + args.seq_lens
+
+    cases = quantizer_cases(args) + kernel_cases(args)
+    if args.filter is not None:
+        cases = [case for case in cases if any(fnmatch.fnmatch(case.name, pattern) for pattern in args.filter)]
+
+    print(f"Running {len(cases)} cases on {args.device}")
+
+    results = []
+    with torch.no_grad():
+        for case in cases:
+            result = run_case(case, args.device, args.warmup, args.repeat, args.max_time)
+            results.append(result)
+            mem = f"{result['peak_mem_bytes'] / 2**20:8.1f} MiB" if result["peak_mem_bytes"] is not None else "       - MiB"
+            mem += " " + ("cuda" if result["peak_mem_kind"] == "cuda_delta" else "rss ")
+            print(f"{result['median_s'] * 1e3:10.3f} ms {mem}  {case.name:<24} {json.dumps(case.params, sort_keys=True)}", flush=True)
+
+    with open(args.output, "w") as f:
+        json.dump({"machine": machine_info(args.device), "results": results}, f, indent=2)
+    print(f"Saved {len(results)} results to {args.output}")
+
+    if args.compare is not None:
+        regressions = compare(results, args.compare, args.threshold, args.mem_threshold)
+        print(f"{len(regressions)} regressions above {args.threshold:.0%} time or {args.mem_threshold:.0%} peak memory")
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
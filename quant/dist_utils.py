@@ -1,3 +1,6 @@
+import json
+import time
+
 import torch
 import torch.nn as nn
 from pathlib import Path
@@ -193,4 +196,238 @@ def save_acts(model, val_loader, dev, output_dir, silent=False):
         inps = outs.cpu()
 
     if not silent:
-        print(f"Activation capture complete! Saved to {output_dir}")
\ No newline at end of file
+        print(f"Activation capture complete! Saved to {output_dir}")
+
+def _sync(dev):
+    if torch.device(dev).type == "cuda":
+        torch.cuda.synchronize()
+
+
+def _llama_layer_kwargs(model, hidden_states):
+    """
+    Position embeddings and causal mask as LlamaModel passes them to its decoder
+    layers for unpadded inputs without a KV cache: SDPA and flash attention get
+    no mask and apply causality themselves, eager attention gets a 4-D additive
+    mask. Built here rather than through the private _update_causal_mask.
+    """
+    bsz, seqlen = hidden_states.shape[:2]
+    cache_position = torch.arange(seqlen, device=hidden_states.device)
+    position_ids = cache_position.unsqueeze(0)
+    if model.config._attn_implementation == "eager":
+        min_value = torch.finfo(hidden_states.dtype).min
+        causal_mask = torch.full((seqlen, seqlen), min_value, dtype=hidden_states.dtype, device=hidden_states.device).triu(1)
+        causal_mask = causal_mask[None, None].expand(bsz, 1, seqlen, seqlen)
+    else:
+        causal_mask = None
+    position_embeddings = model.model.rotary_emb(hidden_states, position_ids)
+    return {
+        "attention_mask": causal_mask,
+        "position_ids": position_ids,
+        "cache_position": cache_position,
+        "position_embeddings": position_embeddings,
+    }
+
+
+def _open_layer_cache(cache_dir, idx, meta, shared):
+    nsamples, seqlen, hidden_size = meta["shape"]
+    inps = torch.from_file(
+        f"{cache_dir}/{idx}_inps.bin",
+        shared=shared,
+        size=nsamples * seqlen * hidden_size,
+        dtype=getattr(torch, meta["dtype"]),
+    )
+    return inps.view(nsamples, seqlen, hidden_size)
+
+
+@torch.no_grad()
+def save_llama_layer_inputs(model, testloader, dev, output_dir, batch_size=4, silent=False):
+    """Save the inputs of every Llama decoder layer (and the last layer output) for the baseline model"""
+    model.eval()
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    layers = model.model.layers
+    nsamples = len(testloader)
+    seqlen = testloader[0][0].shape[1]
+    meta = {
+        "shape": [nsamples, seqlen, model.config.hidden_size],
+        "dtype": str(model.dtype).replace("torch.", ""),
+        "num_layers": len(layers),
+        "layer_time": [0.0] * len(layers),
+        "embed_time": 0.0,
+    }
+
+    # File idx holds the input of layer idx, file num_layers the output of the last layer
+    caches = [_open_layer_cache(output_dir, i, meta, shared=True) for i in range(len(layers) + 1)]
+
+    cursor = {"sample": 0, "start": 0.0}
+
+    def pre_hook_factory(idx):
+        def hook(module, args, kwargs):
+            hidden_states = args[0] if args else kwargs["hidden_states"]
+            bsz = hidden_states.shape[0]
+            caches[idx][cursor["sample"]:cursor["sample"] + bsz] = hidden_states.detach().cpu()
+            _sync(dev)
+            cursor["start"] = time.perf_counter()
+        return hook
+
+    def post_hook_factory(idx):
+        def hook(module, args, kwargs, output):
+            _sync(dev)
+            meta["layer_time"][idx] += time.perf_counter() - cursor["start"]
+            if idx == len(layers) - 1:
+                hidden_states = output[0]
+                caches[idx + 1][cursor["sample"]:cursor["sample"] + hidden_states.shape[0]] = hidden_states.detach().cpu()
+        return hook
+
+    handles = []
+    for i, layer in enumerate(layers):
+        handles.append(layer.register_forward_pre_hook(pre_hook_factory(i), with_kwargs=True))
+        handles.append(layer.register_forward_hook(post_hook_factory(i), with_kwargs=True))
+
+    for i in range(0, nsamples, batch_size):
+        if not silent:
+            print(f"Caching layer inputs for samples {i}-{min(i + batch_size, nsamples) - 1}...", flush=True)
+        batch = torch.cat([sample[0] for sample in testloader[i:i + batch_size]], dim=0).to(dev)
+        cursor["sample"] = i
+
+        _sync(dev)
+        start = time.perf_counter()
+        model.model.embed_tokens(batch)
+        _sync(dev)
+        meta["embed_time"] += time.perf_counter() - start
+
+        model.model(batch)
+
+    for h in handles:
+        h.remove()
+
+    with open(f"{output_dir}/meta.json", "w") as f:
+        json.dump(meta, f, indent=2)
+
+    if not silent:
+        print(f"Layer input caching complete! Saved to {output_dir}")
+
+
+@torch.no_grad()
+def save_llama_attention_states(model, testloader, dev, output_dir, num_samples=1, num_tokens=128, silent=False):
+    """Save the post-RoPE Q/K/V states of every Llama attention block for the first samples and tokens"""
+    from transformers.models.llama.modeling_llama import apply_rotary_pos_emb
+
+    model.eval()
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    layers = model.model.layers
+    attn = layers[0].self_attn
+    states = [{"q": [], "k": [], "v": []} for _ in layers]
+
+    def hook_factory(idx):
+        def hook(module, args, kwargs):
+            hidden_states = args[0] if args else kwargs["hidden_states"]
+            bsz, q_len, _ = hidden_states.shape
+            q = module.q_proj(hidden_states).view(bsz, q_len, module.num_heads, module.head_dim).transpose(1, 2)
+            k = module.k_proj(hidden_states).view(bsz, q_len, module.num_key_value_heads, module.head_dim).transpose(1, 2)
+            v = module.v_proj(hidden_states).view(bsz, q_len, module.num_key_value_heads, module.head_dim).transpose(1, 2)
+            cos, sin = kwargs["position_embeddings"]
+            q, k = apply_rotary_pos_emb(q, k, cos, sin)
+            for name, t in zip(["q", "k", "v"], [q, k, v]):
+                states[idx][name].append(t.detach().cpu())
+        return hook
+
+    handles = [layer.self_attn.register_forward_pre_hook(hook_factory(i), with_kwargs=True) for i, layer in enumerate(layers)]
+
+    # Attention is causal, so a prefix of each sample gives exactly its states
+    batch = torch.cat([sample[0][:, :num_tokens] for sample in testloader[:num_samples]], dim=0).to(dev)
+    model.model(batch)
+
+    for h in handles:
+        h.remove()
+
+    for i, layer_states in enumerate(states):
+        torch.save({name: torch.cat(ts, dim=0) for name, ts in layer_states.items()}, f'{output_dir}/{i}_qkv.pt')
+
+    meta = {
+        "num_layers": len(layers),
+        "num_samples": batch.shape[0],
+        "num_tokens": batch.shape[1],
+        "num_heads": attn.num_heads,
+        "num_key_value_groups": attn.num_key_value_groups,
+        "head_dim": attn.head_dim,
+        "dtype": str(model.dtype).replace("torch.", ""),
+    }
+    with open(f"{output_dir}/attn_meta.json", "w") as f:
+        json.dump(meta, f, indent=2)
+
+    if not silent:
+        print(f"Attention state caching complete! Saved to {output_dir}")
+
+
+@torch.no_grad()
+def find_divergent_layer(model, cache_dir, dev, batch_size=4):
+    """
+    Index of the first decoder layer whose output differs from the cached
+    baseline. Only the first batch is probed, a layer that matches on it is
+    assumed to match on every sample.
+    """
+    with open(f"{cache_dir}/meta.json") as f:
+        meta = json.load(f)
+
+    layers = model.model.layers
+    for i, layer in enumerate(layers):
+        hidden_states = _open_layer_cache(cache_dir, i, meta, shared=False)[:batch_size].to(dev)
+        expected = _open_layer_cache(cache_dir, i + 1, meta, shared=False)[:batch_size].to(dev)
+        out = layer(hidden_states, **_llama_layer_kwargs(model, hidden_states))[0]
+        if not torch.equal(out, expected):
+            return i
+
+    return len(layers)
+
+
+@torch.no_grad()
+def cached_prefix_evaluator(model, testenc, dev, batch_size, cache_dir, silent=False):
+    """
+    Perplexity that starts from cached baseline inputs at the first layer whose
+    output diverges on the first batch. Returns it with the estimated time
+    saved, net of that probe.
+    """
+    model.eval()
+    with open(f"{cache_dir}/meta.json") as f:
+        meta = json.load(f)
+
+    nsamples, seqlen, _ = meta["shape"]
+    if nsamples != len(testenc) or seqlen != testenc[0][0].shape[1]:
+        raise ValueError(f"Activation cache in {cache_dir} was built for {nsamples}x{seqlen} samples, got {len(testenc)}x{testenc[0][0].shape[1]}.")
+
+    layers = model.model.layers
+    _sync(dev)
+    start = time.perf_counter()
+    start_layer = find_divergent_layer(model, cache_dir, dev, batch_size)
+    _sync(dev)
+    probe_time = time.perf_counter() - start
+    inps = _open_layer_cache(cache_dir, start_layer, meta, shared=False)
+
+    if not silent:
+        print(f"Reusing cached activations up to layer {start_layer} of {len(layers)} (divergence probed on the first {min(batch_size, nsamples)} samples only)")
+
+    nlls = []
+    for i in range(0, nsamples, batch_size):
+        hidden_states = inps[i:i + batch_size].to(dev)
+        layer_kwargs = _llama_layer_kwargs(model, hidden_states)
+        for layer in layers[start_layer:]:
+            hidden_states = layer(hidden_states, **layer_kwargs)[0]
+
+        logits = model.lm_head(model.model.norm(hidden_states)).float()
+        labels = torch.cat([sample[0] for sample in testenc[i:i + batch_size]], dim=0).to(dev)
+        loss = torch.nn.functional.cross_entropy(
+            logits[:, :-1, :].reshape(-1, logits.size(-1)),
+            labels[:, 1:].reshape(-1),
+        )
+        nlls.append(loss.unsqueeze(-1))
+
+    ppl = torch.exp(torch.cat(nlls).mean())
+
+    # Baseline time of the skipped layers, less the probe that found them
+    time_saved = meta["embed_time"] + sum(meta["layer_time"][:start_layer]) - probe_time
+    if not silent:
+        print(f"Skipped {start_layer} decoder layers, estimated time saved: {time_saved:.2f} s (after the {probe_time:.2f} s first-batch divergence probe)")
+
+    return ppl.item(), time_saved
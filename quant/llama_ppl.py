@@ -1,15 +1,21 @@
 import argparse
+import hashlib
 import json
+import os
 import random
+from statistics import NormalDist
 
 from tqdm import tqdm
+import numpy as np
 import torch
 import transformers
 import datasets
 from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer
 
 from quant_utils.patch_utils import patch_bert_model
-from quant_utils.modelling_llama import LlamaAttention, QuantLlamaAttention
+from dist_utils import save_llama_layer_inputs, save_llama_attention_states, cached_prefix_evaluator
+from quant_utils.modelling_llama import LlamaAttention, QuantLlamaAttention, MultiQuantLlamaAttention
+from quant_utils.profiling import AttentionProfiler, attach_profiler
 
 
 
@@ -56,26 +62,62 @@ def get_model(model_id, max_length, device, bf16_model=True):
     return tokenizer, model
 
 
-def get_wikitext2(nsamples=128, seed=0, seqlen=2048, model="", tokenizer=None, eval_mode=False):
-    if tokenizer is None:
-        tokenizer = transformers.AutoTokenizer.from_pretrained(model, use_fast=False)
-    
-    if eval_mode:
+def get_tokenized_cache_path(tokenizer, dataset_name, split, seqlen, cache_dir):
+    """
+    Cache file for a tokenized split, keyed by (tokenizer, dataset, split, seqlen).
+    """
+    key = json.dumps([tokenizer.name_or_path, type(tokenizer).__name__, len(tokenizer), dataset_name, split, seqlen])
+    digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f"{dataset_name.replace('/', '_')}_{split}_seqlen_{seqlen}_{digest}.npy")
+
+
+def load_tokenized_eval_set(tokenizer, seqlen, cache_dir="/data/datasets/tokenized/"):
+    """
+    Tokenized WikiText-2 test split as a [nsamples, seqlen] int64 tensor.
+    The first call tokenizes and stores the chunks as .npy, later calls memory-map
+    that file (copy-on-write) so concurrent evaluators share one page-cached copy.
+    """
+    dataset_name = "Salesforce/wikitext/wikitext-2-raw-v1"
+    cache_path = get_tokenized_cache_path(tokenizer, dataset_name, "test", seqlen, cache_dir)
+
+    if not os.path.exists(cache_path):
         testdata = datasets.load_dataset(
             "Salesforce/wikitext",
             "wikitext-2-raw-v1",
             cache_dir="/data/datasets/"
         )["test"]
         testenc = tokenizer("\n\n".join(testdata["text"]), return_tensors="pt")
-        
-        # Convert to same format as train set
+
+        # Same chunks as range(0, len - seqlen, seqlen)
+        nsamples = len(range(0, testenc.input_ids.shape[1] - seqlen, seqlen))
+        input_ids = testenc.input_ids[0, :nsamples * seqlen].reshape(nsamples, seqlen).to(torch.int64).numpy()
+
+        # Write atomically so concurrent evaluators never read a partial file
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, input_ids)
+        os.replace(tmp_path, cache_path)
+        print(f"Cached tokenized evaluation set to {cache_path}")
+
+    return torch.from_numpy(np.load(cache_path, mmap_mode="c"))
+
+
+def get_wikitext2(nsamples=128, seed=0, seqlen=2048, model="", tokenizer=None, eval_mode=False, cache_dir="/data/datasets/tokenized/"):
+    if tokenizer is None:
+        tokenizer = transformers.AutoTokenizer.from_pretrained(model, use_fast=False)
+    
+    if eval_mode:
+        input_ids = load_tokenized_eval_set(tokenizer, seqlen, cache_dir=cache_dir)
+
+        # Targets only keep the last token of each chunk, build them in one allocation
+        targets = torch.full_like(input_ids, -100)
+        targets[:, -1] = input_ids[:, -1]
+
+        # Convert to same format as train set, samples are [1, seqlen] views
         testloader = []
-        for i in range(0, testenc.input_ids.shape[1] - seqlen, seqlen):
-            j = i + seqlen
-            inp = testenc.input_ids[:, i:j]
-            tar = inp.clone()
-            tar[:, :-1] = -100
-            testloader.append((inp, tar))
+        for i in range(input_ids.shape[0]):
+            testloader.append((input_ids[i:i + 1], targets[i:i + 1]))
         return testloader
     else:
         traindata = datasets.load_dataset(
@@ -118,6 +160,112 @@ def evaluator(model, testenc, dev, batch_size):
     model.config.use_cache = use_cache
     return ppl.item()
 
+
+@torch.no_grad()
+def sequential_evaluator(model, testenc, dev, batch_size, threshold=None, rel_tol=None, confidence=0.95, min_samples=16, seed=0):
+    """
+    Perplexity estimated on a random permutation of the samples, stopping as soon as
+    the confidence interval lies entirely above threshold or its relative half-width
+    drops below rel_tol. The interval is over the mean per-sample NLL (with finite
+    population correction, so it collapses to the exact value on the full set).
+    Returns (ppl, (ppl_low, ppl_high), num_evaluated, stop_reason).
+    """
+    model.eval()
+    use_cache = model.config.use_cache
+    model.config.use_cache = False
+    model.model.embed_tokens = model.model.embed_tokens.to(dev)
+
+    num_samples = len(testenc)
+    order = torch.randperm(num_samples, generator=torch.Generator().manual_seed(seed)).tolist()
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+
+    # Welford running mean / variance of the per-sample NLL
+    n, mean, m2 = 0, 0.0, 0.0
+    low, high = float("-inf"), float("inf")
+    stop_reason = "full evaluation set"
+    num_batches = (num_samples + batch_size - 1) // batch_size
+    for i in tqdm(range(0, num_samples, batch_size), desc="Evaluating", total=num_batches):
+        batch = torch.cat([testenc[j][0] for j in order[i:i + batch_size]], dim=0).to(dev)
+        logits = model(batch).logits[:, :-1, :].float()
+        sample_nlls = torch.nn.functional.cross_entropy(
+            logits.transpose(1, 2),
+            batch[:, 1:],
+            reduction="none",
+        ).mean(dim=1)
+        del logits
+
+        for nll in sample_nlls.tolist():
+            n += 1
+            delta = nll - mean
+            mean += delta / n
+            m2 += delta * (nll - mean)
+
+        if n < 2:
+            continue
+        fpc = ((num_samples - n) / (num_samples - 1)) ** 0.5
+        half_width = z * (m2 / (n - 1) / n) ** 0.5 * fpc
+        low, high = mean - half_width, mean + half_width
+
+        if n >= min_samples and n < num_samples:
+            if threshold is not None and np.exp(low) > threshold:
+                stop_reason = f"perplexity above {threshold} with {confidence:.0%} confidence"
+                break
+            if rel_tol is not None and (np.exp(high) - np.exp(low)) / (2 * np.exp(mean)) < rel_tol:
+                stop_reason = f"relative CI half-width below {rel_tol}"
+                break
+
+    model.config.use_cache = use_cache
+    return float(np.exp(mean)), (float(np.exp(low)), float(np.exp(high))), n, stop_reason
+
+
+@torch.no_grad()
+def multi_config_evaluator(model, testenc, dev, batch_size, num_configs):
+    """
+    Perplexity of every config of a MultiQuantLlamaAttention patched model.
+    Each batch is repeated num_configs times along dim 0, config i sees slice i.
+    """
+    model.eval()
+    use_cache = model.config.use_cache
+    model.config.use_cache = False
+    model.model.embed_tokens = model.model.embed_tokens.to(dev)
+
+    nlls = [[] for _ in range(num_configs)]
+    num_batches = (len(testenc) + batch_size - 1) // batch_size
+    for i in tqdm(range(0, len(testenc), batch_size), desc="Evaluating", total=num_batches):
+        batch_samples = testenc[i:i + batch_size]
+        batch = torch.cat([sample[0] for sample in batch_samples], dim=0).to(dev)
+        hidden_states = model.model(batch.repeat(num_configs, 1))[0]
+
+        # Compute the logits per config to keep the [B,S,vocab] tensor small
+        for c, h in enumerate(hidden_states.chunk(num_configs, dim=0)):
+            logits = model.lm_head(h).float()
+            loss = torch.nn.functional.cross_entropy(
+                logits[:, :-1, :].reshape(-1, logits.size(-1)),
+                batch[:, 1:].reshape(-1),
+            )
+            nlls[c].append(loss.unsqueeze(-1))
+            del logits
+
+    ppls = [torch.exp(torch.cat(config_nlls).mean()).item() for config_nlls in nlls]
+
+    model.config.use_cache = use_cache
+    return ppls
+
+
+def load_multi_config(path):
+    """
+    Read a --multi_config JSON file: a list of {"config": {name: json}, "report": path}
+    entries, where "report" is optional.
+    """
+    with open(path, 'r') as f:
+        entries = json.load(f)
+
+    if not isinstance(entries, list) or len(entries) == 0:
+        raise ValueError(f"{path} must contain a non-empty list of configs.")
+
+    return [entry["config"] for entry in entries], [entry.get("report") for entry in entries]
+
+
 def get_attributes(model_id: str):
     config = AutoConfig.from_pretrained(model_id)
     model = AutoModelForCausalLM.from_pretrained(model_id)
@@ -158,9 +306,27 @@ def main():
     parser.add_argument('--max_num_samples', type=int, default=None, help='Crop the validation set to a maximum number of samples. None=no cropping. (default: %(default)s)')
     parser.add_argument('--model_id', default='meta-llama/Llama-3.2-1B', help='HF Model ID of target model to quantize (optional)')
     parser.add_argument('--config', action='append', default=[], help='Config in the form name=json. Eg. --config k_thresh=\{"quant":"IntQuantizer","bit_w":8\}')
+    parser.add_argument('--quant_layers', default=None, help='Comma separated decoder layer indices to quantize, e.g. 8,9,10. None=all layers. (default: %(default)s)')
+    parser.add_argument('--act_cache_dir', default=None, help='Directory with cached baseline decoder layer inputs, reused up to the first diverging layer (optional)')
+    parser.add_argument('--save_act_cache', action='store_true', help='Build the --act_cache_dir cache from the unquantized model before patching')
+    parser.add_argument('--ppl_threshold', type=float, default=None, help='Sequential evaluation: stop once perplexity is confidently above this value (optional)')
+    parser.add_argument('--ppl_rel_tol', type=float, default=None, help='Sequential evaluation: stop once the relative CI half-width is below this value, e.g. 0.01 (optional)')
+    parser.add_argument('--ppl_confidence', type=float, default=0.95, help='Confidence level of the sequential evaluation interval (default: %(default)s)')
+    parser.add_argument('--save_attn_states', default=None, help='Save post-RoPE Q/K/V states of the unquantized model to this directory and exit, for the experimental attention error proxy in DSE/AttentionErrorProxy.py (optional)')
+    parser.add_argument('--attn_states_tokens', type=int, default=128, help='Tokens per sample kept by --save_attn_states (default: %(default)s)')
+    parser.add_argument('--attn_states_samples', type=int, default=1, help='Samples kept by --save_attn_states (default: %(default)s)')
+    parser.add_argument('--profile', default=None, help='Profile every quantized attention stage per layer and write the report to this file, e.g. next to the _accuracy.txt (optional)')
+    parser.add_argument('--multi_config', default=None, help='JSON file with a list of {"config": {...}, "report": path} entries evaluated together in one model forward (optional)')
 
     args = parser.parse_args()
 
+    # Sequential evaluation runs one config on the uncached model, the other modes would ignore it
+    sequential = args.ppl_threshold is not None or args.ppl_rel_tol is not None
+    if sequential and args.multi_config is not None:
+        parser.error("--ppl_threshold and --ppl_rel_tol cannot be combined with --multi_config")
+    if sequential and args.act_cache_dir is not None:
+        parser.error("--ppl_threshold and --ppl_rel_tol cannot be combined with --act_cache_dir")
+
     configs = {}
     for item in args.config:
         name, json_str = item.split('=', 1)
@@ -185,12 +351,26 @@ def main():
     )
 
 
+    if args.save_attn_states is not None:
+        save_llama_attention_states(model, val_loader, device, args.save_attn_states, num_samples=args.attn_states_samples, num_tokens=args.attn_states_tokens)
+        return
+
+    if args.save_act_cache:
+        if args.act_cache_dir is None:
+            raise ValueError("--save_act_cache requires --act_cache_dir")
+        save_llama_layer_inputs(model, val_loader, device, args.act_cache_dir, batch_size=args.batch_size)
+
+    multi_configs, multi_reports = None, None
+    if args.multi_config is not None:
+        multi_configs, multi_reports = load_multi_config(args.multi_config)
+
     # Patch model with quantized attention.
     model, quantizers, thresholds = patch_bert_model(
         model,
         attn_block=LlamaAttention,
-        quant_attn_block=QuantLlamaAttention,
-        q_config=configs,
+        quant_attn_block=QuantLlamaAttention if multi_configs is None else MultiQuantLlamaAttention,
+        q_config=configs if multi_configs is None else multi_configs,
+        layer_indices=None if args.quant_layers is None else [int(i) for i in args.quant_layers.split(',')],
     )
     model.to(device)
     model.eval()
@@ -210,10 +390,50 @@ def main():
     #     q.end_calib()
 
 
-    # Evaluate model
-    print(f"Validation samples: {len(val_loader)}")
-    dataset_ppl = evaluator(model, val_loader, model.device, args.batch_size)
-    print(f"\nPerplexity: {dataset_ppl:.2f}")
+    profiler = None
+    if args.profile is not None:
+        profiler = AttentionProfiler()
+        attach_profiler(model, profiler)
+
+    try:
+        # Evaluate model
+        print(f"Validation samples: {len(val_loader)}")
+        if multi_configs is not None:
+            print(f"Evaluating {len(multi_configs)} quantizer configs in one forward pass")
+            dataset_ppls = multi_config_evaluator(model, val_loader, model.device, args.batch_size, len(multi_configs))
+            for i, (config, report, dataset_ppl) in enumerate(zip(multi_configs, multi_reports, dataset_ppls)):
+                print(f"\nConfig {i}: {json.dumps(config)}")
+                print(f"Perplexity: {dataset_ppl:.2f}")
+                if report is not None:
+                    with open(report, 'w') as f:
+                        f.write(f"Config: {json.dumps(config)}\n")
+                        f.write(f"Validation samples: {len(val_loader)}\n")
+                        f.write(f"\nPerplexity: {dataset_ppl:.2f}\n")
+            return
+
+        if args.ppl_threshold is not None or args.ppl_rel_tol is not None:
+            dataset_ppl, (ppl_low, ppl_high), num_evaluated, stop_reason = sequential_evaluator(
+                model, val_loader, model.device, args.batch_size,
+                threshold=args.ppl_threshold,
+                rel_tol=args.ppl_rel_tol,
+                confidence=args.ppl_confidence,
+            )
+            print(f"\nPerplexity: {dataset_ppl:.2f}")
+            print(f"Perplexity CI ({args.ppl_confidence:.0%}): [{ppl_low:.2f}, {ppl_high:.2f}]")
+            print(f"Evaluated samples: {num_evaluated}/{len(val_loader)}")
+            print(f"Stop reason: {stop_reason}")
+            return
+
+        if args.act_cache_dir is not None:
+            dataset_ppl, time_saved = cached_prefix_evaluator(model, val_loader, model.device, args.batch_size, args.act_cache_dir)
+            print(f"Time saved by activation cache (net of the first-batch divergence probe): {time_saved:.2f} s")
+        else:
+            dataset_ppl = evaluator(model, val_loader, model.device, args.batch_size)
+        print(f"\nPerplexity: {dataset_ppl:.2f}")
+    finally:
+        if profiler is not None:
+            profiler.save_report(args.profile)
+            print(f"Saved attention profile to {args.profile}")
 
 if __name__ == "__main__":
     main()
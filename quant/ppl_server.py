@@ -0,0 +1,98 @@
+import argparse
+import time
+import traceback
+from multiprocessing.connection import Listener
+
+import torch
+
+from llama_ppl import get_model, get_wikitext2, evaluator
+from quant_utils.patch_utils import patch_bert_model, repatch_model
+from quant_utils.modelling_llama import LlamaAttention, QuantLlamaAttention
+
+
+
+class PerplexityServer:
+    """
+    Keeps the model and the tokenized evaluation set resident and answers
+    perplexity requests for quantizer configs, re-patching only the
+    attention blocks between requests.
+    """
+    def __init__(self, model_id, max_length, batch_size, device):
+        self.batch_size = batch_size
+
+        tokenizer, model = get_model(model_id, max_length, device)
+        self.val_loader = get_wikitext2(
+            seqlen=max_length,
+            tokenizer=tokenizer,
+            eval_mode=True,
+        )
+
+        # Patch once with an empty config (no quantization), later requests only swap quantizers
+        self.model, _, _ = patch_bert_model(
+            model,
+            attn_block=LlamaAttention,
+            quant_attn_block=QuantLlamaAttention,
+            q_config={},
+        )
+        self.model.to(device)
+        self.model.eval()
+
+    def evaluate(self, q_config):
+        repatch_model(self.model, QuantLlamaAttention, q_config)
+        return evaluator(self.model, self.val_loader, self.model.device, self.batch_size)
+
+    def handle(self, request):
+        if request.get("cmd") == "ping":
+            return {"status": "ok"}
+
+        start_time = time.perf_counter()
+        try:
+            ppl = self.evaluate(request["config"])
+        except Exception as e:
+            traceback.print_exc()
+            return {"status": "error", "error": f"{type(e).__name__}: {e}"}
+
+        return {
+            "status": "ok",
+            "perplexity": ppl,
+            "validation_samples": len(self.val_loader),
+            "elapsed": time.perf_counter() - start_time,
+        }
+
+    def serve(self, host, port, authkey):
+        with Listener((host, port), authkey=authkey) as listener:
+            print(f"Perplexity server ready on {host}:{port}", flush=True)
+            while True:
+                with listener.accept() as conn:
+                    while True:
+                        try:
+                            request = conn.recv()
+                        except EOFError:
+                            break
+
+                        if request.get("cmd") == "shutdown":
+                            conn.send({"status": "ok"})
+                            return
+
+                        conn.send(self.handle(request))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Persistent perplexity evaluation worker')
+    parser.add_argument('--host', default='localhost', help='Address to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=6000, help='Port to listen on (default: %(default)s)')
+    parser.add_argument('--authkey', default='a-pace', help='Shared secret for client connections (default: %(default)s)')
+    parser.add_argument('--batch_size', type=int, default=4, help='Batch size (default: %(default)s)')
+    parser.add_argument('--max_length', type=int, default=2048, help='Maximum sequence length (default: %(default)s)')
+    parser.add_argument('--model_id', default='meta-llama/Llama-3.2-1B', help='HF Model ID of target model to quantize (default: %(default)s)')
+
+    args = parser.parse_args()
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    print(f"Using device: {device}")
+
+    server = PerplexityServer(args.model_id, args.max_length, args.batch_size, device)
+    server.serve(args.host, args.port, args.authkey.encode())
+
+if __name__ == "__main__":
+    main()
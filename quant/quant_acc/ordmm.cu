@@ -1,6 +1,7 @@
 #include <torch/extension.h>
 #include "ordmm_chunk_bcast_scaled.cuh"
 #include "ordacc_chunk.cuh"
+#include "round_fp_tensor.cuh"
 
 
 
@@ -8,4 +9,8 @@ PYBIND11_MODULE(TORCH_EXTENSION_NAME, m){
     // Software emulation of accumulator quantization.
     m.def("ordmm_chunk_bcast_scaled", &ordmm_chunk_bcast_scaled, "ordmm_chunk_bcast_scaled");
     m.def("ordacc_chunk_scaled", &ordacc_chunk_scaled, "ordacc_chunk_scaled");
+
+    // Elementwise rounding, checked against tb/vectors.
+    m.def("round_fp", &round_fp, "round_fp");
+    m.def("round_int", &round_int, "round_int");
 }
@@ -0,0 +1,86 @@
+#ifndef ROUND_TENSOR_CUH
+#define ROUND_TENSOR_CUH
+
+#include <torch/extension.h>
+#include "round_fp.cuh"
+
+#define TILE_SIZE_ROUND 256
+
+
+
+__global__ void round_fp_kernel(
+    const float* __restrict__ input,
+    float* __restrict__ output,
+    int64_t numel,
+    int man_width, int exp_width
+){
+    int64_t idx = (int64_t)blockIdx.x * blockDim.x + threadIdx.x;
+
+    if (idx >= numel) return;
+
+    output[idx] = round_rne_fp_full(input[idx], man_width, exp_width);
+}
+
+
+__global__ void round_int_kernel(
+    const float* __restrict__ input,
+    float* __restrict__ output,
+    int64_t numel,
+    int bit_width
+){
+    int64_t idx = (int64_t)blockIdx.x * blockDim.x + threadIdx.x;
+
+    if (idx >= numel) return;
+
+    output[idx] = round_rne_int(input[idx], bit_width);
+}
+
+
+// Elementwise wrappers exposing the device rounding functions, used to check
+// them against the reference vectors in tb/vectors.
+torch::Tensor round_fp(torch::Tensor input, int man_width, int exp_width){
+    auto input_flat = input.contiguous().to(torch::kFloat);
+    torch::Tensor output = torch::empty_like(input_flat);
+
+    int64_t numel = input_flat.numel();
+
+    dim3 block_dim(TILE_SIZE_ROUND);
+    dim3 grid_dim((numel + TILE_SIZE_ROUND - 1) / TILE_SIZE_ROUND);
+
+    if (numel > 0){
+        round_fp_kernel<<<grid_dim, block_dim>>>(
+            input_flat.data_ptr<float>(),
+            output.data_ptr<float>(),
+            numel,
+            man_width,
+            exp_width
+        );
+    }
+
+    return output;
+}
+
+
+torch::Tensor round_int(torch::Tensor input, int bit_width){
+    auto input_flat = input.contiguous().to(torch::kFloat);
+    torch::Tensor output = torch::empty_like(input_flat);
+
+    int64_t numel = input_flat.numel();
+
+    dim3 block_dim(TILE_SIZE_ROUND);
+    dim3 grid_dim((numel + TILE_SIZE_ROUND - 1) / TILE_SIZE_ROUND);
+
+    if (numel > 0){
+        round_int_kernel<<<grid_dim, block_dim>>>(
+            input_flat.data_ptr<float>(),
+            output.data_ptr<float>(),
+            numel,
+            bit_width
+        );
+    }
+
+    return output;
+}
+
+
+#endif // ROUND_TENSOR_CUH
@@ -14,6 +14,8 @@ setup(
             depends=[
                 "ordmm_chunk_bcast_scaled.cuh",
                 "ordacc_chunk.cuh",
+                "round_fp.cuh",
+                "round_fp_tensor.cuh",
             ],
             extra_compile_args={
                 "cxx": ["-O3"],
@@ -0,0 +1,48 @@
+import torch
+
+
+def read_status_kb(field):
+    """ A field of /proc/self/status in kB, None if unavailable (Linux only). """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak(device):
+    """
+    Resets the memory high-water mark of device, returns the current usage in
+    bytes (None if unsupported): the allocated CUDA memory, or the process RSS
+    on CPU, where writing 5 to clear_refs resets VmHWM to it (Linux only).
+    """
+    if device.type == "cuda":
+        torch.cuda.reset_peak_memory_stats(device)
+        return torch.cuda.memory_allocated(device)
+
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return None
+    rss = read_status_kb("VmRSS")
+    return rss * 1024 if rss is not None else None
+
+
+def peak_growth(device, base):
+    """
+    Growth of the high-water mark since reset_peak() returned base, in bytes:
+    of the CUDA allocator, or of the process peak RSS on CPU. base is read
+    just after VmHWM was reset and the RSS can grow in between, so the CPU
+    growth is clamped at 0.
+    """
+    if base is None:
+        return None
+    if device.type == "cuda":
+        return torch.cuda.max_memory_allocated(device) - base
+
+    hwm = read_status_kb("VmHWM")
+    return max(hwm * 1024 - base, 0) if hwm is not None else None
@@ -6,7 +6,27 @@ import torch.nn.functional as F
 from transformers.models.llama.modeling_llama import LlamaAttention, Cache, logger, repeat_kv, apply_rotary_pos_emb
 
 from .quant_utils import q_reg, MXFPQuantizer
-from ordmm import ordmm_chunk_bcast_scaled, ordacc_chunk_scaled
+from . import ordmm_ref
+from .profiling import NULL_STAGE
+
+try:
+    import ordmm
+except ImportError:
+    ordmm = None
+
+
+def ordmm_chunk_bcast_scaled(input, *args):
+    ''' CUDA kernel for GPU tensors, the PyTorch reference otherwise or if ordmm is not built. '''
+    if ordmm is not None and input.is_cuda:
+        return ordmm.ordmm_chunk_bcast_scaled(input, *args)
+    return ordmm_ref.ordmm_chunk_bcast_scaled(input, *args)
+
+
+def ordacc_chunk_scaled(input, *args):
+    ''' CUDA kernel for GPU tensors, the PyTorch reference otherwise or if ordmm is not built. '''
+    if ordmm is not None and input.is_cuda:
+        return ordmm.ordacc_chunk_scaled(input, *args)
+    return ordmm_ref.ordacc_chunk_scaled(input, *args)
 
 
 
@@ -36,6 +56,37 @@ class QuantLlamaAttention(nn.Module):
 
         self.rotary_emb = orig_attn.rotary_emb
 
+        # Opt-in AttentionProfiler, see profiling.attach_profiler
+        self.profiler = None
+
+        self.set_q_config(q_config)
+
+    @classmethod
+    def from_states(cls, head_dim, num_key_value_groups=1, q_config={}):
+        ''' Only the quant_attention path, for cached post-RoPE Q/K/V states without the projections. '''
+        attn = cls.__new__(cls)
+        nn.Module.__init__(attn)
+        attn.head_dim = head_dim
+        attn.num_key_value_groups = num_key_value_groups
+        attn.attention_dropout = 0.0
+        attn.layer_idx = None
+        attn.profiler = None
+        attn.set_q_config(q_config)
+        return attn
+
+    def _stage(self, name, tensor):
+        ''' Profiled region of this layer, a no-op without a profiler. '''
+        if self.profiler is None:
+            return NULL_STAGE
+        return self.profiler.stage(self.layer_idx, name, tensor.device)
+
+    def set_q_config(self, q_config):
+        ''' (Re)configure quantizers and summation methods, keeping the projections. '''
+
+        for name in ['k_quantizer', 's_quantizer', 'v_quantizer']:
+            if hasattr(self, name):
+                delattr(self, name)
+
         # Use CLI quantizer configs if available
         self.init_quantizers(q_config)
 
@@ -63,160 +114,214 @@ class QuantLlamaAttention(nn.Module):
             quant_type = q_config['v_quantizer'].pop('quant')
             self.v_quantizer = q_reg[quant_type](**q_config['v_quantizer'])
 
-    def forward(
-        self,
-        hidden_states: torch.Tensor,
-        attention_mask: Optional[torch.Tensor] = None,
-        position_ids: Optional[torch.LongTensor] = None,
-        past_key_value: Optional[Cache] = None,
-        output_attentions: bool = False,
-        use_cache: bool = False,
-        cache_position: Optional[torch.LongTensor] = None,
-        position_embeddings: Optional[Tuple[torch.Tensor, torch.Tensor]] = None,  # will become mandatory in v4.45
-        **kwargs,
-    ) -> Tuple[torch.Tensor, Optional[torch.Tensor], Optional[Tuple[torch.Tensor]]]:
+    def project_qkv(self, hidden_states, position_ids=None, past_key_value=None, cache_position=None, position_embeddings=None):
+        ''' Q/K/V projections followed by RoPE, returns [B,H,S,D] states. '''
         bsz, q_len, _ = hidden_states.size()
 
-        if self.config.pretraining_tp > 1:
-            key_value_slicing = (self.num_key_value_heads * self.head_dim) // self.config.pretraining_tp
-            query_slices = self.q_proj.weight.split(
-                (self.num_heads * self.head_dim) // self.config.pretraining_tp, dim=0
-            )
-            key_slices = self.k_proj.weight.split(key_value_slicing, dim=0)
-            value_slices = self.v_proj.weight.split(key_value_slicing, dim=0)
+        with self._stage("qkv_proj", hidden_states):
+            if self.config.pretraining_tp > 1:
+                key_value_slicing = (self.num_key_value_heads * self.head_dim) // self.config.pretraining_tp
+                query_slices = self.q_proj.weight.split(
+                    (self.num_heads * self.head_dim) // self.config.pretraining_tp, dim=0
+                )
+                key_slices = self.k_proj.weight.split(key_value_slicing, dim=0)
+                value_slices = self.v_proj.weight.split(key_value_slicing, dim=0)
 
-            query_states = [F.linear(hidden_states, query_slices[i]) for i in range(self.config.pretraining_tp)]
-            query_states = torch.cat(query_states, dim=-1)
+                query_states = [F.linear(hidden_states, query_slices[i]) for i in range(self.config.pretraining_tp)]
+                query_states = torch.cat(query_states, dim=-1)
 
-            key_states = [F.linear(hidden_states, key_slices[i]) for i in range(self.config.pretraining_tp)]
-            key_states = torch.cat(key_states, dim=-1)
+                key_states = [F.linear(hidden_states, key_slices[i]) for i in range(self.config.pretraining_tp)]
+                key_states = torch.cat(key_states, dim=-1)
 
-            value_states = [F.linear(hidden_states, value_slices[i]) for i in range(self.config.pretraining_tp)]
-            value_states = torch.cat(value_states, dim=-1)
+                value_states = [F.linear(hidden_states, value_slices[i]) for i in range(self.config.pretraining_tp)]
+                value_states = torch.cat(value_states, dim=-1)
 
-        else:
-            query_states = self.q_proj(hidden_states)
-            key_states = self.k_proj(hidden_states)
-            value_states = self.v_proj(hidden_states)
-
-        query_states = query_states.view(bsz, q_len, self.num_heads, self.head_dim).transpose(1, 2)
-        key_states = key_states.view(bsz, q_len, self.num_key_value_heads, self.head_dim).transpose(1, 2)
-        value_states = value_states.view(bsz, q_len, self.num_key_value_heads, self.head_dim).transpose(1, 2)
-
-        if position_embeddings is None:
-            logger.warning_once(
-                "The attention layers in this model are transitioning from computing the RoPE embeddings internally "
-                "through `position_ids` (2D tensor with the indexes of the tokens), to using externally computed "
-                "`position_embeddings` (Tuple of tensors, containing cos and sin). In v4.45 `position_ids` will be "
-                "removed and `position_embeddings` will be mandatory."
-            )
-            cos, sin = self.rotary_emb(value_states, position_ids)
-        else:
-            cos, sin = position_embeddings
-        query_states, key_states = apply_rotary_pos_emb(query_states, key_states, cos, sin)
+            else:
+                query_states = self.q_proj(hidden_states)
+                key_states = self.k_proj(hidden_states)
+                value_states = self.v_proj(hidden_states)
+
+            query_states = query_states.view(bsz, q_len, self.num_heads, self.head_dim).transpose(1, 2)
+            key_states = key_states.view(bsz, q_len, self.num_key_value_heads, self.head_dim).transpose(1, 2)
+            value_states = value_states.view(bsz, q_len, self.num_key_value_heads, self.head_dim).transpose(1, 2)
+
+        with self._stage("rope", hidden_states):
+            if position_embeddings is None:
+                logger.warning_once(
+                    "The attention layers in this model are transitioning from computing the RoPE embeddings internally "
+                    "through `position_ids` (2D tensor with the indexes of the tokens), to using externally computed "
+                    "`position_embeddings` (Tuple of tensors, containing cos and sin). In v4.45 `position_ids` will be "
+                    "removed and `position_embeddings` will be mandatory."
+                )
+                cos, sin = self.rotary_emb(value_states, position_ids)
+            else:
+                cos, sin = position_embeddings
+            query_states, key_states = apply_rotary_pos_emb(query_states, key_states, cos, sin)
 
         if past_key_value is not None:
             # sin and cos are specific to RoPE models; cache_position needed for the static cache
-            cache_kwargs = {"sin": sin, "cos": cos, "cache_position": cache_position}
-            key_states, value_states = past_key_value.update(key_states, value_states, self.layer_idx, cache_kwargs)
+            with self._stage("kv_cache", hidden_states):
+                cache_kwargs = {"sin": sin, "cos": cos, "cache_position": cache_position}
+                key_states, value_states = past_key_value.update(key_states, value_states, self.layer_idx, cache_kwargs)
+
+        return query_states, key_states, value_states
 
-        key_states = repeat_kv(key_states, self.num_key_value_groups)
-        value_states = repeat_kv(value_states, self.num_key_value_groups)
+    def quant_attention(self, query_states, key_states, value_states, attention_mask=None):
+        ''' Quantized Q*K^T, softmax and P*V on projected states. '''
+        with self._stage("repeat_kv", query_states):
+            key_states = repeat_kv(key_states, self.num_key_value_groups)
+            value_states = repeat_kv(value_states, self.num_key_value_groups)
 
         # Quantize keys and queries
         if hasattr(self, "k_quantizer"):
-            key_states = self.k_quantizer(key_states)
-            query_states = self.k_quantizer(query_states)
+            with self._stage("k_quantizer", query_states):
+                key_states = self.k_quantizer(key_states)
+                query_states = self.k_quantizer(query_states)
 
             if (self.sum_type_attn_s == 'KULISCH') or (type(self.k_quantizer) != MXFPQuantizer):
-                attn_weights = torch.matmul(query_states, key_states.transpose(2, 3)) / math.sqrt(self.head_dim)
+                with self._stage("qk_matmul", query_states):
+                    attn_weights = torch.matmul(query_states, key_states.transpose(2, 3)) / math.sqrt(self.head_dim)
             else:
-                k_scale = self.k_quantizer.dynamic_scale(key_states)
-                q_scale = self.k_quantizer.dynamic_scale(query_states)
-                k_quant = key_states / k_scale
-                q_quant = query_states / q_scale
-                exp_ext = torch.ceil(torch.log2(torch.ceil(torch.log2(torch.tensor(self.k_quantizer.group_size))) + (2 ** self.k_quantizer.exp_w - 1))) + 1
-                attn_weights = ordmm_chunk_bcast_scaled(q_quant,
-                    k_quant,
-                    q_scale,
-                    k_scale,
-                    self.k_quantizer.man_w,
-                    min(self.k_quantizer.exp_w + exp_ext, 7),
-                    self.k_quantizer.group_size,
-                    self.sum_type_attn_s
-                ) / math.sqrt(self.head_dim)
+                with self._stage("qk_scales", query_states):
+                    k_scale = self.k_quantizer.dynamic_scale(key_states)
+                    q_scale = self.k_quantizer.dynamic_scale(query_states)
+                    k_quant = key_states / k_scale
+                    q_quant = query_states / q_scale
+                    exp_ext = torch.ceil(torch.log2(torch.ceil(torch.log2(torch.tensor(self.k_quantizer.group_size))) + (2 ** self.k_quantizer.exp_w - 1))) + 1
+                with self._stage("qk_ordmm", query_states):
+                    attn_weights = ordmm_chunk_bcast_scaled(q_quant,
+                        k_quant,
+                        q_scale,
+                        k_scale,
+                        self.k_quantizer.man_w,
+                        min(self.k_quantizer.exp_w + exp_ext, 7),
+                        self.k_quantizer.group_size,
+                        self.sum_type_attn_s
+                    ) / math.sqrt(self.head_dim)
         else:
-            attn_weights = torch.matmul(query_states, key_states.transpose(2, 3)) / math.sqrt(self.head_dim)
+            with self._stage("qk_matmul", query_states):
+                attn_weights = torch.matmul(query_states, key_states.transpose(2, 3)) / math.sqrt(self.head_dim)
 
         # Quantize attention scores to arbitrary FP, no scales
         if hasattr(self, "s_quantizer"):
-            self.s_quantizer.static_scale = True
-            self.s_quantizer.calibrated = True
-            self.s_quantizer.scale_calib = torch.tensor(1)
-            attn_weights = self.s_quantizer(attn_weights)
-
-        if attention_mask is not None:  # no matter the length, we just slice it
-            causal_mask = attention_mask[:, :, :, : key_states.shape[-2]]
-            attn_weights = attn_weights + causal_mask
-
-        # Step 0: cast to float32
-        x = attn_weights.to(torch.float32)
-        # Step 1: subtract max for numerical stability
-        x = x - x.max(dim=-1, keepdim=True).values
-        # Step 2: exponentiate
-        exp_x = torch.exp(x)
+            with self._stage("s_quantizer", attn_weights):
+                self.s_quantizer.static_scale = True
+                self.s_quantizer.calibrated = True
+                self.s_quantizer.scale_calib = torch.tensor(1)
+                attn_weights = self.s_quantizer(attn_weights)
+
+        with self._stage("softmax_exp", attn_weights):
+            if attention_mask is not None:  # no matter the length, we just slice it
+                causal_mask = attention_mask[:, :, :, : key_states.shape[-2]]
+                attn_weights = attn_weights + causal_mask
+
+            # Step 0: cast to float32
+            x = attn_weights.to(torch.float32)
+            # Step 1: subtract max for numerical stability
+            x = x - x.max(dim=-1, keepdim=True).values
+            # Step 2: exponentiate
+            exp_x = torch.exp(x)
         # Step 3: sum
         if hasattr(self, "v_quantizer"):
-            exp_x = self.v_quantizer(exp_x)
+            with self._stage("v_quantizer_exp", exp_x):
+                exp_x = self.v_quantizer(exp_x)
 
             if (self.sum_type_smax == 'KULISCH') or (type(self.v_quantizer) != MXFPQuantizer):
-                sum_exp_x = exp_x.sum(dim=-1, keepdim=True)
+                with self._stage("softmax_sum", exp_x):
+                    sum_exp_x = exp_x.sum(dim=-1, keepdim=True)
             else:
-                e_scale = self.v_quantizer.dynamic_scale(exp_x)
-                e_quant = exp_x / e_scale
-                exp_ext = torch.ceil(torch.log2(torch.ceil(torch.log2(torch.tensor(self.v_quantizer.group_size))) + (2 ** self.v_quantizer.exp_w - 1)))
-                sum_exp_x = ordacc_chunk_scaled(e_quant,
-                    e_scale,
-                    self.v_quantizer.man_w,
-                    min(self.v_quantizer.exp_w + exp_ext, 7),
-                    self.v_quantizer.group_size,
-                    self.sum_type_smax
-                ).unsqueeze(-1)
+                with self._stage("softmax_scales", exp_x):
+                    e_scale = self.v_quantizer.dynamic_scale(exp_x)
+                    e_quant = exp_x / e_scale
+                    exp_ext = torch.ceil(torch.log2(torch.ceil(torch.log2(torch.tensor(self.v_quantizer.group_size))) + (2 ** self.v_quantizer.exp_w - 1)))
+                with self._stage("softmax_ordacc", exp_x):
+                    sum_exp_x = ordacc_chunk_scaled(e_quant,
+                        e_scale,
+                        self.v_quantizer.man_w,
+                        min(self.v_quantizer.exp_w + exp_ext, 7),
+                        self.v_quantizer.group_size,
+                        self.sum_type_smax
+                    ).unsqueeze(-1)
         else:
-            sum_exp_x = exp_x.sum(dim=-1, keepdim=True)
-        # Step 4: normalize
-        softmax_x = exp_x / sum_exp_x
-        # Step 5: cast back
-        attn_weights = softmax_x.to(query_states.dtype)
+            with self._stage("softmax_sum", exp_x):
+                sum_exp_x = exp_x.sum(dim=-1, keepdim=True)
+        with self._stage("softmax_norm", exp_x):
+            # Step 4: normalize
+            softmax_x = exp_x / sum_exp_x
+            # Step 5: cast back
+            attn_weights = softmax_x.to(query_states.dtype)
 
-        # upcast attention to fp32
-        attn_weights = nn.functional.dropout(attn_weights, p=self.attention_dropout, training=self.training)
+            # upcast attention to fp32
+            attn_weights = nn.functional.dropout(attn_weights, p=self.attention_dropout, training=self.training)
 
         # Quantize values
         if hasattr(self, "v_quantizer"):
-            attn_weights = self.v_quantizer(attn_weights)
-            value_states = self.v_quantizer(value_states.transpose(-1,-2)).transpose(-1,-2)
+            with self._stage("v_quantizer_pv", attn_weights):
+                attn_weights = self.v_quantizer(attn_weights)
+                value_states = self.v_quantizer(value_states.transpose(-1,-2)).transpose(-1,-2)
 
             if (self.sum_type_attn_o == 'KULISCH') or (type(self.v_quantizer) != MXFPQuantizer):
-                attn_output = torch.matmul(attn_weights, value_states)
+                with self._stage("pv_matmul", attn_weights):
+                    attn_output = torch.matmul(attn_weights, value_states)
             else:
-                p_scale = self.v_quantizer.dynamic_scale(attn_weights)
-                v_scale = self.v_quantizer.dynamic_scale(value_states.transpose(-1,-2))
-                p_quant = attn_weights / p_scale
-                v_quant = value_states.transpose(-1,-2) / v_scale
-                exp_ext = torch.ceil(torch.log2(torch.ceil(torch.log2(torch.tensor(self.v_quantizer.group_size))) + (2 ** self.v_quantizer.exp_w - 1))) + 1
-                attn_output = ordmm_chunk_bcast_scaled(
-                    p_quant,
-                    v_quant,
-                    p_scale,
-                    v_scale,
-                    self.v_quantizer.man_w,
-                    min(self.v_quantizer.exp_w + exp_ext, 7),
-                    self.v_quantizer.group_size,
-                    self.sum_type_attn_o
-                ).to(attn_weights.dtype)
+                with self._stage("pv_scales", attn_weights):
+                    p_scale = self.v_quantizer.dynamic_scale(attn_weights)
+                    v_scale = self.v_quantizer.dynamic_scale(value_states.transpose(-1,-2))
+                    p_quant = attn_weights / p_scale
+                    v_quant = value_states.transpose(-1,-2) / v_scale
+                    exp_ext = torch.ceil(torch.log2(torch.ceil(torch.log2(torch.tensor(self.v_quantizer.group_size))) + (2 ** self.v_quantizer.exp_w - 1))) + 1
+                with self._stage("pv_ordmm", attn_weights):
+                    attn_output = ordmm_chunk_bcast_scaled(
+                        p_quant,
+                        v_quant,
+                        p_scale,
+                        v_scale,
+                        self.v_quantizer.man_w,
+                        min(self.v_quantizer.exp_w + exp_ext, 7),
+                        self.v_quantizer.group_size,
+                        self.sum_type_attn_o
+                    ).to(attn_weights.dtype)
         else:
-            attn_output = torch.matmul(attn_weights, value_states)
+            with self._stage("pv_matmul", attn_weights):
+                attn_output = torch.matmul(attn_weights, value_states)
+
+        return attn_output, attn_weights
+
+    def project_output(self, attn_output, bsz, q_len):
+        ''' Merge heads and apply the output projection. '''
+        with self._stage("o_proj", attn_output):
+            attn_output = attn_output.transpose(1, 2).contiguous()
+
+            attn_output = attn_output.reshape(bsz, q_len, -1)
+
+            if self.config.pretraining_tp > 1:
+                attn_output = attn_output.split(self.hidden_size // self.config.pretraining_tp, dim=2)
+                o_proj_slices = self.o_proj.weight.split(self.hidden_size // self.config.pretraining_tp, dim=1)
+                attn_output = sum([F.linear(attn_output[i], o_proj_slices[i]) for i in range(self.config.pretraining_tp)])
+            else:
+                attn_output = self.o_proj(attn_output)
+
+        return attn_output
+
+    def forward(
+        self,
+        hidden_states: torch.Tensor,
+        attention_mask: Optional[torch.Tensor] = None,
+        position_ids: Optional[torch.LongTensor] = None,
+        past_key_value: Optional[Cache] = None,
+        output_attentions: bool = False,
+        use_cache: bool = False,
+        cache_position: Optional[torch.LongTensor] = None,
+        position_embeddings: Optional[Tuple[torch.Tensor, torch.Tensor]] = None,  # will become mandatory in v4.45
+        **kwargs,
+    ) -> Tuple[torch.Tensor, Optional[torch.Tensor], Optional[Tuple[torch.Tensor]]]:
+        bsz, q_len, _ = hidden_states.size()
+
+        query_states, key_states, value_states = self.project_qkv(
+            hidden_states, position_ids, past_key_value, cache_position, position_embeddings
+        )
+
+        attn_output, attn_weights = self.quant_attention(query_states, key_states, value_states, attention_mask)
 
         if attn_output.size() != (bsz, self.num_heads, q_len, self.head_dim):
             raise ValueError(
@@ -224,19 +329,74 @@ class QuantLlamaAttention(nn.Module):
                 f" {attn_output.size()}"
             )
 
-        attn_output = attn_output.transpose(1, 2).contiguous()
-
-        attn_output = attn_output.reshape(bsz, q_len, -1)
-
-        if self.config.pretraining_tp > 1:
-            attn_output = attn_output.split(self.hidden_size // self.config.pretraining_tp, dim=2)
-            o_proj_slices = self.o_proj.weight.split(self.hidden_size // self.config.pretraining_tp, dim=1)
-            attn_output = sum([F.linear(attn_output[i], o_proj_slices[i]) for i in range(self.config.pretraining_tp)])
-        else:
-            attn_output = self.o_proj(attn_output)
+        attn_output = self.project_output(attn_output, bsz, q_len)
 
         if not output_attentions:
             attn_weights = None
 
         return attn_output, attn_weights, past_key_value
 
+
+
+def split_configs(t, num_configs):
+    ''' Split a config-stacked tensor along dim 0, broadcasting batch-1 tensors. '''
+    if t is None or t.size(0) == 1:
+        return [t] * num_configs
+    return t.chunk(num_configs, dim=0)
+
+
+class MultiQuantLlamaAttention(nn.Module):
+    """
+    Evaluates several quantizer/accumulator configurations in one forward pass.
+    The batch holds one copy of the inputs per configuration stacked along dim 0,
+    slice i is handled by the QuantLlamaAttention built from q_configs[i].
+    """
+    def __init__(self, orig_attn: LlamaAttention, q_configs=[]):
+        super().__init__()
+        if len(q_configs) == 0:
+            raise ValueError("MultiQuantLlamaAttention needs at least one quantizer config.")
+
+        # Branches share the projection weights of orig_attn, only quantizers differ
+        self.branches = nn.ModuleList([QuantLlamaAttention(orig_attn, q_config) for q_config in q_configs])
+        self.num_configs = len(self.branches)
+
+    def forward(
+        self,
+        hidden_states: torch.Tensor,
+        attention_mask: Optional[torch.Tensor] = None,
+        position_ids: Optional[torch.LongTensor] = None,
+        past_key_value: Optional[Cache] = None,
+        output_attentions: bool = False,
+        use_cache: bool = False,
+        cache_position: Optional[torch.LongTensor] = None,
+        position_embeddings: Optional[Tuple[torch.Tensor, torch.Tensor]] = None,
+        **kwargs,
+    ) -> Tuple[torch.Tensor, Optional[torch.Tensor], Optional[Tuple[torch.Tensor]]]:
+        bsz, q_len, _ = hidden_states.size()
+        if bsz % self.num_configs != 0:
+            raise ValueError(f"Batch size {bsz} is not a multiple of the number of configs {self.num_configs}.")
+
+        # Projections and RoPE are config independent, run them once on the stacked batch
+        query_states, key_states, value_states = self.branches[0].project_qkv(
+            hidden_states, position_ids, past_key_value, cache_position, position_embeddings
+        )
+
+        outputs = []
+        weights = []
+        for branch, q, k, v, mask in zip(
+            self.branches,
+            split_configs(query_states, self.num_configs),
+            split_configs(key_states, self.num_configs),
+            split_configs(value_states, self.num_configs),
+            split_configs(attention_mask, self.num_configs),
+        ):
+            attn_output, attn_weights = branch.quant_attention(q, k, v, mask)
+            outputs.append(attn_output)
+            weights.append(attn_weights)
+
+        attn_output = torch.cat(outputs, dim=0)
+        attn_output = self.branches[0].project_output(attn_output, bsz, q_len)
+
+        attn_weights = torch.cat(weights, dim=0) if output_attentions else None
+
+        return attn_output, attn_weights, past_key_value
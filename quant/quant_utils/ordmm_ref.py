@@ -0,0 +1,264 @@
+import torch
+
+
+
+# Chunk length of the ordered sums in ordacc_chunk.cuh
+ROUND_INTERVAL = 32
+
+
+def _round_rne_fp_subnormal(x, man_width, exp_width):
+    """ Bit-level rounding with a per-element shift, needed for subnormals. """
+    bits = x.to(torch.float32).contiguous().view(torch.int32).to(torch.int64) & 0xFFFFFFFF
+    sign = bits & 0x80000000
+    exp = (bits >> 23) & 0xFF
+    man = bits & 0x007FFFFF
+
+    max_exp = (1 << (exp_width - 1)) + 127
+    min_exp = -max_exp + 2 + 127 + 127
+    man_dif = 23 - man_width
+    max_bits = sign | (max_exp << 23) | (((1 << man_width) - 1) << man_dif)
+
+    # Subnormals drop more mantissa bits the further the exponent sits below min_exp
+    subnormal = exp < min_exp
+    man_shift = torch.where(subnormal, man_dif + min_exp - exp, torch.full_like(exp, man_dif)).clamp(1, 24)
+    one = torch.ones_like(man_shift)
+
+    round_bit = man & torch.bitwise_left_shift(one, man_shift - 1)
+    sticky_bits = man & (torch.bitwise_left_shift(one, man_shift) - 1) >> 1
+    man = torch.bitwise_left_shift(torch.bitwise_right_shift(man, man_shift), man_shift)
+
+    round_up = (round_bit != 0) & ((sticky_bits != 0) | ((man & torch.bitwise_left_shift(one, man_shift)) != 0))
+    man = torch.where(round_up, man + torch.bitwise_left_shift(one, man_shift), man)
+
+    # Mantissa overflow bumps the exponent
+    man_ofl = (man & 0x00800000) != 0
+    rnd_exp = torch.where(man_ofl, exp + 1, exp)
+    man = torch.where(man_ofl, torch.zeros_like(man), man)
+
+    out = sign | (rnd_exp << 23) | man
+    out = torch.where(subnormal & (rnd_exp < min_exp - man_width), sign, out)
+    out = torch.where(~subnormal & (rnd_exp > max_exp), max_bits, out)
+
+    # Range checks on the unrounded exponent come first in the kernel
+    out = torch.where(exp < min_exp - man_width - 1, sign, out)
+    out = torch.where(exp > max_exp, max_bits, out)
+
+    out = torch.where(out >= 1 << 31, out - (1 << 32), out)
+    return out.to(torch.int32).view(torch.float32)
+
+
+def _round_rne_fp_subnormal_fast(bits, abs_bits, man_width, min_exp):
+    """
+    Subnormal rounding of every element as bits, for the caller to select
+    from. Subnormals share one quantum q, so they round to nearest even as
+    round(x / q) * q, except where the kernel drops the hidden bit: below q
+    they flush to zero and a tie at 1.5 q rounds down.
+    """
+    quantum_bits = (min_exp - man_width) << 23
+    quantum = 2.0 ** (min_exp - 127 - man_width)
+    values = bits.view(torch.float32)
+    out = (torch.round(values * (1 / quantum)) * quantum).view(torch.int32)
+    out &= ((quantum_bits - 1 - abs_bits) >> 31) | -(1 << 31)
+
+    tie = abs_bits == quantum_bits | (1 << 22)
+    if tie.any():
+        out[tie] = quantum_bits | (bits[tie] & -(1 << 31))
+    return out
+
+
+def round_rne_fp_full(x: torch.Tensor, man_width: int, exp_width: int) -> torch.Tensor:
+    """
+    Port of round_rne_fp_full in quant_acc/round_fp.cuh: rounds float32 values
+    to nearest even with man_width mantissa and exp_width exponent bits,
+    saturating on overflow and flushing below the subnormal range.
+    """
+    bits = x.to(torch.float32).contiguous().view(torch.int32)
+    abs_bits = bits & 0x7FFFFFFF
+
+    max_exp = (1 << (exp_width - 1)) + 127
+    min_exp = -max_exp + 2 + 127 + 127
+    man_dif = 23 - man_width
+    max_bits = (max_exp << 23) | (((1 << man_width) - 1) << man_dif)
+    # Magnitudes below this flush to zero, below min_exp << 23 they are subnormal
+    flush_bits = (min_exp - man_width - 1) << 23
+
+    # Normal values share one shift, so add-and-mask rounds to nearest even and
+    # a mantissa carry bumps the exponent. Like the kernel, the even bit is
+    # taken from the mantissa field only. Everything above max_bits saturates,
+    # clamping first also keeps the addition from overflowing on NaN and inf.
+    # Masks are built from sign bits, torch.where is several times slower on CPU.
+    out = abs_bits.clamp(max=max_bits)
+    if man_dif < 23:
+        out += (out >> man_dif) & 1
+    out += (1 << (man_dif - 1)) - 1
+    out &= ~((1 << man_dif) - 1)
+    out.clamp_(max=max_bits)
+    if flush_bits > 0:
+        out &= (flush_bits - 1 - abs_bits) >> 31
+    out |= bits & -(1 << 31)
+    out = out.view(torch.float32)
+
+    subnormal = (abs_bits < min_exp << 23) & (abs_bits >= flush_bits)
+    if subnormal.any():
+        # The quantum and its inverse must be normal float32 values
+        if not 1 <= man_width < min_exp:
+            out[subnormal] = _round_rne_fp_subnormal(x.to(torch.float32)[subnormal], man_width, exp_width)
+        else:
+            sub_bits = _round_rne_fp_subnormal_fast(bits, abs_bits, man_width, min_exp)
+            out_bits = out.view(torch.int32)
+            out_bits ^= (out_bits ^ sub_bits) & -subnormal.to(torch.int32)
+
+    return out
+
+
+def _ordered_sum(terms, man_width, exp_width, sum_type, round_terms):
+    """
+    One chunk of the kernels' ordered accumulation over an iterable of float32
+    tensors, rounding after every operation. Returns the chunk value before
+    it is scaled into the outer float sum.
+    """
+    rnd = lambda v: round_rne_fp_full(v, man_width, exp_width)
+
+    def err(a, b, s):
+        # Error term of s = a + b, ordered by magnitude as in the kernels. The
+        # operands are swapped by bit masks first, so only one branch is rounded
+        swap = -(a.abs() < b.abs()).to(torch.int32)
+        a_bits, b_bits = a.view(torch.int32), b.view(torch.int32)
+        diff = (a_bits ^ b_bits) & swap
+        big, small = (a_bits ^ diff).view(torch.float32), (b_bits ^ diff).view(torch.float32)
+        return rnd(rnd(big - s) + small)
+
+    acc = c = cs = ccs = None
+    for v in terms:
+        if acc is None:
+            acc, c, cs, ccs = (torch.zeros_like(v) for _ in range(4))
+
+        if sum_type == "QUANT":
+            acc = rnd(acc + v)
+            continue
+
+        if round_terms:
+            v = rnd(v)
+
+        if sum_type == "KAHAN":
+            y = rnd(v - c)
+            t = rnd(acc + y)
+            c = rnd(rnd(t - acc) - y)
+            acc = t
+        elif sum_type == "TWOSUM":
+            s = rnd(acc + v)
+            sum_p = rnd(s - v)
+            value_p = rnd(s - sum_p)
+            c = rnd(c + rnd(rnd(acc - sum_p) + rnd(v - value_p)))
+            acc = s
+        elif sum_type == "FASTTWOSUM":
+            s = rnd(acc + v)
+            z = rnd(s - acc)
+            c = rnd(c + rnd(v - z))
+            acc = s
+        elif sum_type == "NEUMAIER":
+            s = rnd(acc + v)
+            c = rnd(c + err(acc, v, s))
+            acc = s
+        elif sum_type == "KLEIN":
+            s = rnd(acc + v)
+            c = err(acc, v, s)
+            acc = s
+            t = rnd(cs + c)
+            cc = err(cs, c, t)
+            cs = t
+            ccs = rnd(ccs + cc)
+        else:
+            raise ValueError(f"sum_type has an invalid value: {sum_type}")
+
+    if sum_type in ["QUANT", "KAHAN"]:
+        return acc
+    if sum_type == "KLEIN":
+        return rnd(acc + rnd(cs + ccs))
+    return rnd(acc + c)
+
+
+# Elements per intermediate tensor when tiles are summed side by side, larger
+# reductions are split into groups of tiles to bound the memory
+MAX_TILE_ELEMENTS = 1 << 24
+
+
+def _sum_tiles(values, output):
+    """ Adds the scaled tile values [..., tiles] to output one tile after another, in float32 like the kernels. """
+    for tile in range(values.shape[-1]):
+        output += values[..., tile]
+    return output
+
+
+def ordmm_chunk_bcast_scaled(input, weight_tpose, scale_input, scale_weight_tpose, man_width, exp_width, tile_size=32, sum_type="QUANT"):
+    """
+    Reference of ordmm_chunk_bcast_scaled for CPU tensors: input [..., M, K]
+    times weight_tpose [..., N, K]^T with broadcast batch dimensions. Each
+    tile of K is summed in order with the given method and scaled by the
+    scales at its first element, tiles are summed in float32. Tiles are
+    independent, so all of them step through their tile_size terms at once.
+    """
+    # Widths may arrive as tensors, which the extension binding converts to int
+    man_width, exp_width, tile_size = int(man_width), int(exp_width), int(tile_size)
+    if tile_size not in [2, 4, 8, 16, 32]:
+        raise ValueError("tile_size must be one of {2, 4, 8, 16, 32}")
+
+    batch_shape = torch.broadcast_shapes(input.shape[:-2], weight_tpose.shape[:-2])
+    a = input.to(weight_tpose.dtype).expand(*batch_shape, *input.shape[-2:])
+    b = weight_tpose.expand(*batch_shape, *weight_tpose.shape[-2:])
+    a_scale = scale_input.to(torch.float32).expand(*batch_shape, *input.shape[-2:])
+    b_scale = scale_weight_tpose.to(torch.float32).expand(*batch_shape, *weight_tpose.shape[-2:])
+
+    # The kernel pads partial tiles with zeros
+    reduce_dim = a.shape[-1]
+    num_tiles = -(-reduce_dim // tile_size)
+    pad = num_tiles * tile_size - reduce_dim
+    if pad:
+        a = torch.nn.functional.pad(a, (0, pad))
+        b = torch.nn.functional.pad(b, (0, pad))
+
+    output = torch.zeros(*batch_shape, a.shape[-2], b.shape[-2], dtype=torch.float32, device=input.device)
+    group = max(1, MAX_TILE_ELEMENTS // max(output.numel(), 1))
+
+    for first in range(0, num_tiles, group):
+        tiles = slice(first * tile_size, min(first + group, num_tiles) * tile_size)
+        a_tiles, b_tiles = a[..., tiles], b[..., tiles]
+
+        # Term j of every tile, formed in the input dtype and widened: [..., M, N, tiles]
+        terms = ((a_tiles[..., :, None, j::tile_size] * b_tiles[..., None, :, j::tile_size]).to(torch.float32) for j in range(tile_size))
+        value = _ordered_sum(terms, man_width, exp_width, sum_type, round_terms=True)
+        scale = a_scale[..., tiles][..., :, None, ::tile_size] * b_scale[..., tiles][..., None, :, ::tile_size]
+        _sum_tiles(value * scale, output)
+
+    return output
+
+
+def ordacc_chunk_scaled(input, scale_input, man_width, exp_width, group_size=32, sum_type="QUANT"):
+    """
+    Reference of ordacc_chunk_scaled for CPU tensors: ordered sums over the
+    last dimension in chunks of ROUND_INTERVAL, each chunk scaled by the
+    scale at its last element and summed in float32. Full chunks are summed
+    side by side, a partial last chunk on its own since the kernel does not
+    pad it.
+    """
+    man_width, exp_width = int(man_width), int(exp_width)
+    scale_input = scale_input.to(torch.float32).expand_as(input)
+    reduce_dim = input.shape[-1]
+    output = torch.zeros(input.shape[:-1], dtype=torch.float32, device=input.device)
+
+    full = reduce_dim // ROUND_INTERVAL * ROUND_INTERVAL
+    group = max(1, MAX_TILE_ELEMENTS // max(output.numel(), 1)) * ROUND_INTERVAL
+
+    for first in range(0, full, group):
+        chunks = slice(first, min(first + group, full))
+        x = input[..., chunks]
+        terms = (x[..., j::ROUND_INTERVAL].to(torch.float32) for j in range(ROUND_INTERVAL))
+        value = _ordered_sum(terms, man_width, exp_width, sum_type, round_terms=False)
+        _sum_tiles(value * scale_input[..., chunks][..., ROUND_INTERVAL - 1::ROUND_INTERVAL], output)
+
+    if full < reduce_dim:
+        terms = (input[..., k].to(torch.float32) for k in range(full, reduce_dim))
+        value = _ordered_sum(terms, man_width, exp_width, sum_type, round_terms=False)
+        output += value * scale_input[..., reduce_dim - 1]
+
+    return output
@@ -2,9 +2,10 @@ from .quant_utils import Quantizer
 from copy import deepcopy
 
 
-def patch_bert_model(model, attn_block, quant_attn_block, q_config={}):
+def patch_bert_model(model, attn_block, quant_attn_block, q_config={}, layer_indices=None):
     """
     Replaces all instances of attn_block modules with quantized attention.
+    If layer_indices is given, only blocks whose layer_idx is listed are replaced.
     """
     quantizers = []
     thresholds = []
@@ -15,12 +16,12 @@ def patch_bert_model(model, attn_block, quant_attn_block, q_config={}):
             full_name = f"{parent_name}.{name}" if parent_name else name
             
             # Check if this module is an instance of attn_block
-            if isinstance(module, attn_block):
+            if isinstance(module, attn_block) and (layer_indices is None or getattr(module, 'layer_idx', None) in layer_indices):
                 # Create quantized version
                 quant_attn = quant_attn_block(module, deepcopy(q_config))
 
-                # Collect quantizers and thresholds
-                for child_name, child in quant_attn.named_children():
+                # Collect quantizers and thresholds (also inside multi-config branches)
+                for child_name, child in quant_attn.named_modules():
                     if 'thresh' in child_name:
                         thresholds.append(child)
                     elif isinstance(child, Quantizer):
@@ -37,3 +38,25 @@ def patch_bert_model(model, attn_block, quant_attn_block, q_config={}):
 
     print(f"Model patched with quantized attention. Total replacements: {len(quantizers) + len(thresholds)} quantizers found.")
     return model, quantizers, thresholds
+
+
+def repatch_model(model, quant_attn_block, q_config={}):
+    """
+    Swaps the quantizer config of already patched attention blocks in place,
+    avoiding a model reload between evaluations.
+    """
+    quantizers = []
+    thresholds = []
+
+    for module in model.modules():
+        if isinstance(module, quant_attn_block):
+            module.set_q_config(deepcopy(q_config))
+            module.to(next(module.parameters()).device)
+
+            for child_name, child in module.named_modules():
+                if 'thresh' in child_name:
+                    thresholds.append(child)
+                elif isinstance(child, Quantizer):
+                    quantizers.append(child)
+
+    return model, quantizers, thresholds
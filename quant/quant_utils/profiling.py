@@ -0,0 +1,146 @@
+import time
+
+import torch
+
+from .memory import reset_peak, peak_growth
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("profiler", "key", "device", "start", "start_event", "mem_base")
+
+    def __init__(self, profiler, key, device):
+        self.profiler = profiler
+        self.key = key
+        self.device = device
+
+    def __enter__(self):
+        self.mem_base = reset_peak(self.device)
+        if self.device.type == "cuda":
+            self.start_event = torch.cuda.Event(enable_timing=True)
+            self.start_event.record()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.start
+        events = None
+        if self.device.type == "cuda":
+            end_event = torch.cuda.Event(enable_timing=True)
+            end_event.record()
+            events = (self.start_event, end_event)
+        peak = peak_growth(self.device, self.mem_base)
+        self.profiler._add(self.key, wall, peak, events)
+        return False
+
+
+class AttentionProfiler:
+    """
+    Per-layer, per-stage timings of QuantLlamaAttention, aggregated over all
+    forward passes. Wall time is host time (on CUDA mostly kernel launches),
+    device time comes from CUDA events. Peak memory is the growth of the CUDA
+    allocator high-water mark, or of the process peak RSS on CPU.
+    """
+    # Pending CUDA events are resolved in batches to bound their number
+    MAX_PENDING_EVENTS = 4096
+
+    def __init__(self):
+        self.stats = {}
+        self.order = []
+        self._pending = []
+
+    def stage(self, layer_idx, name, device):
+        return _Stage(self, (layer_idx, name), torch.device(device))
+
+    def _add(self, key, wall, peak, events):
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = {"calls": 0, "wall_s": 0.0, "cuda_s": None, "peak_mem_bytes": None}
+            if key[1] not in self.order:
+                self.order.append(key[1])
+
+        stats["calls"] += 1
+        stats["wall_s"] += wall
+        if peak is not None:
+            stats["peak_mem_bytes"] = max(peak, stats["peak_mem_bytes"] or 0)
+        if events is not None:
+            self._pending.append((key, events))
+            if len(self._pending) >= self.MAX_PENDING_EVENTS:
+                self._resolve_events()
+
+    def _resolve_events(self):
+        if not self._pending:
+            return
+        torch.cuda.synchronize()
+        for key, (start, end) in self._pending:
+            stats = self.stats[key]
+            stats["cuda_s"] = (stats["cuda_s"] or 0.0) + start.elapsed_time(end) / 1e3
+        self._pending = []
+
+    def summary(self):
+        """ Stage totals over layers in forward order, {stage: {calls, wall_s, cuda_s, peak_mem_bytes}}. """
+        self._resolve_events()
+        totals = {}
+        for stage in self.order:
+            rows = [stats for (_, name), stats in self.stats.items() if name == stage]
+            cuda = [row["cuda_s"] for row in rows if row["cuda_s"] is not None]
+            peaks = [row["peak_mem_bytes"] for row in rows if row["peak_mem_bytes"] is not None]
+            totals[stage] = {
+                "calls": sum(row["calls"] for row in rows),
+                "wall_s": sum(row["wall_s"] for row in rows),
+                "cuda_s": sum(cuda) if cuda else None,
+                "peak_mem_bytes": max(peaks) if peaks else None,
+            }
+        return totals
+
+    def report(self):
+        totals = self.summary()
+        use_cuda = any(row["cuda_s"] is not None for row in totals.values())
+        time_key = "cuda_s" if use_cuda else "wall_s"
+        total_time = sum(row[time_key] or 0.0 for row in totals.values())
+
+        def fmt_mem(value):
+            return f"{value / 2**20:10.1f}" if value is not None else f"{'-':>10}"
+
+        def fmt_cuda(value):
+            return f"{value * 1e3:12.2f}" if value is not None else f"{'-':>12}"
+
+        lines = [f"Attention profile ({'CUDA events' if use_cuda else 'CPU wall time'} for shares)", ""]
+        header = f"{'Stage':<16} {'Calls':>8} {'Wall (ms)':>12} {'CUDA (ms)':>12} {'Share':>7} {'Peak (MiB)':>10}"
+        lines += [header, "-" * len(header)]
+        for stage, row in sorted(totals.items(), key=lambda item: item[1][time_key] or 0.0, reverse=True):
+            share = (row[time_key] or 0.0) / total_time if total_time > 0 else 0.0
+            lines.append(f"{stage:<16} {row['calls']:>8} {row['wall_s'] * 1e3:12.2f} {fmt_cuda(row['cuda_s'])} {share:7.1%} {fmt_mem(row['peak_mem_bytes'])}")
+
+        lines += ["", "Per layer", ""]
+        header = f"{'Layer':>5} {'Stage':<16} {'Calls':>8} {'Wall (ms)':>12} {'CUDA (ms)':>12} {'Peak (MiB)':>10}"
+        lines += [header, "-" * len(header)]
+        layers = sorted({layer for layer, _ in self.stats}, key=lambda layer: -1 if layer is None else layer)
+        for layer in layers:
+            for stage in self.order:
+                row = self.stats.get((layer, stage))
+                if row is not None:
+                    lines.append(f"{'-' if layer is None else layer:>5} {stage:<16} {row['calls']:>8} {row['wall_s'] * 1e3:12.2f} {fmt_cuda(row['cuda_s'])} {fmt_mem(row['peak_mem_bytes'])}")
+
+        return "\n".join(lines) + "\n"
+
+    def save_report(self, path):
+        with open(path, "w") as f:
+            f.write(self.report())
+
+
+def attach_profiler(model, profiler):
+    """ Sets profiler on every quantized attention block of model, None detaches it. """
+    for module in model.modules():
+        if hasattr(module, "profiler"):
+            module.profiler = profiler
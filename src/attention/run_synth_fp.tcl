@@ -37,8 +37,12 @@ set generics "S_q=$S_q S_kv=$S_kv d_kq=$d_kq d_v=$d_v k=$k scale_width=$scale_wi
 # Set the number of threads for Vivado
 set_param general.maxThreads 12
 
-# Generate timestamp
-set timestamp [clock format [clock seconds] -format "%Y%m%d_%H%M"]
+# Generate timestamp, unless SynthesisHandler passed the one of its Vivado log
+if {[llength $argv] > 21} {
+    set timestamp [lindex $argv 21]
+} else {
+    set timestamp [clock format [clock seconds] -format "%Y%m%d_%H%M"]
+}
 
 # Build common prefix (Use prefix_name instead of top)
 set prefix "${outputDir}/${prefix_name}_S_q_${S_q}_S_kv_${S_kv}_d_kq_${d_kq}_d_v_${d_v}_k_${k}_scale_width_${scale_width}_M1_E_${m1_exp}_M1_M_${m1_man}_M2_E_${m2_exp}_M2_M_${m2_man}_M3_E_${m3_exp}_M3_M_${m3_man}_ACCUM_METHOD_${accum_method1}_${accum_method2}_${accum_method3}_DSP_${m1_dsp}_${m2_dsp}_${m3_dsp}_time_${timestamp}"
@@ -100,12 +104,12 @@ puts "Time for write_checkpoint: [expr {($t3 - $t2) / 1000.0}] seconds"
 report_utilization      -file ${prefix}_util.rpt
 set t4 [clock milliseconds]
 puts "Time for report_utilization: [expr {($t4 - $t3) / 1000.0}] seconds"
-# report_timing_summary   -datasheet -file ${prefix}_timing.rpt
-# set t5 [clock milliseconds]
-# puts "Time for report_timing_summary: [expr {($t5 - $t4) / 1000.0}] seconds"
-# report_power            -file ${prefix}_power.rpt
-# set t6 [clock milliseconds]
-# puts "Time for report_power: [expr {($t6 - $t5) / 1000.0}] seconds"
+report_timing_summary   -datasheet -file ${prefix}_timing.rpt
+set t5 [clock milliseconds]
+puts "Time for report_timing_summary: [expr {($t5 - $t4) / 1000.0}] seconds"
+report_power            -file ${prefix}_power.rpt
+set t6 [clock milliseconds]
+puts "Time for report_power: [expr {($t6 - $t5) / 1000.0}] seconds"
 
 # opt_design
 # place_design
@@ -0,0 +1,152 @@
+module matmul_fp_tb #(
+    parameter x_rows         = 2,
+    parameter vec_elem_count = 32,
+    parameter y_cols         = 2,
+    parameter k              = 8,
+    parameter exp_width      = 4,
+    parameter man_width      = 3,
+    parameter scale_width    = 8,
+    parameter max_vectors    = 1000,
+    parameter settle_cycles  = 256,
+    parameter string vec_dir = "../tb/vectors/output"
+)();
+
+    // Generate clock.
+    logic clk;
+
+    initial begin
+        clk = 0;
+        forever
+            #5 clk = ~clk;
+    end
+
+    // Parameters.
+    localparam bit_width   = 1 + exp_width + man_width;
+    localparam block_count = vec_elem_count / k;
+    localparam methods     = 6;
+
+    localparam a_width    = x_rows * vec_elem_count * bit_width;
+    localparam b_width    = vec_elem_count * y_cols * bit_width;
+    localparam s_a_width  = x_rows * block_count * scale_width;
+    localparam s_b_width  = block_count * y_cols * scale_width;
+    localparam stim_width = a_width + b_width + s_a_width + s_b_width;
+    localparam c_width    = x_rows * y_cols * bit_width;
+    localparam res_width  = c_width + x_rows * y_cols * scale_width;
+
+    // Same order as golden_model.SUPPORTED_ACCUM_METHODS
+    localparam string ACCUM_METHODS [methods] = '{"KULISCH", "KAHAN", "TWOSUM", "FASTTWOSUM", "NEUMAIER", "KLEIN"};
+
+
+    // Vectors from tb/vectors/gen_vectors.py (DSE/golden_model.py), stimulus
+    // {A, B, S_A, S_B}, expected {C, S_C} of every accumulation method, first
+    // method and first array element in the MSBs.
+    logic [stim_width-1:0]        stim_mem [max_vectors];
+    logic [methods*res_width-1:0] exp_mem  [max_vectors];
+
+
+    // DUTs, one per accumulation method.
+    logic [stim_width-1:0] stim;
+
+    logic signed [bit_width-1:0]   A   [x_rows][vec_elem_count];
+    logic signed [bit_width-1:0]   B   [vec_elem_count][y_cols];
+    logic      [scale_width-1:0] S_A [x_rows][block_count];
+    logic      [scale_width-1:0] S_B [block_count][y_cols];
+
+    always_comb begin
+        for(int i=0; i<x_rows; i++)
+            for(int j=0; j<vec_elem_count; j++)
+                A[i][j] = stim[stim_width-1 - (i*vec_elem_count + j)*bit_width -: bit_width];
+        for(int i=0; i<vec_elem_count; i++)
+            for(int j=0; j<y_cols; j++)
+                B[i][j] = stim[stim_width-1 - a_width - (i*y_cols + j)*bit_width -: bit_width];
+        for(int i=0; i<x_rows; i++)
+            for(int j=0; j<block_count; j++)
+                S_A[i][j] = stim[stim_width-1 - a_width - b_width - (i*block_count + j)*scale_width -: scale_width];
+        for(int i=0; i<block_count; i++)
+            for(int j=0; j<y_cols; j++)
+                S_B[i][j] = stim[stim_width-1 - a_width - b_width - s_a_width - (i*y_cols + j)*scale_width -: scale_width];
+    end
+
+    logic [res_width-1:0] res [methods];
+
+    for(genvar m=0; m<methods; m++) begin : dut
+        logic signed [bit_width-1:0]   C   [x_rows][y_cols];
+        logic      [scale_width-1:0] S_C [x_rows][y_cols];
+
+        matmul_fp #(
+            .x_rows(x_rows),
+            .vec_elem_count(vec_elem_count),
+            .y_cols(y_cols),
+            .k(k),
+            .bit_width(bit_width),
+            .exp_width(exp_width),
+            .man_width(man_width),
+            .out_width(bit_width),
+            .scale_width(scale_width),
+            .ACCUM_METHOD(ACCUM_METHODS[m])
+        ) u_matmul (
+            .i_clk(clk),
+            .A_i(A),
+            .B_i(B),
+            .S_A_i(S_A),
+            .S_B_i(S_B),
+            .C_o(C),
+            .S_C_o(S_C)
+        );
+
+        always_comb begin
+            for(int i=0; i<x_rows; i++) begin
+                for(int j=0; j<y_cols; j++) begin
+                    res[m][res_width-1 - (i*y_cols + j)*bit_width -: bit_width] = C[i][j];
+                    res[m][res_width-1 - c_width - (i*y_cols + j)*scale_width -: scale_width] = S_C[i][j];
+                end
+            end
+        end
+    end
+
+
+    // Check.
+    logic [res_width-1:0] ref_res;
+    int n;
+
+    initial begin
+        $readmemh($sformatf("%s/matmul_fp_%0d_%0d_%0d_%0d_%0d_%0d_%0d_stim.hex", vec_dir, x_rows, vec_elem_count, y_cols, k, exp_width, man_width, scale_width), stim_mem);
+        $readmemh($sformatf("%s/matmul_fp_%0d_%0d_%0d_%0d_%0d_%0d_%0d_exp.hex", vec_dir, x_rows, vec_elem_count, y_cols, k, exp_width, man_width, scale_width), exp_mem);
+
+        $display("Starting -----");
+        $display("Width Exp: %d", exp_width);
+        $display("Width Man: %d", man_width);
+        $display("K:         %d", k);
+
+        for(n=0; (n<max_vectors) && !$isunknown(stim_mem[n]); n++) begin
+            // The compensated tree steps read sum_i again in later pipeline
+            // stages, so each vector is held until every pipeline has settled.
+            stim = stim_mem[n];
+            repeat(settle_cycles) @(posedge clk);
+            #1;
+
+            for(int m=0; m<methods; m++) begin
+                ref_res = exp_mem[n][(methods-m)*res_width-1 -: res_width];
+                if((res[m] !== ref_res) || $isunknown(res[m])) begin
+                    $display("Vector:  %0d", n);
+                    $display("Method:  %s", ACCUM_METHODS[m]);
+                    $display("DUT out: %h", res[m]);
+                    $display("Ref out: %h  <- Mismatch!", ref_res);
+                    $display("FAILED");
+                    $finish();
+                end
+            end
+        end
+
+        if(n == 0) begin
+            $display("No vectors found in %s", vec_dir);
+            $display("FAILED");
+            $finish();
+        end
+
+        $display("PASSED: %0d vectors", n);
+        $finish();
+    end
+
+
+endmodule
@@ -1,8 +1,12 @@
 module conv_inttobf16_tb #(
-    parameter bit_width = 21
+    parameter bit_width = 21,
+    parameter max_vectors = 1 << bit_width,
+    parameter string vec_dir = "../tb/vectors/output"
 )();
 
-    import "DPI-C" pure function real conv_inttobf16_ref(int i_fi_num, int bit_width);
+    // Vectors from tb/vectors/gen_vectors.py, expected BF16 encoding.
+    logic [bit_width-1:0] stim_mem [max_vectors];
+    logic          [15:0] exp_mem  [max_vectors];
 
     // DUT
     logic [bit_width-1:0]   fi_num;
@@ -18,40 +22,42 @@ module conv_inttobf16_tb #(
 
     // Reference
     logic signed [bit_width-1:0] ref_in;
-    real ref_out;
+    logic                 [15:0] ref_out;
 
-    real r_dut_out;
-
-    longint i;
+    int n;
 
     initial begin
+        $readmemh($sformatf("%s/conv_inttobf16_%0d_stim.hex", vec_dir, bit_width), stim_mem);
+        $readmemh($sformatf("%s/conv_inttobf16_%0d_exp.hex", vec_dir, bit_width), exp_mem);
+
         #1;
         $display("Starting -----");
         $display("Width: %d", bit_width);
 
-        i = 1;
-
-        for(i=0; i<(1<<(bit_width+1)); i++) begin
+        for(n=0; (n<max_vectors) && !$isunknown(stim_mem[n]); n++) begin
 
-            ref_in  = i;
-            ref_out = conv_inttobf16_ref(ref_in, bit_width);
+            ref_in  = stim_mem[n];
+            ref_out = exp_mem[n];
 
             fi_num = ref_in;
             #10
-            r_dut_out = $bitstoshortreal({bf16_num, 16'h0});
 
-
-            if((ref_out != r_dut_out) || $isunknown(bf16_num)) begin
-                $display("Ref in:  %f", ref_in);
-                $display("DUT out: %f", r_dut_out);
-                $display("DUT raw: %d", bf16_num);
-                $display("Ref out: %f  <- Mismatch!", ref_out);
+            if(bf16_num !== ref_out) begin
+                $display("Ref in:  %d", ref_in);
+                $display("DUT raw: %h", bf16_num);
+                $display("Ref raw: %h  <- Mismatch!", ref_out);
                 $display("FAILED");
                 $finish();
             end
         end
 
-        $display("PASSED");
+        if(n == 0) begin
+            $display("No vectors found in %s", vec_dir);
+            $display("FAILED");
+            $finish();
+        end
+
+        $display("PASSED: %0d vectors", n);
         $finish();
     end
 
@@ -0,0 +1,298 @@
+"""
+Runs the testbenches under tb/ with an open-source simulator.
+
+Benches are discovered from their Vivado scripts (run_sim.sh and *_tb.csh):
+the xvlog line gives the sources, the xelab line the top module, xsc the
+DPI C sources, and python lines the vector generation to run first. Each
+bench is built with Verilator, or Icarus when Verilator is not installed,
+into tb/.sim_cache/<hash of simulator, top and source contents>, so only
+benches whose RTL changed are rebuilt. Simulations run in the directory the
+script would cd into, so relative $readmemh paths still resolve.
+
+Benches in KNOWN_FAILURES fail for reasons in the bench or the RTL rather
+than the runner. They are reported as XFAIL with the reason and do not fail
+the run, and as XPASS, which does, once they pass and should be removed.
+
+Usage:
+  python tb/run_tests.py
+  python tb/run_tests.py "rnd_*" dot_int --sim icarus -j 4
+  python tb/run_tests.py --list
+"""
+import argparse
+import fnmatch
+import glob
+import hashlib
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(REPO_ROOT, "tb", ".sim_cache")
+
+# Bench name -> why it fails, observed with Verilator 5
+KNOWN_FAILURES = {
+  "dot_fp": "run_sim.sh compiles only dot_fp.sv, which instantiates vec_mul_fp and vec_sum_int without including them",
+  "dot_fp_spec": "run_sim.sh compiles only dot_fp_spec.sv, whose dot_fp instantiates vec_mul_fp and vec_sum_int without including them",
+  "dot_int": "dot_int leaves i_clk of the pipelined vec_sum_int unconnected, so o_dp never leaves 0",
+  "dot_general_int": "its dot_int leaves i_clk of the pipelined vec_sum_int unconnected",
+  "conv_bf16tomxfp6": "the bench connects signed arrays to the unsigned o_mx_vec port, which Verilator rejects",
+  "conv_bf16tomxfp8": "the bench connects signed arrays to the unsigned o_mx_vec port, which Verilator rejects",
+  "conv_bf16tomxi8": "the bench connects signed arrays to the unsigned o_mx_vec port, which Verilator rejects",
+}
+
+Bench = namedtuple("Bench", ["name", "script", "top", "sources", "c_sources", "pre_commands", "run_dir"])
+Result = namedtuple("Result", ["bench", "simulator", "status", "cached", "build_time", "run_time", "log"])
+
+
+def expand_vars(text, variables):
+  """Expands $name and ${name}, leaving the quoting in place."""
+  return re.sub(r'\$\{?(\w+)\}?', lambda m: variables.get(m.group(1), ""), text)
+
+
+def parse_script(script):
+  """Returns a Bench for a Vivado simulation script, None if it does not run one."""
+  script_dir = os.path.dirname(script)
+  variables = {}
+  cwd = REPO_ROOT
+  sources, c_sources, pre_commands = [], [], []
+  top = None
+
+  with open(script) as f:
+    lines = f.read().splitlines()
+
+  for line in lines:
+    line = line.strip()
+    if not line or line.startswith("#"):
+      continue
+
+    assignment = re.fullmatch(r'(\w+)=(\S+)', line)
+    if assignment:
+      variables[assignment.group(1)] = expand_vars(assignment.group(2), variables).replace('"', "")
+      continue
+
+    for command in expand_vars(line, variables).split("&&"):
+      words = shlex.split(command)
+      if not words:
+        continue
+
+      if words[0] == "cd" and len(words) > 1 and words[1] != "..":
+        cwd = os.path.join(REPO_ROOT, words[1])
+      elif words[0] == "xsc":
+        c_sources += [os.path.normpath(os.path.join(cwd, word)) for word in words[1:] if word.endswith(".c")]
+      elif words[0] == "xvlog":
+        sources += [os.path.normpath(os.path.join(cwd, word)) for word in words[1:] if word.endswith((".sv", ".v"))]
+      elif words[0] == "xelab":
+        top = next(word for word in words[1:] if not word.startswith("-")).split(".")[-1]
+      elif words[0].startswith("python"):
+        pre_commands.append(words)
+
+  if top is None:
+    return None
+
+  name = os.path.basename(script_dir)
+  return Bench(name, script, top, sources, c_sources, pre_commands, cwd)
+
+
+def discover(tb_dir):
+  scripts = sorted(glob.glob(os.path.join(tb_dir, "**", "run_sim.sh"), recursive=True))
+  scripts += sorted(glob.glob(os.path.join(tb_dir, "**", "*_tb.csh"), recursive=True))
+
+  benches = [parse_script(script) for script in scripts]
+  return [bench for bench in benches if bench is not None]
+
+
+def find_simulator(requested):
+  candidates = ["verilator", "icarus"] if requested == "auto" else [requested]
+  for simulator in candidates:
+    if shutil.which("verilator" if simulator == "verilator" else "iverilog"):
+      return simulator
+
+  binaries = ["verilator" if simulator == "verilator" else "iverilog" for simulator in candidates]
+  raise RuntimeError(f"No simulator found on PATH, looked for {', '.join(binaries)}.")
+
+
+def simulator_version(simulator):
+  cmd = ["verilator", "--version"] if simulator == "verilator" else ["iverilog", "-V"]
+  output = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True).stdout
+  return output.splitlines()[0] if output else ""
+
+
+def included_files(sources):
+  """
+  Sources followed through their `include directives, resolved next to the
+  including file the way xvlog does, each file once in discovery order.
+  """
+  files = {}
+  pending = list(sources)
+  while pending:
+    path = pending.pop(0)
+    if path in files or not os.path.exists(path):
+      continue
+    files[path] = None
+
+    with open(path, errors="replace") as f:
+      for include in re.findall(r'^\s*`include\s+"([^"]+)"', f.read(), re.MULTILINE):
+        pending.append(os.path.normpath(os.path.join(os.path.dirname(path), include)))
+
+  return list(files)
+
+
+def cache_key(bench, simulator, version):
+  digest = hashlib.sha256()
+  digest.update(f"{simulator}\n{version}\n{bench.top}\n".encode())
+
+  for path in included_files(bench.sources) + bench.c_sources:
+    digest.update(os.path.relpath(path, REPO_ROOT).encode())
+    with open(path, "rb") as f:
+      digest.update(hashlib.sha256(f.read()).digest())
+
+  return digest.hexdigest()[:16]
+
+
+def build_commands(bench, simulator, build_dir):
+  """Returns (build command, simulation command) for the bench."""
+  # xvlog looks for `include files next to the including source, the simulators
+  # only in their include path, which needs the directory of every file in
+  # an include chain
+  include_dirs = ["-I" + path for path in dict.fromkeys(os.path.dirname(path) for path in included_files(bench.sources))]
+
+  if simulator == "verilator":
+    build = [
+      "verilator", "--binary", "--timing", "-j", "1",
+      "-Wno-fatal", "-Wno-lint", "-Wno-style",
+      "--top-module", bench.top,
+      "-Mdir", os.path.join(build_dir, "obj"),
+      "-o", "sim",
+    ] + include_dirs + bench.sources + bench.c_sources
+    return build, [os.path.join(build_dir, "obj", "sim")]
+
+  build = ["iverilog", "-g2012", "-s", bench.top, "-o", os.path.join(build_dir, "sim.vvp")] + include_dirs + bench.sources
+  return build, ["vvp", "-n", os.path.join(build_dir, "sim.vvp")]
+
+
+def run_bench(bench, simulator, version, timeout):
+  log = []
+
+  missing = [path for path in bench.sources + bench.c_sources if not os.path.exists(path)]
+  if missing:
+    return Result(bench, simulator, "ERROR", False, 0.0, 0.0, "Missing sources: " + " ".join(missing))
+
+  if bench.c_sources and simulator == "icarus":
+    return Result(bench, simulator, "SKIPPED", False, 0.0, 0.0, "DPI-C references need Verilator.")
+
+  build_dir = os.path.join(CACHE_DIR, f"{bench.name}_{cache_key(bench, simulator, version)}")
+  build_cmd, sim_cmd = build_commands(bench, simulator, build_dir)
+  stamp = os.path.join(build_dir, "built")
+
+  os.makedirs(bench.run_dir, exist_ok=True)
+
+  for command in bench.pre_commands:
+    command = [sys.executable] + command[1:]
+    proc = subprocess.run(command, cwd=bench.run_dir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    log.append(proc.stdout)
+    if proc.returncode != 0:
+      return Result(bench, simulator, "ERROR", False, 0.0, 0.0, "".join(log))
+
+  cached = os.path.exists(stamp)
+  start_time = time.perf_counter()
+  if not cached:
+    os.makedirs(build_dir, exist_ok=True)
+    proc = subprocess.run(build_cmd, cwd=build_dir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    log.append(proc.stdout)
+    if proc.returncode != 0:
+      return Result(bench, simulator, "ERROR", False, time.perf_counter() - start_time, 0.0, "".join(log))
+    open(stamp, "w").close()
+  build_time = time.perf_counter() - start_time
+
+  start_time = time.perf_counter()
+  try:
+    proc = subprocess.run(sim_cmd, cwd=bench.run_dir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=timeout)
+  except subprocess.TimeoutExpired as e:
+    log.append(e.stdout or "")
+    return Result(bench, simulator, "TIMEOUT", cached, build_time, time.perf_counter() - start_time, "".join(log))
+  run_time = time.perf_counter() - start_time
+  log.append(proc.stdout)
+
+  # Benches report through $display and $finish without an exit status
+  if "FAILED" in proc.stdout or proc.returncode != 0:
+    status = "FAIL"
+  elif "PASSED" in proc.stdout:
+    status = "PASS"
+  else:
+    status = "ERROR"
+
+  return Result(bench, simulator, status, cached, build_time, run_time, "".join(log))
+
+
+def expect_known_failure(result):
+  """Turns the result of a bench in KNOWN_FAILURES into XFAIL, or XPASS if it passed."""
+  reason = KNOWN_FAILURES.get(result.bench.name)
+  if reason is None or result.status == "SKIPPED":
+    return result
+
+  status = "XPASS" if result.status == "PASS" else "XFAIL"
+  return result._replace(status=status, log=f"Known failure ({result.status}): {reason}\n{result.log}")
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Run the tb/ testbenches with Verilator or Icarus Verilog')
+  parser.add_argument('patterns', nargs='*', default=["*"], help='Bench name glob patterns (default: all)')
+  parser.add_argument('--sim', default='auto', choices=['auto', 'verilator', 'icarus'], help='Simulator, auto prefers Verilator (default: %(default)s)')
+  parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Benches to build and run in parallel (default: %(default)s)')
+  parser.add_argument('--timeout', type=float, default=3600, help='Simulation timeout per bench in seconds (default: %(default)s)')
+  parser.add_argument('--list', action='store_true', help='List discovered benches and exit')
+  parser.add_argument('--clean', action='store_true', help='Remove cached builds before running')
+  parser.add_argument('--verbose', action='store_true', help='Print the log of failing benches')
+
+  args = parser.parse_args()
+
+  benches = discover(os.path.join(REPO_ROOT, "tb"))
+  benches = [bench for bench in benches if any(fnmatch.fnmatch(bench.name, pattern) for pattern in args.patterns)]
+
+  if args.list:
+    for bench in benches:
+      sources = " ".join(os.path.relpath(path, REPO_ROOT) for path in bench.sources + bench.c_sources)
+      print(f"{bench.name:<20} top {bench.top:<24} {sources}")
+    return
+
+  if args.clean and os.path.isdir(CACHE_DIR):
+    shutil.rmtree(CACHE_DIR)
+
+  try:
+    simulator = find_simulator(args.sim)
+  except RuntimeError as e:
+    print(e)
+    sys.exit(1)
+  version = simulator_version(simulator)
+  print(f"Running {len(benches)} benches with {version}")
+
+  start_time = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as executor:
+    futures = [executor.submit(run_bench, bench, simulator, version, args.timeout) for bench in benches]
+    results = []
+    for future in futures:
+      result = expect_known_failure(future.result())
+      results.append(result)
+      build = "cached" if result.cached else f"{result.build_time:.1f}s"
+      print(f"{result.status:<8} {result.bench.name:<20} build {build:<8} run {result.run_time:.1f}s")
+
+      if result.status in ["XFAIL", "XPASS"]:
+        print(f"         {KNOWN_FAILURES[result.bench.name]}")
+      if args.verbose and result.status not in ["PASS", "SKIPPED"]:
+        print(result.log)
+
+  counts = {status: sum(result.status == status for result in results) for status in ["PASS", "FAIL", "ERROR", "TIMEOUT", "SKIPPED", "XFAIL", "XPASS"]}
+  summary = ", ".join(f"{count} {status.lower()}" for status, count in counts.items() if count)
+  print(f"{summary} in {time.perf_counter() - start_time:.1f}s")
+
+  sys.exit(0 if counts["PASS"] + counts["SKIPPED"] + counts["XFAIL"] == len(results) else 1)
+
+if __name__ == "__main__":
+  main()
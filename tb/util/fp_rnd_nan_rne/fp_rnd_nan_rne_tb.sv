@@ -4,7 +4,9 @@ module fp_rnd_nan_rne_tb #(
     parameter width_o_man = 2,
     parameter width_shift = 8,
     parameter sat = 1,
-    parameter e4m3_spec = 0
+    parameter e4m3_spec = 0,
+    parameter max_vectors = 1 << (width_i + width_shift + 1),
+    parameter string vec_dir = "../tb/vectors/output"
 )();
 
 
@@ -13,46 +15,11 @@ module fp_rnd_nan_rne_tb #(
     localparam man_inf  = 0;
     localparam man_nan  = (1 << width_o_man) - 1;
 
-    import "DPI-C" pure function shortreal fp_rnd_rne_ref(int i_num, int i_shift, int i_nan, int width_exp, int width_man, int sat, int e4m3_spec);
-    // import "DPI-C" pure function int compare_ref_dut(shortreal ref_out, shortreal dut_out);
-
-    function logic is_nan(input shortreal i_num);
-        logic [31:0] sr_bits;
-        logic exp_spec;
-        logic man_nan;
-
-        sr_bits = $shortrealtobits(i_num);
-        exp_spec = (sr_bits[30:23] == 8'hff);
-        man_nan = |sr_bits[22:0];
-
-        return exp_spec && man_nan;
-    endfunction
-
-    function logic is_inf(input shortreal i_num);
-        logic [31:0] sr_bits;
-        logic exp_spec;
-        logic man_nan;
-
-        sr_bits = $shortrealtobits(i_num);
-        exp_spec = (sr_bits[30:23] == 8'hff);
-        man_nan = |sr_bits[22:0];
-
-        return exp_spec && ~man_nan;
-    endfunction
-
-    function logic compare_ref_dut(input shortreal i_ref_out, input shortreal i_dut_out);
-
-        if(is_nan(i_ref_out) != is_nan(i_dut_out)) begin
-            return 1;
-        end else if(is_inf(i_ref_out) != is_inf(i_dut_out)) begin
-            return 1;
-        end else if((is_nan(i_ref_out) != 0) || (is_inf(i_dut_out) != 0)) begin
-            return 0;
-        end 
-
-        return (i_ref_out != i_dut_out);
-
-    endfunction
+    // Vectors from tb/vectors/gen_vectors.py, stimulus {num, shift, nan},
+    // expected {exp, man} of the rounded value, NaN and Inf in the element
+    // encodings above.
+    logic [width_i+width_shift+1-1:0] stim_mem [max_vectors];
+    logic   [width_o_exp+width_o_man-1:0] exp_mem  [max_vectors];
 
 
     // DUT
@@ -80,17 +47,19 @@ module fp_rnd_nan_rne_tb #(
 
     // Reference
     logic unsigned [width_i-1:0] ref_in;
-    int ref_shift;
+    logic [width_shift-1:0] ref_shift;
     logic ref_nan;
-    real ref_out;
+    logic [width_o_exp-1:0] ref_exp;
+    logic [width_o_man-1:0] ref_man;
 
     real r_dut_out;
 
-    int i;
-    int j;
-    int l;
+    int n;
 
     initial begin
+        $readmemh($sformatf("%s/fp_rnd_nan_rne_%0d_%0d_%0d_%0d_%0d_%0d_stim.hex", vec_dir, width_i, width_o_exp, width_o_man, width_shift, sat, e4m3_spec), stim_mem);
+        $readmemh($sformatf("%s/fp_rnd_nan_rne_%0d_%0d_%0d_%0d_%0d_%0d_exp.hex", vec_dir, width_i, width_o_exp, width_o_man, width_shift, sat, e4m3_spec), exp_mem);
+
         #1;
         $display("Starting -----");
         $display("Width Exp: %d", width_o_exp);
@@ -98,66 +67,62 @@ module fp_rnd_nan_rne_tb #(
         $display("Saturate?: %d", sat);
         $display("E4M3 Ofl?: %d", e4m3_spec);
 
-        // i = 233;
-        // j = 0;
-        // l = 0;
-
-        for(i=0; i<(1<<(width_i+1)); i++) begin
-            for(j=0; j<(1<<width_shift); j++) begin
-                for(l=0; l<2; l++) begin
-
-                    // Calculate reference signals.
-                    ref_in  = i;
-                    ref_shift = j;
-                    ref_nan = l;
-                    ref_out = fp_rnd_rne_ref(ref_in, ref_shift, ref_nan, width_o_exp, width_o_man, sat, e4m3_spec);
-
-                    // Send input to DUT.
-                    p0_num = ref_in;
-                    p0_shift = ref_shift;
-                    p0_nan = ref_nan;
-                    #10
-
-                    // Interpret DUT output.
-                    if(p0_exp != 0) begin
-                        r_dut_out = {2'h01, p0_man};
-                    end else begin
-                        r_dut_out = {2'h00, p0_man}*2.0;
-                    end
-
-                    if(p0_exp >= width_o_man) begin
-                        r_dut_out *= 2.0**(p0_exp-width_o_man);
-                    end else begin
-                        r_dut_out /= 2.0**(width_o_man-p0_exp);
-                    end
-
-                    if(e4m3_spec) begin
-                        if((p0_exp == exp_spec) && (p0_man == man_nan))
-                            r_dut_out = $bitstoreal(64'h7FF8000000000000);
-                    end else begin
-                        if((p0_exp == exp_spec) && (p0_man == man_nan))
-                            r_dut_out = $bitstoreal(64'h7FF8000000000000);
-                        else if((p0_exp == exp_spec) && (p0_man == man_inf))
-                            r_dut_out = $bitstoreal(64'h7FF0000000000000);
-                    end
-
-                    if(compare_ref_dut(ref_out, r_dut_out) || $isunknown({p0_exp, p0_man})) begin
-                        $display("Ref in:  %f", ref_in);
-                        $display("Shift:   %d", ref_shift);
-                        $display("NaNIn:   %d", ref_nan);
-                        $display("DUT out: %f", r_dut_out);
-                        $display("DUT exp: %d", p0_exp);
-                        $display("DUT man: %d", p0_man);
-                        $display("Ref out: %f  <- Mismatch!", ref_out);
-                        $display("Ref bit: %d  <- Mismatch!", $realtobits(ref_out));
-                        $display("FAILED");
-                        $finish();
-                    end
-                end
+        for(n=0; (n<max_vectors) && !$isunknown(stim_mem[n]); n++) begin
+
+            // Calculate reference signals.
+            {ref_in, ref_shift, ref_nan} = stim_mem[n];
+            {ref_exp, ref_man} = exp_mem[n];
+
+            // Send input to DUT.
+            p0_num = ref_in;
+            p0_shift = ref_shift;
+            p0_nan = ref_nan;
+            #10
+
+            // Interpret DUT output.
+            if(p0_exp != 0) begin
+                r_dut_out = {2'h01, p0_man};
+            end else begin
+                r_dut_out = {2'h00, p0_man}*2.0;
             end
+
+            if(p0_exp >= width_o_man) begin
+                r_dut_out *= 2.0**(p0_exp-width_o_man);
+            end else begin
+                r_dut_out /= 2.0**(width_o_man-p0_exp);
+            end
+
+            if(e4m3_spec) begin
+                if((p0_exp == exp_spec) && (p0_man == man_nan))
+                    r_dut_out = $bitstoreal(64'h7FF8000000000000);
+            end else begin
+                if((p0_exp == exp_spec) && (p0_man == man_nan))
+                    r_dut_out = $bitstoreal(64'h7FF8000000000000);
+                else if((p0_exp == exp_spec) && (p0_man == man_inf))
+                    r_dut_out = $bitstoreal(64'h7FF0000000000000);
+            end
+
+            if({p0_exp, p0_man} !== {ref_exp, ref_man}) begin
+                $display("Ref in:  %f", ref_in);
+                $display("Shift:   %d", ref_shift);
+                $display("NaNIn:   %d", ref_nan);
+                $display("DUT out: %f", r_dut_out);
+                $display("DUT exp: %d", p0_exp);
+                $display("DUT man: %d", p0_man);
+                $display("Ref exp: %d  <- Mismatch!", ref_exp);
+                $display("Ref man: %d  <- Mismatch!", ref_man);
+                $display("FAILED");
+                $finish();
+            end
+        end
+
+        if(n == 0) begin
+            $display("No vectors found in %s", vec_dir);
+            $display("FAILED");
+            $finish();
         end
 
-        $display("PASSED");
+        $display("PASSED: %0d vectors", n);
         $finish();
     end
 
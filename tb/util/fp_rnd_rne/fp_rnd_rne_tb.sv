@@ -2,11 +2,16 @@ module fp_rnd_rne_tb #(
     parameter width_i     = 8,
     parameter width_o_exp = 5,
     parameter width_o_man = 2,
-    parameter width_shift = 8
+    parameter width_shift = 8,
+    parameter max_vectors = 1 << (width_i + width_shift),
+    parameter string vec_dir = "../tb/vectors/output"
 )();
 
 
-    import "DPI-C" pure function shortreal fp_rnd_rne_ref(int i_num, int i_shift, int width_exp, int width_man);
+    // Vectors from tb/vectors/gen_vectors.py, stimulus {num, shift},
+    // expected {exp, man} of the rounded value.
+    logic     [width_i+width_shift-1:0] stim_mem [max_vectors];
+    logic [width_o_exp+width_o_man-1:0] exp_mem  [max_vectors];
 
 
     // DUT
@@ -30,57 +35,61 @@ module fp_rnd_rne_tb #(
 
     // Reference
     logic unsigned [width_i-1:0] ref_in;
-    int ref_shift;
-    real ref_out;
+    logic [width_shift-1:0] ref_shift;
+    logic [width_o_exp-1:0] ref_exp;
+    logic [width_o_man-1:0] ref_man;
 
     real r_dut_out;
 
-    int i;
-    int j;
+    int n;
 
     initial begin
+        $readmemh($sformatf("%s/fp_rnd_rne_%0d_%0d_%0d_%0d_stim.hex", vec_dir, width_i, width_o_exp, width_o_man, width_shift), stim_mem);
+        $readmemh($sformatf("%s/fp_rnd_rne_%0d_%0d_%0d_%0d_exp.hex", vec_dir, width_i, width_o_exp, width_o_man, width_shift), exp_mem);
+
         #1;
         $display("Starting -----");
 
-        i = 1;
-        j = 0;
-
-        for(i=0; i<(1<<(width_i+1)); i++) begin
-            for(j=0; j<(1<<width_shift); j++) begin
-
-                ref_in  = i;
-                ref_shift = j;
-                ref_out = fp_rnd_rne_ref(ref_in, ref_shift, width_o_exp, width_o_man);
-
-                p0_num = ref_in;
-                p0_shift = ref_shift;
-                #10
-                if(p0_exp != 0) begin
-                    r_dut_out = {2'h01, p0_man};
-                end else begin
-                    r_dut_out = {2'h00, p0_man}*2.0;
-                end
-
-                if(p0_exp >= width_o_man) begin
-                    r_dut_out *= 2.0**(p0_exp-width_o_man);
-                end else begin
-                    r_dut_out /= 2.0**(width_o_man-p0_exp);
-                end
-
-                if((ref_out != r_dut_out) || $isunknown({p0_exp, p0_man})) begin
-                    $display("Ref in:  %f", ref_in);
-                    $display("Shift:   %d", ref_shift);
-                    $display("DUT out: %f", r_dut_out);
-                    $display("DUT exp: %d", p0_exp);
-                    $display("DUT man: %d", p0_man);
-                    $display("Ref out: %f  <- Mismatch!", ref_out);
-                    $display("FAILED");
-                    $finish();
-                end
+        for(n=0; (n<max_vectors) && !$isunknown(stim_mem[n]); n++) begin
+
+            {ref_in, ref_shift} = stim_mem[n];
+            {ref_exp, ref_man} = exp_mem[n];
+
+            p0_num = ref_in;
+            p0_shift = ref_shift;
+            #10
+            if(p0_exp != 0) begin
+                r_dut_out = {2'h01, p0_man};
+            end else begin
+                r_dut_out = {2'h00, p0_man}*2.0;
+            end
+
+            if(p0_exp >= width_o_man) begin
+                r_dut_out *= 2.0**(p0_exp-width_o_man);
+            end else begin
+                r_dut_out /= 2.0**(width_o_man-p0_exp);
             end
+
+            if({p0_exp, p0_man} !== {ref_exp, ref_man}) begin
+                $display("Ref in:  %f", ref_in);
+                $display("Shift:   %d", ref_shift);
+                $display("DUT out: %f", r_dut_out);
+                $display("DUT exp: %d", p0_exp);
+                $display("DUT man: %d", p0_man);
+                $display("Ref exp: %d  <- Mismatch!", ref_exp);
+                $display("Ref man: %d  <- Mismatch!", ref_man);
+                $display("FAILED");
+                $finish();
+            end
+        end
+
+        if(n == 0) begin
+            $display("No vectors found in %s", vec_dir);
+            $display("FAILED");
+            $finish();
         end
 
-        $display("PASSED");
+        $display("PASSED: %0d vectors", n);
         $finish();
     end
 
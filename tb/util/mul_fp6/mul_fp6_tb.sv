@@ -23,15 +23,23 @@ module mul_fp_tb();
     localparam fi_width = man_width + 2;
     localparam prd_width = 2 * ((1<<exp_width) + man_width);
 
-    function shortreal fp6tosr(input logic [bit_width-1:0] i_fp6_num);
+    // FP32 layout with an unbiased exponent, exponent 0 holds the subnormals.
+    // Decoded in real arithmetic, $bitstoshortreal is unreliable in Verilator.
+    function real fp6tosr(input logic [bit_width-1:0] i_fp6_num);
 
-        logic [31:0] sr_bits;
+        logic [exp_width-1:0] exp;
+        logic [man_width-1:0] man;
+        real num;
 
-        sr_bits[31]    = i_fp6_num[bit_width-1];
-        sr_bits[30:23] = {{(8-exp_width){1'b0}}, i_fp6_num[bit_width-2:man_width]};
-        sr_bits[22:0]  = {i_fp6_num[man_width-1:0], {(23-man_width){1'b0}}};
+        exp = i_fp6_num[bit_width-2:man_width];
+        man = i_fp6_num[man_width-1:0];
 
-        return $bitstoshortreal(sr_bits) * (2.0**127);
+        if(exp != 0)
+            num = (1.0 + man / 2.0**man_width) * 2.0**exp;
+        else
+            num = man / 2.0**man_width * 2.0;
+
+        return i_fp6_num[bit_width-1] ? -num : num;
 
     endfunction
 
@@ -1,13 +1,13 @@
 module rnd_rne_tb #(
     parameter width_i = 24,
-    parameter width_o = 4
+    parameter width_o = 4,
+    parameter max_vectors = 1 << (width_i - 1),
+    parameter string vec_dir = "../tb/vectors/output"
 )();
 
-    localparam width_diff  = width_i - width_o;
-
-    import "DPI-C" pure function int rnd_rne_ref(input int unsigned i_num,
-                                             input int unsigned width_diff,
-                                             input int unsigned width_o);
+    // Vectors from tb/vectors/gen_vectors.py, expected bit width_o flags overflow.
+    logic [width_i-1:0] stim_mem [max_vectors];
+    logic   [width_o:0] exp_mem  [max_vectors];
 
 
     // DUT
@@ -33,18 +33,21 @@ module rnd_rne_tb #(
     real r_ref_out;
     real r_dut_out;
 
-    int i;
+    int n;
 
     initial begin
+        $readmemh($sformatf("%s/rnd_rne_%0d_%0d_stim.hex", vec_dir, width_i, width_o), stim_mem);
+        $readmemh($sformatf("%s/rnd_rne_%0d_%0d_exp.hex", vec_dir, width_i, width_o), exp_mem);
+
         #1;
         $display("Starting -----");
         $display("Width in:  %d", width_i);
         $display("Width out: %d", width_o);
 
-        for(i=(1<<(width_i-1)); i<(1<<width_i); i++) begin
+        for(n=0; (n<max_vectors) && !$isunknown(stim_mem[n]); n++) begin
 
-            ref_in  = i;
-            ref_out = rnd_rne_ref(ref_in, width_diff, width_o);
+            ref_in  = stim_mem[n];
+            ref_out = exp_mem[n];
 
             r_ref_in  = $itor(ref_in);
             r_ref_out = $itor(ref_out);
@@ -72,7 +75,13 @@ module rnd_rne_tb #(
             end
         end
 
-        $display("PASSED");
+        if(n == 0) begin
+            $display("No vectors found in %s", vec_dir);
+            $display("FAILED");
+            $finish();
+        end
+
+        $display("PASSED: %0d vectors", n);
         $finish();
     end
 
@@ -1,19 +1,21 @@
 module rnd_stc_tb #(
     parameter width_i = 24,
-    parameter width_o = 4
+    parameter width_o = 4,
+    parameter max_vectors = 1 << (width_i - 1),
+    parameter string vec_dir = "../tb/vectors/output"
 )();
 
-    localparam width_diff  = width_i - width_o;
-
-    import "DPI-C" pure function int rnd_stc_ref(input int unsigned i_num,
-                                             input int unsigned width_diff,
-                                             input int unsigned width_o,
-                                             input int unsigned noise);
+    // Vectors from tb/vectors/gen_vectors.py, expected bit width_o flags
+    // overflow. The noise is the DUT's LFSR, reset before the first vector
+    // and stepped once per vector, which the expected words follow.
+    logic [width_i-1:0] stim_mem [max_vectors];
+    logic   [width_o:0] exp_mem  [max_vectors];
 
 
     // DUT
+    logic clk;
+    logic rst;
     logic [width_i-1:0] num;
-    logic [6-1:0] noise;
     logic [width_o-1:0] man_out;
     logic ofl_out;
 
@@ -21,8 +23,9 @@ module rnd_stc_tb #(
         .width_i(width_i),
         .width_o(width_o)
     ) u0_rnd_stc (
+        .i_clk(clk),
+        .i_rst(rst),
         .i_num(num),
-        .i_noise(noise),
         .o_man(man_out),
         .o_ofl(ofl_out)
     );
@@ -30,58 +33,71 @@ module rnd_stc_tb #(
 
     // Reference
     logic [width_i-1:0] ref_in;
-    logic [6-1:0] ref_noise;
     int ref_out;
 
     real r_ref_in;
     real r_ref_out;
     real r_dut_out;
 
-    int i;
-    int j;
+    int n;
 
     initial begin
+        $readmemh($sformatf("%s/rnd_stc_%0d_%0d_stim.hex", vec_dir, width_i, width_o), stim_mem);
+        $readmemh($sformatf("%s/rnd_stc_%0d_%0d_exp.hex", vec_dir, width_i, width_o), exp_mem);
+
+        clk = 0;
+        rst = 1;
         #1;
+        rst = 0;
         $display("Starting -----");
         $display("Width in:  %d", width_i);
         $display("Width out: %d", width_o);
 
-        for(i=(1<<(width_i-1)); i<(1<<width_i); i++) begin
-            for(j=0; j<(1<<6); j++) begin
-
-                ref_in  = i;
-                ref_noise = j;
-                ref_out = rnd_stc_ref(ref_in, width_diff, width_o, ref_noise);
-
-                r_ref_in  = $itor(ref_in);
-                r_ref_out = $itor(ref_out);
-
-                num = ref_in;
-                noise = ref_noise;
-                #10
-                r_dut_out = $itor(man_out);
-
-                if(r_ref_out >= (1<<width_o)) begin
-                    if(~ofl_out) begin
-                        $display("Ref in:  %d", ref_in);
-                        $display("Ref in:  %f", r_ref_in);
-                        $display("DUT out: %f", r_dut_out);
-                        $display("Ref out: %f  <- Mismatch!", r_ref_out);
-                        $display("FAILED");
-                        $finish();
-                    end
-                end else if((r_ref_out != r_dut_out) || $isunknown(man_out)) begin
+        for(n=0; (n<max_vectors) && !$isunknown(stim_mem[n]); n++) begin
+
+            ref_in  = stim_mem[n];
+            ref_out = exp_mem[n];
+
+            r_ref_in  = $itor(ref_in);
+            r_ref_out = $itor(ref_out);
+
+            num = ref_in;
+            #5
+            r_dut_out = $itor(man_out);
+
+            if(r_ref_out >= (1<<width_o)) begin
+                if(~ofl_out) begin
                     $display("Ref in:  %d", ref_in);
                     $display("Ref in:  %f", r_ref_in);
+                    $display("Noise:   %d", u0_rnd_stc.noise);
                     $display("DUT out: %f", r_dut_out);
                     $display("Ref out: %f  <- Mismatch!", r_ref_out);
                     $display("FAILED");
                     $finish();
                 end
+            end else if((r_ref_out != r_dut_out) || ofl_out || $isunknown(man_out)) begin
+                $display("Ref in:  %d", ref_in);
+                $display("Ref in:  %f", r_ref_in);
+                $display("Noise:   %d", u0_rnd_stc.noise);
+                $display("DUT out: %f", r_dut_out);
+                $display("Ref out: %f  <- Mismatch!", r_ref_out);
+                $display("FAILED");
+                $finish();
             end
+
+            // Step the LFSR for the next vector.
+            clk = 1;
+            #5
+            clk = 0;
+        end
+
+        if(n == 0) begin
+            $display("No vectors found in %s", vec_dir);
+            $display("FAILED");
+            $finish();
         end
 
-        $display("PASSED");
+        $display("PASSED: %0d vectors", n);
         $finish();
     end
 
@@ -1,12 +1,14 @@
 module shift_rnd_rne_tb #(
     parameter width_i     = 9,
     parameter width_o     = 8,
-    parameter width_shift = 8
+    parameter width_shift = 8,
+    parameter max_vectors = 1 << (width_i + width_shift),
+    parameter string vec_dir = "../tb/vectors/output"
 )();
 
-    localparam width_diff  = width_i - width_o;
-
-    import "DPI-C" pure function int shift_rnd_rne_ref(int i_num, int i_shift, int width_diff, int width_o);
+    // Vectors from tb/vectors/gen_vectors.py, stimulus {num, shift}.
+    logic [width_i+width_shift-1:0] stim_mem [max_vectors];
+    logic             [width_o-1:0] exp_mem  [max_vectors];
 
 
     // DUT
@@ -29,48 +31,55 @@ module shift_rnd_rne_tb #(
     logic signed [width_i-1:0] ref_in;
     int ref_out;
     int ref_shift;
+    logic [width_shift-1:0] ref_shift_bits;
 
     real r_ref_in;
     real r_ref_out;
     real r_dut_out;
 
-    int i;
-    int j;
+    int n;
 
     initial begin
+        $readmemh($sformatf("%s/shift_rnd_rne_%0d_%0d_%0d_stim.hex", vec_dir, width_i, width_o, width_shift), stim_mem);
+        $readmemh($sformatf("%s/shift_rnd_rne_%0d_%0d_%0d_exp.hex", vec_dir, width_i, width_o, width_shift), exp_mem);
+
         #1;
         $display("Starting -----");
         $display("Width in:  %d", width_i);
         $display("Width out: %d", width_o);
 
-        for(i=0; i<(1<<width_i); i++) begin
-            for(j=0; j<(1<<width_shift); j++) begin
-
-                ref_in  = i;
-                ref_shift = j;
-                ref_out = shift_rnd_rne_ref(ref_in, ref_shift, width_diff, width_o);
-
-                r_ref_in  = $itor(ref_in) *(2.0**-(width_i-2.0));
-                r_ref_out = $itor(ref_out)*(2.0**-(width_o-2.0));
-
-                p0_num = ref_in;
-                p0_shift = ref_shift;
-                #10
-                r_dut_out = $itor(p0_rnd_out)*(2.0**-(width_o-2.0));
-
-                if((r_ref_out != r_dut_out) || $isunknown(p0_rnd_out)) begin
-                    $display("Ref in:  %d", ref_in);
-                    $display("Ref in:  %f", r_ref_in);
-                    $display("Shift:   %d", p0_shift);
-                    $display("DUT out: %f", r_dut_out);
-                    $display("Ref out: %f  <- Mismatch!", r_ref_out);
-                    $display("FAILED");
-                    $finish();
-                end
+        for(n=0; (n<max_vectors) && !$isunknown(stim_mem[n]); n++) begin
+
+            {ref_in, ref_shift_bits} = stim_mem[n];
+            ref_shift = ref_shift_bits;
+            ref_out = signed'(exp_mem[n]);
+
+            r_ref_in  = $itor(ref_in) *(2.0**-(width_i-2.0));
+            r_ref_out = $itor(ref_out)*(2.0**-(width_o-2.0));
+
+            p0_num = ref_in;
+            p0_shift = ref_shift;
+            #10
+            r_dut_out = $itor(p0_rnd_out)*(2.0**-(width_o-2.0));
+
+            if((r_ref_out != r_dut_out) || $isunknown(p0_rnd_out)) begin
+                $display("Ref in:  %d", ref_in);
+                $display("Ref in:  %f", r_ref_in);
+                $display("Shift:   %d", p0_shift);
+                $display("DUT out: %f", r_dut_out);
+                $display("Ref out: %f  <- Mismatch!", r_ref_out);
+                $display("FAILED");
+                $finish();
             end
         end
 
-        $display("PASSED");
+        if(n == 0) begin
+            $display("No vectors found in %s", vec_dir);
+            $display("FAILED");
+            $finish();
+        end
+
+        $display("PASSED: %0d vectors", n);
         $finish();
     end
 
@@ -0,0 +1,281 @@
+"""
+Generates stimulus/expected-response vector files for the testbenches in
+tb/util and tb/convert from the NumPy spec in ref_spec.py, and for
+tb/attention from the bit-accurate datapath of DSE/golden_model.py.
+
+Each testbench sweeps the cross product of its stimulus fields, the first
+field being the outermost loop. The stimulus word packs the fields MSB
+first, so the testbench unpacks it with {field0, field1, ...} = stim.
+Files are named <testbench>_<param values>_{stim,exp}.hex in the order of
+the testbench parameters, which is how the testbenches locate them.
+
+Usage:
+  python tb/vectors/gen_vectors.py all
+  python tb/vectors/gen_vectors.py rnd_rne --param width_i=12 --param width_o=4
+  python tb/vectors/gen_vectors.py round_fp --check_cuda
+"""
+import argparse
+import os
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+import ref_spec
+
+
+Field = namedtuple("Field", ["name", "start", "count", "width"])
+VectorSpec = namedtuple("VectorSpec", ["fields", "exp_width", "reference"])
+# Random vectors too wide for a field sweep, generate(num_vectors, seed)
+# returns (stim, exp, stim_width, exp_width)
+RandomSpec = namedtuple("RandomSpec", ["generate"])
+
+
+def signed(values, width):
+  """Reinterprets width bit two's complement values."""
+  values = np.asarray(values, dtype=np.int64) & ((1 << width) - 1)
+  return np.where(values >= (1 << (width - 1)), values - (1 << width), values)
+
+
+def rnd_rne(width_i=24, width_o=4):
+  width_diff = width_i - width_o
+
+  # Overflow is flagged through bit width_o of the expected word
+  return VectorSpec(
+    fields=[Field("num", 1 << (width_i - 1), 1 << (width_i - 1), width_i)],
+    exp_width=width_o + 1,
+    reference=lambda num: ref_spec.rnd_rne_ref(num, width_diff),
+  )
+
+
+def rnd_stc(width_i=24, width_o=4):
+  width_diff = width_i - width_o
+
+  # The noise comes from the DUT's LFSR, which the testbench steps once per
+  # vector, so it follows the position in the file rather than a field
+  return VectorSpec(
+    fields=[Field("num", 1 << (width_i - 1), 1 << (width_i - 1), width_i)],
+    exp_width=width_o + 1,
+    reference=lambda num: ref_spec.rnd_stc_ref(num, width_diff, ref_spec.lfsr_noise(len(num))),
+  )
+
+
+def shift_rnd_rne(width_i=9, width_o=8, width_shift=8):
+  width_diff = width_i - width_o
+
+  return VectorSpec(
+    fields=[
+      Field("num", 0, 1 << width_i, width_i),
+      Field("shift", 0, 1 << width_shift, width_shift),
+    ],
+    exp_width=width_o,
+    reference=lambda num, shift: ref_spec.shift_rnd_rne_ref(signed(num, width_i), shift, width_diff, width_o),
+  )
+
+
+def fp_rnd_rne(width_i=8, width_o_exp=5, width_o_man=2, width_shift=8):
+  return VectorSpec(
+    fields=[
+      Field("num", 0, 1 << width_i, width_i),
+      Field("shift", 0, 1 << width_shift, width_shift),
+    ],
+    exp_width=width_o_exp + width_o_man,
+    reference=lambda num, shift: ref_spec.minifloat_bits(
+      ref_spec.fp_rnd_rne_ref(num, shift, width_o_exp, width_o_man, width_i), width_o_exp, width_o_man),
+  )
+
+
+def fp_rnd_nan_rne(width_i=8, width_o_exp=5, width_o_man=2, width_shift=8, sat=1, e4m3_spec=0):
+  return VectorSpec(
+    fields=[
+      Field("num", 0, 1 << width_i, width_i),
+      Field("shift", 0, 1 << width_shift, width_shift),
+      Field("nan", 0, 2, 1),
+    ],
+    exp_width=width_o_exp + width_o_man,
+    reference=lambda num, shift, nan: ref_spec.minifloat_bits(
+      ref_spec.fp_rnd_nan_rne_ref(num, shift, nan, width_o_exp, width_o_man, sat, e4m3_spec, width_i), width_o_exp, width_o_man),
+  )
+
+
+def conv_inttobf16(bit_width=21):
+  # BF16 result is the upper half of the FP32 encoding
+  return VectorSpec(
+    fields=[Field("num", 0, 1 << bit_width, bit_width)],
+    exp_width=16,
+    reference=lambda num: ref_spec.float_bits(ref_spec.conv_inttobf16_ref(signed(num, bit_width))) >> 16,
+  )
+
+
+def round_fp(man_width=3, exp_width=4):
+  return VectorSpec(
+    fields=[Field("value", 0, 1 << 32, 32)],
+    exp_width=32,
+    reference=lambda value: ref_spec.float_bits(
+      ref_spec.round_rne_fp_full(ref_spec.bits_float(value), man_width, exp_width)),
+  )
+
+
+def round_int(bit_width=8):
+  return VectorSpec(
+    fields=[Field("value", 0, 1 << 32, 32)],
+    exp_width=32,
+    reference=lambda value: ref_spec.float_bits(ref_spec.round_rne_int(ref_spec.bits_float(value), bit_width)),
+  )
+
+
+def _golden_model():
+  # DSE is a package of the repository root, not on the path of this script
+  repo_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+  if repo_root not in sys.path:
+    sys.path.insert(0, repo_root)
+  from DSE import golden_model
+  return golden_model
+
+
+def matmul_fp(x_rows=2, vec_elem_count=32, y_cols=2, k=8, exp_width=4, man_width=3, scale_width=8):
+  # Expected words of every accumulation method, the testbench instantiates one each
+  return RandomSpec(
+    generate=lambda num_vectors, seed: _golden_model().matmul_fp_vectors(
+      num_vectors, x_rows, vec_elem_count, y_cols, k, exp_width, man_width, scale_width, seed),
+  )
+
+
+TESTBENCHES = {
+  "rnd_rne": rnd_rne,
+  "rnd_stc": rnd_stc,
+  "shift_rnd_rne": shift_rnd_rne,
+  "fp_rnd_rne": fp_rnd_rne,
+  "fp_rnd_nan_rne": fp_rnd_nan_rne,
+  "conv_inttobf16": conv_inttobf16,
+  "round_fp": round_fp,
+  "round_int": round_int,
+  "matmul_fp": matmul_fp,
+}
+
+# Vector sets without a testbench, only checked against the CUDA extension
+CUDA_ONLY = ["round_fp", "round_int"]
+
+# Vectors sampled by default, the stimulus space of the CUDA rounding (2^32)
+# is too large to write out. All others but the random sets are exhaustive.
+# matmul_fp_tb.sv reads max_vectors = 1000
+SAMPLED_MAX_VECTORS = {"round_fp": 1 << 20, "round_int": 1 << 20, "matmul_fp": 1000}
+
+
+def default_params(name):
+  defaults = TESTBENCHES[name].__defaults__
+  arg_names = TESTBENCHES[name].__code__.co_varnames[:len(defaults)]
+  return dict(zip(arg_names, defaults))
+
+
+def vector_indices(spec, max_vectors, seed):
+  """
+  Sweep indices into the stimulus space, exhaustive when max_vectors is 0
+  or the space fits in it, otherwise a sorted random subset keeping both
+  corners.
+  """
+  space = int(np.prod([field.count for field in spec.fields], dtype=object))
+
+  if max_vectors <= 0 or space <= max_vectors:
+    return np.arange(space, dtype=np.int64)
+
+  rng = np.random.default_rng(seed)
+  indices = rng.choice(space, size=max_vectors - 2, replace=False)
+  return np.unique(np.concatenate([[0, space - 1], indices])).astype(np.int64)
+
+
+def generate(spec, indices):
+  """Returns (stimulus words, expected words) for the given sweep indices."""
+  values = {}
+  remaining = indices
+  for field in reversed(spec.fields):
+    values[field.name] = field.start + remaining % field.count
+    remaining = remaining // field.count
+
+  stim = np.zeros(len(indices), dtype=np.uint64)
+  for field in spec.fields:
+    stim = (stim << np.uint64(field.width)) | (values[field.name].astype(np.uint64) & np.uint64((1 << field.width) - 1))
+
+  exp = np.asarray(spec.reference(**values), dtype=np.int64) & ((1 << spec.exp_width) - 1)
+
+  return stim, exp.astype(np.uint64)
+
+
+def write_hex(path, words, width, header):
+  digits = (width + 3) // 4
+  with open(path, "w") as f:
+    f.write(f"// {header}\n")
+    f.write("\n".join(f"{word:0{digits}x}" for word in words.tolist()))
+    f.write("\n")
+
+
+def check_cuda(name, params, stim, exp):
+  """Runs the stimulus through the ordmm extension and compares bit patterns."""
+  import torch
+  import ordmm
+
+  values = torch.from_numpy(stim.astype(np.uint32).view(np.int32)).view(torch.float32).cuda()
+
+  if name == "round_fp":
+    out = ordmm.round_fp(values, params["man_width"], params["exp_width"])
+  elif name == "round_int":
+    out = ordmm.round_int(values, params["bit_width"])
+  else:
+    raise ValueError(f"No CUDA implementation to check {name} against.")
+
+  out_bits = out.cpu().view(torch.int32).numpy().view(np.uint32).astype(np.uint64)
+  both_nan = np.isnan(ref_spec.bits_float(out_bits)) & np.isnan(ref_spec.bits_float(exp))
+  mismatches = np.flatnonzero((out_bits != exp) & ~both_nan)
+
+  for index in mismatches[:10]:
+    print(f"  {name}: in {stim[index]:08x} cuda {out_bits[index]:08x} spec {exp[index]:08x}")
+
+  return len(mismatches)
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Generate $readmemh vector files from the NumPy reference spec')
+  parser.add_argument('testbenches', nargs='+', choices=list(TESTBENCHES) + ["all"], help='Vector sets to generate')
+  parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUE', help='Override a testbench parameter, repeatable')
+  parser.add_argument('--out', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "output"), help='Output directory (default: %(default)s)')
+  parser.add_argument('--max_vectors', type=int, default=None, help='Randomly sample this many vectors from larger stimulus spaces, 0 for exhaustive. The testbench max_vectors parameter must be at least this (default: exhaustive, %s)' % ", ".join(f"{count} for {name}" for name, count in SAMPLED_MAX_VECTORS.items()))
+  parser.add_argument('--seed', type=int, default=0, help='Seed for sampled stimulus spaces (default: %(default)s)')
+  parser.add_argument('--check_cuda', action='store_true', help='Check round_fp/round_int vectors against the ordmm CUDA extension')
+
+  args = parser.parse_args()
+
+  names = [name for name in TESTBENCHES if name not in CUDA_ONLY] if "all" in args.testbenches else args.testbenches
+  overrides = dict(param.split("=", 1) for param in args.param)
+
+  os.makedirs(args.out, exist_ok=True)
+
+  failed = 0
+  for name in names:
+    params = default_params(name)
+    params.update({key: int(value) for key, value in overrides.items() if key in params})
+
+    spec = TESTBENCHES[name](**params)
+    max_vectors = SAMPLED_MAX_VECTORS.get(name, 0) if args.max_vectors is None else args.max_vectors
+    if isinstance(spec, RandomSpec):
+      stim, exp, stim_width, exp_width = spec.generate(max_vectors or SAMPLED_MAX_VECTORS[name], args.seed)
+      stim, exp = np.array(stim, dtype=object), np.array(exp, dtype=object)
+    else:
+      stim, exp = generate(spec, vector_indices(spec, max_vectors, args.seed))
+      stim_width, exp_width = sum(field.width for field in spec.fields), spec.exp_width
+
+    header = f"{name} " + " ".join(f"{key}={value}" for key, value in params.items()) + f", {len(stim)} vectors"
+    prefix = os.path.join(args.out, "_".join([name] + [str(value) for value in params.values()]))
+
+    write_hex(f"{prefix}_stim.hex", stim, stim_width, header)
+    write_hex(f"{prefix}_exp.hex", exp, exp_width, header)
+    print(f"Wrote {len(stim)} vectors to {prefix}_{{stim,exp}}.hex")
+
+    if args.check_cuda and name in CUDA_ONLY:
+      mismatches = check_cuda(name, params, stim, exp)
+      print(f"CUDA check {name}: {mismatches} mismatches")
+      failed += mismatches > 0
+
+  sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+  main()
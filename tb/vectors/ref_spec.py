@@ -0,0 +1,214 @@
+"""
+NumPy reference spec for the tb/util and tb/convert testbenches. The BF16
+to MX block conversions (conv_bf16tomxfp6/8, conv_bf16tomxi8) keep their
+DPI-C references, their constrained-random blocks are out of its scope.
+
+Each *_ref function is a vectorized port of the scalar C function the
+testbench used to call through DPI, taking and returning arrays so a whole
+stimulus sweep is evaluated at once. round_rne_fp_full and round_rne_int
+port the device functions in quant/quant_acc/round_fp.cuh so the same
+vectors can be checked against the CUDA rounding.
+"""
+import numpy as np
+
+
+def rne(num):
+  """Round half to even, matching rne() in the C references."""
+  return np.rint(num)
+
+
+def bit_length(num):
+  """Position of the leading one plus one, 0 for 0 (non-negative input)."""
+  num = np.asarray(num, dtype=np.int64)
+  out = np.zeros(num.shape, dtype=np.int64)
+  nonzero = num > 0
+  out[nonzero] = np.frexp(num[nonzero].astype(np.float64))[1]
+  return out
+
+
+def float_bits(num):
+  return np.asarray(num, dtype=np.float32).view(np.uint32).astype(np.int64)
+
+
+def bits_float(bits):
+  return np.asarray(bits, dtype=np.int64).astype(np.uint32).view(np.float32)
+
+
+def minifloat_bits(num, width_exp, width_man):
+  """
+  Packs {exp, man} of the fp_rnd output encoding: 1.man * 2**exp, exp 0
+  holding the subnormals 0.man * 2, exp all ones with man 0 for Inf and
+  everything set for NaN.
+  """
+  num = np.asarray(num, dtype=np.float64)
+  finite = np.where(np.isfinite(num), num, 0.0)
+
+  exp = np.maximum(np.frexp(finite)[1] - 1, 0)
+  man = np.ldexp(finite, width_man - np.maximum(exp, 1)).astype(np.int64) - np.where(exp > 0, 1 << width_man, 0)
+
+  bits = (exp << width_man) | man
+  bits = np.where(np.isinf(num), ((1 << width_exp) - 1) << width_man, bits)
+  return np.where(np.isnan(num), (1 << (width_exp + width_man)) - 1, bits)
+
+
+def lfsr_noise(count):
+  """Noise rnd_stc's LFSR (x^6 + x^5 + 1, reset to 1) holds in its first count cycles."""
+  states = [1]
+  for _ in range(62):
+    state = states[-1]
+    states.append(((state << 1) & 0x3f) | (((state >> 5) ^ (state >> 4)) & 1))
+
+  return np.asarray(states, dtype=np.int64)[np.arange(count) % 63]
+
+
+def rnd_rne_ref(i_num, width_diff):
+  num = np.asarray(i_num, dtype=np.float32) / np.float32(2.0**width_diff)
+
+  if width_diff >= 32:
+    num = np.zeros_like(num)
+
+  return rne(num).astype(np.int64)
+
+
+def rnd_stc_ref(i_num, width_diff, noise):
+  num = np.asarray(i_num, dtype=np.float32) / np.float32(2.0**width_diff)
+
+  if width_diff >= 32:
+    num = np.zeros_like(num)
+
+  noise_shifted = np.asarray(noise, dtype=np.float32) / np.float32(2.0**6)
+
+  return np.trunc(num + noise_shifted).astype(np.int64)
+
+
+def shift_rnd_rne_ref(i_num, i_shift, width_diff, width_o):
+  total_shift = np.asarray(i_shift, dtype=np.int64) + width_diff
+
+  num = np.ldexp(np.asarray(i_num, dtype=np.float32), -np.minimum(total_shift, 31))
+  num = np.where(total_shift >= 31, np.float32(0), num)
+
+  rounded = rne(num).astype(np.int64)
+
+  # Saturate one step towards zero, the DUT never emits -2**(width_o-1)
+  ofl = np.abs(rounded) > ((1 << (width_o - 1)) - 1)
+  return np.where(ofl, rounded - np.sign(rounded), rounded)
+
+
+def _fp_rnd_align(i_num, i_shift, max_exp, width_i, width_man):
+  """
+  Normalizes the width_i bit input so its leading one sits in the MSB and
+  rounds to width_man fraction bits at the effective exponent, subnormals
+  included.
+  """
+  i_num = np.asarray(i_num, dtype=np.int64)
+
+  lz_num = np.where(i_num != 0, width_i - bit_length(i_num), 0)
+  align_num = i_num << lz_num
+  eff_exp = max_exp - np.asarray(i_shift, dtype=np.int64) - lz_num
+
+  num = align_num * 2.0**-(width_i - 1)
+
+  # Normals keep width_man fraction bits, subnormals lose one per exponent below 1
+  frac_bits = np.where(eff_exp > 0, width_man, width_man + eff_exp - 1)
+  num = rne(np.ldexp(num, frac_bits))
+  num = np.ldexp(num, eff_exp - frac_bits)
+
+  return num
+
+
+def fp_rnd_rne_ref(i_num, i_shift, width_exp, width_man, width_i=8):
+  max_exp = (1 << width_exp) - 1
+  max_val = ((1 << (width_man + 1)) - 1) * 2.0**(max_exp - width_man)
+
+  num = _fp_rnd_align(i_num, i_shift, max_exp, width_i, width_man)
+
+  return np.minimum(num, max_val).astype(np.float32)
+
+
+def fp_rnd_nan_rne_ref(i_num, i_shift, i_nan, width_exp, width_man, sat, e4m3_spec, width_i=8):
+  max_exp = (1 << width_exp) - 1 - (0 if e4m3_spec else 1)
+  max_val = ((1 << (width_man + 1)) - 1 - (1 if e4m3_spec else 0)) * 2.0**(max_exp - width_man)
+
+  num = _fp_rnd_align(i_num, i_shift, max_exp, width_i, width_man)
+
+  i_nan = np.asarray(i_nan, dtype=bool)
+  man_nonzero = (np.asarray(i_num, dtype=np.int64) & 0x7f) != 0
+
+  if sat:
+    ofl_val = max_val
+  elif e4m3_spec:
+    ofl_val = np.nan
+  else:
+    ofl_val = np.inf
+
+  ofl = (i_nan & ~man_nonzero) | (num > max_val)
+  num = np.where(ofl, ofl_val, num)
+  num = np.where(i_nan & man_nonzero, np.nan, num)
+
+  return num.astype(np.float32)
+
+
+def conv_inttobf16_ref(i_fi_num):
+  i_fi_num = np.asarray(i_fi_num, dtype=np.int64)
+
+  exp_val = bit_length(np.abs(i_fi_num)) - 1
+  rounded = np.ldexp(rne(np.ldexp(i_fi_num.astype(np.float64), 7 - exp_val)), exp_val - 7)
+
+  return np.where(i_fi_num == 0, 0.0, rounded)
+
+
+def round_rne_fp_full(value, man_width, exp_width):
+  """Bit-exact port of round_rne_fp_full in round_fp.cuh, float32 in and out."""
+  bits = float_bits(value)
+  sign = bits & 0x80000000
+  exp = (bits >> 23) & 0xFF
+  man = bits & 0x007FFFFF
+
+  max_exp = (1 << (exp_width - 1)) + 127
+  min_exp = -max_exp + 2 + 127 + 127
+  man_dif = 23 - man_width
+  max_bits = sign | (max_exp << 23) | (((1 << man_width) - 1) << man_dif)
+
+  # Subnormals drop more mantissa bits the further the exponent sits below min_exp
+  subnormal = exp < min_exp
+  man_shift = np.where(subnormal, man_dif + min_exp - exp, man_dif)
+  man_shift = np.clip(man_shift, 1, 24)
+
+  round_bit = man & (1 << (man_shift - 1))
+  sticky_bits = man & (((1 << man_shift) - 1) >> 1)
+  man = (man >> man_shift) << man_shift
+
+  round_up = (round_bit != 0) & ((sticky_bits != 0) | ((man & (1 << man_shift)) != 0))
+  man = np.where(round_up, man + (1 << man_shift), man)
+
+  # Mantissa overflow bumps the exponent
+  man_ofl = (man & 0x00800000) != 0
+  rnd_exp = np.where(man_ofl, exp + 1, exp)
+  man = np.where(man_ofl, 0, man)
+
+  out = sign | (rnd_exp << 23) | man
+  out = np.where(subnormal & (rnd_exp < min_exp - man_width), sign, out)
+  out = np.where(~subnormal & (rnd_exp > max_exp), max_bits, out)
+
+  # Range checks on the unrounded exponent come first in the kernel
+  out = np.where(exp < min_exp - man_width - 1, sign, out)
+  out = np.where(exp > max_exp, max_bits, out)
+
+  return bits_float(out)
+
+
+def round_rne_int(value, bit_width):
+  """Port of round_rne_int in round_fp.cuh, NaN clamps to the minimum like fmaxf."""
+  value = np.asarray(value, dtype=np.float32)
+
+  if bit_width >= 24:
+    return value
+  if bit_width <= 0:
+    return np.zeros_like(value)
+
+  max_val = np.float32((1 << (bit_width - 1)) - 1)
+  min_val = np.float32(-(1 << (bit_width - 1)))
+
+  clamped = np.fmin(np.fmax(value, min_val), max_val)
+
+  return np.rint(clamped).astype(np.float32)
@@ -0,0 +1,65 @@
+import threading
+
+from DSE.DesignConfig import DesignConfig
+from DSE.PerplexityWorkerPool import PerplexityWorkerPool
+
+DESIGN_STR = "attention_fp_S_q_4_S_kv_4_d_kq_4_d_v_4_k_4_scale_width_8_M1_E_0_M1_M_2_M2_E_8_M2_M_2_M3_E_4_M3_M_{}_ACCUM_METHOD_KAHAN_KULISCH_KULISCH_DSP_auto_auto_auto"
+
+
+class FakeConnection:
+  """Replies like quant/ppl_server.py, or loses the connection on the first receive."""
+  def __init__(self, reply=None, wait_for=None):
+    self.reply = reply
+    self.wait_for = wait_for
+    self.sent = []
+    self.received = threading.Event()
+    self.closed = False
+
+  def send(self, message):
+    self.sent.append(message)
+
+  def recv(self):
+    self.received.set()
+    if self.wait_for is not None:
+      assert self.wait_for.wait(timeout=10)
+    if self.reply is None:
+      raise EOFError("worker exited")
+    return self.reply
+
+  def close(self):
+    self.closed = True
+
+
+def test_evaluate_requeues_design_of_lost_worker():
+  designs = [DesignConfig.from_str(DESIGN_STR.format(m)) for m in range(1, 7)]
+  lost = FakeConnection()
+  # Replies once the lost worker has taken a design, so it cannot drain the queue first
+  failing = FakeConnection({"status": "error", "error": "RuntimeError: out of memory"}, wait_for=lost.received)
+  pool = PerplexityWorkerPool(devices=[])
+  pool.connections = [lost, failing]
+
+  replies = pool.evaluate(designs)
+
+  assert sorted(replies) == sorted(repr(design) for design in designs)
+  # The lost worker stops after its first design, which the surviving worker evaluates again
+  assert len(lost.sent) == 1
+  assert len(failing.sent) == len(designs)
+  assert lost.sent[0] in failing.sent
+  assert all(reply["error"] == "RuntimeError: out of memory" for reply in replies.values())
+  assert lost.closed
+  assert pool.connections == [failing]
+
+
+def test_evaluate_replies_to_every_design_once_no_worker_is_left():
+  designs = [DesignConfig.from_str(DESIGN_STR.format(m)) for m in range(1, 4)]
+  lost = FakeConnection()
+  pool = PerplexityWorkerPool(devices=[])
+  pool.connections = [lost]
+
+  replies = pool.evaluate(designs)
+
+  # Nothing to re-queue the lost design to, the rest are reported unserved
+  assert len(lost.sent) == 1
+  assert "connection lost" in replies[repr(designs[0])]["error"]
+  assert all(replies[repr(design)]["error"] == "No perplexity worker left" for design in designs[1:])
+  assert pool.connections == []
@@ -0,0 +1,31 @@
+from DSE.DesignConfig import DesignConfig
+from DSE.RunStore import RunStore
+
+DESIGN = DesignConfig.from_str("attention_fp_S_q_4_S_kv_4_d_kq_4_d_v_4_k_4_scale_width_8_M1_E_0_M1_M_2_M2_E_8_M2_M_2_M3_E_4_M3_M_2_ACCUM_METHOD_KAHAN_KULISCH_KULISCH_DSP_auto_auto_auto")
+
+
+def test_claim_race_loser_withdraws(tmp_path):
+  journal_path = str(tmp_path / "journal.jsonl")
+  # Two machines sharing the journal, claims of other hosts are only stale after claim_timeout_s
+  winner = RunStore(journal_path)
+  winner.host = "host-a"
+  loser = RunStore(journal_path)
+  loser.host = "host-b"
+
+  # The winner claims between the loser's check and its append
+  loser_append = loser._append
+  def racing_append(record):
+    if record["event"] == "claim":
+      assert winner.claim(DESIGN, "vivado", "20260101_0000")
+    loser_append(record)
+  loser._append = racing_append
+
+  assert not loser.claim(DESIGN, "vivado", "20260101_0001")
+  loser._append = loser_append
+  assert loser.claimed_by(DESIGN, "vivado") == ("host-a", winner.claims()[0]["pid"])
+  assert [claim["host"] for claim in loser.claims()] == ["host-a"]
+
+  winner.release(DESIGN, "vivado", "20260101_0000")
+  assert loser.claimed_by(DESIGN, "vivado") is None
+  assert loser.claim(DESIGN, "vivado", "20260101_0002")
+  assert winner.claimed_by(DESIGN, "vivado")[0] == "host-b"
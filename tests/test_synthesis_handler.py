@@ -0,0 +1,36 @@
+import os
+import shutil
+
+from DSE.DesignConfig import DesignConfig
+from DSE.SynthesisHandler import SynthesisHandler
+
+HDL_DIR = os.path.join(os.path.dirname(__file__), "..", "src", "attention")
+
+# A checked-in Vivado run, its reports use the legacy single block size naming
+LEGACY_RUN = "attention_fp_S_q_4_S_kv_4_d_kq_4_d_v_4_k_4_scale_width_8_M1_E_0_M1_M_2_M2_E_8_M2_M_2_M3_E_4_M3_M_2_ACCUM_METHOD_KAHAN_KULISCH_KULISCH_DSP_auto_auto_auto_time_20260116_1851"
+
+
+def test_read_result_legacy_reports():
+  design = DesignConfig.from_str(LEGACY_RUN.partition("_time_")[0])
+  # Looked up by the per-stage name the DSE uses
+  assert "_k1_4_k2_4_k3_4_" in repr(design)
+
+  result = SynthesisHandler(hdl_dir=HDL_DIR).read_result(design)
+
+  assert result is not None
+  assert result.fidelity == "vivado"
+  assert result.utilisation == {"LUTs": 8388, "FFs": 5376, "BRAMs": 0, "DSPs": 16}
+  assert result.power["dynamic"] == 0.195
+  assert result.power["static"] == 22.938
+  assert result.timing["no_violation"]
+  assert result.accuracy == -1.0
+
+
+def test_read_result_incomplete_run(tmp_path):
+  # Only the utilisation report of the run
+  synth_output_dir = tmp_path / "synth_output"
+  synth_output_dir.mkdir()
+  shutil.copy(os.path.join(HDL_DIR, "synth_output", f"{LEGACY_RUN}_util.rpt"), synth_output_dir)
+  design = DesignConfig.from_str(LEGACY_RUN.partition("_time_")[0])
+
+  assert SynthesisHandler(hdl_dir=str(tmp_path)).read_result(design) is None